@@ -1,21 +1,23 @@
-from typing import Any, List, Dict, Optional
+import asyncio
+from typing import Any, Iterable, List, Dict, Optional
 
 from koji import ClientSession
 from doozerlib.model import Model
 from doozerlib.rpm_delivery import RPMDeliveries, RPMDelivery
 from doozerlib.rpm_utils import parse_nvr
 
-from doozerlib import brew, util, Runtime
+from doozerlib import brew, exectools, util, Runtime
 from doozerlib.image import BrewBuildImageInspector
 from doozerlib.rpmcfg import RPMMetadata
 from doozerlib.assembly import assembly_rhcos_config, AssemblyTypes, assembly_permits, AssemblyIssue, \
     AssemblyIssueCode, assembly_type
-from doozerlib.rhcos import RHCOSBuildInspector, RHCOSBuildFinder, get_container_configs, RhcosMissingContainerException
+from doozerlib.registry import RegistryClient
+from doozerlib.rhcos import RHCOSBuildInspector, RHCOSBuildFinder, RHCOSReleaseBrowser, get_container_configs, RhcosMissingContainerException
 
 
 class AssemblyInspector:
     """ It inspects an assembly """
-    def __init__(self, runtime: Runtime, brew_session: ClientSession = None, lookup_mode: str = "both"):
+    def __init__(self, runtime: Runtime, brew_session: ClientSession = None, lookup_mode: str = "both", prefetch: bool = False):
         """
         :param runtime: Doozer runtime
         :param brew_session: Brew session object to use for communicating with Brew
@@ -25,6 +27,9 @@ class AssemblyInspector:
             "images": Do the lookups to enable image inspection, but expect code touching group RPMs
                       to fail (limited use case)
             "both": Do the lookups for a full inspection
+        :param prefetch: If True, the archives, installed RPMs and installed package builds of all release
+            images are queried up front in bulk instead of lazily for each image. Use when most of that
+            information will be inspected (e.g. gen-payload).
         """
         self.runtime = runtime
         self.brew_session = brew_session
@@ -35,17 +40,21 @@ class AssemblyInspector:
         self.assembly_type: AssemblyTypes = assembly_type(self.runtime.releases_config, self.runtime.assembly)
         self._rpm_build_cache: Dict[int, Dict[str, Optional[Dict]]] = {}  # Dict[rhel_ver] -> Dict[distgit_key] -> Optional[BuildDict]
         self._permits = assembly_permits(self.runtime.releases_config, self.runtime.assembly)
+        self._rhcos_builds: Dict[tuple, RHCOSBuildInspector] = {}  # (brew_arch, private, custom) => RHCOS build
 
         if not lookup_mode:  # do no lookups
             return
         # If an image component has a latest build, an ImageInspector associated with the image.
         self._release_image_inspectors: Dict[str, Optional[BrewBuildImageInspector]] = dict()
-        for image_meta in runtime.get_for_release_image_metas():
-            latest_build_obj = image_meta.get_latest_build(default=None)
-            if latest_build_obj:
-                self._release_image_inspectors[image_meta.distgit_key] = BrewBuildImageInspector(self.runtime, latest_build_obj['nvr'])
-            else:
-                self._release_image_inspectors[image_meta.distgit_key] = None
+        image_metas = list(runtime.get_for_release_image_metas())
+        latest_builds = runtime.resolve_latest_builds(image_metas) if image_metas else {}
+        dgks_with_builds = [image_meta.distgit_key for image_meta in image_metas if latest_builds.get(image_meta.distgit_key)]
+        inspectors = BrewBuildImageInspector.get_many(self.runtime, [latest_builds[dgk]['nvr'] for dgk in dgks_with_builds])
+        for image_meta in image_metas:
+            self._release_image_inspectors[image_meta.distgit_key] = None
+        self._release_image_inspectors.update(zip(dgks_with_builds, inspectors))
+        if prefetch:
+            BrewBuildImageInspector.prefetch(self.runtime, inspectors)
 
         # Preprocess rpm_deliveries group config
         # This is mainly to support weekly kernel delivery
@@ -381,6 +390,30 @@ class AssemblyInspector:
         :return: Returns an RHCOSBuildInspector for the specified arch. For non-STREAM assemblies, this will be the RHCOS builds
                  pinned in the assembly definition. For STREAM assemblies, it will be the latest RHCOS build in the latest
                  in the app.ci imagestream for ART's release/arch (e.g. ocp-s390x:is/4.7-art-latest-s390x).
+                 Inspectors are retained, so subsequent calls for the same build return the same inspector.
+        """
+        key = (util.brew_arch_for_go_arch(arch), private, custom)
+        if key not in self._rhcos_builds:
+            self._rhcos_builds[key] = exectools.run_coroutine(self._load_rhcos_build(arch, private, custom))
+        return self._rhcos_builds[key]
+
+    async def prefetch_rhcos_builds(self, arches: List[str], private_modes: Iterable[bool] = (False,)):
+        """
+        Retrieves the RHCOS builds of the specified arches and privacy modes concurrently, so that
+        subsequent get_rhcos_build calls for them return immediately.
+        """
+        keys = {(util.brew_arch_for_go_arch(arch), private, False) for arch in arches for private in private_modes}
+        keys = [key for key in keys if key not in self._rhcos_builds]
+        async with RHCOSReleaseBrowser(self.runtime) as release_browser, RegistryClient() as registry:
+            builds = await asyncio.gather(*(self._load_rhcos_build(brew_arch, private, custom, release_browser, registry)
+                                            for brew_arch, private, custom in keys))
+        self._rhcos_builds.update(zip(keys, builds))
+
+    async def _load_rhcos_build(self, arch: str, private: bool, custom: bool,
+                                release_browser: Optional[RHCOSReleaseBrowser] = None,
+                                registry: Optional[RegistryClient] = None) -> RHCOSBuildInspector:
+        """
+        See get_rhcos_build. Clients are shared by concurrent calls if specified.
         """
         runtime = self.runtime
         brew_arch = util.brew_arch_for_go_arch(arch)
@@ -407,8 +440,8 @@ class AssemblyInspector:
 
             try:
                 version = self.runtime.get_minor_version()
-                build_id, pullspec = RHCOSBuildFinder(runtime, version, brew_arch, private,
-                                                      custom=custom).latest_container(container_conf)
+                build_id, pullspec = await RHCOSBuildFinder(runtime, version, brew_arch, private, custom=custom,
+                                                            release_browser=release_browser).find_latest_container(container_conf)
                 if not pullspec:
                     raise IOError(f"No RHCOS latest found for {version} / {brew_arch}")
                 pullspec_for_tag[container_conf.name] = pullspec
@@ -418,4 +451,5 @@ class AssemblyInspector:
                     # their absence will be noted when generating payloads anyway.
                     raise
 
-        return RHCOSBuildInspector(runtime, pullspec_for_tag, brew_arch, build_id)
+        return await RHCOSBuildInspector.create(runtime, pullspec_for_tag, brew_arch, build_id,
+                                                release_browser=release_browser, registry=registry)
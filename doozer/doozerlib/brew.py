@@ -4,21 +4,29 @@ Utility functions for general interactions with Brew and Builds
 
 # stdlib
 import asyncio
+import dataclasses
 import json
 import logging
 import threading
 import time
 import traceback
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from dataclasses import dataclass
 from enum import Enum
 from multiprocessing import Lock
-from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 # 3rd party
+import aiohttp
 import koji
-import koji_cli.lib
 import requests
+from koji.xmlrpcplus import Fault, dumps, getparser
+from requests.adapters import HTTPAdapter
 
-from doozerlib import exectools, constants
+from doozerlib import exectools, constants, koji_cache, telemetry
 
 from . import logutil
 from .model import Missing
@@ -65,117 +73,48 @@ def get_watch_task_info_copy():
 
 
 def watch_task(session, log_f, task_id, terminate_event):
-    end = time.time() + constants.BREW_BUILD_TIMEOUT
-    watcher = koji_cli.lib.TaskWatcher(
-        task_id,
-        session,
-        quiet=True)
-    error = None
-    except_count = 0
-    while error is None:
+    """ Watch a Koji Task for completion
+    :param session: Koji client session
+    :param log_f: a log function
+    :param task_id: Brew task ID
+    :param terminate_event: terminate event
+    :return: error or None on success
+    """
+    watcher = get_task_watcher(session)
+    future = watcher.watch(task_id, log_f, timeout=constants.BREW_BUILD_TIMEOUT, timeout_error='Timeout building image')
+    while True:
         try:
-            watcher.update()
-            except_count = 0
-
-            # Keep around metrics for each task we watch
-            with watch_task_lock:
-                watch_task_info[task_id] = dict(watcher.info)
-
-            if watcher.is_done():
-                return None if watcher.is_success() else watcher.get_failure()
-            log_f("Task state: " + koji.TASK_STATES[watcher.info['state']])
-        except Exception:
-            except_count += 1
-            # possible for watcher.update() to except during connection issue, try again
-            log_f('watcher.update() exception. Trying again in 60s.\n{}'.format(traceback.format_exc()))
-            if except_count >= 10:
-                log_f('watcher.update() excepted 10 times. Giving up.')
-                error = traceback.format_exc()
-                break
-
-        if terminate_event.wait(timeout=3 * 60):
-            error = 'Interrupted'
-        elif time.time() > end:
-            error = 'Timeout building image'
+            return future.result(timeout=1)
+        except FutureTimeoutError:
+            if terminate_event.is_set():
+                watcher.cancel(task_id, 'Interrupted')
+                return future.result()
 
-    log_f(error + ", canceling build")
-    if not session.logged_in:
-        log_f("user logged out from session, login again")
-        session.gssapi_login()
-    canceled = session.cancelTask(task_id, recurse=True)
-    if canceled:
-        log_f(f"Brew task {task_id} was canceled.")
-    else:
-        log_f(f"Brew task {task_id} was NOT canceled.")
-    return error
 
-
-def watch_tasks(session, log_f, task_ids, terminate_event):
+def watch_tasks(session, log_f, task_ids, terminate_event, timeout=constants.BREW_TASK_WATCH_TIMEOUT):
     """ Watch Koji Tasks for completion
     :param session: Koji client session
     :param log_f: a log function
     :param task_ids: a list of task IDs
     :param terminate_event: terminate event
+    :param timeout: Seconds after which unfinished tasks are canceled
     :return: a dict of task ID and error message mappings
     """
     if not task_ids:
         return
-    end = time.time() + 4 * 60 * 60
-    watchers = {}
-    errors = {}
-    except_counts = {}
-    for task_id in task_ids:
-        watchers[task_id] = koji_cli.lib.TaskWatcher(task_id, session, quiet=True)
-        except_counts[task_id] = 0
-    tasks_to_poll = set(watchers.keys())
-    tasks_to_cancel = set()
-    while True:
-        for task_id in tasks_to_poll.copy():
-            watcher = watchers[task_id]
+    watcher = get_task_watcher(session)
+    futures = {task_id: watcher.watch(task_id, log_f, timeout=timeout) for task_id in task_ids}
+    for task_id, future in futures.items():
+        while True:
             try:
-                watcher.update()
-                except_counts[task_id] = 0
-                # Keep around metrics for each task we watch
-                with watch_task_lock:
-                    watch_task_info[task_id] = dict(watcher.info)
-                if watcher.is_done():
-                    errors[task_id] = None if watcher.is_success() else watcher.get_failure()
-                    tasks_to_poll.remove(task_id)
-                log_f(f"Task {task_id} state: {koji.TASK_STATES[watcher.info['state']]}")
-            except Exception:
-                except_counts[task_id] += 1
-                # possible for watcher.update() to except during connection issue, try again
-                log_f('watcher.update() exception. Trying again in 60s.\n{}'.format(traceback.format_exc()))
-                if except_counts[task_id] >= 10:
-                    log_f('watcher.update() excepted 10 times. Giving up.')
-                    errors[task_id] = traceback.format_exc()
-                    tasks_to_cancel.add(task_id)
-                    tasks_to_poll.remove(task_id)
-        if not tasks_to_poll:
-            break
-        if terminate_event.wait(timeout=3 * 60):
-            for task_id in tasks_to_poll:
-                tasks_to_cancel.add(task_id)
-                errors[task_id] = 'Interrupted'
-            break
-        if time.time() > end:
-            for task_id in tasks_to_poll:
-                tasks_to_cancel.add(task_id)
-                errors[task_id] = 'Timeout watching task'
-            break
-    if tasks_to_cancel:
-        log_f(f"{errors}, canceling builds")
-        for task_id in tasks_to_cancel:
-            log_f(f"Error waiting for Brew task {task_id}: {errors[task_id]}. Canceling...")
-            if not session.logged_in:
-                log_f("user logged out from session, login again")
-                session.gssapi_login()
-            canceled = session.cancelTask(task_id, recurse=True)
-            if canceled:
-                log_f(f"Brew task {task_id} was canceled.")
-            else:
-                log_f(f"Brew task {task_id} was NOT canceled.")
-    return errors
+                future.result(timeout=1)
+                break
+            except FutureTimeoutError:
+                if terminate_event.is_set():
+                    for tid in futures:
+                        watcher.cancel(tid, 'Interrupted')
+                    break
+    return {task_id: future.result() for task_id, future in futures.items()}
 
 
 async def watch_task_async(session: koji.ClientSession, log_f: Callable, task_id: int) -> Optional[str]:
@@ -185,15 +124,8 @@ async def watch_task_async(session: koji.ClientSession, log_f: Callable, task_id
     :param task_id: Brew task ID
     :return: error or None on success
     """
-    terminate_event = threading.Event()
-    try:
-        error = await exectools.to_thread(
-            watch_task, session, log_f, task_id, terminate_event
-        )
-    except (asyncio.CancelledError, KeyboardInterrupt):
-        terminate_event.set()
-        raise
-    return error
+    return await get_task_watcher(session).watch_async(task_id, log_f, timeout=constants.BREW_BUILD_TIMEOUT,
+                                                       timeout_error='Timeout building image')
 
 
 async def watch_tasks_async(session: koji.ClientSession, log_f: Callable, task_ids: List[int]) -> Dict[int, Optional[str]]:
@@ -203,15 +135,246 @@ async def watch_tasks_async(session: koji.ClientSession, log_f: Callable, task_i
     :param task_ids: List of Brew task IDs
     :return: a dict of task ID and error message mappings
     """
-    terminate_event = threading.Event()
-    try:
-        errors = await exectools.to_thread(
-            watch_tasks, session, log_f, task_ids, terminate_event
-        )
-    except (asyncio.CancelledError, KeyboardInterrupt):
-        terminate_event.set()
-        raise
-    return errors
+    watcher = get_task_watcher(session)
+    errors = await asyncio.gather(*[watcher.watch_async(task_id, log_f, timeout=constants.BREW_TASK_WATCH_TIMEOUT)
+                                    for task_id in task_ids])
+    return dict(zip(task_ids, errors))
+
+
+@dataclass
+class _WatchedTask:
+    future: Future
+    log_f: Callable
+    started: float
+    deadline: float
+    next_poll: float
+    timeout_error: str
+
+
+class KojiTaskWatcher:
+    """
+    Watches many Brew tasks from a single thread. Due tasks are polled with one getTaskInfo
+    multicall per cycle, rather than running a TaskWatcher (and a thread) per task.
+    Polling is adaptive: a task is polled often right after it is registered, and less
+    often the longer it runs.
+    """
+
+    def __init__(self, session_factory: Callable[[], koji.ClientSession],
+                 min_poll_interval: float = constants.BREW_TASK_WATCH_MIN_INTERVAL,
+                 max_poll_interval: float = constants.BREW_TASK_WATCH_MAX_INTERVAL,
+                 timeout: float = constants.BREW_BUILD_TIMEOUT):
+        """
+        :param session_factory: Creates the koji session used by the watcher thread
+        :param min_poll_interval: Seconds between two polls of a task which was just registered
+        :param max_poll_interval: Maximum number of seconds between two polls of a task
+        :param timeout: Default number of seconds after which a watched task is canceled
+        """
+        self._session_factory = session_factory
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._tasks: Dict[int, _WatchedTask] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def poll_interval(self, age: float) -> float:
+        """
+        :param age: Seconds since the task was registered
+        :return: Seconds to wait before polling the task again
+        """
+        return min(self.max_poll_interval, max(self.min_poll_interval, age / 10))
+
+    def watch(self, task_id: int, log_f: Optional[Callable] = None, timeout: Optional[float] = None,
+              timeout_error: str = 'Timeout watching task') -> Future:
+        """ Starts watching a Brew task
+        :param task_id: Brew task ID
+        :param log_f: a log function
+        :param timeout: Seconds after which the task is canceled; defaults to the timeout of the watcher
+        :param timeout_error: Error message the future resolves to if the task times out
+        :return: a future resolving to an error message, or None on success
+        """
+        now = time.time()
+        with self._lock:
+            if self._stopped:
+                raise ValueError("KojiTaskWatcher has been stopped")
+            if task_id in self._tasks:
+                return self._tasks[task_id].future
+            task = _WatchedTask(future=Future(), log_f=log_f or logger.info, started=now,
+                                deadline=now + (timeout or self.timeout), next_poll=now + self.min_poll_interval,
+                                timeout_error=timeout_error)
+            self._tasks[task_id] = task
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, name="koji-task-watcher", daemon=True)
+                self._thread.start()
+            self._wakeup.notify_all()
+        return task.future
+
+    async def watch_async(self, task_id: int, log_f: Optional[Callable] = None, timeout: Optional[float] = None,
+                          timeout_error: str = 'Timeout watching task') -> Optional[str]:
+        """ Asynchronously watches a Brew task for completion. If the caller is cancelled, so is the Brew task.
+        :param task_id: Brew task ID
+        :param log_f: a log function
+        :param timeout: Seconds after which the task is canceled; defaults to the timeout of the watcher
+        :param timeout_error: Error message returned if the task times out
+        :return: error or None on success
+        """
+        future = self.watch(task_id, log_f, timeout, timeout_error)
+        try:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            await exectools.to_thread(self.cancel, task_id, 'Interrupted')
+            raise
+
+    def cancel(self, task_id: int, error: str = 'Interrupted'):
+        """ Cancels a watched Brew task and resolves its future with the given error.
+        :param task_id: Brew task ID
+        :param error: The error to report to the watchers of the task
+        """
+        with self._lock:
+            task = self._tasks.get(task_id)
+        if task:
+            self._cancel_task(task_id, task.log_f, error)
+            self._finish(task_id, error)
+
+    def cancel_all(self, error: str = 'Interrupted'):
+        """ Cancels every watched Brew task
+        :param error: The error to report to the watchers of the tasks
+        """
+        with self._lock:
+            task_ids = list(self._tasks)
+        for task_id in task_ids:
+            self.cancel(task_id, error)
+
+    def stop(self, cancel_tasks: bool = True):
+        """ Stops watching. Tasks still being watched are resolved with an 'Interrupted' error.
+        :param cancel_tasks: Whether to cancel the Brew tasks that are still being watched
+        """
+        with self._lock:
+            self._stopped = True
+            tasks = self._tasks
+            self._tasks = {}
+            self._wakeup.notify_all()
+        for task_id, task in tasks.items():
+            if cancel_tasks:
+                self._cancel_task(task_id, task.log_f, 'Interrupted')
+            task.future.set_result('Interrupted')
+
+    def _get_session(self) -> koji.ClientSession:
+        if not self._session:
+            self._session = self._session_factory()
+        return self._session
+
+    def _finish(self, task_id: int, error: Optional[str]):
+        with self._lock:
+            task = self._tasks.pop(task_id, None)
+        if task:
+            task.future.set_result(error)
+
+    def _cancel_task(self, task_id: int, log_f: Callable, error: str):
+        log_f(f"{error}, canceling Brew task {task_id}")
+        try:
+            with self._session_lock:
+                session = self._get_session()
+                if not session.logged_in:
+                    log_f("user logged out from session, login again")
+                    session.gssapi_login()
+                canceled = session.cancelTask(task_id, recurse=True)
+            if canceled:
+                log_f(f"Brew task {task_id} was canceled.")
+            else:
+                log_f(f"Brew task {task_id} was NOT canceled.")
+        except Exception:
+            log_f(f"Error canceling Brew task {task_id}:\n{traceback.format_exc()}")
+
+    @staticmethod
+    def _get_failure(session: koji.ClientSession, task_id: int) -> str:
+        """ Mirrors koji_cli.lib.TaskWatcher.get_failure """
+        try:
+            session.getTaskResult(task_id)
+        except (Fault, koji.GenericError) as e:
+            return f'{e.__class__.__name__}: {str(e).strip()}'
+        return ''
+
+    def _poll(self, tasks: Dict[int, _WatchedTask]):
+        with self._session_lock:
+            session = self._get_session()
+            with session.multicall(strict=True) as m:
+                calls = {task_id: m.getTaskInfo(task_id, request=True) for task_id in tasks}
+            results = {task_id: call.result for task_id, call in calls.items()}
+            finished = {}
+            for task_id, info in results.items():
+                # Keep around metrics for each task we watch
+                with watch_task_lock:
+                    watch_task_info[task_id] = dict(info)
+                task_state = koji.TASK_STATES[info['state']]
+                if task_state == 'CLOSED':
+                    finished[task_id] = None
+                elif task_state in ('CANCELED', 'FAILED'):
+                    finished[task_id] = self._get_failure(session, task_id)
+                else:
+                    tasks[task_id].log_f(f"Task {task_id} state: {task_state}")
+        for task_id, error in finished.items():
+            self._finish(task_id, error)
+        now = time.time()
+        for task_id, task in tasks.items():
+            if task_id not in finished and now > task.deadline:
+                self._cancel_task(task_id, task.log_f, task.timeout_error)
+                self._finish(task_id, task.timeout_error)
+
+    def _run(self):
+        except_count = 0
+        while True:
+            with self._lock:
+                if not self._tasks:
+                    self._thread = None
+                    return
+                now = time.time()
+                # Tasks which are nearly due are polled early so they share the multicall
+                horizon = now + self.min_poll_interval / 2
+                due = {task_id: task for task_id, task in self._tasks.items() if task.next_poll <= horizon}
+                if not due:
+                    self._wakeup.wait(min(task.next_poll for task in self._tasks.values()) - now)
+                    continue
+            try:
+                self._poll(due)
+                except_count = 0
+            except Exception:
+                except_count += 1
+                # possible for getTaskInfo to except during connection issue, try again
+                logger.warning('Error polling Brew tasks. Trying again.\n%s', traceback.format_exc())
+                if except_count >= 10:
+                    error = traceback.format_exc()
+                    logger.error('Polling Brew tasks excepted 10 times. Giving up.')
+                    for task_id, task in due.items():
+                        self._cancel_task(task_id, task.log_f, 'Error watching task')
+                        self._finish(task_id, error)
+            now = time.time()
+            with self._lock:
+                for task in due.values():
+                    task.next_poll = now + self.poll_interval(now - task.started)
+
+
+# Process-wide task watchers, keyed by koji hub URL
+_task_watchers: Dict[str, KojiTaskWatcher] = {}
+_task_watchers_lock = threading.Lock()
+
+
+def get_task_watcher(session: koji.ClientSession) -> KojiTaskWatcher:
+    """ Returns the process-wide KojiTaskWatcher for the koji hub of the given session.
+    The watcher uses its own session, created with the URL and options of the given one.
+    :param session: Koji client session
+    :return: a KojiTaskWatcher shared by every caller watching tasks on the same hub
+    """
+    with _task_watchers_lock:
+        watcher = _task_watchers.get(session.baseurl)
+        if not watcher:
+            baseurl, opts = session.baseurl, dict(session.opts)
+            watcher = _task_watchers[baseurl] = KojiTaskWatcher(lambda: koji.ClientSession(baseurl, opts=opts))
+        return watcher
 
 
 def get_build_objects(ids_or_nvrs, session):
@@ -390,6 +553,118 @@ def has_tag_changed_since_build(runtime, koji_client, build, tag, inherit=True)
     return dict()
 
 
+@dataclass
+class KojiSessionPoolStats:
+    size: int = 0  # number of sessions created
+    max_size: int = 0  # maximum number of sessions the pool will create
+    in_use: int = 0  # number of sessions currently checked out
+    peak_in_use: int = 0
+    checkouts: int = 0
+    waits: int = 0  # number of checkouts which had to wait for a session to be released
+    total_wait_time: float = 0.0
+    max_wait_time: float = 0.0
+    total_checkout_duration: float = 0.0
+    max_checkout_duration: float = 0.0
+
+    def __str__(self) -> str:
+        avg_wait = self.total_wait_time / self.checkouts if self.checkouts else 0.0
+        avg_checkout = self.total_checkout_duration / self.checkouts if self.checkouts else 0.0
+        return (f'size={self.size}/{self.max_size} peak_in_use={self.peak_in_use} checkouts={self.checkouts} '
+                f'waits={self.waits} wait_time(total={self.total_wait_time:.1f}s avg={avg_wait:.3f}s max={self.max_wait_time:.1f}s) '
+                f'checkout_duration(avg={avg_checkout:.3f}s max={self.max_checkout_duration:.1f}s)')
+
+
+class KojiSessionPool:
+    """
+    A bounded pool of koji sessions. When every session is checked out, callers block on a
+    condition variable and are woken in FIFO order as sessions are released.
+    """
+
+    def __init__(self, session_factory: Callable[[], "KojiWrapper"], max_size: int):
+        """
+        :param session_factory: Called (without holding any lock) to create a new session when the pool has room to grow.
+        :param max_size: The maximum number of sessions the pool will create.
+        """
+        if max_size < 1:
+            raise ValueError(f'Koji session pool size must be at least 1; got {max_size}')
+        self._session_factory = session_factory
+        self._cond = threading.Condition()
+        self._available: List["KojiWrapper"] = []  # released sessions; most recently released (warmest) last
+        self._waiters = deque()  # FIFO of tickets for threads waiting to check out a session
+        self._stats = KojiSessionPoolStats(max_size=max_size)
+
+    @property
+    def max_size(self) -> int:
+        return self._stats.max_size
+
+    def stats(self) -> KojiSessionPoolStats:
+        """
+        :return: A copy of the pool statistics
+        """
+        with self._cond:
+            return dataclasses.replace(self._stats)
+
+    def _can_checkout_unsafe(self, ticket) -> bool:
+        """Call while holding the condition lock!"""
+        return self._waiters[0] is ticket and (self._available or self._stats.size < self._stats.max_size)
+
+    @contextmanager
+    def session(self) -> Iterator["KojiWrapper"]:
+        """
+        Context manager which checks out a session from the pool and returns it to the pool on exit.
+        """
+        start = time.monotonic()
+        ticket = object()
+        with self._cond:
+            self._waiters.append(ticket)
+            waited = False
+            try:
+                while not self._can_checkout_unsafe(ticket):
+                    waited = True
+                    self._cond.wait()
+            finally:
+                self._waiters.remove(ticket)
+                # Whoever is now at the head of the line may be able to proceed.
+                self._cond.notify_all()
+
+            session = None
+            if self._available:
+                session = self._available.pop()
+            else:
+                self._stats.size += 1  # reserve a slot; the session is created outside the lock
+
+            wait_time = time.monotonic() - start
+            stats = self._stats
+            stats.checkouts += 1
+            stats.waits += 1 if waited else 0
+            stats.total_wait_time += wait_time
+            stats.max_wait_time = max(stats.max_wait_time, wait_time)
+            stats.in_use += 1
+            stats.peak_in_use = max(stats.peak_in_use, stats.in_use)
+
+        if session is None:
+            try:
+                session = self._session_factory()
+            except BaseException:
+                with self._cond:
+                    self._stats.size -= 1
+                    self._stats.in_use -= 1
+                    self._cond.notify_all()
+                raise
+
+        checkout_start = time.monotonic()
+        try:
+            yield session
+        finally:
+            duration = time.monotonic() - checkout_start
+            with self._cond:
+                self._available.append(session)
+                self._stats.in_use -= 1
+                self._stats.total_checkout_duration += duration
+                self._stats.max_checkout_duration = max(self._stats.max_checkout_duration, duration)
+                self._cond.notify_all()
+
+
 class KojiWrapperOpts(object):
     """
     A structure to carry special options into KojiWrapper API invocations. When using
@@ -449,6 +724,17 @@ class KojiWrapper(koji.ClientSession):
     # from the server. This cache is shared among all instances of the wrapper.
     _koji_wrapper_result_cache = {}
 
+    # If enabled with enable_persistent_cache, cache entries are also stored on disk so that they
+    # can be reused by subsequent doozer invocations. Shared among all instances of the wrapper.
+    _koji_wrapper_persistent_cache: Optional[koji_cache.KojiCacheStore] = None
+
+    # Hit / miss / bytes counters for the result cache. Protected by _koji_wrapper_lock.
+    _koji_wrapper_cache_stats = koji_cache.KojiCacheStats()
+
+    # Cacheable calls currently being sent to the hub. Threads making an identical call wait for the
+    # event to be set instead of sending the call again. Protected by _koji_wrapper_lock.
+    _koji_wrapper_in_flight: Dict[str, threading.Event] = {}
+
     # A list of methods which support receiving an event kwarg. See --brew-event CLI argument.
     methods_with_event = set([
         'getBuildConfig',
@@ -567,7 +853,7 @@ class KojiWrapper(koji.ClientSession):
         'uploadFile',
     ])
 
-    def __init__(self, koji_session_args, brew_event=None, force_instance_caching=False):
+    def __init__(self, koji_session_args, brew_event=None, force_instance_caching=False, http_adapter: Optional[HTTPAdapter] = None):
         """
         See class description on what this wrapper provides.
         :param koji_session_args: list to pass as *args to koji.ClientSession superclass
@@ -577,7 +863,10 @@ class KojiWrapper(koji.ClientSession):
         :param force_instance_caching: Caching normally occurs based on individual koji calls. Setting this value to
                 True will override those api level choices - causing every API call to be cached for this
                 instance (see KojiWrapper.force_global_caching to do this for all instances).
+        :param http_adapter: If specified, HTTP requests of this session are sent through this adapter. Sharing
+                an adapter among sessions allows them to reuse keep-alive connections to the hub.
         """
+        self._http_adapter = http_adapter  # must be set before the superclass assigns rsession
         self.___brew_event = None if not brew_event else int(brew_event)
         super(KojiWrapper, self).__init__(*koji_session_args)
         self.force_instance_caching = force_instance_caching
@@ -586,11 +875,65 @@ class KojiWrapper(koji.ClientSession):
         if brew_event:
             self.___before_timestamp = self.getEvent(self.___brew_event)['ts']
 
+    @property
+    def rsession(self) -> Optional[requests.Session]:
+        return self.__dict__.get('_rsession')
+
+    @rsession.setter
+    def rsession(self, session: Optional[requests.Session]):
+        # The koji library (re)creates its requests.Session lazily. Mount the shared adapter whenever it does.
+        adapter = self.__dict__.get('_http_adapter')  # koji's __getattr__ would turn a missing attribute into an api call
+        if session is not None and adapter is not None:
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.__dict__['_rsession'] = session
+
+    def new_session(self):
+        # koji calls this on login, logout and after each retried transport error. It closes the current
+        # requests.Session first, which would close the shared adapter and drop the connections other
+        # sessions are using. Just replace this session's requests.Session.
+        if self.__dict__.get('_http_adapter') is None:
+            return super().new_session()
+        self.logger.debug("Opening new requests session")
+        self.rsession = requests.Session()
+
     @classmethod
     def clear_global_cache(cls):
         with cls._koji_wrapper_lock:
             cls._koji_wrapper_result_cache.clear()
 
+    @classmethod
+    def enable_persistent_cache(cls, path: str, volatile_ttl: int = constants.KOJI_CACHE_VOLATILE_TTL):
+        """
+        Back the result cache with an on-disk store. Immutable results (e.g. completed builds) and results
+        constrained by a brew event never expire; other results are trusted for volatile_ttl seconds.
+        :param path: Directory in which to store the cache database
+        :param volatile_ttl: Seconds for which results which may change are trusted
+        """
+        with cls._koji_wrapper_lock:
+            if cls._koji_wrapper_persistent_cache:
+                cls._koji_wrapper_persistent_cache.close()
+            cls._koji_wrapper_persistent_cache = koji_cache.KojiCacheStore(path, volatile_ttl=volatile_ttl)
+
+    @classmethod
+    def disable_persistent_cache(cls):
+        with cls._koji_wrapper_lock:
+            if cls._koji_wrapper_persistent_cache:
+                cls._koji_wrapper_persistent_cache.close()
+            cls._koji_wrapper_persistent_cache = None
+
+    @classmethod
+    def get_cache_stats(cls) -> koji_cache.KojiCacheStats:
+        """
+        :return: A copy of the hit/miss/bytes counters for the result cache.
+        """
+        with cls._koji_wrapper_lock:
+            stats = dataclasses.replace(cls._koji_wrapper_cache_stats)
+            if cls._koji_wrapper_persistent_cache:
+                stats.bytes_read = cls._koji_wrapper_persistent_cache.bytes_read
+                stats.bytes_written = cls._koji_wrapper_persistent_cache.bytes_written
+            return stats
+
     @classmethod
     def get_cache_size(cls):
         with cls._koji_wrapper_lock:
@@ -613,19 +956,83 @@ class KojiWrapper(koji.ClientSession):
         with KojiWrapper._koji_wrapper_lock:
             KojiWrapper._koji_wrapper_result_cache = json.load(input_filelike)
 
-    def _get_cache_bucket_unsafe(self):
+    @classmethod
+    def _get_cache_bucket_unsafe(cls):
         """Call while holding lock!"""
         return KojiWrapper._koji_wrapper_result_cache
 
-    def _cache_result(self, api_repr, result):
+    @classmethod
+    def _cache_result(cls, api_repr, result, method_name=None, args=None, kwargs=None):
         with KojiWrapper._koji_wrapper_lock:
-            cache_bucket = self._get_cache_bucket_unsafe()
+            cache_bucket = cls._get_cache_bucket_unsafe()
             cache_bucket[api_repr] = result
+            persistent_cache = KojiWrapper._koji_wrapper_persistent_cache
 
-    def _get_cache_result(self, api_repr, return_on_miss):
+        if persistent_cache and method_name:
+            # The store classifies the result to determine whether / how long it may be persisted.
+            persistent_cache.put(api_repr, method_name, args, kwargs, result)
+
+    @classmethod
+    def _get_cache_result(cls, api_repr, return_on_miss):
         with KojiWrapper._koji_wrapper_lock:
-            cache_bucket = self._get_cache_bucket_unsafe()
-            return cache_bucket.get(api_repr, return_on_miss)
+            cache_bucket = cls._get_cache_bucket_unsafe()
+            stats = KojiWrapper._koji_wrapper_cache_stats
+            result = cache_bucket.get(api_repr, Missing)
+            if result is not Missing:
+                stats.memory_hits += 1
+                return result
+            persistent_cache = KojiWrapper._koji_wrapper_persistent_cache
+
+        if persistent_cache:
+            found, result = persistent_cache.get(api_repr)
+            if found:
+                with KojiWrapper._koji_wrapper_lock:
+                    cache_bucket[api_repr] = result
+                    stats.persistent_hits += 1
+                return result
+
+        with KojiWrapper._koji_wrapper_lock:
+            stats.misses += 1
+        return return_on_miss
+
+    @classmethod
+    def _begin_in_flight_call(cls, api_repr) -> Optional[threading.Event]:
+        """
+        Registers the caller as the thread making a cacheable call, unless an identical call is already in flight.
+        :return: None if the caller must make the call (and then call _end_in_flight_call). Otherwise, an
+                event which is set when the identical call completes.
+        """
+        with KojiWrapper._koji_wrapper_lock:
+            event = KojiWrapper._koji_wrapper_in_flight.get(api_repr)
+            if event is None:
+                KojiWrapper._koji_wrapper_in_flight[api_repr] = threading.Event()
+            return event
+
+    @classmethod
+    def _wait_for_in_flight_call(cls, api_repr):
+        """
+        If an identical cacheable call is in flight in another thread, waits for it to complete.
+        Otherwise, registers the caller as the thread making the call; it must then call _end_in_flight_call.
+        :return: (True, result) if an identical call produced the result. (False, None) if the caller must make the call.
+        """
+        while True:
+            event = cls._begin_in_flight_call(api_repr)
+            if event is None:
+                return False, None
+            event.wait()
+            with KojiWrapper._koji_wrapper_lock:
+                result = cls._get_cache_bucket_unsafe().get(api_repr, Missing)
+                if result is not Missing:
+                    KojiWrapper._koji_wrapper_cache_stats.deduplicated += 1
+                    return True, result
+            # The identical call failed; compete to make it again
+
+    @classmethod
+    def _end_in_flight_call(cls, api_repr):
+        with KojiWrapper._koji_wrapper_lock:
+            event = KojiWrapper._koji_wrapper_in_flight.pop(api_repr, None)
+        if event:
+            event.set()
 
     def modify_koji_call_kwargs(self, method_name, kwargs, kw_opts: KojiWrapperOpts):
         """
@@ -635,7 +1042,19 @@ class KojiWrapper(koji.ClientSession):
         :param kw_opts: The KojiWrapperOpts that can been determined for this invocation.
         :return: The actual kwargs to pass to the superclass
         """
-        brew_event = self.___brew_event
+        return self.constrain_koji_call_kwargs(method_name, kwargs, kw_opts, self.___brew_event, self.___before_timestamp)
+
+    @classmethod
+    def constrain_koji_call_kwargs(cls, method_name, kwargs, kw_opts: KojiWrapperOpts, brew_event: Optional[int], before_timestamp: Optional[float]):
+        """
+        For a given koji api method, modify kwargs by inserting an event key if appropriate
+        :param method_name: The koji api method name
+        :param kwargs: The kwargs about to passed in
+        :param kw_opts: The KojiWrapperOpts that can been determined for this invocation.
+        :param brew_event: The brew event to constrain the call with, if any
+        :param before_timestamp: The timestamp of brew_event
+        :return: The actual kwargs to send to the koji server
+        """
         if brew_event:
             if method_name == 'queryHistory':
                 if 'beforeEvent' not in kwargs and 'before' not in kwargs:
@@ -645,7 +1064,7 @@ class KojiWrapper(koji.ClientSession):
             elif method_name == 'listBuilds':
                 if 'completeBefore' not in kwargs and 'createdBefore' not in kwargs:
                     kwargs = kwargs or {}
-                    kwargs['completeBefore'] = self.___before_timestamp
+                    kwargs['completeBefore'] = before_timestamp
             elif method_name in KojiWrapper.methods_with_event:
                 if 'event' not in kwargs:
                     # Only set the kwarg if the caller didn't
@@ -661,7 +1080,8 @@ class KojiWrapper(koji.ClientSession):
 
         return kwargs
 
-    def modify_koji_call_params(self, method_name, params, aggregate_kw_opts: KojiWrapperOpts):
+    @staticmethod
+    def modify_koji_call_params(method_name, params, aggregate_kw_opts: KojiWrapperOpts):
         """
         For a given koji api method, scan a tuple of arguments being passed to that method.
         If a KojiWrapperOpts is detected, interpret it. Return a (possible new) tuple with
@@ -694,25 +1114,19 @@ class KojiWrapper(koji.ClientSession):
 
         return tuple(new_params)
 
-    def _callMethod(self, name, args, kwargs=None, retry=True):
+    @classmethod
+    def prepare_koji_call(cls, name, args, kwargs, aggregate_kw_opts: KojiWrapperOpts, brew_event: Optional[int], before_timestamp: Optional[float]):
         """
-        This method is invoked by the superclass as part of a normal koji_api.<apiName>(...) OR
-        indirectly after koji.multicall() calls are aggregated and executed (this calls
-        the 'multiCall' koji API).
+        Interprets and removes KojiWrapperOpts from the parameters of a koji api call (or of each call bundled
+        in a multiCall) and constrains the call with brew_event where appropriate.
         :param name: The name of the koji API.
-        :param args:
-            - When part of an ordinary invocation: a tuple of args. getBuild(1328870, strict=True) -> args=(1328870,)
-            - When part of a multicall, contains methods, args, and kwargs. getBuild(1328870, strict=True) ->
-                args=([{'methodName': 'getBuild','params': (1328870, {'__starstar': True, 'strict': True})}],)
-        :param kwargs:
-            - When part of an ordinary invocation, a map of kwargs. getBuild(1328870, strict=True) -> kwargs={'strict': True}
-            - When part of a multicall, contains nothing? with multicall including getBuild(1328870, strict=True) -> {}
-        :param retry: passed on to superclass retry
-        :return: The value returned from the koji API call.
+        :param args: See _callMethod
+        :param kwargs: See _callMethod
+        :param aggregate_kw_opts: The KojiWrapperOpts to be populated with KojiWrapperOpts instances found in the parameters.
+        :param brew_event: The brew event to constrain the call with, if any
+        :param before_timestamp: The timestamp of brew_event
+        :return: The (args, kwargs) to send to the koji server
         """
-
-        aggregate_kw_opts: KojiWrapperOpts = KojiWrapperOpts(caching=(KojiWrapper.force_global_caching or self.force_instance_caching))
-
         if name == 'multiCall':
             # If this is a multiCall, we need to search through and modify each bundled invocation
             """
@@ -723,7 +1137,7 @@ class KojiWrapper(koji.ClientSession):
             multiArg = args[0]   # args is a tuple, the first should be our listing of method invocations.
             for call_dict in multiArg:  # For each method invocation in the multicall
                 method_name = call_dict['methodName']
-                params = self.modify_koji_call_params(method_name, call_dict['params'], aggregate_kw_opts)
+                params = cls.modify_koji_call_params(method_name, call_dict['params'], aggregate_kw_opts)
                 if params:
                     params = list(params)
                     # Assess whether we need to inject event of beforeEvent into the koji call kwargs
@@ -731,11 +1145,132 @@ class KojiWrapper(koji.ClientSession):
                     if isinstance(possible_kwargs, dict) and possible_kwargs.get('__starstar', None):
                         # __starstar is a special identifier added by the koji library indicating
                         # the entry is kwargs and not normal args.
-                        params[-1] = self.modify_koji_call_kwargs(method_name, possible_kwargs, aggregate_kw_opts)
+                        params[-1] = cls.constrain_koji_call_kwargs(method_name, possible_kwargs, aggregate_kw_opts, brew_event, before_timestamp)
                 call_dict['params'] = tuple(params)
         else:
-            args = self.modify_koji_call_params(name, args, aggregate_kw_opts)
-            kwargs = self.modify_koji_call_kwargs(name, kwargs, aggregate_kw_opts)
+            args = cls.modify_koji_call_params(name, args, aggregate_kw_opts)
+            kwargs = cls.constrain_koji_call_kwargs(name, kwargs, aggregate_kw_opts, brew_event, before_timestamp)
+        return args, kwargs
+
+    @staticmethod
+    def get_caching_key(name, args, kwargs) -> str:
+        # We need a reproducible immutable key from a dict with nested dicts. json.dumps
+        # and sorting keys is a deterministic way of achieving this.
+        return json.dumps({
+            'method_name': name,
+            'args': args,
+            'kwargs': kwargs
+        }, sort_keys=True)
+
+    @staticmethod
+    def package_result(name, result, cache_hit: Union[bool, List[bool]], return_metadata: bool):
+        """
+        :param cache_hit: Whether the result came from the cache. For a multiCall, this may be
+                a list indicating whether each entry came from the cache.
+        """
+        ret = result
+        if return_metadata:
+            # If KojiWrapperOpts asked for information about call metadata back,
+            # return the results in a wrapper containing that information.
+            if name == 'multiCall':
+                # Results are going to be returned as [ [result1], [result2], ... ] if there is no fault.
+                # If there is a fault, the fault entry will be a dict.
+                entry_cache_hits = cache_hit if isinstance(cache_hit, list) else [cache_hit] * len(result)
+                ret = []
+                for entry, entry_cache_hit in zip(result, entry_cache_hits):
+                    # A fault was entry will not carry metadata, so only package when we see a list
+                    if isinstance(entry, list):
+                        ret.append([KojiWrapperMetaReturn(entry[0], cache_hit=entry_cache_hit)])
+                    else:
+                        # Pass on fault without modification.
+                        ret.append(entry)
+            else:
+                ret = KojiWrapperMetaReturn(result, cache_hit=cache_hit)
+        return ret
+
+    @staticmethod
+    def get_trace_fields(name, args) -> Dict:
+        """
+        Describes a koji api call for the telemetry trace. Arguments of ordinary calls are not
+        recorded; multicalls are summarized by the number of calls and the methods called.
+        """
+        if name != 'multiCall':
+            return {}
+        methods = [call_dict['methodName'] for call_dict in args[0]]
+        return {'calls': len(methods), 'methods': sorted(set(methods))}
+
+    def _call_multicall_cached(self, calls: List[Dict], kwargs, retry, my_id) -> Tuple[List, List[bool]]:
+        """
+        Answers each call bundled in a multiCall from the cache where possible and sends only the
+        remaining calls to the hub, as a smaller multiCall. Results are cached per call, so that
+        overlapping multicalls (and ordinary calls) share cached results.
+        :param calls: The calls bundled in the multiCall (i.e. args[0] of the multiCall)
+        :return: (results, cache_hits). results is in the format returned by the multiCall api:
+                [result] for each successful call or a fault dict. cache_hits indicates whether each
+                entry came from the cache.
+        """
+        call_specs = [(call_dict['methodName'], *koji_cache.split_multicall_params(call_dict['params'])) for call_dict in calls]
+        keys = [self.get_caching_key(*spec) for spec in call_specs]
+        results = [Missing] * len(calls)
+        cache_hits = [True] * len(calls)
+        pending = range(len(calls))
+        while pending:
+            for i in pending:
+                result = self._get_cache_result(keys[i], Missing)
+                if result is not Missing:
+                    results[i] = [result]
+            pending = [i for i in pending if results[i] is Missing]
+
+            # Single-flight: calls which are in flight in other threads are not sent again
+            to_send = []
+            in_flight = []
+            for i in pending:
+                event = self._begin_in_flight_call(keys[i])
+                if event is None:
+                    to_send.append(i)
+                else:
+                    in_flight.append((i, event))
+
+            if to_send:
+                try:
+                    sub_calls = [calls[i] for i in to_send]
+                    with telemetry.span('koji', 'multiCall', id=my_id, **self.get_trace_fields('multiCall', (sub_calls,))):
+                        sub_results = super()._callMethod('multiCall', (sub_calls,), kwargs=kwargs, retry=retry)
+                    for i, entry in zip(to_send, sub_results):
+                        results[i] = entry
+                        cache_hits[i] = False
+                        if isinstance(entry, list):  # faults are not cached
+                            method_name, call_args, call_kwargs = call_specs[i]
+                            self._cache_result(keys[i], entry[0], method_name=method_name, args=call_args, kwargs=call_kwargs)
+                finally:
+                    for i in to_send:
+                        self._end_in_flight_call(keys[i])
+
+            for _, event in in_flight:
+                event.wait()
+            # Calls which were in flight elsewhere are answered by the cache, unless they failed
+            pending = [i for i, _ in in_flight]
+        return results, cache_hits
+
+    def _callMethod(self, name, args, kwargs=None, retry=True):
+        """
+        This method is invoked by the superclass as part of a normal koji_api.<apiName>(...) OR
+        indirectly after koji.multicall() calls are aggregated and executed (this calls
+        the 'multiCall' koji API).
+        :param name: The name of the koji API.
+        :param args:
+            - When part of an ordinary invocation: a tuple of args. getBuild(1328870, strict=True) -> args=(1328870,)
+            - When part of a multicall, contains methods, args, and kwargs. getBuild(1328870, strict=True) ->
+                args=([{'methodName': 'getBuild','params': (1328870, {'__starstar': True, 'strict': True})}],)
+        :param kwargs:
+            - When part of an ordinary invocation, a map of kwargs. getBuild(1328870, strict=True) -> kwargs={'strict': True}
+            - When part of a multicall, contains nothing? with multicall including getBuild(1328870, strict=True) -> {}
+        :param retry: passed on to superclass retry
+        :return: The value returned from the koji API call.
+        """
+
+        aggregate_kw_opts: KojiWrapperOpts = KojiWrapperOpts(caching=(KojiWrapper.force_global_caching or self.force_instance_caching))
+        args, kwargs = self.prepare_koji_call(name, args, kwargs, aggregate_kw_opts, self.___brew_event, self.___before_timestamp)
 
         my_id = KojiWrapper.get_next_call_id()
 
@@ -749,50 +1284,43 @@ class KojiWrapper(koji.ClientSession):
                 if logger:
                     logger.info(f'koji-api-call-{my_id}: {name}(args={args}, kwargs={kwargs})')
 
-                def package_result(result, cache_hit: bool):
-                    ret = result
-                    if return_metadata:
-                        # If KojiWrapperOpts asked for information about call metadata back,
-                        # return the results in a wrapper containing that information.
-                        if name == 'multiCall':
-                            # Results are going to be returned as [ [result1], [result2], ... ] if there is no fault.
-                            # If there is a fault, the fault entry will be a dict.
-                            ret = []
-                            for entry in result:
-                                # A fault was entry will not carry metadata, so only package when we see a list
-                                if isinstance(entry, list):
-                                    ret.append([KojiWrapperMetaReturn(entry[0], cache_hit=cache_hit)])
-                                else:
-                                    # Pass on fault without modification.
-                                    ret.append(entry)
-                        else:
-                            ret = KojiWrapperMetaReturn(result, cache_hit=cache_hit)
-                    return ret
+                if use_caching and name == 'multiCall':
+                    result, cache_hits = self._call_multicall_cached(args[0], kwargs, retry, my_id)
+                    if logger:
+                        logger.info(f'koji-api-call-{my_id}: {name} returned={result} ({sum(cache_hits)}/{len(cache_hits)} calls from cache)')
+                    return self.package_result(name, result, cache_hits, return_metadata)
 
                 caching_key = None
                 if use_caching:
-                    # We need a reproducible immutable key from a dict with nested dicts. json.dumps
-                    # and sorting keys is a deterministic way of achieving this.
-                    caching_key = json.dumps({
-                        'method_name': name,
-                        'args': args,
-                        'kwargs': kwargs
-                    }, sort_keys=True)
+                    caching_key = self.get_caching_key(name, args, kwargs)
                     result = self._get_cache_result(caching_key, Missing)
                     if result is not Missing:
                         if logger:
                             logger.info(f'CACHE HIT: koji-api-call-{my_id}: {name} returned={result}')
-                        return package_result(result, True)
+                        return self.package_result(name, result, True, return_metadata)
 
-                result = super()._callMethod(name, args, kwargs=kwargs, retry=retry)
-
-                if use_caching:
-                    self._cache_result(caching_key, result)
+                    # Single-flight: only one thread at a time sends a given cacheable call
+                    wait_start = time.time()
+                    deduplicated, result = self._wait_for_in_flight_call(caching_key)
+                    if deduplicated:
+                        telemetry.record_span('koji', name, wait_start, time.time(), id=my_id, deduplicated=True, **self.get_trace_fields(name, args))
+                        if logger:
+                            logger.info(f'DEDUPLICATED: koji-api-call-{my_id}: {name} returned={result}')
+                        return self.package_result(name, result, True, return_metadata)
+                    try:
+                        with telemetry.span('koji', name, id=my_id, **self.get_trace_fields(name, args)):
+                            result = super()._callMethod(name, args, kwargs=kwargs, retry=retry)
+                        self._cache_result(caching_key, result, method_name=name, args=args, kwargs=kwargs)
+                    finally:
+                        self._end_in_flight_call(caching_key)
+                else:
+                    with telemetry.span('koji', name, id=my_id, **self.get_trace_fields(name, args)):
+                        result = super()._callMethod(name, args, kwargs=kwargs, retry=retry)
 
                 if logger:
                     logger.info(f'koji-api-call-{my_id}: {name} returned={result}')
 
-                return package_result(result, False)
+                return self.package_result(name, result, False, return_metadata)
             except requests.exceptions.ConnectionError as ce:
                 if logger:
                     logger.warning(f'koji-api-call-{my_id}: {name}(...) failed="{ce}""; retries remaining {retries - 1}')
@@ -809,3 +1337,158 @@ class KojiWrapper(koji.ClientSession):
             return True
         self._gss_logged_in = super().gssapi_login(principal=principal, keytab=keytab, ccache=ccache, proxyuser=proxyuser)
         return self._gss_logged_in
+
+
+class AsyncKojiWrapper:
+    """
+    An asyncio counterpart of KojiWrapper for anonymous (i.e. query) koji api calls, so that async code
+    can await koji directly instead of blocking a thread per call.
+    - Calls are sent over a pooled aiohttp session. Many concurrent calls share one event loop.
+    - brew_event pinning, KojiWrapperOpts and the result cache behave (and are shared) as in KojiWrapper.
+    - Concurrent identical queries are coalesced into a single request to the hub.
+    - Calls are retried if the connection to the hub fails or the hub responds with a server error.
+
+    async with AsyncKojiWrapper(hub_url) as koji_api:
+        rpms = await koji_api.listRPMs(imageID=archive_id)
+
+    An instance must only be used from a single event loop. Multicalls and calls which require
+    authentication (e.g. tagBuild) must be made with KojiWrapper.
+    """
+
+    # koji api methods with these prefixes do not modify anything and are safe to coalesce
+    QUERY_METHOD_PREFIXES = ('get', 'list', 'query')
+
+    def __init__(self, hub_url: str, brew_event: Optional[int] = None, force_instance_caching: bool = False,
+                 connection_limit: int = constants.KOJI_ASYNC_CONNECTION_LIMIT, timeout: float = 60 * 10):
+        """
+        :param hub_url: The URL of the koji hub
+        :param brew_event: If specified, all koji queries (that support event=...) will be called with this event.
+        :param force_instance_caching: Cache the result of every api call of this instance (see KojiWrapper).
+        :param connection_limit: Maximum number of concurrent connections to the hub
+        :param timeout: Seconds after which an api call times out
+        """
+        self.hub_url = hub_url
+        self.brew_event = None if not brew_event else int(brew_event)
+        self.force_instance_caching = force_instance_caching
+        self.connection_limit = connection_limit
+        self.timeout = timeout
+        self.coalesced_calls = 0  # Number of calls which were answered by an identical in-flight call
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._before_timestamp: Optional[float] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}  # caching key => future result of the request
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    def __getattr__(self, name: str):
+        # Allows koji api calls like await koji_api.getBuild(...)
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        async def _call(*args, **kwargs):
+            return await self.call(name, *args, **kwargs)
+        _call.__name__ = name
+        return _call
+
+    async def call(self, name: str, *args, **kwargs):
+        """
+        Invokes a koji api method. Parameters are the same as those of the method, optionally
+        including a KojiWrapperOpts positional parameter.
+        """
+        return await self._call_method(name, args, kwargs)
+
+    async def _get_before_timestamp(self) -> Optional[float]:
+        if self.brew_event and self._before_timestamp is None:
+            event = await self._call_method('getEvent', (self.brew_event, KojiWrapperOpts(caching=True)), {}, before_timestamp=None)
+            self._before_timestamp = event['ts']
+        return self._before_timestamp
+
+    @classmethod
+    def _is_query(cls, name: str) -> bool:
+        return name.startswith(cls.QUERY_METHOD_PREFIXES)
+
+    async def _call_method(self, name: str, args, kwargs, before_timestamp=Missing):
+        if before_timestamp is Missing:
+            before_timestamp = await self._get_before_timestamp()
+        aggregate_kw_opts = KojiWrapperOpts(caching=(KojiWrapper.force_global_caching or self.force_instance_caching))
+        args, kwargs = KojiWrapper.prepare_koji_call(name, args, kwargs, aggregate_kw_opts, self.brew_event, before_timestamp)
+
+        my_id = KojiWrapper.get_next_call_id()
+        logger = aggregate_kw_opts.logger
+        if logger:
+            logger.info(f'koji-api-call-{my_id}: {name}(args={args}, kwargs={kwargs})')
+
+        try:
+            caching_key = KojiWrapper.get_caching_key(name, args, kwargs)
+        except TypeError:  # arguments which cannot be serialized can be neither cached nor coalesced
+            caching_key = None
+
+        use_caching = aggregate_kw_opts.caching and caching_key is not None
+        if use_caching:
+            result = KojiWrapper._get_cache_result(caching_key, Missing)
+            if result is not Missing:
+                if logger:
+                    logger.info(f'CACHE HIT: koji-api-call-{my_id}: {name} returned={result}')
+                return KojiWrapper.package_result(name, result, True, aggregate_kw_opts.return_metadata)
+
+        if caching_key is not None and self._is_query(name):
+            future = self._in_flight.get(caching_key)
+            if future is None:
+                future = self._in_flight[caching_key] = asyncio.ensure_future(self._send(name, args, kwargs))
+                future.add_done_callback(lambda _: self._in_flight.pop(caching_key, None))
+            else:
+                self.coalesced_calls += 1
+            # A cancelled caller must not cancel the request for other callers
+            result = await asyncio.shield(future)
+        else:
+            result = await self._send(name, args, kwargs)
+
+        if use_caching:
+            KojiWrapper._cache_result(caching_key, result, method_name=name, args=args, kwargs=kwargs)
+        if logger:
+            logger.info(f'koji-api-call-{my_id}: {name} returned={result}')
+        return KojiWrapper.package_result(name, result, False, aggregate_kw_opts.return_metadata)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.connection_limit),
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def _send(self, name: str, args, kwargs):
+        request = dumps(koji.encode_args(*args, **(kwargs or {})), name, allow_none=1).encode('utf-8')
+        headers = {'User-Agent': 'koji/1', 'Content-Type': 'text/xml'}
+        retries = 4
+        with telemetry.span('koji', name, **KojiWrapper.get_trace_fields(name, args)):
+            while True:
+                try:
+                    parser, unmarshaller = getparser()
+                    async with self._get_session().post(self.hub_url, data=request, headers=headers) as resp:
+                        resp.raise_for_status()
+                        async for chunk in resp.content.iter_chunked(8192):
+                            parser.feed(chunk)
+                    break
+                except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, aiohttp.ClientResponseError, asyncio.TimeoutError) as e:
+                    if isinstance(e, aiohttp.ClientResponseError) and e.status < 500:
+                        raise  # client errors are not transient
+                    retries -= 1
+                    if retries == 0:
+                        raise
+                    logger.warning(f'koji api call {name}(...) failed="{e}"; retries remaining {retries}')
+                    await asyncio.sleep(5)
+        parser.close()
+        try:
+            result = unmarshaller.close()
+        except Fault as fault:
+            raise koji.convertFault(fault)
+        if len(result) == 1:
+            result = result[0]
+        return result
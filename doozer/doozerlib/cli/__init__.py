@@ -95,6 +95,15 @@ def print_version(ctx, param, value):
               help="Path to rhpkg config file to use instead of system default")
 @click.option("--cache-dir", metavar="DIR", required=False, default=None,
               help="A directory in which reference git repos can be stored for caching purposes")
+@click.option("--koji-cache-dir", metavar="DIR", required=False, default=None,
+              help="A directory in which Koji API results can be cached across invocations (opt-in)")
+@click.option("--koji-cache-ttl", metavar="SECONDS", required=False, default=None, type=int,
+              help="How long cached Koji API results which may change are trusted (default 3600). Results for immutable objects never expire.")
+@click.option("--koji-session-pool-size", metavar="N", required=False, default=None, type=int,
+              help="Maximum number of concurrent Koji sessions (overrides koji_session_pool_size in group.yml; default 30)")
+@click.option("--concurrency-limit", metavar="RESOURCE=LIMIT", multiple=True, default=[],
+              help="Maximum number of concurrent users of a shared resource (e.g. rhpkg::push=5, git::clone, oc::image_mirror, cgit); "
+                   "overrides concurrency_limits in group.yml. 0 for no limit. [multiple]")
 @click.option("--datastore", metavar="ENV", required=False, default=None,
               help="Whether to store & retrieve data in int / stage / prod database environment")
 @click.option("--profile", metavar="NAME", default="", help="Name of build profile")
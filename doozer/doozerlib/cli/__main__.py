@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import base64
 
 import click
@@ -10,6 +11,7 @@ import sys
 import subprocess
 from typing import Dict, cast
 import tempfile
+import threading
 import traceback
 import koji
 import io
@@ -23,7 +25,9 @@ from doozerlib import Runtime, state, cli as cli_package
 from doozerlib.distgit import ImageDistGitRepo
 from doozerlib.pushd import Dir
 from doozerlib.model import Missing
+from doozerlib import brew
 from doozerlib.brew import get_watch_task_info_copy
+from doozerlib.image_build_scheduler import ImageBuildScheduler
 from doozerlib import metadata
 from doozerlib.config import MetaDataConfig as mdc
 from doozerlib.cli import cli, pass_runtime, validate_semver_major_minor_patch
@@ -44,7 +48,9 @@ from doozerlib.cli.config_tag_rpms import config_tag_rpms
 
 from doozerlib import coverity
 from doozerlib.exceptions import DoozerFatalError
+from doozerlib import constants
 from doozerlib import exectools
+from doozerlib import telemetry
 from doozerlib.rhcos import RHCOSBuildInspector
 from doozerlib.util import green_print, red_print, yellow_print, color_print, dict_get
 from doozerlib.util import analyze_debug_timing, get_cincinnati_channels, extract_version_fields, go_arch_for_brew_arch
@@ -789,8 +795,11 @@ def print_build_metrics(runtime):
 @click.option('--dry-run', default=False, is_flag=True, help='Do not build anything, but only print build operations.')
 @click.option('--build-retries', type=int, default=1, help='Number of build attempts for an osbs build')
 @click.option('--comment-on-pr', default=False, is_flag=True, help='Comment on PR after a build, if flag is enabled')
+@click.option('--max-concurrent-builds', type=int, default=None,
+              help='Maximum number of Brew builds in flight at once. Default is no limit. Ignored for --local builds.')
 @pass_runtime
-def images_build_image(runtime, repo_type, repo, push_to_defaults, push_to, scratch, threads, filter_by_os, dry_run, build_retries, comment_on_pr):
+def images_build_image(runtime, repo_type, repo, push_to_defaults, push_to, scratch, threads, filter_by_os, dry_run, build_retries, comment_on_pr,
+                       max_concurrent_builds):
     """
     Attempts to build container images for all of the distgit repositories
     in a group. If an image has already been built, it will be treated as
@@ -864,7 +873,6 @@ def images_build_image(runtime, repo_type, repo, push_to_defaults, push_to, scra
             exit(1)
 
     if not runtime.local:
-        threads = None
         with runtime.shared_koji_client_session() as koji_api:
             if not koji_api.logged_in:
                 koji_api.gssapi_login()
@@ -886,14 +894,30 @@ def images_build_image(runtime, repo_type, repo, push_to_defaults, push_to, scra
         active_profile["signing_intent"] = "release" if repo_type == "signed" else repo_type
     if repo:
         active_profile["repo_list"] = list(repo)
-    results = exectools.parallel_exec(
-        lambda dgr, terminate_event: dgr.build_container(
+
+    # Builds start as soon as the images they depend on are built; all in-flight
+    # Brew tasks are watched by the process-wide batched poller.
+    terminate_event = threading.Event()
+    task_watcher = None
+    if not runtime.local:
+        with runtime.shared_koji_client_session() as koji_api:
+            task_watcher = brew.get_task_watcher(koji_api)
+
+    def on_cancel():
+        terminate_event.set()
+        if task_watcher:
+            task_watcher.cancel_all()
+
+    scheduler = ImageBuildScheduler(
+        runtime,
+        lambda dgr: dgr.build_container(
             active_profile, push_to_defaults, additional_registries=push_to, retries=build_retries,
-            terminate_event=terminate_event, scratch=scratch, realtime=(threads == 1),
+            terminate_event=terminate_event, scratch=scratch, realtime=(runtime.local and threads == 1),
             dry_run=dry_run, registry_config_dir=runtime.registry_config_dir,
-            filter_by_os=filter_by_os, comment_on_pr=comment_on_pr),
-        items, n_threads=threads)
-    results = results.get()
+            filter_by_os=filter_by_os, comment_on_pr=comment_on_pr, task_watcher=task_watcher),
+        max_concurrent_builds=threads if runtime.local else max_concurrent_builds,
+        on_cancel=on_cancel)
+    results = asyncio.run(scheduler.run(items))
 
     if not runtime.local:  # not needed for local builds
         try:
@@ -1923,7 +1947,7 @@ installonly_limit=3
             if repo.is_reposync_latest_only():
                 cmd += ' -n'
 
-            rc, out, err = exectools.cmd_gather(cmd, realtime=True)
+            rc, out, err = exectools.cmd_gather(cmd, realtime=True, max_output_bytes=constants.REALTIME_OUTPUT_LIMIT)
             if rc != 0:
                 if not repo.cs_optional:
                     raise DoozerFatalError(err)
@@ -2034,6 +2058,34 @@ def analyze_debug_log(debug_log):
     analyze_debug_timing(f)
 
 
+@cli.command("analyze:trace", short_help="Summarize a trace file and convert it into a timeline")
+@click.argument("trace_file", nargs=1)
+@click.option("--output", "-o", metavar="PATH", default=None,
+              help="Where to write the Chrome trace event file. Defaults to <trace_file>.chrome.json")
+@click.option("--top", default=20, type=int, help="Number of most time consuming operations to print.")
+def analyze_trace(trace_file, output, top):
+    """
+    Specify a doozer working directory trace.jsonl as the argument. The trace records each
+    subprocess and koji api call performed by the run.
+
+    The operations which consumed the most time are printed and the trace is converted
+    into a Chrome trace event file. Open it with chrome://tracing or https://ui.perfetto.dev
+    to see a timeline of all the work done by each thread / asyncio task, including how much
+    of it ran concurrently and where the run sat idle.
+    """
+    spans = telemetry.load_trace(trace_file)
+    if not spans:
+        raise DoozerFatalError(f"No spans found in {trace_file}")
+
+    print(f'{"category":<12} {"operation":<40} {"count":>7} {"total(s)":>10} {"max(s)":>10}')
+    for cat, name, count, total, longest in telemetry.summarize_trace(spans)[:top]:
+        print(f'{cat:<12} {name[:40]:<40} {count:>7} {total:>10.1f} {longest:>10.1f}')
+
+    output = output or f'{trace_file}.chrome.json'
+    count = telemetry.export_chrome_trace(trace_file, output)
+    green_print(f'Wrote timeline of {count} spans to {output}')
+
+
 @cli.command('olm-bundle:list-olm-operators', short_help='List all images that are OLM operators')
 @pass_runtime
 def list_olm_operators(runtime: Runtime):
@@ -7,6 +7,7 @@ import ssl
 import sys
 import time
 import xmlrpc.client as xmlrpclib
+from concurrent.futures import ThreadPoolExecutor
 from types import SimpleNamespace
 from typing import Dict, List, Optional, Tuple
 
@@ -16,9 +17,11 @@ import yaml
 from doozerlib.rpm_utils import compare_nvr, parse_nvr
 from requests_kerberos import HTTPKerberosAuth
 
+from doozerlib import exectools
 from doozerlib.cli import cli
 from doozerlib.exceptions import DoozerFatalError
 from doozerlib.plashet import PlashetBuilder
+from doozerlib.pushd import Dir
 from doozerlib.runtime import Runtime
 from doozerlib.brew import get_builds_tags
 from doozerlib.util import (find_latest_builds, isolate_el_version_in_brew_tag,
@@ -34,6 +37,12 @@ logger: logging.Logger = None
 # reference.
 plashet_concerns = []
 
+# Default maximum number of arch repos assembled concurrently (see --max-workers)
+DEFAULT_MAX_WORKERS = 4
+
+# Maximum number of koji calls sent in a single multicall
+KOJI_MULTICALL_BATCH_SIZE = 500
+
 
 def update_advisory_builds(config, errata_proxy, advisory_id, nvres, nvr_product_version):
     """
@@ -102,81 +111,139 @@ def update_advisory_builds(config, errata_proxy, advisory_id, nvres, nvr_product
             raise IOError(f'Unable to add nvrs to advisory {advisory_id}: {to_add}')
 
 
-def _assemble_repo(config, nvres: List[str]):
+def _assemble_arch_repo(config, arch_name: str, signing_mode: str, nvres: List[str]) -> Dict[str, float]:
     """
-    This method is intended to be wrapped by assemble_repo.
-    Assembles one or more architecture specific repos in the
-    dest_dir with the specified nvrs. It is expected by the time this method
-    is called that all RPMs are signed if any of those arches requires signing.
-    :param config: cli config
-    :param nvres: a list of nvres to include.
-    :return: n/a
-    An exception will be thrown if no RPMs can be found matching an nvr.
+    Assembles the repo for a single architecture. See _assemble_repo.
+    :return: A dict with the number of seconds spent linking packages and running createrepo_c
     """
+    start = time.monotonic()
+    # These directories shouldn't exist yet. They will be created during assemble.
+    dest_arch_path = os.path.join(config.dest_dir, arch_name)
+    if config.repo_subdir:
+        dest_arch_path += '/' + config.repo_subdir.strip('/')  # strip / from start and end
+    links_dir = os.path.join(dest_arch_path, 'Packages')
+    rpm_list_path = os.path.join(dest_arch_path, 'rpm_list')
+    mkdirs(links_dir)
+
+    # Each arch will have its own yum repo & thus needs its own rpm_list
+    with open(rpm_list_path, mode='w+') as rl:
+
+        for nvre in nvres:
+            nvr = strip_epoch(nvre)
+            matched_count = 0
 
-    for arch_name, signing_mode in config.arch:
-        # These directories shouldn't exist yet. They will be created during assemble.
-        dest_arch_path = os.path.join(config.dest_dir, arch_name)
-        if config.repo_subdir:
-            dest_arch_path += '/' + config.repo_subdir.strip('/')  # strip / from start and end
-        links_dir = os.path.join(dest_arch_path, 'Packages')
-        rpm_list_path = os.path.join(dest_arch_path, 'rpm_list')
-        mkdirs(links_dir)
+            nvre_obj = parse_nvr(nvre)
+            package_name = nvre_obj["name"]
 
-        # Each arch will have its own yum repo & thus needs its own rpm_list
-        with open(rpm_list_path, mode='w+') as rl:
+            if package_name in config.exclude_package:
+                logger.info(f'Skipping repo addition for excluded package: {nvre}')
+                continue
 
-            for nvre in nvres:
-                nvr = strip_epoch(nvre)
-                matched_count = 0
+            signed = (signing_mode == 'signed')
+            br_arch_base_path = get_brewroot_arch_base_path(config, nvre, signed)
 
-                nvre_obj = parse_nvr(nvre)
-                package_name = nvre_obj["name"]
+            # Include noarch in each arch specific repo.
+            include_arches = [arch_name, 'noarch']
+            for a in include_arches:
+                brewroot_arch_path = os.path.join(br_arch_base_path, a)
 
-                if package_name in config.exclude_package:
-                    logger.info(f'Skipping repo addition for excluded package: {nvre}')
+                if not os.path.isdir(brewroot_arch_path):
+                    logger.debug(f'No {a} arch directory for {nvre}')
                     continue
 
-                signed = (signing_mode == 'signed')
-                br_arch_base_path = get_brewroot_arch_base_path(config, nvre, signed)
-
-                # Include noarch in each arch specific repo.
-                include_arches = [arch_name, 'noarch']
-                for a in include_arches:
-                    brewroot_arch_path = os.path.join(br_arch_base_path, a)
-
-                    if not os.path.isdir(brewroot_arch_path):
-                        logger.debug(f'No {a} arch directory for {nvre}')
-                        continue
-
-                    logger.info(f'Found {"signed" if signed else "unsigned"} {a} arch directory for {nvre}')
-                    link_name = '{nvr}__{arch}'.format(
-                        nvr=nvr,
-                        arch=a,
-                    )
-                    if signed:
-                        link_name += f'__{config.signing_key_id}'
-
-                    package_link_path = os.path.join(links_dir, link_name)
-                    os.symlink(brewroot_arch_path, package_link_path)
+                logger.info(f'Found {"signed" if signed else "unsigned"} {a} arch directory for {nvre}')
+                link_name = '{nvr}__{arch}'.format(
+                    nvr=nvr,
+                    arch=a,
+                )
+                if signed:
+                    link_name += f'__{config.signing_key_id}'
+
+                package_link_path = os.path.join(links_dir, link_name)
+                os.symlink(brewroot_arch_path, package_link_path)
+
+                rpms = os.listdir(package_link_path)
+                if not rpms:
+                    raise IOError(f'Did not find any rpms in {brewroot_arch_path}')
+
+                for r in rpms:
+                    rpm_path = os.path.join('Packages', link_name, r)
+                    rl.write(rpm_path + '\n')
+                    matched_count += 1
+
+            if not matched_count:
+                logger.warning("Unable to find any {arch} rpms for {nvre} in {p} ; this may be ok if the package doesn't support the arch and it is not required for that arch".format(
+                    arch=arch_name, nvre=nvre, p=get_brewroot_arch_base_path(config, nvre, signed)))
+
+    linked = time.monotonic()
+    with Dir(dest_arch_path):
+        rc, _, err = exectools.cmd_gather(['createrepo_c', '-i', 'rpm_list', '.'])
+    if rc != 0:
+        raise IOError('Error creating repo at: {repo_dir}: {err}'.format(repo_dir=dest_arch_path, err=err))
+
+    print('Successfully created repo at: {repo_dir}'.format(repo_dir=dest_arch_path))
+    return {
+        'link_seconds': round(linked - start, 2),
+        'createrepo_seconds': round(time.monotonic() - linked, 2),
+    }
 
-                    rpms = os.listdir(package_link_path)
-                    if not rpms:
-                        raise IOError(f'Did not find any rpms in {brewroot_arch_path}')
 
-                    for r in rpms:
-                        rpm_path = os.path.join('Packages', link_name, r)
-                        rl.write(rpm_path + '\n')
-                        matched_count += 1
+def _assemble_repo(config, nvres: List[str], timings: Optional[Dict] = None):
+    """
+    This method is intended to be wrapped by assemble_repo.
+    Assembles one or more architecture specific repos in the
+    dest_dir with the specified nvrs. It is expected by the time this method
+    is called that all RPMs are signed if any of those arches requires signing.
+    Arch repos are assembled concurrently by up to config.max_workers threads.
+    :param config: cli config
+    :param nvres: a list of nvres to include.
+    :param timings: If specified, the time spent on each arch will be recorded in this dict.
+    :return: n/a
+    An exception will be thrown if no RPMs can be found matching an nvr.
+    """
+    max_workers = max(1, min(len(config.arch), getattr(config, 'max_workers', None) or DEFAULT_MAX_WORKERS))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {arch_name: executor.submit(_assemble_arch_repo, config, arch_name, signing_mode, nvres)
+                   for arch_name, signing_mode in config.arch}
+        for arch_name, future in futures.items():
+            arch_timings = future.result()  # raises the first failure
+            if timings is not None:
+                timings[arch_name] = arch_timings
 
-                if not matched_count:
-                    logger.warning("Unable to find any {arch} rpms for {nvre} in {p} ; this may be ok if the package doesn't support the arch and it is not required for that arch".format(
-                        arch=arch_name, nvre=nvre, p=get_brewroot_arch_base_path(config, nvre, signed)))
 
-        if os.system('cd {repo_dir} && createrepo_c -i rpm_list .'.format(repo_dir=dest_arch_path)) != 0:
-            raise IOError('Error creating repo at: {repo_dir}'.format(repo_dir=dest_arch_path))
+def _get_plashet_packages(koji_proxy, nvres) -> List[Dict]:
+    """
+    Retrieves the builds and latest tagging event of the specified nvres with batched multicalls.
+    :return: A list of package entries for the plashet.yml, sorted by nvre
+    """
+    nvres = sorted(nvres)
+    with koji_proxy.multicall(strict=True, batch=KOJI_MULTICALL_BATCH_SIZE) as m:
+        build_tasks = [m.getBuild(strip_epoch(nvre)) for nvre in nvres]
+    builds = [task.result for task in build_tasks]
+    with koji_proxy.multicall(strict=True, batch=KOJI_MULTICALL_BATCH_SIZE) as m:
+        history_tasks = [m.queryHistory(table='tag_listing', build=build['id']) for build in builds]
+
+    packages = list()
+    for build, history_task in zip(builds, history_tasks):
+        tag_listing = history_task.result['tag_listing']
+        latest_tag = {}
+        if tag_listing:
+            tag_listing.sort(key=lambda event: event['create_event'])
+            tl = tag_listing[-1]
+            latest_tag = {
+                'tag_name': tl['tag.name'],
+                'event': tl['create_event'],
+            }
 
-        print('Successfully created repo at: {repo_dir}'.format(repo_dir=dest_arch_path))
+        package = {
+            'package_name': build['package_name'],
+            'build_id': build['id'],
+            'nvr': build['nvr'],
+            'epoch': build['epoch'],
+            'latest_tag': latest_tag,
+        }
+        packages.append(package)
+    return packages
 
 
 def assemble_repo(config, nvres, event_info=None, extra_data: Dict = None):
@@ -184,6 +251,7 @@ def assemble_repo(config, nvres, event_info=None, extra_data: Dict = None):
     Assembles one or more architecture specific repos in the
     dest_dir with the specified nvrs. It is expected by the time this method
     is called that all RPMs are signed if any of those arches requires signing.
+    Package information for the plashet.yml is retrieved from brew while the repos are assembled.
     :param config: cli config
     :param nvres: a list of nvres to include.
     :param event_info: The brew event information to encode into the plashet.yml
@@ -196,43 +264,33 @@ def assemble_repo(config, nvres, event_info=None, extra_data: Dict = None):
     koji_proxy = runtime.build_retrying_koji_client()
     koji_proxy.gssapi_login()
 
-    with open(os.path.join(config.dest_dir, 'plashet.yml'), mode='w+', encoding='utf-8') as y:
+    start = time.monotonic()
+    arch_timings = {}
+
+    def get_packages():
+        packages = _get_plashet_packages(koji_proxy, nvres)
+        return packages, round(time.monotonic() - start, 2)
+
+    with open(os.path.join(config.dest_dir, 'plashet.yml'), mode='w+', encoding='utf-8') as y, \
+            ThreadPoolExecutor(max_workers=1) as koji_executor:
+        packages_future = koji_executor.submit(get_packages)
         success = False
         try:
-            _assemble_repo(config, nvres)
+            _assemble_repo(config, nvres, timings=arch_timings)
             success = True
         finally:
-
-            packages = list()
-            for nvre in sorted(nvres):
-                nvr = strip_epoch(nvre)
-                build = koji_proxy.getBuild(nvr)
-                tag_listing = koji_proxy.queryHistory(table='tag_listing',
-                                                      build=build['id'])['tag_listing']
-                latest_tag = {}
-                if tag_listing:
-                    tag_listing.sort(key=lambda event: event['create_event'])
-                    tl = tag_listing[-1]
-                    latest_tag = {
-                        'tag_name': tl['tag.name'],
-                        'event': tl['create_event'],
-                    }
-
-                package = {
-                    'package_name': build['package_name'],
-                    'build_id': build['id'],
-                    'nvr': build['nvr'],
-                    'epoch': build['epoch'],
-                    'latest_tag': latest_tag,
-                }
-                packages.append(package)
-
+            packages, koji_seconds = packages_future.result()
             plashet_info = {
                 'assemble': {
                     'success': success,
                     'concerns': plashet_concerns,
                     'brew_event': event_info or koji_proxy.getLastEvent(),
                     'packages': packages,
+                    'timings': {
+                        'koji_seconds': koji_seconds,
+                        'arches': arch_timings,
+                        'total_seconds': round(time.monotonic() - start, 2),
+                    },
                 },
                 'extra': extra_data or {},
             }
@@ -386,6 +444,8 @@ def setup_logging(dest_dir: str):
               multiple=True, default=[], help='Exclude one or more package names')
 @click.option('-i', '--include-package', metavar='NAME',
               multiple=True, default=[], help='Only include specified packages')
+@click.option('--max-workers', metavar='N', type=click.INT, default=DEFAULT_MAX_WORKERS,
+              help='Maximum number of arch repos to assemble concurrently')
 def config_plashet(ctx, base_dir, brew_root, name, signing_key_id, **kwargs):
     """
     Creates a directory containing one or more arch specific yum repositories by using local
@@ -350,7 +350,7 @@ class Nightly:
         ))
         if not self.rhcos_inspector:
             ps4tag = {tag: self.pullspec_for_tag[tag] for tag in self.rhcos_tag_names}
-            self.rhcos_inspector = RHCOSBuildInspector(runtime, ps4tag, arch)
+            self.rhcos_inspector = await RHCOSBuildInspector.create(runtime, ps4tag, arch)
 
     async def retrieve_nvr_for_tag(self, tag: str) -> str:
         """Retrieve group image NVR according to the image info at the tag pullspec"""
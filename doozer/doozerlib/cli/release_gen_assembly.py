@@ -302,6 +302,11 @@ class GenAssemblyCli:
         component's NVR as an override in the assembly definition.
         """
 
+        # Find the builds of all images at the basis event in bulk; get_latest_build below answers from the cache
+        self.runtime.resolve_latest_builds([image_meta for image_meta in self.runtime.image_metas()
+                                            if not image_meta.base_only and image_meta.for_release],
+                                           complete_before_event=self.basis_event)
+
         for image_meta in self.runtime.image_metas():
 
             if image_meta.base_only or not image_meta.for_release:
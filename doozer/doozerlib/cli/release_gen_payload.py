@@ -5,6 +5,7 @@ import traceback
 import sys
 import os
 import json
+import time
 from pathlib import Path
 from typing import List, Optional, Tuple, Dict, NamedTuple, Iterable, Set, Any, Callable, cast
 from unittest.mock import MagicMock
@@ -25,9 +26,10 @@ from doozerlib.runtime import Runtime
 from doozerlib.util import red_print, go_suffix_for_arch, brew_arch_for_go_arch, isolate_nightly_name_components, \
     convert_remote_git_to_https, go_arch_for_brew_arch
 from doozerlib.assembly import AssemblyTypes, assembly_basis, AssemblyIssue, AssemblyIssueCode
-from doozerlib import exectools
+from doozerlib import constants, exectools
 from doozerlib.model import Model
 from doozerlib.exceptions import DoozerFatalError
+from doozerlib.registry import RegistryClient, RegistryError
 from doozerlib.util import find_manifest_list_sha
 
 
@@ -280,7 +282,9 @@ class GenPayloadCli:
 
         rt = self.runtime
         self.logger.info(f"Collecting latest information associated with the assembly: {rt.assembly}")
-        assembly_inspector = AssemblyInspector(rt, rt.build_retrying_koji_client())
+        assembly_inspector = AssemblyInspector(rt, rt.build_retrying_koji_client(), prefetch=True)
+        # The payload of every arch includes RHCOS; retrieve the RHCOS builds of all arches at once.
+        await assembly_inspector.prefetch_rhcos_builds([arch for arch in rt.arches if arch not in self.exclude_arch])
 
         self.payload_entries_for_arch = self.generate_payload_entries(assembly_inspector)
         assembly_report: Dict = await self.generate_assembly_report(assembly_inspector)
@@ -480,17 +484,19 @@ class GenPayloadCli:
         """
 
         self.logger.debug("detecting images with group RPMs installed that are not the latest builds...")
-        for dgk, build_inspector in assembly_inspector.get_group_release_images().items():
-            if build_inspector:
-                for arch, non_latest_rpms in (await build_inspector.find_non_latest_rpms()).items():
-                    # This could indicate an issue with scan-sources or that an image is no longer successfully building
-                    # It could also mean that images are pinning content, which may be expected, so allow permits.
-                    for installed_nvr, newest_nvr, repo in non_latest_rpms:
-                        self.assembly_issues.append(AssemblyIssue(
-                            f"Found outdated RPM ({installed_nvr}) installed in {build_inspector.get_nvr()} ({arch})"
-                            f" when {newest_nvr} was available in repo {repo}",
-                            component=dgk, code=AssemblyIssueCode.OUTDATED_RPMS_IN_STREAM_BUILD
-                        ))
+        build_inspectors = {dgk: build_inspector for dgk, build_inspector in assembly_inspector.get_group_release_images().items() if build_inspector}
+        # Images are checked concurrently; their koji queries share the event loop
+        results = await asyncio.gather(*(build_inspector.find_non_latest_rpms() for build_inspector in build_inspectors.values()))
+        for (dgk, build_inspector), arch_non_latest_rpms in zip(build_inspectors.items(), results):
+            for arch, non_latest_rpms in arch_non_latest_rpms.items():
+                # This could indicate an issue with scan-sources or that an image is no longer successfully building
+                # It could also mean that images are pinning content, which may be expected, so allow permits.
+                for installed_nvr, newest_nvr, repo in non_latest_rpms:
+                    self.assembly_issues.append(AssemblyIssue(
+                        f"Found outdated RPM ({installed_nvr}) installed in {build_inspector.get_nvr()} ({arch})"
+                        f" when {newest_nvr} was available in repo {repo}",
+                        component=dgk, code=AssemblyIssueCode.OUTDATED_RPMS_IN_STREAM_BUILD
+                    ))
 
     def detect_inconsistent_images(self, assembly_inspector: AssemblyInspector):
         """
@@ -691,12 +697,11 @@ class GenPayloadCli:
         # Ensure that all payload images have been mirrored before updating
         # the imagestream. Otherwise, the imagestream will fail to import the
         # image.
-        tasks = []
-        for arch, payload_entries in self.payload_entries_for_arch.items():
-            tasks.append(self.mirror_payload_content(arch, payload_entries))
-        await asyncio.gather(*tasks)
-
-        await asyncio.sleep(120)
+        async with RegistryClient() as registry:
+            tasks = []
+            for arch, payload_entries in self.payload_entries_for_arch.items():
+                tasks.append(self.mirror_payload_content(arch, payload_entries, registry))
+            await asyncio.gather(*tasks)
 
         # Update the imagestreams being monitored by the release controller.
         tasks = []
@@ -714,9 +719,11 @@ class GenPayloadCli:
                                  "not have group.multi_arch.enabled==true")
 
     @exectools.limit_concurrency(500)
-    async def mirror_payload_content(self, arch: str, payload_entries: Dict[str, PayloadEntry]):
+    async def mirror_payload_content(self, arch: str, payload_entries: Dict[str, PayloadEntry],
+                                     registry: Optional[RegistryClient] = None):
         """
         Ensure an arch's payload entries are synced out for the public to access.
+        :param registry: Client used to check which images already exist at their destination
         """
 
         # Prevents writing the same destination twice (not supported by oc if in the same mirroring file):
@@ -743,12 +750,93 @@ class GenPayloadCli:
                 await out_file.write(f"{src_pullspec}={dest_pullspec}\n")
 
         if self.apply or self.apply_multi_arch:
-            self.logger.info(f"Mirroring images from {str(src_dest_path)}")
-            try:
+            if registry:
+                await self.mirror_missing_images(arch, mirror_src_for_dest, registry)
+            else:
+                await self.mirror_images(src_dest_path)
+
+    async def mirror_images(self, src_dest_path: Path):
+        """
+        Mirror the images listed in a SRC=DEST file with 'oc image mirror'.
+        """
+        self.logger.info(f"Mirroring images from {str(src_dest_path)}")
+        try:
+            async with exectools.get_resource_limiter(constants.RESOURCE_OC_IMAGE_MIRROR):
                 await asyncio.wait_for(exectools.cmd_assert_async(
-                    f"oc image mirror --keep-manifest-list --filename={str(src_dest_path)}", retries=3), timeout=1800)
-            except asyncio.TimeoutError:
-                pass
+                    f"oc image mirror --keep-manifest-list --filename={str(src_dest_path)}", retries=3),
+                    timeout=constants.PAYLOAD_MIRROR_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise DoozerFatalError(f"Mirroring images from {str(src_dest_path)} did not complete "
+                                   f"within {constants.PAYLOAD_MIRROR_TIMEOUT} seconds")
+
+    async def mirror_missing_images(self, arch: str, mirror_src_for_dest: Dict[str, str], registry: RegistryClient):
+        """
+        Mirror the images whose destination does not exist yet, in concurrent batches, then wait
+        until every mirrored destination can be read from the registry (so that imagestreams can
+        import them).
+        Destination tags are derived from the digest of the source, so an existing destination
+        already holds the right content.
+        """
+        start = time.monotonic()
+
+        async def exists(dest_pullspec: str) -> bool:
+            try:
+                return await registry.manifest_exists(dest_pullspec)
+            except RegistryError as e:
+                self.logger.warning(f"Unable to determine whether {dest_pullspec} exists; will mirror it: {e}")
+                return False
+
+        dest_pullspecs = list(mirror_src_for_dest)
+        found = await asyncio.gather(*(exists(dest) for dest in dest_pullspecs))
+        missing = [dest for dest, dest_exists in zip(dest_pullspecs, found) if not dest_exists]
+        self.logger.info(f"{arch}: {len(dest_pullspecs) - len(missing)} of {len(dest_pullspecs)} payload images "
+                         f"already exist at their destination; mirroring {len(missing)}")
+        if not missing:
+            return
+
+        batch_size = constants.PAYLOAD_MIRROR_BATCH_SIZE
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+
+        async def mirror_batch(index: int, batch: List[str]):
+            batch_path = self.output_path.joinpath(f"src_dest.{arch}.{index}")
+            async with aiofiles.open(batch_path, mode="w+", encoding="utf-8") as out_file:
+                for dest_pullspec in batch:
+                    await out_file.write(f"{mirror_src_for_dest[dest_pullspec]}={dest_pullspec}\n")
+            batch_start = time.monotonic()
+            await self.mirror_images(batch_path)
+            self.logger.info(f"{arch}: Mirrored {len(batch)} images from {batch_path} in {time.monotonic() - batch_start:.1f}s")
+
+        await asyncio.gather(*(mirror_batch(index, batch) for index, batch in enumerate(batches)))
+        await self.wait_for_mirrored_images(arch, missing, registry, start)
+
+    async def wait_for_mirrored_images(self, arch: str, dest_pullspecs: List[str], registry: RegistryClient, start: float):
+        """
+        Wait until each mirrored image can be read from the destination registry. Registries may
+        take a moment before pushed manifests are served.
+        :param start: time.monotonic() at which mirroring started; readiness is reported relative to it
+        """
+        deadline = time.monotonic() + constants.PAYLOAD_MIRROR_READY_TIMEOUT
+
+        async def wait_until_readable(dest_pullspec: str):
+            delay = 1
+            while True:
+                try:
+                    if await registry.manifest_exists(dest_pullspec):
+                        break
+                except RegistryError as e:
+                    # oc reported the image as pushed; do not wait on a registry we are unable to query
+                    self.logger.warning(f"Unable to confirm {dest_pullspec} is readable: {e}")
+                    break
+                if time.monotonic() + delay > deadline:
+                    raise DoozerFatalError(f"{dest_pullspec} was mirrored but is not readable after "
+                                           f"{constants.PAYLOAD_MIRROR_READY_TIMEOUT} seconds")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            self.logger.debug(f"{arch}: {dest_pullspec} readable {time.monotonic() - start:.1f}s after mirroring started")
+
+        await asyncio.gather(*(wait_until_readable(dest) for dest in dest_pullspecs))
+        self.logger.info(f"{arch}: All {len(dest_pullspecs)} mirrored images are readable "
+                         f"{time.monotonic() - start:.1f}s after mirroring started")
 
     async def generate_specific_payload_imagestreams(self, arch: str, private_mode: bool,
                                                      payload_entries: Dict[str, PayloadEntry],
@@ -1,86 +1,148 @@
 import asyncio
+import time
+from collections import defaultdict, deque
 from datetime import datetime, timezone
+from typing import Awaitable, Dict, List, Optional, Set
 
 import click
 import yaml
 
-from doozerlib import brew, exectools, rhcos, util
-from doozerlib.cli import cli, pass_runtime
+from doozerlib import brew, constants, exectools, rhcos, util
+from doozerlib.cli import cli, click_coroutine, pass_runtime
 from doozerlib.cli import release_gen_payload as rgp
-from doozerlib.metadata import RebuildHint, RebuildHintCode
+from doozerlib.image import ImageMetadata
+from doozerlib.metadata import Metadata, RebuildHint, RebuildHintCode
 from doozerlib.runtime import Runtime
 
 
-@cli.command("config:scan-sources", short_help="Determine if any rpms / images need to be rebuilt.")
-@click.option("--ci-kubeconfig", metavar='KC_PATH', required=False,
-              help="File containing kubeconfig for looking at release-controller imagestreams")
-@click.option("--yaml", "as_yaml", default=False, is_flag=True, help='Print results in a yaml block')
-@pass_runtime
-def config_scan_source_changes(runtime: Runtime, ci_kubeconfig, as_yaml):
+class ConfigScanSources:
     """
-    Determine if any rpms / images need to be rebuilt.
+    Determines which rpms and images need to be rebuilt.
 
-    \b
-    The method will report RPMs in this group if:
-    - Their source git hash no longer matches their upstream source.
-    - The buildroot used by the previous RPM build has changed.
+    Every check of an rpm or image is an asyncio task which awaits only the inputs it depends on
+    (e.g. the latest builds of an image's dependencies, or the outcome of the rpm checks before
+    inspecting the rpms installed in an image). Independent checks therefore run as soon as
+    possible rather than phase by phase. Blocking calls run in threads and are throttled per
+    backend by the resource limiters named in BACKEND_RESOURCES (see --concurrency-limit).
+    """
 
-    \b
-    It will report images if the latest build:
-    - Contains an RPM that is about to be rebuilt based on the RPM check above.
-    - If the source git hash no longer matches the upstream source.
-    - Contains any RPM (from anywhere in Red Hat) which has likely changed since the image was built.
-        - This indirectly detects non-member parent image changes.
-    - Was built with a buildroot that has now changed (probably not useful for images, but was cheap to add).
-    - Used a builder image (from anywhere in Red Hat) that has changed.
-    - Used a builder image from this group that is about to change.
-    - If the associated member is a descendant of any image that needs change.
+    # Resource limiting the number of concurrent blocking operations, per backend
+    BACKEND_RESOURCES = {
+        'koji': constants.RESOURCE_SCAN_SOURCES_KOJI,
+        'cgit': constants.RESOURCE_SCAN_SOURCES_CGIT,
+        'git': constants.RESOURCE_SCAN_SOURCES_GIT,
+        'registry': constants.RESOURCE_SCAN_SOURCES_REGISTRY,
+    }
+
+    def __init__(self, runtime: Runtime, ci_kubeconfig: Optional[str], as_yaml: bool):
+        self.runtime = runtime
+        self.ci_kubeconfig = ci_kubeconfig
+        self.as_yaml = as_yaml
+        self._limits: Dict[str, exectools.ResourceLimiter] = {
+            backend: exectools.get_resource_limiter(resource, constants.DEFAULT_RESOURCE_LIMITS[resource])
+            for backend, resource in self.BACKEND_RESOURCES.items()
+        }
+        self._executor: Optional[exectools.TrackingThreadPoolExecutor] = None  # runs blocking operations during run()
 
-    \b
-    It will report RHCOS updates available per imagestream.
-    """
-    runtime.initialize(mode='both', clone_distgits=False, clone_source=False, prevent_cloning=True)
+        self.changing_rpm_metas: Set[Metadata] = set()
+        self.changing_image_metas: Set[ImageMetadata] = set()
+        self.changing_rpm_packages: Set[str] = set()
+        self.assessment_reason: Dict[str, str] = dict()  # maps metadata qualified_key => message describing change
+
+        # Maps distgit_key => images which use that group member as a builder
+        self.builder_dependents: Dict[str, List[ImageMetadata]] = defaultdict(list)
 
-    all_rpm_metas = set(runtime.rpm_metas())
-    all_image_metas = set(runtime.image_metas())
+        # Memoized tasks shared by all checks which depend on the same input
+        self._upstream_tasks: Dict[str, asyncio.Future] = {}
+        self._latest_build_tasks: Dict[str, asyncio.Future] = {}
+        self._builder_image_tasks: Dict[str, asyncio.Future] = {}
+        self._rpm_scan: Optional[asyncio.Future] = None
 
-    changing_rpm_metas = set()
-    changing_image_metas = set()
-    changing_rpm_packages = set()
-    assessment_reason = dict()  # maps metadata qualified_key => message describing change
+        # Maps phase name => [operations, total seconds, longest seconds, seconds after start when the last operation finished]
+        self._phase_timings: Dict[str, List[float]] = {}
+        self._start_time = 0.0
 
-    def add_assessment_reason(meta, rebuild_hint: RebuildHint):
+    def add_assessment_reason(self, meta, rebuild_hint: RebuildHint):
         # qualify by whether this is a True or False for change so that we can store both in the map.
         key = f'{meta.qualified_key}+{rebuild_hint.rebuild}'
         # If the key is already there, don't replace the message as it is likely more interesting
         # than subsequent reasons (e.g. changing because of ancestry)
-        if key not in assessment_reason:
-            assessment_reason[key] = rebuild_hint.reason
-
-    def add_image_meta_change(meta, rebuild_hint: RebuildHint):
-        nonlocal changing_image_metas
-        changing_image_metas.add(meta)
-        add_assessment_reason(meta, rebuild_hint)
-        for descendant_meta in meta.get_descendants():
-            changing_image_metas.add(descendant_meta)
-            add_assessment_reason(descendant_meta, RebuildHint(RebuildHintCode.ANCESTOR_CHANGING, f'Ancestor {meta.distgit_key} is changing'))
-
-    with runtime.shared_koji_client_session() as koji_api:
-        runtime.logger.info(f'scan-sources coordinate: brew_event: {koji_api.getLastEvent(brew.KojiWrapperOpts(brew_event_aware=True))}')
-        runtime.logger.info(f'scan-sources coordinate: emulated_brew_event: {runtime.brew_event}')
-
-        # First, scan for any upstream source code changes. If found, these are guaranteed rebuilds.
-        for meta, rebuild_hint in runtime.scan_for_upstream_changes():
-
-            dgk = meta.distgit_key
-            if not (meta.enabled or meta.mode == "disabled" and runtime.load_disabled):
-                # An enabled image's dependents are always loaded. Ignore disabled configs unless explicitly indicated
+        if key not in self.assessment_reason:
+            self.assessment_reason[key] = rebuild_hint.reason
+
+    def add_image_meta_change(self, meta: ImageMetadata, rebuild_hint: RebuildHint):
+        """
+        Marks an image as changing. The change is propagated through the image tree: descendants
+        of a changing image and images using it as a builder will change as well.
+        """
+        self.add_assessment_reason(meta, rebuild_hint)
+        queue = deque([meta])
+        while queue:
+            changing_meta = queue.popleft()
+            if changing_meta in self.changing_image_metas:
                 continue
-
-            if meta.meta_type == 'rpm':
-                package_name = meta.get_package_name()
-                if not rebuild_hint.rebuild:  # If no change has been detected, check buildroots to see if it has changed
-
+            self.changing_image_metas.add(changing_meta)
+            for descendant_meta in changing_meta.get_descendants():
+                self.add_assessment_reason(descendant_meta, RebuildHint(RebuildHintCode.ANCESTOR_CHANGING, f'Ancestor {changing_meta.distgit_key} is changing'))
+                queue.append(descendant_meta)
+            for dependent_meta in self.builder_dependents.get(changing_meta.distgit_key, []):
+                if dependent_meta not in self.changing_image_metas:
+                    self.runtime.logger.info(f'{dependent_meta.distgit_key} will be rebuilt due to change in builder member ')
+                self.add_assessment_reason(dependent_meta, RebuildHint(RebuildHintCode.BUILDER_CHANGING, f'Builder group member has changed: {changing_meta.distgit_key}'))
+                queue.append(dependent_meta)
+
+    def _record_timing(self, phase: str, start: float):
+        end = time.monotonic()
+        timing = self._phase_timings.setdefault(phase, [0, 0.0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += end - start
+        timing[2] = max(timing[2], end - start)
+        timing[3] = max(timing[3], end - self._start_time)
+
+    async def _run_blocking(self, backend: str, phase: str, func, *args):
+        """
+        Runs a blocking function in a thread once the backend has capacity and records its duration for the phase.
+        """
+        async with self._limits[backend]:
+            start = time.monotonic()
+            try:
+                return await exectools.to_executor(self._executor, func, *args)
+            finally:
+                self._record_timing(phase, start)
+
+    @staticmethod
+    def _memoized(futures: Dict[str, asyncio.Future], key: str, coro_func, *args) -> asyncio.Future:
+        future = futures.get(key)
+        if future is None:
+            future = futures[key] = asyncio.ensure_future(coro_func(*args))
+        return future
+
+    def upstream_hint(self, meta: Metadata) -> Awaitable[RebuildHint]:
+        return self._memoized(self._upstream_tasks, meta.qualified_key, self._run_blocking, 'git', 'upstream', meta.needs_rebuild)
+
+    def latest_build(self, meta: Metadata) -> Awaitable[Optional[Dict]]:
+        return self._memoized(self._latest_build_tasks, meta.qualified_key, self._run_blocking, 'koji', 'latest_build', meta.get_latest_build, None)
+
+    def builder_image_build(self, builder_image_url: str) -> Awaitable[Dict]:
+        def _find():
+            with self.runtime.pooled_koji_client_session() as koji_api:
+                return ImageMetadata.get_builder_image_build(koji_api, builder_image_url)
+        return self._memoized(self._builder_image_tasks, builder_image_url, self._run_blocking, 'registry', 'builder_image', _find)
+
+    def _is_scanned(self, meta: Metadata) -> bool:
+        # An enabled image's dependents are always loaded. Ignore disabled configs unless explicitly indicated
+        return meta.enabled or meta.mode == "disabled" and self.runtime.load_disabled
+
+    async def scan_rpm(self, meta: Metadata):
+        rebuild_hint = await self.upstream_hint(meta)
+        if not self._is_scanned(meta):
+            return
+
+        dgk = meta.distgit_key
+        package_name = meta.get_package_name()
+        if not rebuild_hint.rebuild:  # If no change has been detected, check buildroots to see if it has changed
+            def _check_buildroot():
+                with self.runtime.pooled_koji_client_session() as koji_api:
                     # A package may contain multiple RPMs; find the oldest one in the latest package build.
                     eldest_rpm_build = None
                     for latest_rpm_build in koji_api.getLatestRPMS(tag=meta.branch() + '-candidate', package=package_name)[1]:
@@ -88,173 +150,237 @@ def config_scan_source_changes(runtime: Runtime, ci_kubeconfig, as_yaml):
                             eldest_rpm_build = latest_rpm_build
 
                     # Detect if our buildroot changed since the oldest rpm of the latest build of the package was built.
-                    build_root_change = brew.has_tag_changed_since_build(runtime, koji_api, eldest_rpm_build, meta.build_root_tag(), inherit=True)
-
+                    build_root_change = brew.has_tag_changed_since_build(self.runtime, koji_api, eldest_rpm_build, meta.build_root_tag(), inherit=True)
                     if build_root_change:
-                        rebuild_hint = RebuildHint(RebuildHintCode.BUILD_ROOT_CHANGING, 'Oldest package rpm build was before buildroot change')
-                        runtime.logger.info(f'{dgk} ({eldest_rpm_build}) in {package_name} is older than more recent buildroot change: {build_root_change}')
+                        self.runtime.logger.info(f'{dgk} ({eldest_rpm_build}) in {package_name} is older than more recent buildroot change: {build_root_change}')
+                    return build_root_change
 
-                if rebuild_hint.rebuild:
-                    add_assessment_reason(meta, rebuild_hint)
-                    changing_rpm_metas.add(meta)
-                    changing_rpm_packages.add(package_name)
+            if await self._run_blocking('koji', 'rpm_buildroot', _check_buildroot):
+                rebuild_hint = RebuildHint(RebuildHintCode.BUILD_ROOT_CHANGING, 'Oldest package rpm build was before buildroot change')
 
-            elif meta.meta_type == 'image':
-                if rebuild_hint.rebuild:
-                    add_image_meta_change(meta, rebuild_hint)
+        if rebuild_hint.rebuild:
+            self.add_assessment_reason(meta, rebuild_hint)
+            self.changing_rpm_metas.add(meta)
+            self.changing_rpm_packages.add(package_name)
 
-            else:
-                raise IOError(f'Unsupported meta type: {meta.meta_type}')
-
-        # To limit the size of the queries we are going to make, find the oldest and newest image
-        oldest_image_event_ts = None
-        newest_image_event_ts = 0
-        for image_meta in runtime.image_metas():
-            info = image_meta.get_latest_build(default=None)
-            if info is None:
+    async def scan_image(self, image_meta: ImageMetadata):
+        # First, scan for any upstream source code changes. If found, these are guaranteed rebuilds.
+        rebuild_hint = await self.upstream_hint(image_meta)
+        if rebuild_hint.rebuild and self._is_scanned(image_meta):
+            self.add_image_meta_change(image_meta, rebuild_hint)
+
+        # Each of the following checks is skipped once a rebuild has been requested (possibly by an ancestor).
+        if image_meta in self.changing_image_metas:
+            return
+        info = await self.latest_build(image_meta)
+        if info is not None:
+            await self._check_dependencies(image_meta, info)
+            if image_meta in self.changing_image_metas:
+                return
+            await self._check_config_digest(image_meta, info)
+            if image_meta in self.changing_image_metas:
+                return
+
+        # Builder images are shared by many images; resolve each of them only once.
+        await asyncio.gather(*(self.builder_image_build(url) for url in image_meta.get_builder_image_urls().values()))
+        # An image which installs a changing rpm must be rebuilt; wait until all rpms have been assessed.
+        await self._rpm_scan
+        if image_meta in self.changing_image_metas:
+            return
+
+        async with self._limits['koji']:
+            start = time.monotonic()
+            try:
+                _, rebuild_hint = await image_meta.does_image_need_change(self.changing_rpm_packages, image_meta.build_root_tag(),
+                                                                          executor=self._executor)
+            finally:
+                self._record_timing('image_content', start)
+        if rebuild_hint.rebuild:
+            self.add_image_meta_change(image_meta, rebuild_hint)
+
+    async def _check_dependencies(self, image_meta: ImageMetadata, info: Dict):
+        """
+        Request a rebuild if A is a dependent (operator or child image) of B but the latest build of A is older than B.
+        """
+        rebase_time = util.isolate_timestamp_in_release(info["release"])
+        if not rebase_time:  # no timestamp string in NVR?
+            return
+        rebase_time = datetime.strptime(rebase_time, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+        dependencies = image_meta.dependencies.copy()
+        base_image = image_meta.config["from"].member
+        if base_image:
+            dependencies.add(base_image)
+        for builder in image_meta.config['from'].builder:
+            if builder.member:
+                dependencies.add(builder.member)
+
+        dep_metas = []
+        for dep_key in sorted(dependencies):
+            dep = self.runtime.image_map.get(dep_key)
+            if not dep:
+                self.runtime.logger.warning("Image %s has unknown dependency %s. Is it excluded?", image_meta.distgit_key, dep_key)
+                continue
+            dep_metas.append(dep)
+
+        for dep_info in await asyncio.gather(*(self.latest_build(dep) for dep in dep_metas)):
+            if not dep_info:
                 continue
-            create_event_ts = koji_api.getEvent(info['creation_event_id'])['ts']
-            if oldest_image_event_ts is None or create_event_ts < oldest_image_event_ts:
-                oldest_image_event_ts = create_event_ts
-            if create_event_ts > newest_image_event_ts:
-                newest_image_event_ts = create_event_ts
-
-            if image_meta in changing_image_metas:
-                continue  # A rebuild is already requested.
-
-            # Request a rebuild if A is a dependent (operator or child image) of B but the latest build of A is older than B.
-            rebase_time = util.isolate_timestamp_in_release(info["release"])
-            if not rebase_time:  # no timestamp string in NVR?
+            dep_rebase_time = util.isolate_timestamp_in_release(dep_info["release"])
+            if not dep_rebase_time:  # no timestamp string in NVR?
                 continue
-            rebase_time = datetime.strptime(rebase_time, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
-            dependencies = image_meta.dependencies.copy()
-            base_image = image_meta.config["from"].member
-            if base_image:
-                dependencies.add(base_image)
+            dep_rebase_time = datetime.strptime(dep_rebase_time, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+            if dep_rebase_time > rebase_time:
+                self.add_image_meta_change(image_meta, RebuildHint(RebuildHintCode.DEPENDENCY_NEWER, 'Dependency has a newer build'))
+                return
+
+    async def _check_config_digest(self, image_meta: ImageMetadata, info: Dict):
+        """
+        If no upstream change has been detected, check configurations
+        like image meta, repos, and streams to see if they have changed
+        We detect config changes by comparing their digest changes.
+        The config digest of the previous build is stored at .oit/config_digest on distgit repo.
+        """
+        try:
+            source_url = info['source']  # git://pkgs.devel.redhat.com/containers/atomic-openshift-descheduler#6fc9c31e5d9437ac19e3c4b45231be8392cdacac
+            source_commit = source_url.split('#')[1]  # isolate the commit hash
+            # Look at the digest that created THIS build. What is in head does not matter.
+            prev_digest = await self._run_blocking('cgit', 'config_digest', image_meta.fetch_cgit_file, '.oit/config_digest', source_commit)
+            prev_digest = prev_digest.decode('utf-8')
+            current_digest = image_meta.calculate_config_digest(self.runtime.group_config, self.runtime.streams)
+            if current_digest.strip() != prev_digest.strip():
+                self.runtime.logger.info('%s config_digest %s is differing from %s', image_meta.distgit_key, prev_digest, current_digest)
+                self.add_image_meta_change(image_meta, RebuildHint(RebuildHintCode.CONFIG_CHANGE, 'Metadata configuration change'))
+        except exectools.RetryException:
+            self.runtime.logger.info('%s config_digest cannot be retrieved; request a build', image_meta.distgit_key)
+            self.add_image_meta_change(image_meta, RebuildHint(RebuildHintCode.CONFIG_CHANGE, 'Unable to retrieve config_digest'))
+
+    def report_timings(self):
+        logger = self.runtime.logger
+        logger.info(f'scan-sources timing: wall time {time.monotonic() - self._start_time:.1f}s')
+        for phase, (count, total, longest, finished) in sorted(self._phase_timings.items(), key=lambda item: item[1][3]):
+            logger.info(f'scan-sources timing: {phase}: {int(count)} operations; total {total:.1f}s; '
+                        f'longest {longest:.1f}s; done after {finished:.1f}s')
+
+    async def run(self):
+        self._start_time = time.monotonic()
+        # Blocking operations run on an executor of their own, large enough not to throttle the backends any further.
+        # A backend without a limit gets as many threads as its default limit.
+        max_workers = sum(limiter.limit or constants.DEFAULT_RESOURCE_LIMITS[self.BACKEND_RESOURCES[backend]]
+                          for backend, limiter in self._limits.items())
+        self._executor = exectools.TrackingThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scan-sources')
+        try:
+            await self._scan()
+        finally:
+            # Don't leave queued blocking operations behind if the scan has failed
+            self._executor.cancel_pending()
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def _scan(self):
+        runtime = self.runtime
+
+        all_rpm_metas = set(runtime.rpm_metas())
+        all_image_metas = set(runtime.image_metas())
+
+        for image_meta in all_image_metas:
             for builder in image_meta.config['from'].builder:
                 if builder.member:
-                    dependencies.add(builder.member)
-            for dep_key in dependencies:
-                dep = runtime.image_map.get(dep_key)
-                if not dep:
-                    runtime.logger.warning("Image %s has unknown dependency %s. Is it excluded?", image_meta.distgit_key, dep_key)
-                    continue
-                dep_info = dep.get_latest_build(default=None)
-                if not dep_info:
-                    continue
-                dep_rebase_time = util.isolate_timestamp_in_release(dep_info["release"])
-                if not dep_rebase_time:  # no timestamp string in NVR?
-                    continue
-                dep_rebase_time = datetime.strptime(dep_rebase_time, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
-                if dep_rebase_time > rebase_time:
-                    add_image_meta_change(image_meta, RebuildHint(RebuildHintCode.DEPENDENCY_NEWER, 'Dependency has a newer build'))
+                    self.builder_dependents[builder.member].append(image_meta)
 
-            if image_meta in changing_image_metas:
-                continue  # A rebuild is already requested.
+        with runtime.shared_koji_client_session() as koji_api:
+            runtime.logger.info(f'scan-sources coordinate: brew_event: {koji_api.getLastEvent(brew.KojiWrapperOpts(brew_event_aware=True))}')
+            runtime.logger.info(f'scan-sources coordinate: emulated_brew_event: {runtime.brew_event}')
 
-            # If no upstream change has been detected, check configurations
-            # like image meta, repos, and streams to see if they have changed
-            # We detect config changes by comparing their digest changes.
-            # The config digest of the previous build is stored at .oit/config_digest on distgit repo.
-            try:
-                source_url = info['source']  # git://pkgs.devel.redhat.com/containers/atomic-openshift-descheduler#6fc9c31e5d9437ac19e3c4b45231be8392cdacac
-                source_commit = source_url.split('#')[1]  # isolate the commit hash
-                # Look at the digest that created THIS build. What is in head does not matter.
-                prev_digest = image_meta.fetch_cgit_file('.oit/config_digest', commit_hash=source_commit).decode('utf-8')
-                current_digest = image_meta.calculate_config_digest(runtime.group_config, runtime.streams)
-                if current_digest.strip() != prev_digest.strip():
-                    runtime.logger.info('%s config_digest %s is differing from %s', image_meta.distgit_key, prev_digest, current_digest)
-                    add_image_meta_change(image_meta, RebuildHint(RebuildHintCode.CONFIG_CHANGE, 'Metadata configuration change'))
-            except exectools.RetryException:
-                runtime.logger.info('%s config_digest cannot be retrieved; request a build', image_meta.distgit_key)
-                add_image_meta_change(image_meta, RebuildHint(RebuildHintCode.CONFIG_CHANGE, 'Unable to retrieve config_digest'))
-
-    runtime.logger.debug(f'Will be assessing tagging changes between newest_image_event_ts:{newest_image_event_ts} and oldest_image_event_ts:{oldest_image_event_ts}')
-
-    def _thread_does_image_need_change(image_meta):
-        return asyncio.run(image_meta.does_image_need_change(changing_rpm_packages, image_meta.build_root_tag(), newest_image_event_ts, oldest_image_event_ts))
-
-    change_results = exectools.parallel_exec(
-        f=lambda image_meta, terminate_event: _thread_does_image_need_change(image_meta),
-        args=runtime.image_metas(),
-        n_threads=20
-    )
+        rhcos_status = None
+        if self.ci_kubeconfig:  # we can determine m-os-c needs updating if we can look at imagestreams
+            rhcos_status = asyncio.ensure_future(self._run_blocking('registry', 'rhcos', _detect_rhcos_status, runtime, self.ci_kubeconfig))
 
-    for change_result in change_results.get():
-        meta, rebuild_hint = change_result
-        if rebuild_hint.rebuild:
-            add_image_meta_change(meta, rebuild_hint)
-
-    # does_image_need_change() checks whether its non-member builder images have changed
-    # but cannot determine whether member builder images have changed until anticipated
-    # changes have been calculated. The following loop does this. It uses while True,
-    # because technically, we could keep finding changes in intermediate builder images
-    # and have to ensure we pull in images that rely on them in the next iteration.
-    # fyi, changes in direct parent images should be detected by RPM changes, which
-    # does does_image_name_change will detect.
-    while True:
-        changing_image_dgks = [meta.distgit_key for meta in changing_image_metas]
+        # Find the latest builds of all components in a few koji multicalls; individual lookups are then served from cache.
+        await self._run_blocking('koji', 'latest_build', runtime.resolve_latest_builds, list(all_image_metas | all_rpm_metas))
+
+        # List the refs of each upstream repository once, no matter how many components build from it.
+        prefetch = asyncio.ensure_future(exectools.to_executor(self._executor, runtime.prefetch_remote_refs, list(all_image_metas | all_rpm_metas)))
+        self._rpm_scan = asyncio.ensure_future(asyncio.gather(*(self.scan_rpm(rpm_meta) for rpm_meta in all_rpm_metas)))
+        await asyncio.gather(prefetch, self._rpm_scan, *(self.scan_image(image_meta) for image_meta in all_image_metas))
+
+        # We have our information. Now build the output report..
+        image_results = []
         for image_meta in all_image_metas:
-            dgk = image_meta.distgit_key
-            if dgk in changing_image_dgks:  # Already in? Don't look any further
-                continue
+            is_changing = image_meta in self.changing_image_metas
+            image_results.append({
+                'name': image_meta.distgit_key,
+                'changed': is_changing,
+                'reason': self.assessment_reason.get(f'{image_meta.qualified_key}+{is_changing}', 'No change detected'),
+            })
+
+        rpm_results = []
+        for rpm_meta in all_rpm_metas:
+            is_changing = rpm_meta in self.changing_rpm_metas
+            rpm_results.append({
+                'name': rpm_meta.distgit_key,
+                'changed': is_changing,
+                'reason': self.assessment_reason.get(f'{rpm_meta.qualified_key}+{is_changing}', 'No change detected'),
+            })
+
+        results = dict(
+            rpms=rpm_results,
+            images=image_results
+        )
+
+        runtime.logger.debug(f'scan-sources coordinate: results:\n{yaml.safe_dump(results, indent=4)}')
+
+        if rhcos_status:
+            results['rhcos'] = await rhcos_status
+
+        if self.as_yaml:
+            click.echo('---')
+            click.echo(yaml.safe_dump(results, indent=4))
+        else:
+            for kind, items in results.items():
+                if not items:
+                    continue
+                click.echo(kind.upper() + ":")
+                for item in items:
+                    click.echo('  {} is {} (reason: {})'.format(item['name'],
+                                                                'changed' if item['changed'] else 'the same',
+                                                                item['reason']))
+
+        self.report_timings()
+        runtime.logger.info(f'KojiWrapper cache stats: {brew.KojiWrapper.get_cache_stats()}')
+        runtime.logger.info(f'Koji session pool stats: {runtime.get_koji_session_pool().stats()}')
 
-            for builder in image_meta.config['from'].builder:
-                if builder.member and builder.member in changing_image_dgks:
-                    runtime.logger.info(f'{dgk} will be rebuilt due to change in builder member ')
-                    add_image_meta_change(image_meta, RebuildHint(RebuildHintCode.BUILDER_CHANGING, f'Builder group member has changed: {builder.member}'))
-
-        if len(changing_image_metas) == len(changing_image_dgks):
-            # The for loop didn't find anything new, we can break
-            break
-
-    # We have our information. Now build the output report..
-    image_results = []
-    changing_image_dgks = [meta.distgit_key for meta in changing_image_metas]
-    for image_meta in all_image_metas:
-        dgk = image_meta.distgit_key
-        is_changing = dgk in changing_image_dgks
-        image_results.append({
-            'name': dgk,
-            'changed': is_changing,
-            'reason': assessment_reason.get(f'{image_meta.qualified_key}+{is_changing}', 'No change detected'),
-        })
-
-    rpm_results = []
-    changing_rpm_dgks = [meta.distgit_key for meta in changing_rpm_metas]
-    for rpm_meta in all_rpm_metas:
-        dgk = rpm_meta.distgit_key
-        is_changing = dgk in changing_rpm_dgks
-        rpm_results.append({
-            'name': dgk,
-            'changed': is_changing,
-            'reason': assessment_reason.get(f'{rpm_meta.qualified_key}+{is_changing}', 'No change detected'),
-        })
-
-    results = dict(
-        rpms=rpm_results,
-        images=image_results
-    )
 
-    runtime.logger.debug(f'scan-sources coordinate: results:\n{yaml.safe_dump(results, indent=4)}')
+@cli.command("config:scan-sources", short_help="Determine if any rpms / images need to be rebuilt.")
+@click.option("--ci-kubeconfig", metavar='KC_PATH', required=False,
+              help="File containing kubeconfig for looking at release-controller imagestreams")
+@click.option("--yaml", "as_yaml", default=False, is_flag=True, help='Print results in a yaml block')
+@pass_runtime
+@click_coroutine
+async def config_scan_source_changes(runtime: Runtime, ci_kubeconfig, as_yaml):
+    """
+    Determine if any rpms / images need to be rebuilt.
 
-    if ci_kubeconfig:  # we can determine m-os-c needs updating if we can look at imagestreams
-        results['rhcos'] = _detect_rhcos_status(runtime, ci_kubeconfig)
+    \b
+    The method will report RPMs in this group if:
+    - Their source git hash no longer matches their upstream source.
+    - The buildroot used by the previous RPM build has changed.
 
-    if as_yaml:
-        click.echo('---')
-        click.echo(yaml.safe_dump(results, indent=4))
-    else:
-        for kind, items in results.items():
-            if not items:
-                continue
-            click.echo(kind.upper() + ":")
-            for item in items:
-                click.echo('  {} is {} (reason: {})'.format(item['name'],
-                                                            'changed' if item['changed'] else 'the same',
-                                                            item['reason']))
+    \b
+    It will report images if the latest build:
+    - Contains an RPM that is about to be rebuilt based on the RPM check above.
+    - If the source git hash no longer matches the upstream source.
+    - Contains any RPM (from anywhere in Red Hat) which has likely changed since the image was built.
+        - This indirectly detects non-member parent image changes.
+    - Was built with a buildroot that has now changed (probably not useful for images, but was cheap to add).
+    - Used a builder image (from anywhere in Red Hat) that has changed.
+    - Used a builder image from this group that is about to change.
+    - If the associated member is a descendant of any image that needs change.
 
-    runtime.logger.info(f'KojiWrapper cache size: {int(brew.KojiWrapper.get_cache_size() / 1024)}KB')
+    \b
+    It will report RHCOS updates available per imagestream.
+    """
+    runtime.initialize(mode='both', clone_distgits=False, clone_source=False, prevent_cloning=True)
+    await ConfigScanSources(runtime, ci_kubeconfig, as_yaml).run()
 
 
 def _detect_rhcos_status(runtime, kubeconfig) -> list:
@@ -27,3 +27,58 @@ default_db_params = {
 
 # TODO: once brew outage is resolved, change to 6 hours again (currently set to 100)
 BREW_BUILD_TIMEOUT = 100 * 60 * 60  # how long we wait before canceling a task
+BREW_TASK_WATCH_TIMEOUT = 4 * 60 * 60  # how long watch_tasks waits before canceling the tasks it watches
+
+# Default maximum number of sessions in Runtime's koji session pool (see --koji-session-pool-size)
+KOJI_SESSION_POOL_SIZE = 30
+
+# Maximum number of concurrent connections AsyncKojiWrapper opens to the koji hub
+KOJI_ASYNC_CONNECTION_LIMIT = 30
+
+# How long (in seconds) Koji API results which may change are trusted in the persistent cache (see --koji-cache-dir)
+KOJI_CACHE_VOLATILE_TTL = 60 * 60
+
+# Maximum number of calls sent to the koji hub in a single multiCall request when prefetching in bulk
+KOJI_MULTICALL_BATCH_SIZE = 500
+
+# Maximum number of threads constructing component metadata while the runtime is initialized
+METADATA_LOAD_THREADS = 16
+
+# Maximum number of concurrent `git ls-remote` processes used to resolve upstream refs
+GIT_LS_REMOTE_CONCURRENCY = 10
+
+# Shared resources whose concurrent use is limited by exectools.get_resource_limiter.
+# Limits can be set with concurrency_limits in group.yml or --concurrency-limit RESOURCE=LIMIT.
+RESOURCE_RHPKG_PUSH = 'rhpkg::push'
+RESOURCE_GIT_CLONE = 'git::clone'
+RESOURCE_OC_IMAGE_MIRROR = 'oc::image_mirror'
+RESOURCE_CGIT = 'cgit'
+# Blocking operations of scan-sources, per backend
+RESOURCE_SCAN_SOURCES_KOJI = 'scan-sources::koji'
+RESOURCE_SCAN_SOURCES_CGIT = 'scan-sources::cgit'
+RESOURCE_SCAN_SOURCES_GIT = 'scan-sources::git'  # upstream source checks (git ls-remote)
+RESOURCE_SCAN_SOURCES_REGISTRY = 'scan-sources::registry'  # oc image info / imagestreams
+DEFAULT_RESOURCE_LIMITS = {
+    RESOURCE_RHPKG_PUSH: 5,
+    RESOURCE_SCAN_SOURCES_KOJI: 20,
+    RESOURCE_SCAN_SOURCES_CGIT: 20,
+    RESOURCE_SCAN_SOURCES_GIT: 20,
+    RESOURCE_SCAN_SOURCES_REGISTRY: 10,
+}
+
+# gen-payload mirrors the payload images which are missing from the destination registry in
+# `oc image mirror` invocations of this many images each
+PAYLOAD_MIRROR_BATCH_SIZE = 50
+# Seconds after which a single `oc image mirror` invocation of gen-payload is considered hung
+PAYLOAD_MIRROR_TIMEOUT = 1800
+# Seconds to wait for mirrored payload images to become readable from the destination registry
+PAYLOAD_MIRROR_READY_TIMEOUT = 600
+
+# Most recent output (bytes per stream) retained in memory for long running commands whose output is streamed to the console
+REALTIME_OUTPUT_LIMIT = 10 * 1024 * 1024
+
+# Seconds between two polls of a Brew task which KojiTaskWatcher just started watching
+BREW_TASK_WATCH_MIN_INTERVAL = 10
+
+# Maximum number of seconds between two polls of a long running Brew task (see KojiTaskWatcher)
+BREW_TASK_WATCH_MAX_INTERVAL = 3 * 60
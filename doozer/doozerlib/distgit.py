@@ -235,7 +235,8 @@ class DistGitRepo(object):
                             cmd_list.extend(["--depth", str(rhpkg_clone_depth)])
 
                         # Clone the distgit repository. Occasional flakes in clone, so use retry.
-                        exectools.cmd_assert(cmd_list, retries=3, set_env=constants.GIT_NO_PROMPTS)
+                        with exectools.get_resource_limiter(constants.RESOURCE_GIT_CLONE):
+                            exectools.cmd_assert(cmd_list, retries=3, set_env=constants.GIT_NO_PROMPTS)
 
                     if distgit_commitish:
                         with Dir(self.distgit_dir):
@@ -343,7 +344,8 @@ class DistGitRepo(object):
         assert self.sha is not None
         self.logger.debug("Checking if distgit commit %s is available on cgit...", self.sha)
         url = self.metadata.cgit_file_url(filename, commit_hash=self.sha, branch=self.branch)
-        response = requests.head(url)
+        with exectools.get_resource_limiter(constants.RESOURCE_CGIT):
+            response = requests.head(url)
         if response.status_code == 404:
             self.logger.debug("Distgit commit %s is not available on cgit", self.sha)
             return False, url
@@ -365,8 +367,8 @@ class DistGitRepo(object):
                 # When initializing new release branches, a large amount of data needs to
                 # be pushed. If every distgit within a release is being pushed at the same
                 # time, a single push invocation can take hours to complete -- making the
-                # timeout value counterproductive. Limit to 5 simultaneous pushes.
-                with self.runtime.get_named_semaphore('rhpkg::push', count=5):
+                # timeout value counterproductive. Limit simultaneous pushes (5 by default).
+                with exectools.get_resource_limiter(constants.RESOURCE_RHPKG_PUSH):
                     timeout = str(self.runtime.global_opts['rhpkg_push_timeout'])
                     exectools.cmd_assert("timeout {} rhpkg push".format(timeout), retries=3)
                     # rhpkg will create but not push tags :(
@@ -387,13 +389,13 @@ class DistGitRepo(object):
                 return (self.metadata, repr(e))
             return (self.metadata, True)
 
-    @exectools.limit_concurrency(limit=5)
+    @exectools.limit_concurrency(resource=constants.RESOURCE_RHPKG_PUSH)
     async def push_async(self):
         self.logger.info("Pushing distgit repository %s", self.name)
         # When initializing new release branches, an large amount of data needs to
         # be pushed. If every distgit within a release is being pushed at the same
         # time, a single push invocation can take hours to complete -- making the
-        # timeout value counterproductive. Limit to 5 simultaneous pushes.
+        # timeout value counterproductive. Limit simultaneous pushes (5 by default); push() shares the limit.
         timeout = str(self.runtime.global_opts['rhpkg_push_timeout'])
         await exectools.cmd_assert_async(["timeout", f"{timeout}", "git", "push", "--follow-tags"], cwd=self.distgit_dir, retries=3)
 
@@ -870,7 +872,8 @@ class ImageDistGitRepo(DistGitRepo):
                     else:
                         for r in range(10):
                             self.logger.info("Mirroring image [retry={}]".format(r))
-                            rc, out, err = exectools.cmd_gather(mirror_cmd, timeout=1800)
+                            with exectools.get_resource_limiter(constants.RESOURCE_OC_IMAGE_MIRROR):
+                                rc, out, err = exectools.cmd_gather(mirror_cmd, timeout=1800)
                             if rc == 0:
                                 break
                             self.logger.info("Error mirroring image -- retrying in 60 seconds.\n{}".format(err))
@@ -947,9 +950,29 @@ class ImageDistGitRepo(DistGitRepo):
         if terminate_event.is_set():
             raise KeyboardInterrupt()
 
+    def get_build_dependencies(self) -> List[str]:
+        """
+        :return: The names of the group members which must be built before this image.
+        """
+        dependencies = []
+        # If this image is FROM another group member, we need to wait on that group member
+        # Use .get('from',None) since from is a reserved word.
+        image_from = Model(self.config.get('from', None))
+        if image_from.member is not Missing:
+            dependencies.append(image_from.member)
+        for builder in image_from.get('builder', []):
+            if 'member' in builder:
+                dependencies.append(builder['member'])
+        # Allow an image to wait on an arbitrary image in the group. This is presently
+        # just a workaround for: https://projects.engineering.redhat.com/browse/OSBS-5592
+        if self.config.wait_for is not Missing:
+            dependencies.append(self.config.wait_for)
+        return dependencies
+
     def build_container(
             self, profile, push_to_defaults, additional_registries, terminate_event,
-            scratch=False, retries=3, realtime=False, dry_run=False, registry_config_dir=None, filter_by_os=None, comment_on_pr=False):
+            scratch=False, retries=3, realtime=False, dry_run=False, registry_config_dir=None, filter_by_os=None, comment_on_pr=False,
+            task_watcher=None):
         """
         This method is designed to be thread-safe. Multiple builds should take place in brew
         at the same time. After a build, images are pushed serially to all mirrors.
@@ -960,6 +983,7 @@ class ImageDistGitRepo(DistGitRepo):
         :param terminate_event: Allows the main thread to interrupt the build.
         :param scratch: Whether this is a scratch build. UNTESTED.
         :param retries: Number of times the build should be retried.
+        :param task_watcher: An optional brew.KojiTaskWatcher shared by concurrent builds to watch Brew tasks.
         :return: True if the build was successful
         """
         if self.org_image_name is None or self.org_version is None:
@@ -998,24 +1022,13 @@ class ImageDistGitRepo(DistGitRepo):
         target_image = ":".join((self.org_image_name, target_tag))
 
         try:
-            # If this image is FROM another group member, we need to wait on that group member
-            # Use .get('from',None) since from is a reserved word.
-            image_from = Model(self.config.get('from', None))
-            if image_from.member is not Missing:
-                self._set_wait_for(image_from.member, terminate_event)
-            for builder in image_from.get('builder', []):
-                if 'member' in builder:
-                    self._set_wait_for(builder['member'], terminate_event)
+            for image_name in self.get_build_dependencies():
+                self._set_wait_for(image_name, terminate_event)
 
             if self.runtime.assembly and util.isolate_assembly_in_release(release) != self.runtime.assembly:
                 # Assemblies should follow its naming convention
                 raise ValueError(f"Image {self.name} is not rebased with assembly '{self.runtime.assembly}'.")
 
-            # Allow an image to wait on an arbitrary image in the group. This is presently
-            # just a workaround for: https://projects.engineering.redhat.com/browse/OSBS-5592
-            if self.config.wait_for is not Missing:
-                self._set_wait_for(self.config.wait_for, terminate_event)
-
             push_version, push_release = ('', '')
             if self.runtime.local:
                 self.build_status = self._build_container_local(target_image, profile["repo_type"], realtime)
@@ -1049,7 +1062,7 @@ class ImageDistGitRepo(DistGitRepo):
 
                 if self.image_build_method != "osbs2":
                     raise DoozerFatalError(f"Do not understand image build method {self.image_build_method}. Only osbs2 exists")
-                osbs2 = OSBS2Builder(self.runtime, scratch=scratch, dry_run=dry_run)
+                osbs2 = OSBS2Builder(self.runtime, scratch=scratch, dry_run=dry_run, task_watcher=task_watcher)
                 try:
                     task_id, task_url, build_info = asyncio.run(osbs2.build(self.metadata, profile, retries=retries))
                     record["task_id"] = task_id
@@ -1159,7 +1172,7 @@ class ImageDistGitRepo(DistGitRepo):
 
         with Dir(self.distgit_dir):
             self.logger.info(cmd)
-            rc, out, err = exectools.cmd_gather(cmd, realtime=True)
+            rc, out, err = exectools.cmd_gather(cmd, realtime=True, max_output_bytes=constants.REALTIME_OUTPUT_LIMIT)
 
             if rc != 0:
                 self.logger.error("Error running {}: out={}  ; err={}".format(builder, out, err))
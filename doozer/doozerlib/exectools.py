@@ -14,18 +14,20 @@ import shlex
 import os
 import threading
 import platform
+import selectors
 import sys
+import dataclasses
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from multiprocessing.pool import ThreadPool, MapResult
-from typing import Dict, List, Optional, Tuple, TypeVar, Union
+from typing import Dict, List, Optional, Set, Tuple, TypeVar, Union
 import urllib
-import errno
-
-from fcntl import fcntl, F_GETFL, F_SETFL
-from os import O_NONBLOCK, read
 
 from . import logutil
 from . import pushd
 from . import assertion
+from . import telemetry
 from .exceptions import WrapException
 from .util import green_print, yellow_print, timer
 
@@ -76,7 +78,8 @@ def urlopen_assert(url_or_req, httpcode=200, retries=3):
 
 
 def cmd_assert(cmd, realtime=False, retries=1, pollrate=60, on_retry=None,
-               set_env=None, strip=False, log_stdout: bool = False, log_stderr: bool = True, timeout: Optional[int] = None) -> Tuple[str, str]:
+               set_env=None, strip=False, log_stdout: bool = False, log_stderr: bool = True, timeout: Optional[int] = None,
+               max_output_bytes: Optional[int] = None) -> Tuple[str, str]:
     """
     Run a command, logging (using exec_cmd) and raise an exception if the
     return code of the command indicates failure.
@@ -92,6 +95,7 @@ def cmd_assert(cmd, realtime=False, retries=1, pollrate=60, on_retry=None,
     :param log_stdout: Whether stdout should be logged into the DEBUG log.
     :param log_stderr: Whether stderr should be logged into the DEBUG log
     :param timeout: Kill the process if it does not terminate after timeout seconds.
+    :param max_output_bytes: With realtime, only retain this many of the most recent bytes of stdout and stderr each.
     :return: (stdout,stderr) if exit code is zero
     """
 
@@ -106,7 +110,8 @@ def cmd_assert(cmd, realtime=False, retries=1, pollrate=60, on_retry=None,
                 cmd_gather(on_retry, set_env)
 
         result, stdout, stderr = cmd_gather(cmd, set_env=set_env, realtime=realtime, strip=strip,
-                                            log_stdout=log_stdout, log_stderr=log_stderr, timeout=timeout)
+                                            log_stdout=log_stdout, log_stderr=log_stderr, timeout=timeout,
+                                            max_output_bytes=max_output_bytes)
         if result == SUCCESS:
             break
 
@@ -124,7 +129,94 @@ cmd_counter_lock = threading.Lock()
 cmd_counter = 0  # Increments atomically to help search logs for command start/stop
 
 
-def cmd_gather(cmd: Union[str, List], set_env: Optional[Dict[str, str]] = None, realtime=False, strip=False, log_stdout=False, log_stderr=True, timeout: Optional[int] = None) -> Tuple[int, str, str]:
+class _RealtimeOutput:
+    """
+    Collects the output of one stream of a process while forwarding it, line by line, to the console.
+    """
+
+    # A line longer than this is forwarded without waiting for its end
+    MAX_LINE_BYTES = 64 * 1024
+
+    def __init__(self, echo, max_bytes: Optional[int] = None):
+        """
+        :param echo: Function called with each line of output
+        :param max_bytes: If set, only (approximately) this many of the most recent bytes are retained
+        """
+        self.echo = echo
+        self.max_bytes = max_bytes
+        self.truncated = False
+        self._chunks = deque()
+        self._size = 0
+        self._partial_line = b''
+
+    def feed(self, data: bytes):
+        self._chunks.append(data)
+        self._size += len(data)
+        if self.max_bytes:
+            while self._size - len(self._chunks[0]) >= self.max_bytes:
+                self._size -= len(self._chunks.popleft())
+                self.truncated = True
+
+        lines = (self._partial_line + data).split(b'\n')
+        self._partial_line = lines.pop()
+        for line in lines:
+            self.echo(line.rstrip(b'\r'))
+        if len(self._partial_line) > self.MAX_LINE_BYTES:
+            self.echo(self._partial_line)
+            self._partial_line = b''
+
+    def close(self) -> bytes:
+        """
+        Forwards any incomplete last line and returns the retained output.
+        """
+        if self._partial_line:
+            self.echo(self._partial_line)
+            self._partial_line = b''
+        output = b''.join(self._chunks)
+        if self.truncated:
+            # Start at a line boundary so that the output does not begin with a partial utf-8 character
+            output = output[output.find(b'\n') + 1:]
+        return output
+
+
+def _communicate_realtime(proc: subprocess.Popen, timeout: Optional[float] = None,
+                          max_output_bytes: Optional[int] = None) -> Tuple[bytes, bytes, bool]:
+    """
+    Like proc.communicate(), but stdout and stderr are printed to the console as the process produces them.
+    :param proc: A process whose stdout and stderr are pipes
+    :param timeout: Kill the process if it does not terminate after timeout seconds.
+    :param max_output_bytes: Only retain (approximately) this many of the most recent bytes of each stream.
+    :return: (stdout, stderr, whether any output was discarded because of max_output_bytes)
+    """
+    outputs = {
+        proc.stdout: _RealtimeOutput(green_print, max_output_bytes),
+        proc.stderr: _RealtimeOutput(yellow_print, max_output_bytes),
+    }
+    deadline = time.monotonic() + timeout if timeout else None
+    with selectors.DefaultSelector() as selector:
+        for stream in outputs:
+            selector.register(stream, selectors.EVENT_READ)
+        while selector.get_map():
+            wait = None
+            if deadline is not None:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    proc.kill()
+                    deadline = None  # keep reading until the streams of the killed process are closed
+                    continue
+            for key, _ in selector.select(wait):
+                data = os.read(key.fd, 65536)
+                if data:
+                    outputs[key.fileobj].feed(data)
+                else:
+                    selector.unregister(key.fileobj)
+    proc.wait()
+    stdout, stderr = outputs[proc.stdout], outputs[proc.stderr]
+    return stdout.close(), stderr.close(), stdout.truncated or stderr.truncated
+
+
+def cmd_gather(cmd: Union[str, List], set_env: Optional[Dict[str, str]] = None, realtime=False, strip=False, log_stdout=False, log_stderr=True, timeout: Optional[int] = None,
+               max_output_bytes: Optional[int] = None) -> Tuple[int, str, str]:
     """
     Runs a command and returns rc,stdout,stderr as a tuple.
 
@@ -139,6 +231,8 @@ def cmd_gather(cmd: Union[str, List], set_env: Optional[Dict[str, str]] = None,
     :param log_stdout: Whether stdout should be logged into the DEBUG log.
     :param log_stderr: Whether stderr should be logged into the DEBUG log
     :param timeout: Kill the process if it does not terminate after timeout seconds.
+    :param max_output_bytes: With realtime, only retain (approximately) this many of the most recent bytes of
+                             stdout and stderr each. The complete output is still printed to the console.
     :return: (rc,stdout,stderr)
     """
     global cmd_counter, cmd_counter_lock
@@ -165,7 +259,8 @@ def cmd_gather(cmd: Union[str, List], set_env: Optional[Dict[str, str]] = None,
     # Make sure output of launched commands is utf-8
     env['LC_ALL'] = 'en_US.UTF-8'
 
-    with timer(logger.info, f'{cmd_info}: Executed:cmd_gather'):
+    with timer(logger.info, f'{cmd_info}: Executed:cmd_gather'), \
+            telemetry.span('subprocess', telemetry.command_class(cmd_list), id=my_id, cmd=cmd_list, cwd=cwd) as trace_fields:
         logger.info(f'{cmd_info}: Executing:cmd_gather')
         try:
             proc = subprocess.Popen(
@@ -174,6 +269,7 @@ def cmd_gather(cmd: Union[str, List], set_env: Optional[Dict[str, str]] = None,
         except OSError as exc:
             description = "{}: Errored:\nException:\n{}\nIs {} installed?".format(cmd_info, exc, cmd_list[0])
             logger.error(description)
+            trace_fields['rc'] = exc.errno
             return exc.errno, "", description
 
         if not realtime:
@@ -184,53 +280,12 @@ def cmd_gather(cmd: Union[str, List], set_env: Optional[Dict[str, str]] = None,
                 out, err = proc.communicate()
             rc = proc.returncode
         else:
-            out = b''
-            err = b''
-
-            # Many thanks to http://eyalarubas.com/python-subproc-nonblock.html
-            # setup non-blocking read
-            # set the O_NONBLOCK flag of proc.stdout file descriptor:
-            flags = fcntl(proc.stdout, F_GETFL)  # get current proc.stdout flags
-            fcntl(proc.stdout, F_SETFL, flags | O_NONBLOCK)
-            # set the O_NONBLOCK flag of proc.stderr file descriptor:
-            flags = fcntl(proc.stderr, F_GETFL)  # get current proc.stderr flags
-            fcntl(proc.stderr, F_SETFL, flags | O_NONBLOCK)
-
-            rc = None
-            stdout_complete = False
-            stderr_complete = False
-            while not stdout_complete or not stderr_complete or rc is None:
-                output = None
-                try:
-                    output = read(proc.stdout.fileno(), 4096)
-                    if output:
-                        green_print(output.rstrip())
-                        out += output
-                    else:
-                        stdout_complete = True
-                except OSError as ose:
-                    if ose.errno == errno.EAGAIN or ose.errno == errno.EWOULDBLOCK:
-                        pass  # It is supposed to raise one of these exceptions
-                    else:
-                        raise
-
-                error = None
-                try:
-                    error = read(proc.stderr.fileno(), 4096)
-                    if error:
-                        yellow_print(error.rstrip())
-                        out += error
-                    else:
-                        stderr_complete = True
-                except OSError as ose:
-                    if ose.errno == errno.EAGAIN or ose.errno == errno.EWOULDBLOCK:
-                        pass  # It is supposed to raise one of these exceptions
-                    else:
-                        raise
-
-                if rc is None:
-                    rc = proc.poll()
-                    time.sleep(0.5)  # reduce busy-wait
+            out, err, truncated = _communicate_realtime(proc, timeout=timeout, max_output_bytes=max_output_bytes)
+            rc = proc.returncode
+            if truncated:
+                logger.info(f'{cmd_info}: Output exceeded {max_output_bytes} bytes; only the most recent output was retained')
+
+        trace_fields.update(rc=rc, stdout_bytes=len(out), stderr_bytes=len(err))
 
         # We read in bytes representing utf-8 output; decode so that python recognizes them as unicode strings
         out = out.decode('utf-8')
@@ -314,16 +369,18 @@ async def cmd_gather_async(cmd: Union[str, List[str]], text_mode=True, cwd: Opti
     cmd_info = f"[cwd={cwd}]: {cmd_list}"
 
     logger.debug("Executing:cmd_gather %s", cmd_info)
-    proc = await asyncio.create_subprocess_exec(
-        *cmd_list,
-        cwd=cwd,
-        env=set_env,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-        stdin=subprocess.DEVNULL)
-
-    out, err = await proc.communicate()
-    rc = proc.returncode
+    with telemetry.span('subprocess', telemetry.command_class(cmd_list), cmd=cmd_list, cwd=cwd) as trace_fields:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd_list,
+            cwd=cwd,
+            env=set_env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            stdin=subprocess.DEVNULL)
+
+        out, err = await proc.communicate()
+        rc = proc.returncode
+        trace_fields.update(rc=rc, stdout_bytes=len(out), stderr_bytes=len(err))
 
     out_str = out.decode(encoding="utf-8") if text_mode else out.hex()
     err_str = err.decode(encoding="utf-8")
@@ -400,25 +457,280 @@ async def to_thread(func, *args, **kwargs):
 
     Return a coroutine that can be awaited to get the eventual result of *func*.
     """
+    return await to_executor(None, func, *args, **kwargs)
+
+
+async def to_executor(executor: Optional[Executor], func, *args, **kwargs):
+    """Like to_thread, but runs function *func* on the given executor.
+
+    :param executor: The executor to run *func* on; None for the default executor of the event loop
+    """
     loop = asyncio.get_event_loop()
     ctx = contextvars.copy_context()
     func_call = functools.partial(ctx.run, func, *args, **kwargs)
-    return await loop.run_in_executor(None, func_call)
+    return await loop.run_in_executor(executor, func_call)
+
 
+class TrackingThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    A ThreadPoolExecutor which can cancel the calls that have been submitted but have not started yet.
+    Like shutdown(cancel_futures=True), which is only available from Python 3.9.
+    """
 
-def limit_concurrency(limit=5):
-    """A decorator to limit the number of parallel tasks with asyncio.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending: Set[Future] = set()
+        self._pending_lock = threading.Lock()
+
+    def submit(self, *args, **kwargs) -> Future:
+        future = super().submit(*args, **kwargs)
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future: Future):
+        with self._pending_lock:
+            self._pending.discard(future)
+
+    def cancel_pending(self) -> int:
+        """
+        Cancels the submitted calls which have not started running.
+        :return: The number of calls cancelled
+        """
+        with self._pending_lock:
+            pending = list(self._pending)
+        return sum(future.cancel() for future in pending)
+
+
+def run_coroutine(coro):
+    """Runs coroutine *coro* to completion from synchronous code and returns its result.
+
+    The synchronous code may itself be called by a coroutine (i.e. an event loop is already
+    running in the current thread and cannot be reentered). In that case, the coroutine is run
+    by a new event loop in a separate thread, while the current thread blocks as it would on any
+    other blocking call.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:  # no running event loop
+        return asyncio.run(coro)
+    ctx = contextvars.copy_context()
+    result = {}
 
-    It should be noted that when the decorator function is executed, the created Semaphore is bound to the default event loop.
-    https://stackoverflow.com/a/66289885
+    def run():
+        try:
+            result['value'] = ctx.run(asyncio.run, coro)
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=run, name='run_coroutine')
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+
+@dataclass
+class ResourceLimiterStats:
+    limit: Optional[int] = None  # None for no limit
+    acquisitions: int = 0
+    waits: int = 0  # number of acquisitions which had to wait for the resource to be released
+    total_wait_time: float = 0.0
+    max_wait_time: float = 0.0
+    peak_in_use: int = 0
+    peak_queue_depth: int = 0
+
+    def __str__(self) -> str:
+        avg_wait = self.total_wait_time / self.acquisitions if self.acquisitions else 0.0
+        return (f'limit={self.limit} acquisitions={self.acquisitions} peak_in_use={self.peak_in_use} '
+                f'waits={self.waits} peak_queue_depth={self.peak_queue_depth} '
+                f'wait_time(total={self.total_wait_time:.1f}s avg={avg_wait:.3f}s max={self.max_wait_time:.1f}s)')
+
+
+class _ResourceWaiter:
+    def __init__(self, notify):
+        self.notify = notify  # called (holding the limiter lock) once the resource has been granted
+        self.granted = False
+
+
+class ResourceLimiter:
     """
-    # use asyncio.BoundedSemaphore(5) instead of Semaphore to prevent accidentally increasing the original limit (stackoverflow.com/a/48971158/6687477)
-    sem = asyncio.BoundedSemaphore(limit)
+    Limits the number of concurrent users of a named resource. Unlike threading and asyncio semaphores,
+    a limiter is shared by threads (with) and coroutines (async with) of any event loop, so that sync and
+    async code paths using the same resource honor a single limit. Waiters are granted the resource in
+    FIFO order. Use get_resource_limiter to obtain the process-wide limiter of a resource.
+    """
+
+    def __init__(self, name: str, limit: Optional[int] = None):
+        """
+        :param name: The resource name, e.g. 'rhpkg::push'
+        :param limit: The maximum number of concurrent users. None (or 0) for no limit.
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._waiters = deque()
+        self._stats = ResourceLimiterStats(limit=limit or None)
+
+    @property
+    def limit(self) -> Optional[int]:
+        return self._stats.limit
+
+    def set_limit(self, limit: Optional[int]):
+        with self._lock:
+            self._stats.limit = limit or None
+            self._grant_unsafe()
+
+    def stats(self) -> ResourceLimiterStats:
+        """
+        :return: A copy of the limiter statistics
+        """
+        with self._lock:
+            return dataclasses.replace(self._stats)
+
+    def _available_unsafe(self) -> bool:
+        """Call while holding the lock!"""
+        return self._stats.limit is None or self._in_use < self._stats.limit
+
+    def _grant_unsafe(self):
+        """Call while holding the lock! Hands the resource to as many waiters as the limit allows."""
+        while self._waiters and self._available_unsafe():
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self._in_use += 1
+            waiter.notify()
+
+    def _enqueue_or_acquire(self, notify) -> Optional[_ResourceWaiter]:
+        """
+        Acquires the resource if it is available and nobody is waiting for it.
+        :return: None if the resource was acquired, otherwise the queued waiter
+        """
+        with self._lock:
+            if not self._waiters and self._available_unsafe():
+                self._in_use += 1
+                self._record_acquisition_unsafe(0.0, waited=False)
+                return None
+            waiter = _ResourceWaiter(notify)
+            self._waiters.append(waiter)
+            self._stats.peak_queue_depth = max(self._stats.peak_queue_depth, len(self._waiters))
+            return waiter
+
+    def _record_acquisition_unsafe(self, wait_time: float, waited: bool):
+        stats = self._stats
+        stats.acquisitions += 1
+        stats.waits += 1 if waited else 0
+        stats.total_wait_time += wait_time
+        stats.max_wait_time = max(stats.max_wait_time, wait_time)
+        stats.peak_in_use = max(stats.peak_in_use, self._in_use)
+
+    def acquire(self):
+        start = time.monotonic()
+        event = threading.Event()
+        waiter = self._enqueue_or_acquire(event.set)
+        if waiter:
+            event.wait()
+            with self._lock:
+                self._record_acquisition_unsafe(time.monotonic() - start, waited=True)
+
+    async def acquire_async(self):
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def _notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue_or_acquire(_notify)
+        if not waiter:
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if not waiter.granted:
+                    self._waiters.remove(waiter)
+            if waiter.granted:
+                self.release()
+            raise
+        with self._lock:
+            self._record_acquisition_unsafe(time.monotonic() - start, waited=True)
 
+    def release(self):
+        with self._lock:
+            self._in_use -= 1
+            self._grant_unsafe()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+_resource_limiters: Dict[str, ResourceLimiter] = {}
+_resource_limits: Dict[str, Optional[int]] = {}  # limits set by configure_resource_limits
+_resource_limiters_lock = threading.Lock()
+
+
+def get_resource_limiter(name: str, default_limit: Optional[int] = None) -> ResourceLimiter:
+    """
+    Returns the process-wide limiter of a resource, creating it on first use.
+    :param name: The resource name, e.g. 'rhpkg::push'
+    :param default_limit: The limit of a new limiter, unless one has been set with configure_resource_limits
+    """
+    with _resource_limiters_lock:
+        limiter = _resource_limiters.get(name)
+        if limiter is None:
+            limiter = ResourceLimiter(name, _resource_limits.get(name, default_limit))
+            _resource_limiters[name] = limiter
+        return limiter
+
+
+def configure_resource_limits(limits: Dict[str, Optional[int]]):
+    """
+    Sets the limits of resources; existing limiters are updated in place.
+    :param limits: resource name => maximum number of concurrent users (None or 0 for no limit)
+    """
+    with _resource_limiters_lock:
+        _resource_limits.update(limits)
+        limiters = [(_resource_limiters[name], limit) for name, limit in limits.items() if name in _resource_limiters]
+    for limiter, limit in limiters:
+        limiter.set_limit(limit)
+
+
+def get_resource_limiter_stats() -> Dict[str, ResourceLimiterStats]:
+    """
+    :return: resource name => statistics of every limiter which has been created
+    """
+    with _resource_limiters_lock:
+        limiters = list(_resource_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def limit_concurrency(limit=5, resource: Optional[str] = None):
+    """A decorator to limit the number of concurrent invocations of a coroutine function.
+
+    :param limit: The limit, unless the resource limit has been set with configure_resource_limits
+    :param resource: The name of the resource limiter to use. Invocations of functions decorated with the same
+                     resource name (and any other users of that resource) share the limit. Defaults to a resource
+                     named after the decorated function.
+    """
     def executor(func):
+        limiter = get_resource_limiter(resource or f'{func.__module__}.{func.__qualname__}', limit)
+
         @functools.wraps(func)
         async def wrapper(*args, **kwargs):
-            async with sem:
+            async with limiter:
                 return await func(*args, **kwargs)
 
         return wrapper
@@ -4,11 +4,17 @@
 from future import standard_library
 
 import yaml
+import hashlib
+import json
 import logging
+import pickle
+import threading
 import urllib.parse
 import os
 import shutil
 import io
+import tempfile
+from typing import Any, Dict, Optional, Tuple
 from . import exectools
 from .pushd import Dir
 from doozerlib import constants
@@ -16,6 +22,12 @@ from doozerlib import constants
 standard_library.install_aliases()
 SCHEMES = ['ssh', 'ssh+git', "http", "https"]
 
+try:
+    # LibYAML parses an order of magnitude faster than the pure python implementation
+    from yaml import CFullLoader as YamlLoader
+except ImportError:
+    from yaml import FullLoader as YamlLoader
+
 
 class GitDataException(Exception):
     """A broad exception for errors during GitData operations"""
@@ -48,7 +60,7 @@ class DataObj(object):
 
     def reload(self):
         with io.open(self.path, 'r', encoding="utf-8") as f:
-            self.data = yaml.full_load(f)
+            self.data = yaml.load(f, Loader=YamlLoader)
 
     def save(self):
         with io.open(self.path, 'w', encoding="utf-8") as f:
@@ -57,7 +69,7 @@ class DataObj(object):
 
 class GitData(object):
     def __init__(self, data_path=None, clone_dir='./', commitish='master',
-                 sub_dir=None, exts=['yaml', 'yml', 'json'], reclone=False, logger=None):
+                 sub_dir=None, exts=['yaml', 'yml', 'json'], reclone=False, logger=None, parse_cache_dir=None):
         """
         Load structured data from a git source.
         :param str data_path: Git url (git/http/https) or local directory path
@@ -67,6 +79,7 @@ class GitData(object):
         :param list exts: List of valid extensions to search for in data, with out period
         :param reclone: If a clone is already present, remove it and reclone latest.
         :param logger: Python logging object to use
+        :param parse_cache_dir: If set, parsed data files are cached in this directory and reused by later runs
         :raises GitDataException:
         """
         self.logger = logger
@@ -83,6 +96,9 @@ class GitData(object):
         self.commit_hash = None
         self.origin_url = None
         self.reclone = reclone
+        self.parse_cache_dir = parse_cache_dir
+        self._parsed: Dict[str, bytes] = {}  # sha256 of parsed text => pickled data
+        self._parsed_lock = threading.Lock()
         if data_path:
             self.clone_data(data_path)
 
@@ -224,7 +240,7 @@ class GitData(object):
                             except KeyError as e:
                                 self.logger.warning('{} contains template key `{}` but no value was provided'.format(data_file, e.args[0]))
                         try:
-                            data = yaml.full_load(raw_text)
+                            data = self.parse(raw_text)
                         except Exception as e:
                             raise ValueError(f"error parsing file {data_file}: {e}")
                         use = True
@@ -245,6 +261,66 @@ class GitData(object):
 
         return result
 
+    def parse(self, raw_text: str):
+        """
+        Parses YAML (or JSON) data. Results are cached by the digest of the text, so that content
+        loaded more than once (e.g. the same file with and without variables replaced) is only parsed once,
+        and, if parse_cache_dir is set, is not parsed again by later runs.
+        :return: A new copy of the parsed data, which the caller is free to modify
+        """
+        digest = hashlib.sha256(raw_text.encode('utf-8')).hexdigest()
+        with self._parsed_lock:
+            pickled = self._parsed.get(digest)
+        if pickled is None:
+            found, data = self._read_parse_cache(digest)
+            if not found:
+                data = yaml.load(raw_text, Loader=YamlLoader)
+                self._write_parse_cache(digest, data)
+            # Copies are made by unpickling; pickled data never leaves this process.
+            pickled = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+            with self._parsed_lock:
+                self._parsed[digest] = pickled
+        return pickle.loads(pickled)
+
+    def _parse_cache_path(self, digest: str) -> str:
+        return os.path.join(self.parse_cache_dir, digest[:2], f'{digest}.json')
+
+    def _read_parse_cache(self, digest: str) -> Tuple[bool, Any]:
+        """
+        :return: (found, data)
+        """
+        if not self.parse_cache_dir:
+            return False, None
+        try:
+            # The cache directory may be shared; entries are JSON so that reading one can never run code.
+            with open(self._parse_cache_path(digest), 'r', encoding='utf-8') as f:
+                return True, json.load(f)
+        except FileNotFoundError:
+            return False, None
+        except Exception as e:
+            self.logger.warning(f'Ignoring unreadable parse cache entry {digest}: {e}')
+            return False, None
+
+    def _write_parse_cache(self, digest: str, data: Any):
+        if not self.parse_cache_dir:
+            return
+        try:
+            serialized = json.dumps(data)
+        except (TypeError, ValueError):
+            return  # e.g. dates, which JSON cannot represent
+        if json.loads(serialized) != data:
+            return  # e.g. non-string keys, which JSON would turn into strings
+        path = self._parse_cache_path(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write then rename, so that concurrent runs never read a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(serialized)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.warning(f'Unable to write parse cache entry {path}: {e}')
+
     def commit(self, msg):
         """
         Commit outstanding data changes
@@ -3,16 +3,16 @@ import asyncio
 import hashlib
 import json
 import logging
+from concurrent.futures import Executor
 from typing import (Any, Awaitable, Dict, List, Optional, Set, Tuple, Union,
                     cast)
 
 import doozerlib
-from doozerlib import brew, coverity, exectools
+from doozerlib import brew, constants, coverity, exectools
 from doozerlib.distgit import pull_image
 from doozerlib.metadata import Metadata, RebuildHint, RebuildHintCode
 from doozerlib.model import Missing, Model
 from doozerlib.pushd import Dir
-from doozerlib.repodata import OutdatedRPMFinder, Repodata
 from doozerlib.rpm_utils import parse_nvr, to_nevra
 from doozerlib.util import (brew_arch_for_go_arch, go_arch_for_brew_arch,
                             isolate_el_version_in_release)
@@ -281,7 +281,62 @@ class ImageMetadata(Metadata):
     # Mapping of brew pullspec => most recent brew build dict.
     builder_image_builds = dict()
 
-    async def does_image_need_change(self, changing_rpm_packages=None, buildroot_tag=None, newest_image_event_ts=None, oldest_image_event_ts=None) -> Tuple[Metadata, RebuildHint]:
+    def get_builder_image_urls(self) -> Dict[str, str]:
+        """
+        :return: Returns a dict mapping the name of each non-member builder or parent image
+                 of this image to its pullspec.
+        """
+        builder_image_urls: Dict[str, str] = {}
+        builders = list(self.config['from'].builder) or []
+        builders.append(self.config['from'])  # Add the parent image to the builders
+        for builder in builders:
+            if builder.member:
+                # We can't determine if images are about to change. Defer to scan-sources.
+                continue
+
+            if builder.image:
+                builder_image_name = builder.image
+            elif builder.stream:
+                builder_image_name = self.runtime.resolve_stream(builder.stream).image
+            else:
+                raise IOError(f'Unable to determine builder or parent image pullspec from {builder}')
+
+            if "." in builder_image_name.split('/', 2)[0]:
+                # looks like full pullspec with domain name; e.g. "registry.redhat.io/ubi8/nodejs-12:1-45"
+                builder_image_url = builder_image_name
+            else:
+                # Assume this is a org/repo name relative to brew; e.g. "openshift/ose-base:ubi8"
+                builder_image_url = self.runtime.resolve_brew_image_url(builder_image_name)
+            builder_image_urls[builder_image_name] = builder_image_url
+        return builder_image_urls
+
+    @classmethod
+    def get_builder_image_build(cls, koji_api, builder_image_url: str) -> Dict:
+        """
+        Finds the brew build of the image currently at the specified pullspec.
+        Results are cached in builder_image_builds.
+        :param koji_api: A koji session
+        :param builder_image_url: Pullspec of a builder or parent image
+        :return: The brew build dict
+        """
+        builder_brew_build = cls.builder_image_builds.get(builder_image_url, None)
+        if builder_brew_build:
+            return builder_brew_build
+
+        out, err = exectools.cmd_assert(f'oc image info {builder_image_url} --filter-by-os amd64 -o=json', retries=5, pollrate=10)
+        latest_builder_image_info = Model(json.loads(out))
+        builder_info_labels = latest_builder_image_info.config.config.Labels
+        builder_nvr_list = [builder_info_labels['com.redhat.component'], builder_info_labels['version'], builder_info_labels['release']]
+
+        if not all(builder_nvr_list):
+            raise IOError(f'Unable to find nvr in {builder_info_labels}')
+
+        builder_image_nvr = '-'.join(builder_nvr_list)
+        builder_brew_build = koji_api.getBuild(builder_image_nvr)
+        cls.builder_image_builds[builder_image_url] = builder_brew_build
+        return builder_brew_build
+
+    async def does_image_need_change(self, changing_rpm_packages=None, buildroot_tag=None, executor: Optional[Executor] = None) -> Tuple[Metadata, RebuildHint]:
         """
         Answers the question of whether the latest built image needs to be rebuilt based on
         the packages (and therefore RPMs) it is dependent on might have changed in tags
@@ -289,14 +344,38 @@ class ImageMetadata(Metadata):
         we know is changing because we are about to rebuild it.
         :param changing_rpm_packages: A list of package names that are about to change.
         :param buildroot_tag: The build root for this image
-        :param newest_image_event_ts: The build timestamp of the most recently built image in this group.
-        :param oldest_image_event_ts: The build timestamp of the oldest build in this group from getLatestBuild of each component.
+        :param executor: The executor which runs the blocking koji queries; defaults to that of the event loop
         :return: (meta, RebuildHint).
         """
 
         if not changing_rpm_packages:
             changing_rpm_packages = []
 
+        # Koji queries are blocking; run them in a thread so that many images can be assessed on the same event loop.
+        assessment = await exectools.to_executor(executor, self._assess_latest_build, changing_rpm_packages, buildroot_tag)
+        if isinstance(assessment, RebuildHint):
+            return self, assessment
+        image_nvr, bbii, arch_rpms = assessment
+
+        self.logger.info('Checking whether any of the installed rpms is outdated')
+        non_latest_rpms = await bbii.find_non_latest_rpms(arch_rpms)
+        rebuild_hints = [
+            f"Outdated RPM {installed_rpm} installed in {image_nvr} ({arch}) when {latest_rpm} was available in repo {repo}"
+            for arch, non_latest in non_latest_rpms.items() for installed_rpm, latest_rpm, repo in non_latest
+        ]
+        if rebuild_hints:
+            return self, RebuildHint(
+                RebuildHintCode.PACKAGE_CHANGE,
+                ";\n".join(rebuild_hints)
+            )
+        return self, RebuildHint(RebuildHintCode.BUILD_IS_UP_TO_DATE, 'No change detected')
+
+    def _assess_latest_build(self, changing_rpm_packages, buildroot_tag) -> Union[RebuildHint, Tuple[str, "BrewBuildImageInspector", Dict[str, List[Dict]]]]:
+        """
+        Performs the koji based part of does_image_need_change.
+        :return: A RebuildHint if a reason to rebuild was found. Otherwise, (image_nvr, brew build inspector, arch => rpm dicts
+                 which should be checked against the configured repos).
+        """
         dgk = self.distgit_key
         runtime = self.runtime
 
@@ -304,7 +383,7 @@ class ImageMetadata(Metadata):
             image_build = self.get_latest_build(default='')
             if not image_build:
                 # Seems this have never been built. Mark it as needing change.
-                return self, RebuildHint(RebuildHintCode.NO_LATEST_BUILD, 'Image has never been built before')
+                return RebuildHint(RebuildHintCode.NO_LATEST_BUILD, 'Image has never been built before')
 
             image_nvr = image_build['nvr']
             self.logger.debug(f'Image {dgk} latest is {image_nvr}')
@@ -332,57 +411,23 @@ class ImageMetadata(Metadata):
                         extra_latest_tagging_event = extra_latest_tagging_infos[-1]['create_event']
                         self.logger.debug(f'Checking image creation time against extra_packages {extra_package_name} in tag {extra_package_brew_tag} @ tagging event {extra_latest_tagging_event}')
                         if extra_latest_tagging_event > image_build_event_id:
-                            return self, RebuildHint(RebuildHintCode.PACKAGE_CHANGE, f'Image {dgk} is sensitive to extra_packages {extra_package_name} which changed at event {extra_latest_tagging_event}')
+                            return RebuildHint(RebuildHintCode.PACKAGE_CHANGE, f'Image {dgk} is sensitive to extra_packages {extra_package_name} which changed at event {extra_latest_tagging_event}')
                     else:
                         self.logger.warning(f'{dgk} unable to find tagging event for for extra_packages {extra_package_name} in tag {extra_package_brew_tag} ; Possible metadata error.')
 
             # Collect build times from any parent/builder images used to create this image
-            builders = list(self.config['from'].builder) or []
-            builders.append(self.config['from'])  # Add the parent image to the builders
-            for builder in builders:
-                if builder.member:
-                    # We can't determine if images are about to change. Defer to scan-sources.
-                    continue
-
-                if builder.image:
-                    builder_image_name = builder.image
-                elif builder.stream:
-                    builder_image_name = runtime.resolve_stream(builder.stream).image
-                else:
-                    raise IOError(f'Unable to determine builder or parent image pullspec from {builder}')
-
-                if "." in builder_image_name.split('/', 2)[0]:
-                    # looks like full pullspec with domain name; e.g. "registry.redhat.io/ubi8/nodejs-12:1-45"
-                    builder_image_url = builder_image_name
-                else:
-                    # Assume this is a org/repo name relative to brew; e.g. "openshift/ose-base:ubi8"
-                    builder_image_url = self.runtime.resolve_brew_image_url(builder_image_name)
-
-                builder_brew_build = ImageMetadata.builder_image_builds.get(builder_image_url, None)
-
-                if not builder_brew_build:
-                    out, err = exectools.cmd_assert(f'oc image info {builder_image_url} --filter-by-os amd64 -o=json', retries=5, pollrate=10)
-                    latest_builder_image_info = Model(json.loads(out))
-                    builder_info_labels = latest_builder_image_info.config.config.Labels
-                    builder_nvr_list = [builder_info_labels['com.redhat.component'], builder_info_labels['version'], builder_info_labels['release']]
-
-                    if not all(builder_nvr_list):
-                        raise IOError(f'Unable to find nvr in {builder_info_labels}')
-
-                    builder_image_nvr = '-'.join(builder_nvr_list)
-                    builder_brew_build = koji_api.getBuild(builder_image_nvr)
-                    ImageMetadata.builder_image_builds[builder_image_url] = builder_brew_build
-                    self.logger.debug(f'Found that builder or parent image {builder_image_url} has event {builder_brew_build["creation_event_id"]}')
-
+            for builder_image_name, builder_image_url in self.get_builder_image_urls().items():
+                builder_brew_build = ImageMetadata.get_builder_image_build(koji_api, builder_image_url)
+                self.logger.debug(f'Found that builder or parent image {builder_image_url} has event {builder_brew_build["creation_event_id"]}')
                 if image_build_event_id < builder_brew_build['creation_event_id']:
                     self.logger.info(f'will be rebuilt because a builder or parent image changed: {builder_image_name}')
-                    return self, RebuildHint(RebuildHintCode.BUILDER_CHANGING, f'A builder or parent image {builder_image_name} has changed since {image_nvr} was built')
+                    return RebuildHint(RebuildHintCode.BUILDER_CHANGING, f'A builder or parent image {builder_image_name} has changed since {image_nvr} was built')
 
             self.logger.info("Checking if buildroot of image %s has changed", self.distgit_key)
             build_root_change = brew.has_tag_changed_since_build(runtime, koji_api, image_build, buildroot_tag, inherit=True)
             if build_root_change:
                 self.logger.info(f'Image will be rebuilt due to buildroot change since {image_nvr} (last build event={image_build_event_id}). Build root change: [{build_root_change}]')
-                return self, RebuildHint(RebuildHintCode.BUILD_ROOT_CHANGING, f'Buildroot tag changes since {image_nvr} was built')
+                return RebuildHint(RebuildHintCode.BUILD_ROOT_CHANGING, f'Buildroot tag changes since {image_nvr} was built')
 
             self.logger.info("Getting RPMs contained in %s", image_nvr)
             bbii = BrewBuildImageInspector(self.runtime, image_build)
@@ -392,7 +437,7 @@ class ImageMetadata(Metadata):
             target_arches = set(self.get_arches())
             if target_arches != build_arches:
                 # The latest brew build does not exactly match the required arches as specified in group.yml
-                return self, RebuildHint(RebuildHintCode.ARCHES_CHANGE, f'Arches of {image_nvr}: ({build_arches}) does not match target arches {target_arches}')
+                return RebuildHint(RebuildHintCode.ARCHES_CHANGE, f'Arches of {image_nvr}: ({build_arches}) does not match target arches {target_arches}')
 
             # Build up a map of RPMs built by this group. It is the 'latest' builds of these RPMs
             # relative to the current assembly that matter in the forthcoming search -- not
@@ -422,7 +467,7 @@ class ImageMetadata(Metadata):
                     build = koji_api.getBuild(build_id, brew.KojiWrapperOpts(caching=True))
                     package_name = build['package_name']
                     if package_name in changing_rpm_packages:
-                        return self, RebuildHint(RebuildHintCode.PACKAGE_CHANGE, f'Image includes {package_name} which is also about to change')
+                        return RebuildHint(RebuildHintCode.PACKAGE_CHANGE, f'Image includes {package_name} which is also about to change')
 
                     latest_assembly_build_nvr = group_rpm_builds_nvrs.get(package_name, None)
                     if latest_assembly_build_nvr and latest_assembly_build_nvr == build['nvr']:
@@ -433,18 +478,7 @@ class ImageMetadata(Metadata):
                     # Add this rpm_entry to arch_rpms in order to chech whether it is latest in repos
                     arch_rpms[arch].append(rpm_entry)
 
-        self.logger.info('Checking whether any of the installed rpms is outdated')
-        non_latest_rpms = await bbii.find_non_latest_rpms(arch_rpms)
-        rebuild_hints = [
-            f"Outdated RPM {installed_rpm} installed in {image_nvr} ({arch}) when {latest_rpm} was available in repo {repo}"
-            for arch, non_latest in non_latest_rpms.items() for installed_rpm, latest_rpm, repo in non_latest
-        ]
-        if rebuild_hints:
-            return self, RebuildHint(
-                RebuildHintCode.PACKAGE_CHANGE,
-                ";\n".join(rebuild_hints)
-            )
-        return self, RebuildHint(RebuildHintCode.BUILD_IS_UP_TO_DATE, 'No change detected')
+            return image_nvr, bbii, arch_rpms
 
     def covscan(self, cc: coverity.CoverityContext) -> bool:
         self.logger.info('Setting up for coverity scan')
@@ -597,13 +631,13 @@ class ArchiveImageInspector:
             logger.warning("Skipping non-latest rpms check for image %s because it doesn't have enabled_repos configured.", meta.distgit_key)
             return []
         logger.info("Fetching repodatas for enabled repos %s", ", ".join(f"{repo_name}-{arch}" for repo_name in enabled_repos))
-        repodatas: List[Repodata] = await asyncio.gather(*(group_repos[repo_name].get_repodata_threadsafe(arch) for repo_name in enabled_repos))
+        repo_index = await group_repos.get_repo_index(enabled_repos, arch)
 
         # Get all installed rpms in the image
-        rpms_to_check = rpms_to_check or self.get_installed_rpm_dicts()
+        rpms_to_check = rpms_to_check or await self.get_installed_rpm_dicts_async()
 
         logger.info("Determining outdated rpms...")
-        results = OutdatedRPMFinder().find_non_latest_rpms(rpms_to_check, repodatas, logger=cast(logging.Logger, logger))
+        results = repo_index.find_non_latest_rpms(rpms_to_check, logger=cast(logging.Logger, logger))
         return results
 
     def get_installed_rpm_dicts(self) -> List[Dict]:
@@ -620,6 +654,16 @@ class ArchiveImageInspector:
                 self._cache[cn] = rpm_entries
         return self._cache[cn]
 
+    async def get_installed_rpm_dicts_async(self) -> List[Dict]:
+        """
+        Like get_installed_rpm_dicts, but queries koji without blocking the event loop.
+        """
+        cn = 'get_installed_rpms'
+        if cn not in self._cache:
+            async with self.runtime.async_koji_client_session() as koji_api:
+                self._cache[cn] = await koji_api.listRPMs(brew.KojiWrapperOpts(caching=True), imageID=self.get_archive_id())
+        return self._cache[cn]
+
     def get_installed_package_build_dicts(self) -> Dict[str, Dict]:
         """
         :return: Returns a Dict containing records for package builds corresponding to
@@ -700,6 +744,57 @@ class BrewBuildImageInspector:
             self._build_pullspec = self._brew_build_obj['extra']['image']['index']['pull'][0]
             self._brew_build_id = self._brew_build_obj['id']
 
+    @classmethod
+    def get_many(cls, runtime: "doozerlib.Runtime", builds: List[Union[str, int]]) -> List["BrewBuildImageInspector"]:
+        """
+        Creates inspectors for many builds, querying koji for all of them in a single multicall.
+        :param builds: Brew build ids or NVRs
+        """
+        if not builds:
+            return []
+        with runtime.pooled_koji_client_session() as koji_api:
+            with koji_api.multicall(strict=True, batch=constants.KOJI_MULTICALL_BATCH_SIZE) as m:
+                tasks = [m.getBuild(build) for build in builds]
+        return [cls(runtime, task.result) for task in tasks]
+
+    @classmethod
+    def prefetch(cls, runtime: "doozerlib.Runtime", inspectors: List["BrewBuildImageInspector"]):
+        """
+        Populates the caches of many build inspectors (and their archive inspectors) at once. Instead of
+        lazily querying koji for each build and archive, the archives of all builds, the RPMs installed in
+        all image archives and the package builds of all distinct RPMs are each queried in a few
+        large multicalls.
+        :param inspectors: The build inspectors to prefetch information for
+        """
+        batch = constants.KOJI_MULTICALL_BATCH_SIZE
+        with runtime.pooled_koji_client_session() as koji_api:
+            pending = [i for i in inspectors if 'get_all_archives' not in i._cache]
+            if pending:
+                with koji_api.multicall(strict=True, batch=batch) as m:
+                    tasks = [m.listArchives(i.get_brew_build_id()) for i in pending]
+                for inspector, task in zip(pending, tasks):
+                    inspector._cache['get_all_archives'] = task.result
+
+            archive_inspectors = [a for i in inspectors for a in i.get_image_archive_inspectors()]
+            pending = [a for a in archive_inspectors if 'get_installed_rpms' not in a._cache]
+            if pending:
+                with koji_api.multicall(strict=True, batch=batch) as m:
+                    tasks = [m.listRPMs(brew.KojiWrapperOpts(caching=True), imageID=a.get_archive_id()) for a in pending]
+                for archive_inspector, task in zip(pending, tasks):
+                    archive_inspector._cache['get_installed_rpms'] = task.result
+
+            pending = [a for a in archive_inspectors if 'get_installed_package_build_dicts' not in a._cache]
+            build_ids = sorted({rpm_entry['build_id'] for a in pending for rpm_entry in a.get_installed_rpm_dicts()})
+            if build_ids:
+                with koji_api.multicall(strict=True, batch=batch) as m:
+                    tasks = [m.getBuild(build_id, brew.KojiWrapperOpts(caching=True)) for build_id in build_ids]
+                package_builds = {build_id: task.result for build_id, task in zip(build_ids, tasks)}
+                for archive_inspector in pending:
+                    archive_inspector._cache['get_installed_package_build_dicts'] = {
+                        package_builds[rpm_entry['build_id']]['package_name']: package_builds[rpm_entry['build_id']]
+                        for rpm_entry in archive_inspector.get_installed_rpm_dicts()
+                    }
+
     def get_manifest_list_digest(self) -> str:
         """
         :return: Returns  'sha256:....' for the manifest list associated with this brew build.
@@ -0,0 +1,98 @@
+"""
+Schedules image builds in dependency order.
+
+Rather than starting a thread for every image and letting children block on the
+build locks of their parents, ImageBuildScheduler starts the build of an image as soon
+as all of the group members it depends on have finished building. Only images which
+are ready to build occupy a worker thread.
+"""
+
+import asyncio
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+from doozerlib import distgit, exectools, logutil
+
+LOGGER = logutil.getLogger(__name__)
+
+
+class ImageBuildScheduler:
+    """ Builds images as a DAG: a child build starts the moment its last parent build finishes.
+    """
+
+    def __init__(self, runtime, build_func: Callable[["distgit.ImageDistGitRepo"], Tuple[str, bool]],
+                 max_concurrent_builds: Optional[int] = None, on_cancel: Optional[Callable[[], None]] = None):
+        """
+        :param runtime: Doozer runtime
+        :param build_func: Builds an image and returns a (distgit_key, success) tuple; e.g. ImageDistGitRepo.build_container
+        :param max_concurrent_builds: Maximum number of builds running (and thus Brew tasks submitted) at once. None for no limit.
+        :param on_cancel: Called if the run is cancelled (e.g. by Ctrl-C) to make the builds running in worker threads
+            stop (e.g. set their terminate event and cancel their Brew tasks). The run does not wait for them.
+        """
+        self.runtime = runtime
+        self.build_func = build_func
+        self.max_concurrent_builds = max_concurrent_builds
+        self.on_cancel = on_cancel
+
+    def get_dependencies(self, dgr: "distgit.ImageDistGitRepo", scheduled: Dict[str, "distgit.ImageDistGitRepo"]) -> List[str]:
+        """
+        :param dgr: The image to build
+        :param scheduled: The images being built, keyed by distgit_key
+        :return: The distgit_keys of the scheduled images which must be built before dgr
+        """
+        dependencies = []
+        for image_name in dgr.get_build_dependencies():
+            image = self.runtime.resolve_image(image_name, False)
+            if image is None or image.distgit_key not in scheduled:
+                # not included; build_container will skip it as well
+                continue
+            dependencies.append(image.distgit_key)
+        return dependencies
+
+    async def run(self, dgrs: List["distgit.ImageDistGitRepo"]) -> List[Tuple[str, bool]]:
+        """ Builds the images.
+        :param dgrs: The images to build
+        :return: A list of (distgit_key, success) tuples in the order of dgrs
+        """
+        if not dgrs:
+            return []
+        scheduled = {dgr.metadata.distgit_key: dgr for dgr in dgrs}
+        loop = asyncio.get_running_loop()
+        done: Dict[str, asyncio.Future] = {key: loop.create_future() for key in scheduled}
+        max_workers = min(self.max_concurrent_builds or len(dgrs), len(dgrs))
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def _build(dgr: "distgit.ImageDistGitRepo"):
+            key = dgr.metadata.distgit_key
+            try:
+                dependencies = self.get_dependencies(dgr, scheduled)
+                for dependency in dependencies:
+                    # A failed parent fails its children; build_func is still called
+                    # so that the failure is recorded the same way as any other.
+                    await asyncio.shield(done[dependency])
+                async with semaphore:
+                    LOGGER.info("Building %s", key)
+                    result = await loop.run_in_executor(executor, self.build_func, dgr)
+            except BaseException as e:
+                # Never leave the children of this image waiting
+                done[key].set_result(False)
+                if not isinstance(e, Exception):
+                    raise  # e.g. cancelled
+                LOGGER.error("Error building %s:\n%s", key, traceback.format_exc())
+                return key, False
+            done[key].set_result(result[1])
+            return result
+
+        executor = exectools.TrackingThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-build")
+        try:
+            results = await asyncio.gather(*[_build(dgr) for dgr in dgrs])
+        except BaseException:
+            # Waiting for running builds to finish would block the event loop until they do;
+            # ask them to stop instead and leave without them.
+            if self.on_cancel:
+                self.on_cancel()
+            executor.cancel_pending()
+            executor.shutdown(wait=False)
+            raise
+        executor.shutdown()
+        return list(results)
@@ -0,0 +1,221 @@
+"""
+A persistent, on-disk backend for the KojiWrapper result cache.
+
+KojiWrapper caches results in memory keyed by a json.dumps representation of the method
+and its arguments. This module stores those same entries in a sqlite database so that they
+can be reused across doozer invocations (e.g. hourly scan-sources runs). Each entry is
+classified by KojiCachePolicy to decide how long it may be trusted:
+- Immutable objects (completed builds, their archives and RPM lists) never expire.
+- Queries bounded by a brew event never expire; the event is part of the caching key.
+- Anything else is considered volatile and expires after a TTL.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+from doozerlib import constants, logutil
+
+LOGGER = logutil.getLogger(__name__)
+
+# Koji build state for a completed build. See brew.BuildStates.
+_BUILD_STATE_COMPLETE = 1
+
+
+class KojiCachePolicy(Enum):
+    IMMUTABLE = 0  # result will never change
+    EVENT_BOUNDED = 1  # result is constrained by a brew event which is part of the caching key
+    VOLATILE = 2  # result may change; trust it for a limited time
+    UNCACHEABLE = 3  # result must not be persisted (e.g. faults)
+
+
+# Methods whose (non-empty) results describe objects that cannot change once they exist.
+IMMUTABLE_METHODS = {
+    'getArchive',
+    'getEvent',
+    'getImageArchive',
+    'getPackage',
+    'getPackageID',
+    'getRPM',
+    'listArchives',
+    'listBuildRPMs',
+    'listRPMs',
+}
+
+
+def split_multicall_params(params) -> Tuple[Tuple, Dict]:
+    """
+    Split the params of a multicall entry into positional args and kwargs.
+    The koji library encodes kwargs as a trailing dict with a '__starstar' key.
+    :param params: e.g. (1328870, {'__starstar': True, 'strict': True})
+    :return: (args, kwargs) e.g. ((1328870,), {'strict': True})
+    """
+    params = tuple(params or ())
+    if params and isinstance(params[-1], dict) and params[-1].get('__starstar', None):
+        kwargs = {k: v for k, v in params[-1].items() if k != '__starstar'}
+        return params[:-1], kwargs
+    return params, {}
+
+
+def classify_call(method_name: str, args, kwargs: Optional[Dict], result: Any) -> KojiCachePolicy:
+    """
+    Decide how long the result of a koji api call can be trusted. The calls bundled in a multiCall
+    are cached, and therefore classified, individually.
+    :param method_name: The koji api name
+    :param args: Positional arguments passed to the api
+    :param kwargs: Keyword arguments passed to the api (after brew event injection)
+    :param result: The value returned by koji
+    :return: The KojiCachePolicy which applies to the result
+    """
+    kwargs = kwargs or {}
+
+    if method_name == 'multiCall':
+        # Its calls are cached individually instead
+        return KojiCachePolicy.UNCACHEABLE
+
+    if method_name == 'getBuild':
+        # A build which has not completed can still change state.
+        if isinstance(result, dict) and result.get('state') == _BUILD_STATE_COMPLETE:
+            return KojiCachePolicy.IMMUTABLE
+        return KojiCachePolicy.VOLATILE
+
+    if method_name in IMMUTABLE_METHODS:
+        # An empty result may be filled in later (e.g. archives of a build still in progress).
+        return KojiCachePolicy.IMMUTABLE if result else KojiCachePolicy.VOLATILE
+
+    if kwargs.get('event') is not None:
+        # Only apis which support event= receive it (see KojiWrapper.modify_koji_call_kwargs)
+        return KojiCachePolicy.EVENT_BOUNDED
+
+    if method_name == 'queryHistory' and (kwargs.get('beforeEvent') is not None or kwargs.get('before') is not None):
+        return KojiCachePolicy.EVENT_BOUNDED
+
+    # Builds created before a point in time may still change state (e.g. complete or fail) afterwards;
+    # only those completed before it are settled.
+    if method_name == 'listBuilds' and kwargs.get('completeBefore') is not None:
+        return KojiCachePolicy.EVENT_BOUNDED
+
+    return KojiCachePolicy.VOLATILE
+
+
+@dataclass
+class KojiCacheStats:
+    memory_hits: int = 0
+    persistent_hits: int = 0
+    misses: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    deduplicated: int = 0  # misses which were answered by an identical call already in flight in another thread
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.persistent_hits
+
+    def __str__(self) -> str:
+        return (f'hits={self.hits} (memory={self.memory_hits}, persistent={self.persistent_hits}) misses={self.misses} '
+                f'(deduplicated={self.deduplicated}) read={int(self.bytes_read / 1024)}KB written={int(self.bytes_written / 1024)}KB')
+
+
+class KojiCacheStore:
+    """
+    A sqlite backed store for KojiWrapper cache entries. Instances are safe to share between threads.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS koji_cache (
+            key_hash TEXT PRIMARY KEY,
+            method TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created REAL NOT NULL,
+            expires REAL
+        )
+    """
+
+    def __init__(self, path: str, volatile_ttl: int = constants.KOJI_CACHE_VOLATILE_TTL):
+        """
+        :param path: A directory in which the cache database will be stored (created if it does not exist).
+        :param volatile_ttl: Number of seconds for which results classified as volatile are trusted.
+                             A value <= 0 prevents volatile results from being persisted at all.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.db_path = os.path.join(path, 'koji-cache.sqlite')
+        self.volatile_ttl = volatile_ttl
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=60)
+        with self._lock:
+            # WAL allows concurrent doozer processes to read while another writes.
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(self.SCHEMA)
+        self.prune()
+
+    @staticmethod
+    def _hash_key(caching_key: str) -> str:
+        return hashlib.sha256(caching_key.encode('utf-8')).hexdigest()
+
+    def get(self, caching_key: str) -> Tuple[bool, Any]:
+        """
+        :param caching_key: The KojiWrapper caching key
+        :return: (found, value)
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires FROM koji_cache WHERE key_hash = ?',
+                                     (self._hash_key(caching_key),)).fetchone()
+            if not row:
+                return False, None
+            value, expires = row
+            if expires is not None and expires < time.time():
+                return False, None
+            self.bytes_read += len(value)
+        return True, json.loads(value)
+
+    def put(self, caching_key: str, method_name: str, args, kwargs, result) -> KojiCachePolicy:
+        """
+        Persist a koji api result if its cache policy allows.
+        :return: The policy which was applied to the result.
+        """
+        policy = classify_call(method_name, args, kwargs, result)
+        if policy is KojiCachePolicy.UNCACHEABLE:
+            return policy
+
+        now = time.time()
+        expires = None
+        if policy is KojiCachePolicy.VOLATILE:
+            if self.volatile_ttl <= 0:
+                return KojiCachePolicy.UNCACHEABLE
+            expires = now + self.volatile_ttl
+
+        try:
+            value = json.dumps(result)
+        except (TypeError, ValueError):
+            LOGGER.debug('Unable to serialize result of %s for persistent cache', method_name)
+            return KojiCachePolicy.UNCACHEABLE
+
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO koji_cache (key_hash, method, value, created, expires) VALUES (?, ?, ?, ?, ?)',
+                               (self._hash_key(caching_key), method_name, value, now, expires))
+            self.bytes_written += len(value)
+        return policy
+
+    def prune(self):
+        """
+        Remove expired entries from the store.
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM koji_cache WHERE expires IS NOT NULL AND expires < ?', (time.time(),))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM koji_cache')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,3 +1,4 @@
+import copy
 import datetime
 import io
 import pathlib
@@ -7,7 +8,7 @@ import time
 import urllib.parse
 from collections import OrderedDict
 from enum import Enum
-from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple, Union
 from defusedxml import ElementTree
 
 import dateutil.parser
@@ -18,7 +19,7 @@ from tenacity import (retry, retry_if_exception_type, stop_after_attempt,
                       wait_fixed)
 
 import doozerlib
-from doozerlib import exectools, logutil
+from doozerlib import constants, exectools, logutil
 from doozerlib.assembly import assembly_basis_event, assembly_metadata_config
 from doozerlib.brew import BuildStates
 from doozerlib.distgit import DistGitRepo, ImageDistGitRepo, RPMDistGitRepo
@@ -80,6 +81,59 @@ class RebuildHint(NamedTuple):
         return self.code.value[0]
 
 
+class LatestBuildSearch(NamedTuple):
+    """
+    The koji queries which find the latest build of a component. See Metadata.get_latest_build.
+    """
+    key: Tuple  # identifies the search in Runtime's latest build cache
+    pattern_prefix: str
+    extra_pattern: str
+    rpm_suffix: str
+    el_ver: Optional[int]
+    build_state: BuildStates
+    release_suffixes: List[str]  # release suffixes (assembly qualifiers) to search for in order of preference
+    complete_before_event: Optional[int]
+
+    def list_builds_query(self, release_suffix: str) -> Dict:
+        """
+        :return: kwargs for listBuilds which find the latest build with the specified release suffix.
+        """
+        # Include * after pattern_suffix to tolerate:
+        # 1. Matching an unspecified RPM suffix (e.g. .el7).
+        # 2. Other release components that might be introduced later.
+        return dict(state=None if self.build_state is None else self.build_state.value,
+                    pattern=f'{self.pattern_prefix}{self.extra_pattern}{release_suffix}*{self.rpm_suffix}',
+                    queryOpts={'limit': 1, 'order': '-creation_event_id'})
+
+    def list_builds_kwargs(self, koji_api) -> Dict:
+        """
+        :return: extra kwargs to pass to listBuilds which bound the search by brew event.
+        """
+        list_builds_kwargs = {}
+        if self.complete_before_event is not None:
+            if self.complete_before_event < 0:
+                # By setting the parameter to None, it tells the koji wrapper to not bound the brew event.
+                list_builds_kwargs['completeBefore'] = None
+            else:
+                # listBuilds accepts timestamps, not brew events, so convert brew event into seconds since the epoch
+                list_builds_kwargs['completeBefore'] = koji_api.getEvent(self.complete_before_event)['ts']
+        return list_builds_kwargs
+
+    def refine(self, builds: List[Dict], release_suffix: str) -> List[Dict]:
+        """
+        Filters listBuilds results for a release suffix.
+        """
+        # Ensure the suffix ends the string OR at least terminated by a '.' .
+        # This latter check ensures that 'assembly.how' doesn't match a build from
+        # "assembly.howdy'.
+        refined = [b for b in builds if b['nvr'].endswith(release_suffix) or f'{release_suffix}.' in b['nvr']]
+        if refined and not release_suffix and len(self.release_suffixes) > 1 and '.assembly.' in refined[0]['release']:
+            # True latest belongs to another assembly. In this case, just return
+            # that they are no builds for this assembly.
+            return []
+        return refined
+
+
 class Metadata(object):
     def __init__(self, meta_type: str, runtime: "doozerlib.Runtime", data_obj: Dict, commitish: Optional[str] = None, prevent_cloning: Optional[bool] = False):
         """
@@ -375,10 +429,11 @@ class Metadata(object):
         :return: the content of the file
         """
         url = self.cgit_file_url(filename, commit_hash=commit_hash, branch=branch)
-        req = exectools.retry(
-            3, lambda: urllib.request.urlopen(url),
-            check_f=lambda req: req.code == 200)
-        return req.read()
+        with exectools.get_resource_limiter(constants.RESOURCE_CGIT):
+            req = exectools.retry(
+                3, lambda: urllib.request.urlopen(url),
+                check_f=lambda req: req.code == 200)
+            return req.read()
 
     def get_latest_build(self, default: Optional[Any] = -1, assembly: Optional[str] = None, extra_pattern: str = '*',
                          build_state: BuildStates = BuildStates.COMPLETE, component_name: Optional[str] = None,
@@ -407,94 +462,30 @@ class Metadata(object):
         """
         if not component_name:
             component_name = self.get_component_name()
-        builds = []
+        if assembly is None:
+            assembly = self.runtime.assembly
+        search = self.latest_build_search(assembly=assembly, extra_pattern=extra_pattern, build_state=build_state,
+                                          component_name=component_name, el_target=el_target, complete_before_event=complete_before_event)
+
+        def default_return():
+            msg = f"No builds detected for using prefix: '{search.pattern_prefix}', extra_pattern: '{extra_pattern}', assembly: '{assembly}', build_state: '{build_state.name}', el_target: '{el_target}'"
+            if default != -1:
+                self.logger.info(msg)
+                return default
+            raise IOError(msg)
+
+        pinned = honor_is and self.config['is']
+        if not pinned:
+            # Runtime.resolve_latest_builds may have already found the build along with those of other components.
+            cached, found_build = self.runtime.get_cached_latest_build(search.key)
+            if cached:
+                if not found_build:
+                    return default_return()
+                # Callers may modify the build; never hand out the cached object itself
+                return copy.deepcopy(found_build)
 
         with self.runtime.pooled_koji_client_session(caching=True) as koji_api:
-            package_info = koji_api.getPackage(component_name)  # e.g. {'id': 66873, 'name': 'atomic-openshift-descheduler-container'}
-            if not package_info:
-                raise IOError(f'No brew package is defined for {component_name}')
-            package_id = package_info['id']  # we could just constrain package name using pattern glob, but providing package ID # should be a much more efficient DB query.
-            # listBuilds returns all builds for the package; We need to limit the query to the builds
-            # relevant for our major/minor.
-
-            rpm_suffix = ''  # By default, find the latest RPM build - regardless of el7, el8, ...
-
-            el_ver = None
-            if self.meta_type == 'image':
-                ver_prefix = 'v'  # openshift-enterprise-console-container-v4.7.0-202106032231.p0.git.d9f4379
-            else:
-                # RPMs do not have a 'v' in front of their version; images do.
-                ver_prefix = ''  # openshift-clients-4.7.0-202106032231.p0.git.e29b355.el8
-                if el_target:
-                    el_ver = isolate_el_version_in_brew_tag(el_target)
-                    if el_ver:
-                        rpm_suffix = f'.el{el_ver}'
-                    else:
-                        raise IOError(f'Unable to determine rhel version from specified el_target: {el_target}')
-
-            pattern_prefix = f'{component_name}-{ver_prefix}{self.branch_major_minor()}.'
-
-            if assembly is None:
-                assembly = self.runtime.assembly
-
-            list_builds_kwargs = {}  # extra kwargs that will be passed to koji_api.listBuilds invocations
-            if complete_before_event is not None:
-                if complete_before_event < 0:
-                    # By setting the parameter to None, it tells the koji wrapper to not bound the brew event.
-                    list_builds_kwargs['completeBefore'] = None
-                else:
-                    # listBuilds accepts timestamps, not brew events, so convert brew event into seconds since the epoch
-                    complete_before_ts = koji_api.getEvent(complete_before_event)['ts']
-                    list_builds_kwargs['completeBefore'] = complete_before_ts
-
-            def default_return():
-                msg = f"No builds detected for using prefix: '{pattern_prefix}', extra_pattern: '{extra_pattern}', assembly: '{assembly}', build_state: '{build_state.name}', el_target: '{el_target}'"
-                if default != -1:
-                    self.logger.info(msg)
-                    return default
-                raise IOError(msg)
-
-            def latest_build_list(pattern_suffix):
-                # Include * after pattern_suffix to tolerate:
-                # 1. Matching an unspecified RPM suffix (e.g. .el7).
-                # 2. Other release components that might be introduced later.
-                builds = koji_api.listBuilds(packageID=package_id,
-                                             state=None if build_state is None else build_state.value,
-                                             pattern=f'{pattern_prefix}{extra_pattern}{pattern_suffix}*{rpm_suffix}',
-                                             queryOpts={'limit': 1, 'order': '-creation_event_id'},
-                                             **list_builds_kwargs)
-
-                # Ensure the suffix ends the string OR at least terminated by a '.' .
-                # This latter check ensures that 'assembly.how' doesn't match a build from
-                # "assembly.howdy'.
-                refined = [b for b in builds if b['nvr'].endswith(pattern_suffix) or f'{pattern_suffix}.' in b['nvr']]
-
-                if refined and build_state == BuildStates.COMPLETE:
-                    # A final sanity check to see if the build is tagged with something we
-                    # respect. There is a chance that a human may untag a build. There
-                    # is no standard practice at present in which they should (they should just trigger
-                    # a rebuild). If we find the latest build is not tagged appropriately, blow up
-                    # and let a human figure out what happened.
-                    check_nvr = refined[0]['nvr']
-                    for i in range(2):
-                        tags = {tag['name'] for tag in koji_api.listTags(build=check_nvr)}
-                        if tags:
-                            refined[0]['_tags'] = tags  # save tag names to dict for future use
-                            break
-                        # Observed that a complete build needs some time before it gets tagged. Give it some
-                        # time if not immediately available.
-                        time.sleep(60)
-
-                    # RPMS have multiple targets, so our self.branch() isn't perfect.
-                    # We should permit rhel-8/rhel-7/etc.
-                    tag_prefix = self.branch().rsplit('-', 1)[0] + '-'   # String off the rhel version.
-                    accepted_tags = [name for name in tags if name.startswith(tag_prefix)]
-                    if not accepted_tags:
-                        self.logger.warning(f'Expected to find at least one tag starting with {self.branch()} on latest build {check_nvr} but found [{tags}]; tagging failed after build or something has changed tags in an unexpected way')
-
-                return refined
-
-            if honor_is and self.config['is']:
+            if pinned:
                 if build_state != BuildStates.COMPLETE:
                     # If this component is defined by 'is', history failures, etc, do not matter.
                     return default_return()
@@ -502,9 +493,9 @@ class Metadata(object):
                 # under 'is' for RPMs, we expect 'el7' and/or 'el8', etc. For images, just 'nvr'.
                 isd = self.config['is']
                 if self.meta_type == 'rpm':
-                    if el_ver is None:
+                    if search.el_ver is None:
                         raise ValueError(f'Expected el_target to be set when querying a pinned RPM component {self.distgit_key}')
-                    is_nvr = isd[f'el{el_ver}']
+                    is_nvr = isd[f'el{search.el_ver}']
                     if not is_nvr:
                         return default_return()
                 else:
@@ -524,39 +515,114 @@ class Metadata(object):
                 found_build['id'] = found_build['build_id']
                 return found_build
 
-            if not assembly:
-                # if assembly is '' (by parameter) or still None after runtime.assembly,
-                # we are returning true latest.
-                builds = latest_build_list('')
-            else:
-                basis_event = assembly_basis_event(self.runtime.get_releases_config(), assembly=assembly)
-                if basis_event:
-                    # If an assembly has a basis event, its latest images can only be sourced from
-                    # "is:" or the stream assembly. We've already checked for "is" above.
-                    assembly = 'stream'
-
-                # Assemblies without a basis will return assembly qualified builds for their
-                # latest images. This includes "stream" and "test", but could also include
-                # an assembly that is customer specific  with its own branch.
-                builds = latest_build_list(f'.assembly.{assembly}')
-                if not builds:
-                    if assembly != 'stream':
-                        builds = latest_build_list('.assembly.stream')
-                    if not builds:
-                        # Fall back to true latest
-                        builds = latest_build_list('')
-                        if builds and '.assembly.' in builds[0]['release']:
-                            # True latest belongs to another assembly. In this case, just return
-                            # that they are no builds for this assembly.
-                            builds = []
-
-            if not builds:
-                return default_return()
-
-            found_build = builds[0]
-            # Different brew apis return different keys here; normalize to make the rest of doozer not need to change.
-            found_build['id'] = found_build['build_id']
-            return found_build
+            package_info = koji_api.getPackage(component_name)  # e.g. {'id': 66873, 'name': 'atomic-openshift-descheduler-container'}
+            if not package_info:
+                raise IOError(f'No brew package is defined for {component_name}')
+            package_id = package_info['id']  # we could just constrain package name using pattern glob, but providing package ID # should be a much more efficient DB query.
+            list_builds_kwargs = search.list_builds_kwargs(koji_api)
+
+            found_build = None
+            for release_suffix in search.release_suffixes:
+                builds = koji_api.listBuilds(packageID=package_id, **search.list_builds_query(release_suffix), **list_builds_kwargs)
+                builds = search.refine(builds, release_suffix)
+                if builds:
+                    found_build = builds[0]
+                    break
+
+            if found_build and build_state == BuildStates.COMPLETE:
+                for i in range(2):
+                    tags = {tag['name'] for tag in koji_api.listTags(build=found_build['nvr'])}
+                    if tags:
+                        break
+                    # Observed that a complete build needs some time before it gets tagged. Give it some
+                    # time if not immediately available.
+                    time.sleep(60)
+                self._check_latest_build_tags(found_build, tags)
+
+            if found_build:
+                # Different brew apis return different keys here; normalize to make the rest of doozer not need to change.
+                found_build['id'] = found_build['build_id']
+            self.runtime.cache_latest_build(search.key, found_build)
+
+        if not found_build:
+            return default_return()
+        return copy.deepcopy(found_build)
+
+    def latest_build_search(self, assembly: str, extra_pattern: str = '*', build_state: BuildStates = BuildStates.COMPLETE,
+                            component_name: Optional[str] = None, el_target: Optional[Union[str, int]] = None,
+                            complete_before_event: Optional[int] = None) -> "LatestBuildSearch":
+        """
+        Describes the koji queries which find the latest build of this component. See get_latest_build for
+        a description of the parameters; assembly must already be resolved against runtime.assembly.
+        """
+        if not component_name:
+            component_name = self.get_component_name()
+
+        rpm_suffix = ''  # By default, find the latest RPM build - regardless of el7, el8, ...
+
+        el_ver = None
+        if self.meta_type == 'image':
+            ver_prefix = 'v'  # openshift-enterprise-console-container-v4.7.0-202106032231.p0.git.d9f4379
+        else:
+            # RPMs do not have a 'v' in front of their version; images do.
+            ver_prefix = ''  # openshift-clients-4.7.0-202106032231.p0.git.e29b355.el8
+            if el_target:
+                el_ver = isolate_el_version_in_brew_tag(el_target)
+                if el_ver:
+                    rpm_suffix = f'.el{el_ver}'
+                else:
+                    raise IOError(f'Unable to determine rhel version from specified el_target: {el_target}')
+
+        pattern_prefix = f'{component_name}-{ver_prefix}{self.branch_major_minor()}.'
+
+        if not assembly:
+            # if assembly is '' (by parameter) or still None after runtime.assembly,
+            # we are returning true latest.
+            release_suffixes = ['']
+        else:
+            basis_event = assembly_basis_event(self.runtime.get_releases_config(), assembly=assembly)
+            if basis_event:
+                # If an assembly has a basis event, its latest images can only be sourced from
+                # "is:" or the stream assembly.
+                assembly = 'stream'
+
+            # Assemblies without a basis will return assembly qualified builds for their
+            # latest images. This includes "stream" and "test", but could also include
+            # an assembly that is customer specific  with its own branch.
+            # If there are none, fall back to stream and then to true latest.
+            release_suffixes = [f'.assembly.{assembly}']
+            if assembly != 'stream':
+                release_suffixes.append('.assembly.stream')
+            release_suffixes.append('')
+
+        return LatestBuildSearch(
+            key=(component_name, assembly, el_ver, build_state, extra_pattern, complete_before_event),
+            pattern_prefix=pattern_prefix,
+            extra_pattern=extra_pattern,
+            rpm_suffix=rpm_suffix,
+            el_ver=el_ver,
+            build_state=build_state,
+            release_suffixes=release_suffixes,
+            complete_before_event=complete_before_event,
+        )
+
+    def _check_latest_build_tags(self, build: Dict, tags: Set[str]):
+        """
+        A final sanity check to see if the latest build is tagged with something we
+        respect. There is a chance that a human may untag a build. There
+        is no standard practice at present in which they should (they should just trigger
+        a rebuild). If we find the latest build is not tagged appropriately, warn
+        and let a human figure out what happened.
+        """
+        if tags:
+            build['_tags'] = tags  # save tag names to dict for future use
+
+        # RPMS have multiple targets, so our self.branch() isn't perfect.
+        # We should permit rhel-8/rhel-7/etc.
+        tag_prefix = self.branch().rsplit('-', 1)[0] + '-'   # String off the rhel version.
+        accepted_tags = [name for name in tags if name.startswith(tag_prefix)]
+        if not accepted_tags:
+            self.logger.warning(f'Expected to find at least one tag starting with {self.branch()} on latest build {build["nvr"]} but found [{tags}]; tagging failed after build or something has changed tags in an unexpected way')
 
     def get_latest_build_info(self, default=-1, **kwargs):
         """
@@ -623,6 +689,19 @@ class Metadata(object):
         """
         return self._component_name
 
+    def get_remote_source_details(self) -> Optional[Model]:
+        """
+        :return: Returns the details (url, branch) of the upstream git repository of this component
+        without cloning it, or None if the upstream source is not a remote git repository.
+        """
+        source = self.config.content.source
+        if "git" in source:
+            return source.git
+        if source.alias and self.runtime.group_config.sources and source.alias in self.runtime.group_config.sources:
+            # This is a new style alias with url information in group config
+            return self.runtime.group_config.sources[source.alias]
+        return None
+
     def needs_rebuild(self):
         if self.config.targets:
             # If this meta has multiple build targets, check currency of each
@@ -708,18 +787,11 @@ class Metadata(object):
         # Otherwise, we have source. In the case of git source, check the upstream with ls-remote.
         # In the case of alias (only legacy stuff afaik), check the cloned repo directory.
 
-        if "git" in self.config.content.source:
-            remote_branch = self.runtime.detect_remote_source_branch(self.config.content.source.git)[0]
-            out, _ = exectools.cmd_assert(["git", "ls-remote", self.config.content.source.git.url, remote_branch], strip=True, retries=5, on_retry='sleep 5')
-            # Example output "296ac244f3e7fd2d937316639892f90f158718b0	refs/heads/openshift-4.8"
-            upstream_commit_hash = out.split()[0]
-        elif self.config.content.source.alias and self.runtime.group_config.sources and self.config.content.source.alias in self.runtime.group_config.sources:
-            # This is a new style alias with url information in group config
-            source_details = self.runtime.group_config.sources[self.config.content.source.alias]
-            remote_branch = self.runtime.detect_remote_source_branch(source_details)[0]
-            out, _ = exectools.cmd_assert(["git", "ls-remote", source_details.url, remote_branch], strip=True, retries=5, on_retry='sleep 5')
-            # Example output "296ac244f3e7fd2d937316639892f90f158718b0	refs/heads/openshift-4.8"
-            upstream_commit_hash = out.split()[0]
+        source_details = self.get_remote_source_details()
+        if source_details:
+            # detect_remote_source_branch resolves the branch through the runtime's memoized remote refs.
+            # Example: ("openshift-4.8", "296ac244f3e7fd2d937316639892f90f158718b0")
+            _, upstream_commit_hash = self.runtime.detect_remote_source_branch(source_details)
         else:
             # If it is not git, we will need to punt to the rest of doozer to get the upstream source for us.
             with Dir(dgr.source_path()):
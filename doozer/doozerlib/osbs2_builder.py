@@ -23,16 +23,19 @@ class OSBS2Builder:
     """
 
     def __init__(
-        self, runtime: "runtime.Runtime", *, scratch: bool = False, dry_run: bool = False
+        self, runtime: "runtime.Runtime", *, scratch: bool = False, dry_run: bool = False,
+        task_watcher: Optional[brew.KojiTaskWatcher] = None
     ) -> None:
         """ Create a OSBS2Builder instance.
         :param runtime: Doozer runtime
         :param scratch: Whether to create a scratch build
         :param dry_run: Don't build anything but just exercise the code
+        :param task_watcher: If set, build tasks are watched by this shared watcher instead of a dedicated one
         """
         self._runtime = runtime
         self.scratch = scratch
         self.dry_run = dry_run
+        self.task_watcher = task_watcher
 
     async def build(self, image: "image.ImageMetadata", profile: Dict, retries: int = 3) -> Tuple[int, Optional[str], Optional[Dict]]:
         """ Build an image
@@ -70,6 +73,8 @@ class OSBS2Builder:
                 if self.dry_run:
                     logger.warning("[DRY RUN] Build task %s would have completed", task_id)
                     error = None
+                elif self.task_watcher:
+                    error = await self.task_watcher.watch_async(task_id, logger.info)
                 else:
                     error = await brew.watch_task_async(koji_api, logger.info, task_id)
 
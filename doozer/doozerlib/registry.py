@@ -0,0 +1,217 @@
+"""
+A minimal asynchronous client of the Docker registry HTTP API v2.
+
+It answers whether an image exists in a registry with a single HEAD request on its manifest,
+which is far cheaper than `oc image info` (a subprocess which downloads the manifest and config),
+and reads image configs (e.g. labels) without spawning such a subprocess for each image.
+Credentials are read from the same auth files `oc` and podman use.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+from tenacity import before_sleep_log, retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from doozerlib import logutil
+
+LOGGER = logutil.getLogger(__name__)
+
+MANIFEST_MEDIA_TYPES = (
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.docker.distribution.manifest.v2+json',
+    'application/vnd.oci.image.index.v1+json',
+    'application/vnd.oci.image.manifest.v1+json',
+)
+
+_CHALLENGE_PARAM_PATTERN = re.compile(r'(\w+)="([^"]*)"')
+
+
+class RegistryError(Exception):
+    pass
+
+
+def parse_pullspec(pullspec: str) -> Tuple[str, str, str]:
+    """
+    Splits a pullspec into its registry, repository and reference (a tag or digest).
+    e.g. 'quay.io/org/repo:tag' => ('quay.io', 'org/repo', 'tag')
+    """
+    if '@' in pullspec:
+        name, reference = pullspec.split('@', 1)
+    else:
+        slash = pullspec.rfind('/')
+        colon = pullspec.rfind(':')
+        if colon > slash:
+            name, reference = pullspec[:colon], pullspec[colon + 1:]
+        else:
+            name, reference = pullspec, 'latest'
+    registry, _, repository = name.partition('/')
+    if not repository:
+        raise ValueError(f'Pullspec does not include a registry: {pullspec}')
+    return registry, repository, reference
+
+
+def load_registry_auths(auth_file: Optional[str] = None) -> Dict[str, str]:
+    """
+    Reads registry credentials from auth_file or, if not specified, from the first auth file
+    found among those used by oc and podman ($REGISTRY_AUTH_FILE, ~/.docker/config.json,
+    $XDG_RUNTIME_DIR/containers/auth.json).
+    :return: Map of registry (optionally followed by a repository path) => base64 encoded "user:password"
+    """
+    candidates = [auth_file] if auth_file else [
+        os.environ.get('REGISTRY_AUTH_FILE'),
+        os.path.expanduser('~/.docker/config.json'),
+        os.path.join(os.environ['XDG_RUNTIME_DIR'], 'containers/auth.json') if os.environ.get('XDG_RUNTIME_DIR') else None,
+    ]
+    for path in candidates:
+        if path and os.path.isfile(path):
+            with open(path, 'r') as f:
+                auths = json.load(f).get('auths', {})
+            return {re.sub(r'^https?://', '', key).rstrip('/'): entry['auth'] for key, entry in auths.items() if entry.get('auth')}
+    return {}
+
+
+class RegistryClient:
+    """
+    Checks whether images exist in their registries. Tokens are requested on demand and reused for
+    subsequent requests to the same repository.
+
+    async with RegistryClient() as registry:
+        if not await registry.manifest_exists('quay.io/org/repo:tag'):
+            ...
+        labels = (await registry.get_image_config('quay.io/org/repo@sha256:...'))['config']['Labels']
+
+    An instance must only be used from a single event loop.
+    """
+
+    def __init__(self, auth_file: Optional[str] = None, connection_limit: int = 32, timeout: float = 60):
+        """
+        :param auth_file: Registry auth file (see load_registry_auths)
+        :param connection_limit: Maximum number of concurrent connections
+        :param timeout: Seconds after which a request times out
+        """
+        self.auths = load_registry_auths(auth_file)
+        self.connection_limit = connection_limit
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._authorizations: Dict[Tuple[str, str], str] = {}  # (registry, repository) => Authorization header
+        self._authorization_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.connection_limit),
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    def _get_basic_auth(self, registry: str, repository: str) -> Optional[str]:
+        # The most specific auth entry wins (e.g. quay.io/org over quay.io)
+        path = f'{registry}/{repository}'
+        matches = [key for key in self.auths if path == key or path.startswith(key + '/')]
+        return self.auths[max(matches, key=len)] if matches else None
+
+    async def _authorize(self, registry: str, repository: str, challenge: str, rejected: Optional[str]):
+        """
+        Obtains an Authorization header for the repository in response to a 401 challenge.
+        :param challenge: The WWW-Authenticate header of the 401 response
+        :param rejected: The Authorization header which was rejected, if any
+        """
+        key = (registry, repository)
+        lock = self._authorization_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if self._authorizations.get(key) != rejected:
+                return  # another task already obtained a new authorization
+            basic_auth = self._get_basic_auth(registry, repository)
+            scheme, _, params = challenge.partition(' ')
+            if scheme.lower() == 'basic':
+                if not basic_auth:
+                    raise RegistryError(f'No credentials for {registry}/{repository}')
+                self._authorizations[key] = f'Basic {basic_auth}'
+                return
+            if scheme.lower() != 'bearer':
+                raise RegistryError(f'Unsupported authentication challenge from {registry}: {challenge}')
+            params = dict(_CHALLENGE_PARAM_PATTERN.findall(params))
+            query = {'scope': f'repository:{repository}:pull'}
+            if 'service' in params:
+                query['service'] = params['service']
+            headers = {'Authorization': f'Basic {basic_auth}'} if basic_auth else {}
+            async with self._get_session().get(params['realm'], params=query, headers=headers) as resp:
+                if resp.status != 200:
+                    raise RegistryError(f'Unable to obtain a token for {registry}/{repository}: HTTP {resp.status}')
+                token_response = await resp.json(content_type=None)
+            self._authorizations[key] = f'Bearer {token_response.get("token") or token_response["access_token"]}'
+
+    async def _request(self, method: str, registry: str, repository: str, path: str,
+                       accept: Optional[str] = None) -> Tuple[int, Optional[bytes]]:
+        """
+        Sends a request to the API of a repository, authenticating in response to 401 challenges.
+        :param path: Path relative to the repository API (e.g. 'manifests/latest')
+        :return: (HTTP status, response body). The body is None for HEAD requests.
+        """
+        url = f'https://{registry}/v2/{repository}/{path}'
+        key = (registry, repository)
+        for _ in range(2):
+            headers = {'Accept': accept} if accept else {}
+            authorization = self._authorizations.get(key)
+            if authorization:
+                headers['Authorization'] = authorization
+            async with self._get_session().request(method, url, headers=headers) as resp:
+                if resp.status != 401:
+                    return resp.status, None if method == 'HEAD' else await resp.read()
+                challenge = resp.headers.get('WWW-Authenticate', '')
+            await self._authorize(registry, repository, challenge, authorization)
+        raise RegistryError(f'Not authorized to read {registry}/{repository}')
+
+    @retry(reraise=True, stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=10),
+           retry=retry_if_exception_type((aiohttp.ClientConnectionError, asyncio.TimeoutError)),
+           before_sleep=before_sleep_log(LOGGER, logging.WARNING))
+    async def manifest_exists(self, pullspec: str) -> bool:
+        """
+        Checks whether the manifest (or manifest list) of an image can be read from its registry.
+        :param pullspec: e.g. quay.io/org/repo:tag or quay.io/org/repo@sha256:...
+        :return: True if it exists, False if the registry reports it does not.
+        :raises RegistryError: If the registry cannot be queried.
+        """
+        registry, repository, reference = parse_pullspec(pullspec)
+        status, _ = await self._request('HEAD', registry, repository, f'manifests/{reference}', ', '.join(MANIFEST_MEDIA_TYPES))
+        if status == 200:
+            return True
+        if status == 404:
+            return False
+        raise RegistryError(f'HEAD {pullspec} manifest returned HTTP {status}')
+
+    @retry(reraise=True, stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=10),
+           retry=retry_if_exception_type((aiohttp.ClientConnectionError, asyncio.TimeoutError)),
+           before_sleep=before_sleep_log(LOGGER, logging.WARNING))
+    async def get_image_config(self, pullspec: str) -> Dict:
+        """
+        Reads the config of an image, which includes its labels (the 'config' field of `oc image info -o json`).
+        :param pullspec: Pullspec of a single image. Manifest lists are not supported.
+        :raises RegistryError: If the image config cannot be read.
+        """
+        registry, repository, reference = parse_pullspec(pullspec)
+        status, body = await self._request('GET', registry, repository, f'manifests/{reference}', ', '.join(MANIFEST_MEDIA_TYPES))
+        if status != 200:
+            raise RegistryError(f'Unable to read the manifest of {pullspec}: HTTP {status}')
+        manifest = json.loads(body)
+        if 'config' not in manifest:
+            raise RegistryError(f'{pullspec} is a manifest list; the config of a specific image must be requested')
+        # the registry may redirect blob requests to storage on another host; aiohttp drops the Authorization header then
+        status, body = await self._request('GET', registry, repository, f'blobs/{manifest["config"]["digest"]}')
+        if status != 200:
+            raise RegistryError(f'Unable to read the config of {pullspec}: HTTP {status}')
+        return json.loads(body)
@@ -0,0 +1,109 @@
+"""
+Resolves branches and tags of remote git repositories.
+
+Many components share an upstream repository (e.g. group_config.sources aliases or
+monorepos). Rather than running `git ls-remote <url> <branch>` for every component,
+RemoteRefResolver lists the refs of each repository once and answers every subsequent
+question about that repository from memory.
+"""
+
+import threading
+from typing import Dict, Iterable, Optional
+
+from doozerlib import constants, exectools, logutil
+
+LOGGER = logutil.getLogger(__name__)
+
+
+class RemoteRefResolver:
+    """
+    A thread safe, memoizing resolver of remote git refs. The refs of a repository are
+    listed with a single `git ls-remote` no matter how many threads ask for them concurrently.
+    """
+
+    def __init__(self, max_concurrency: int = constants.GIT_LS_REMOTE_CONCURRENCY, retries: int = 5, pollrate: int = 5):
+        """
+        :param max_concurrency: Maximum number of concurrent `git ls-remote` processes.
+        :param retries: Number of attempts to list the refs of a repository.
+        :param pollrate: Seconds to wait between attempts.
+        """
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.pollrate = pollrate
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._refs: Dict[str, Dict[str, str]] = {}  # git_url => {ref name => commit hash}
+
+    @staticmethod
+    def parse_ls_remote(out: str) -> Dict[str, str]:
+        """
+        :param out: The output of git ls-remote; e.g. "7e66b10fbcd6bb4988275ffad0a69f563695901f\trefs/heads/some_branch"
+        :return: A dict mapping each ref name to its commit hash. Iteration order is the order of the output.
+        """
+        refs = {}
+        for line in out.splitlines():
+            fields = line.split()
+            if len(fields) != 2:
+                continue
+            commit_hash, ref_name = fields
+            refs[ref_name] = commit_hash
+        return refs
+
+    def get_refs(self, git_url: str) -> Dict[str, str]:
+        """
+        Lists the branches and tags of a remote repository. Results are memoized.
+        :param git_url: The URL of the remote git repository
+        :return: A dict mapping ref names (e.g. refs/heads/main) to commit hashes
+        :raises ChildProcessError: if the refs could not be listed.
+        """
+        with self._lock:
+            refs = self._refs.get(git_url)
+            if refs is not None:
+                return refs
+            url_lock = self._url_locks.setdefault(git_url, threading.Lock())
+
+        with url_lock:  # only one thread lists a given repository
+            with self._lock:
+                refs = self._refs.get(git_url)
+            if refs is not None:
+                return refs
+            with self._semaphore:
+                LOGGER.info('Listing remote refs of %s', git_url)
+                out, _ = exectools.cmd_assert(["git", "ls-remote", "--heads", "--tags", git_url], retries=self.retries, pollrate=self.pollrate)
+            refs = self.parse_ls_remote(out)
+            with self._lock:
+                self._refs[git_url] = refs
+            return refs
+
+    def resolve(self, git_url: str, ref: str, heads_only: bool = False) -> Optional[str]:
+        """
+        Resolves a ref in a remote repository like `git ls-remote <git_url> <ref>` would: the first
+        ref whose name is, or ends with, "/<ref>".
+        :param git_url: The URL of the remote git repository
+        :param ref: A branch or tag name (e.g. "main", "refs/heads/main", "v1.0.0")
+        :param heads_only: Only consider branches.
+        :return: The commit hash, or None if no ref matches.
+        """
+        for ref_name, commit_hash in self.get_refs(git_url).items():
+            if heads_only and not ref_name.startswith('refs/heads/'):
+                continue
+            if ref_name == ref or ref_name.endswith(f'/{ref}'):
+                return commit_hash
+        return None
+
+    def prefetch(self, git_urls: Iterable[str]):
+        """
+        Lists the refs of several repositories concurrently. Failures are logged and
+        will be reported again when the refs of the repository are next requested.
+        :param git_urls: URLs of remote git repositories; duplicates are ignored.
+        """
+        def _prefetch(git_url):
+            try:
+                self.get_refs(git_url)
+            except ChildProcessError as e:
+                LOGGER.warning('Unable to list remote refs of %s: %s', git_url, e)
+
+        git_urls = sorted(set(git_urls))
+        if git_urls:
+            exectools.parallel_exec(lambda git_url, _: _prefetch(git_url), git_urls, n_threads=min(len(git_urls), self.max_concurrency)).get()
@@ -1,8 +1,12 @@
 import asyncio
 import gzip
 import io
+import json
 import logging
+import os
+import tempfile
 import xml.etree.ElementTree as ET
+import zlib
 from dataclasses import dataclass, field
 from logging import Logger
 from typing import Any, Dict, List, Optional, Set, Tuple
@@ -152,6 +156,18 @@ class Repodata:
 
 
 class RepodataLoader:
+    # Bump when the format of cached repodata changes
+    CACHE_FORMAT_VERSION = 1
+    # Size of chunks in which primary.xml.gz is downloaded and parsed
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        :param cache_dir: If set, parsed repodata is stored in this directory keyed by the checksums in repomd.xml.
+                          A repository whose metadata has not changed is then neither downloaded nor parsed again.
+        """
+        self.cache_dir = cache_dir
+
     @staticmethod
     async def _fetch_remote_gzip(session: aiohttp.ClientSession, url: Optional[str]):
         if not url:
@@ -164,6 +180,92 @@ class RepodataLoader:
         with gzip.GzipFile(fileobj=data) as uncompressed:
             return uncompressed.read()
 
+    @classmethod
+    async def _fetch_primary_rpms(cls, session: aiohttp.ClientSession, url: str) -> List[Rpm]:
+        """
+        Downloads primary.xml.gz and parses it as it arrives. Only the rpms are kept; each <package>
+        element is discarded as soon as it has been parsed.
+        """
+        rpms: List[Rpm] = []
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # gzip header
+        parser = ET.XMLPullParser(events=("start", "end"))
+        root = None
+        package_tag = f"{{{NAMESPACES['common']}}}package"
+
+        def _consume(data: bytes):
+            nonlocal root
+            parser.feed(data)
+            for event, element in parser.read_events():
+                if event == "start":
+                    if root is None:
+                        root = element
+                elif element.tag == package_tag:
+                    if element.get("type") == "rpm":
+                        rpms.append(Rpm.from_metadata(element))
+                    root.clear()  # drop parsed packages
+
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.content.iter_chunked(cls.CHUNK_SIZE):
+                _consume(decompressor.decompress(chunk))
+        _consume(decompressor.flush())
+        parser.close()
+        return rpms
+
+    @staticmethod
+    def _checksum(repomd_xml: ET.Element, data_type: str) -> Optional[str]:
+        checksum = repomd_xml.find(f'repo:data[@type="{data_type}"]/repo:checksum', NAMESPACES)
+        return checksum.text.strip() if checksum is not None and checksum.text else None
+
+    def _cache_path(self, repo_name: str, primary_checksum: str, modules_checksum: Optional[str]) -> str:
+        return os.path.join(self.cache_dir, f"{repo_name}.{primary_checksum}.{modules_checksum or 'none'}.json.gz")
+
+    def _read_cache(self, path: str) -> Optional[Repodata]:
+        try:
+            with gzip.open(path, "rt") as f:
+                content = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            LOGGER.warning("Ignoring unreadable repodata cache %s: %s", path, e)
+            return None
+        if content.get("version") != self.CACHE_FORMAT_VERSION:
+            return None
+        return Repodata(
+            name=content["name"],
+            primary_rpms=[Rpm(name=n, epoch=e, version=v, release=r, arch=a) for n, e, v, r, a in content["rpms"]],
+            modules=[RpmModule(name=m["name"], stream=m["stream"], version=m["version"], context=m["context"], arch=m["arch"], rpms=set(m["rpms"]))
+                     for m in content["modules"]],
+        )
+
+    def _write_cache(self, path: str, repodata: Repodata):
+        content = {
+            "version": self.CACHE_FORMAT_VERSION,
+            "name": repodata.name,
+            "rpms": [[rpm.name, rpm.epoch, rpm.version, rpm.release, rpm.arch] for rpm in repodata.primary_rpms],
+            "modules": [{"name": m.name, "stream": m.stream, "version": m.version, "context": m.context, "arch": m.arch, "rpms": sorted(m.rpms)}
+                        for m in repodata.modules],
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write to a temporary file first so that concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".repodata-")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(json.dumps(content).encode())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        # Repodata of previous versions of this repository will not be used again
+        prefix = f"{repodata.name}."
+        for entry in os.listdir(self.cache_dir):
+            if entry.startswith(prefix) and entry.endswith(".json.gz") and os.path.join(self.cache_dir, entry) != path:
+                try:
+                    os.unlink(os.path.join(self.cache_dir, entry))
+                except FileNotFoundError:
+                    pass
+
     async def load(self, repo_name: str, repo_url: str):
         if not repo_url.endswith("/"):
             repo_url += "/"
@@ -191,87 +293,134 @@ class RepodataLoader:
                     raise ValueError("Couldn't find modules location in repodata")
                 modules_url = parse.urljoin(repo_url, modules_location.attrib['href'])
 
-            @retry(reraise=True, stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=1, max=10),
-                   retry=(retry_if_exception_type((aiohttp.ServerDisconnectedError, aiohttp.ClientResponseError, aiohttp.ClientPayloadError))),
-                   before_sleep=before_sleep_log(LOGGER, logging.WARNING))
+            cache_path = None
+            primary_checksum = self._checksum(repomd_xml, "primary")
+            if self.cache_dir and primary_checksum:
+                cache_path = self._cache_path(repo_name, primary_checksum, self._checksum(repomd_xml, "modules"))
+                repodata = self._read_cache(cache_path)
+                if repodata:
+                    LOGGER.debug("Using cached repodata for %s from %s", repo_name, cache_path)
+                    return repodata
+
+            retry_opts = dict(reraise=True, stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=1, max=10),
+                              retry=(retry_if_exception_type((aiohttp.ServerDisconnectedError, aiohttp.ClientResponseError, aiohttp.ClientPayloadError))),
+                              before_sleep=before_sleep_log(LOGGER, logging.WARNING))
+
+            @retry(**retry_opts)
             async def fetch_remote_gzip(url: Optional[str]):
                 return await self._fetch_remote_gzip(session, url)
 
-            primary_bytes, modules_bytes = await asyncio.gather(
-                fetch_remote_gzip(primary_url),
+            @retry(**retry_opts)
+            async def fetch_primary_rpms(url: str):
+                return await self._fetch_primary_rpms(session, url)
+
+            primary_rpms, modules_bytes = await asyncio.gather(
+                fetch_primary_rpms(primary_url),
                 fetch_remote_gzip(modules_url),
             )
 
         yaml = YAML(typ='safe')
-        repodata = Repodata.from_metadatas(
-            repo_name,
-            ET.fromstring(primary_bytes),
-            list(yaml.load_all(modules_bytes) if modules_bytes else [])
+        modules_yaml = list(yaml.load_all(modules_bytes) if modules_bytes else [])
+        repodata = Repodata(
+            name=repo_name,
+            primary_rpms=primary_rpms,
+            modules=[RpmModule.from_metadata(metadata) for metadata in modules_yaml if metadata['document'] == 'modulemd'],
         )
+        if cache_path:
+            try:
+                self._write_cache(cache_path, repodata)
+            except OSError as e:
+                LOGGER.warning("Unable to cache repodata for %s: %s", repo_name, e)
         return repodata
 
 
-class OutdatedRPMFinder:
+class RepoIndex:
+    """
+    A precomputed view of a set of YUM repositories (of a single arch) for finding outdated rpms.
 
-    @staticmethod
-    def _find_candidate_modular_rpms(all_modules, enabled_streams):
+    Building an index walks every rpm and module in the repositories once. Checking an image afterwards
+    only costs time proportional to the number of rpms installed in it, so a single index should be shared
+    by all images checked against the same repositories.
+    """
+
+    def __init__(self, repodatas: List[Repodata]):
+        self.repo_names = [repodata.name for repodata in repodatas]
+        self.all_modules: Dict[str, Dict[int, List[Tuple[str, RpmModule]]]] = {}  # module_name_stream => version => [(repo_name, module_object)]
+        self.all_modular_rpms: Dict[str, Dict[str, Dict[str, RpmModule]]] = {}  # rpm_nvera => repo_name => module_nsvca => module_object
+        for repodata in repodatas:
+            for module in repodata.modules:
+                self.all_modules.setdefault(module.name_stream, {}).setdefault(module.version, []).append((repodata.name, module))
+                for nevra in module.rpms:
+                    self.all_modular_rpms.setdefault(nevra, {}).setdefault(repodata.name, {})[module.nsvca] = module
+
+        # Latest non-modular rpm of each package among all repos, before shadowing by modular rpms is considered
+        all_non_modular_rpms: Dict[str, Tuple[str, Rpm]] = {}  # rpm_nvera => (repo_name, rpm)
+        for repodata in repodatas:
+            for rpm in repodata.primary_rpms:
+                nevra = rpm.nevra
+                if nevra in self.all_modular_rpms:
+                    continue  # It is a modular rpm
+                all_non_modular_rpms[nevra] = (repodata.name, rpm)
+        self.latest_non_modular_rpms: Dict[str, Tuple[str, Rpm]] = {}  # package_name => (repo_name, rpm)
+        for repo, rpm in all_non_modular_rpms.values():
+            _, candidate = self.latest_non_modular_rpms.get(rpm.name, (None, None))
+            if not candidate or rpm.compare(candidate) > 0:
+                self.latest_non_modular_rpms[rpm.name] = (repo, rpm)
+
+        self._parsed_modular_rpms: Dict[str, Rpm] = {}  # rpm_nvera => rpm
+        # Images built from the same repos tend to enable the same module streams
+        self._candidate_modular_rpms: Dict[frozenset, Dict[str, Tuple[str, Rpm]]] = {}
+
+    def _parse_modular_rpm(self, nevra: str) -> Rpm:
+        rpm = self._parsed_modular_rpms.get(nevra)
+        if not rpm:
+            rpm = self._parsed_modular_rpms[nevra] = Rpm.from_nevra(nevra)
+        return rpm
+
+    def _find_candidate_modular_rpms(self, enabled_streams: Dict[str, Set[str]]) -> Dict[str, Tuple[str, Rpm]]:
         """ Finds all candidate modular rpms in enabled module streams
         """
+        key = frozenset((module_stream, frozenset(contexts)) for module_stream, contexts in enabled_streams.items())
+        candidate_modular_rpms = self._candidate_modular_rpms.get(key)
+        if candidate_modular_rpms is not None:
+            return candidate_modular_rpms
+
         # Find the latest module versions for each enabled streams
         latest_modules: Dict[str, Dict[str, Tuple[str, RpmModule]]] = {}  # module_stream => context => (repo_name, RpmModule)
         for module_stream, allowed_contexts in enabled_streams.items():
-            module_versions = sorted(all_modules[module_stream].keys(), reverse=True)  # module versions are sorted from newest to oldest
+            module_versions = sorted(self.all_modules[module_stream].keys(), reverse=True)  # module versions are sorted from newest to oldest
             latest_modules[module_stream] = {}
             for version in module_versions:
-                for update_repo, update_module in all_modules[module_stream][version]:
+                for update_repo, update_module in self.all_modules[module_stream][version]:
                     if update_module.context not in allowed_contexts:
                         continue  # This module has a different "context"; ignoring
                     if update_module.context in latest_modules[module_stream]:
                         continue  # a newer version has been found
                     latest_modules[module_stream][update_module.context] = (update_repo, update_module)
         # Finally populate candidate_modular_rpms
-        candidate_modular_rpms: Dict[str, Tuple[str, Rpm]] = {}  # package_name => (repo_name, rpm)
+        candidate_modular_rpms = {}  # package_name => (repo_name, rpm)
         for _, context_modules in latest_modules.items():
             for _, repo_module in context_modules.items():
                 repo, module = repo_module
                 for nevra in module.rpms:
-                    rpm = Rpm.from_nevra(nevra)
+                    rpm = self._parse_modular_rpm(nevra)
                     _, candidate = candidate_modular_rpms.get(rpm.name, (None, None))
                     if not candidate or rpm.compare(candidate) > 0:
                         candidate_modular_rpms[rpm.name] = (repo, rpm)
+        self._candidate_modular_rpms[key] = candidate_modular_rpms
         return candidate_modular_rpms
 
-    @staticmethod
-    def _find_candidate_non_modular_rpms(all_non_modular_rpms, candidate_modular_rpms, logger):
-        """ Finds all candidate non-modular rpms.
-        For each non-modular rpm, if there is another candidate modular rpm with the same package name,
-        the non-modular rpm will be exempted.
-        """
-        candidate_non_modulear_rpms: Dict[str, Tuple[str, Rpm]] = {}  # package_name => (repo_name, rpm)
-        for nevra, repo in all_non_modular_rpms.items():
-            rpm = Rpm.from_nevra(nevra)
-            _, candidate = candidate_non_modulear_rpms.get(rpm.name, (None, None))
-            if not candidate or rpm.compare(candidate) > 0:
-                if rpm.name in candidate_modular_rpms:
-                    modular_repo, modular_rpm = candidate_modular_rpms[rpm.name]
-                    logger.debug("Non-modular RPM %s from %s is shadowed by modular RPM %s from %s", nevra, repo, modular_rpm.nevra, modular_repo)
-                    continue  # This non-modular rpm is shadowed by a modular rpm
-                candidate_non_modulear_rpms[rpm.name] = (repo, rpm)
-        return candidate_non_modulear_rpms
-
-    def find_non_latest_rpms(self, rpms_to_check: List[Dict], repodatas: List[Repodata], logger: Optional[Logger] = None) -> List[Tuple[str, str, str]]:
+    def find_non_latest_rpms(self, rpms_to_check: List[Dict], logger: Optional[Logger] = None) -> List[Tuple[str, str, str]]:
         """
         Finds non-latest rpms.
 
         :param rpms_to_check: a list of RPMs to check
-        :param repodata: a list of YUM repos.
         :return: Returns a list of outdated rpms in the form of (installed_rpm, latest_rpm, repo_name)
         """
-        # Determine which repos are enabled for the image
-        logger = logger or logging.getLogger(__name__)
+        logger = logger or LOGGER
 
         # archive_rpms holds all rpms to examine
-        archive_rpms = {rpm['name']: rpm for rpm in rpms_to_check}  # rpm_name => rpm dict
+        archive_rpms = {rpm['name']: Rpm.from_dict(rpm) for rpm in rpms_to_check}  # rpm_name => rpm
 
         # To correctly detect outdated rpms coming from modular repos, we need to know which modules are enabled during image build.
         # However, this is no Brew API or any other easy way to know that.
@@ -280,55 +429,51 @@ class OutdatedRPMFinder:
         # 2. For each installed rpm, check if the rpm is contained by a module stream.
         # 3. If yes, we will consider that module stream is "enabled" for this image.
         # This approach is not perfect, but it should be good enough for our use cases.
-
-        logger.info("Determining which module streams are enabled")
-        # Populate dicts to hold all modules and all modular rpms
-        all_modules: Dict[str, Dict[int, List[Tuple[str, RpmModule]]]] = {}  # module_name_stream => version => [(repo_name, module_object)]
-        all_modular_rpms: Dict[str, Dict[str, Dict[str, RpmModule]]] = {}  # rpm_nvera => repo_name => module_nsvca => module_object
-        for repodata in repodatas:
-            for module in repodata.modules:
-                all_modules.setdefault(module.name_stream, {}).setdefault(module.version, []).append((repodata.name, module))
-                for nevra in module.rpms:
-                    all_modular_rpms.setdefault(nevra, {}).setdefault(repodata.name, {})[module.nsvca] = module
-
-        # Populate a dict to hold enabled module streams
         enabled_streams: Dict[str, Set[str]] = {}  # module_stream => {context}
+        modular_names: Set[str] = set()  # names of installed rpms which are modular
         for name, archive_rpm in archive_rpms.items():
-            rpm = Rpm.from_dict(archive_rpm)
-            if rpm.nevra in all_modular_rpms:
-                for repo_name, modules in all_modular_rpms[rpm.nevra].items():
-                    for _, module in modules.items():
-                        enabled_streams.setdefault(module.name_stream, set()).add(module.context)
+            repo_modules = self.all_modular_rpms.get(archive_rpm.nevra)
+            if not repo_modules:
+                continue
+            modular_names.add(name)
+            for modules in repo_modules.values():
+                for module in modules.values():
+                    enabled_streams.setdefault(module.name_stream, set()).add(module.context)
 
         # Populate candidate_modular_rpms, which will hold visible modular rpms that are latest among all configured repos
         candidate_modular_rpms: Dict[str, Tuple[str, Rpm]] = {}  # package_name => (repo_name, rpm)
         if not enabled_streams:
-            logger.info("Looks like no module streams are enabled")
+            logger.debug("Looks like no module streams are enabled")
         else:
-            candidate_modular_rpms = self._find_candidate_modular_rpms(all_modules, enabled_streams)
-
-        # Populate a dict to hold all non-modular rpms
-        all_non_modular_rpms: Dict[str, str] = {}  # rpm_nvera => repo_name
-        for repodata in repodatas:
-            for rpm in repodata.primary_rpms:
-                if rpm.nevra in all_modular_rpms:
-                    continue  # It is a modular rpm
-                all_non_modular_rpms[rpm.nevra] = repodata.name
-
-        # Populate candidate_non_modulear_rpms, which will hold all visible non-modular rpms that are latest among all configured repos
-        candidate_non_modulear_rpms = self._find_candidate_non_modular_rpms(all_non_modular_rpms, candidate_modular_rpms, logger)
+            candidate_modular_rpms = self._find_candidate_modular_rpms(enabled_streams)
 
         # Compare archive rpms to all candidate rpms
         results: List[Tuple[str, str, str]] = []
         for name, archive_rpm in archive_rpms.items():
-            archive_rpm = Rpm.from_dict(archive_rpm)
             repo, candidate_rpm = None, None
-            if archive_rpm.nevra in all_modular_rpms:  # Archive rpm is a modular rpm
+            if name in modular_names:  # Archive rpm is a modular rpm
                 repo, candidate_rpm = candidate_modular_rpms.get(name, (None, None))
+            elif name in candidate_modular_rpms:  # Non-modular rpms are shadowed by a modular rpm with the same package name
+                modular_repo, modular_rpm = candidate_modular_rpms[name]
+                logger.debug("Non-modular RPM %s is shadowed by modular RPM %s from %s", archive_rpm.nevra, modular_rpm.nevra, modular_repo)
             else:  # Archive rpm is a non-modular rpm
-                repo, candidate_rpm = candidate_non_modulear_rpms.get(name, (None, None))
+                repo, candidate_rpm = self.latest_non_modular_rpms.get(name, (None, None))
             if not repo or not candidate_rpm:
                 continue  # Archive rpm rpm is not available in any configured repos
             if archive_rpm.compare(candidate_rpm) < 0:  # Archive rpm is older than candidate rpm
                 results.append((archive_rpm.nevra, candidate_rpm.nevra, repo))
         return results
+
+
+class OutdatedRPMFinder:
+
+    def find_non_latest_rpms(self, rpms_to_check: List[Dict], repodatas: List[Repodata], logger: Optional[Logger] = None) -> List[Tuple[str, str, str]]:
+        """
+        Finds non-latest rpms.
+        If many images are checked against the same repos, build a RepoIndex once and use it instead.
+
+        :param rpms_to_check: a list of RPMs to check
+        :param repodata: a list of YUM repos.
+        :return: Returns a list of outdated rpms in the form of (installed_rpm, latest_rpm, repo_name)
+        """
+        return RepoIndex(repodatas).find_non_latest_rpms(rpms_to_check, logger=logger)
@@ -5,13 +5,13 @@ import tempfile
 import threading
 import time
 from pathlib import Path
-from typing import Dict, List, Optional, cast
+from typing import Dict, Iterable, List, Optional, Tuple, cast
 
 import requests
 import yaml
 
 from doozerlib import exectools, rpm_utils
-from doozerlib.repodata import Repodata, RepodataLoader
+from doozerlib.repodata import Repodata, RepodataLoader, RepoIndex
 
 from .model import Missing, Model
 
@@ -24,7 +24,7 @@ ARCH_X86_64 = "x86_64"
 class Repo(object):
     """Represents a single yum repository and provides sane ways to
     access each property based on the arch or repo type."""
-    def __init__(self, name, data, valid_arches, gpgcheck=True):
+    def __init__(self, name, data, valid_arches, gpgcheck=True, repodata_cache_dir: Optional[str] = None):
         self.name = name
         self._valid_arches = valid_arches
         self._invalid_cs_arches = set()
@@ -54,6 +54,8 @@ class Repo(object):
         # This fields holds a cache for the repository metadata.
         self._repodatas: Dict[str, Repodata] = {}  # key is arch, value is Repodata instance
         self._repodata_cache_locks = {arch: threading.Lock() for arch in valid_arches}
+        # If set, parsed repository metadata is also cached on disk and reused across invocations
+        self.repodata_cache_dir = repodata_cache_dir
 
     @property
     def enabled(self):
@@ -198,7 +200,7 @@ class Repo(object):
             return repodata
         name = f"{self.name}-{arch}"
         repourl = cast(str, self.baseurl("unsigned", arch))
-        repodata = self._repodatas[arch] = await RepodataLoader().load(name, repourl)
+        repodata = self._repodatas[arch] = await RepodataLoader(cache_dir=self.repodata_cache_dir).load(name, repourl)
         return repodata
 
     async def get_repodata_threadsafe(self, arch: str):
@@ -250,17 +252,19 @@ class Repos(object):
     Represents the entire collection of repos and provides
     automatic content_set and repo conf file generation.
     """
-    def __init__(self, repos: Dict[str, Dict], arches: List[str], gpgcheck=True):
+    def __init__(self, repos: Dict[str, Dict], arches: List[str], gpgcheck=True, repodata_cache_dir: Optional[str] = None):
         self._arches = arches
         self._repos: Dict[str, Repo] = {}
         repotypes = []
         names = []
         for name, repo in repos.items():
             names.append(name)
-            self._repos[name] = Repo(name, repo, self._arches, gpgcheck=gpgcheck)
+            self._repos[name] = Repo(name, repo, self._arches, gpgcheck=gpgcheck, repodata_cache_dir=repodata_cache_dir)
             repotypes.extend(self._repos[name].repotypes)
         self.names = tuple(names)
         self.repotypes = list(set(repotypes))  # leave only unique values
+        self._repo_indexes: Dict[Tuple[Tuple[str, ...], str], RepoIndex] = {}  # key is (repo names, arch)
+        self._repo_index_lock = threading.Lock()
 
     def __getitem__(self, item: str) -> Repo:
         """Allows getting a Repo() object simply by name via repos[repo_name]"""
@@ -271,6 +275,22 @@ class Repos(object):
     def items(self):
         return self._repos.items()
 
+    async def get_repo_index(self, repo_names: Iterable[str], arch: str) -> RepoIndex:
+        """
+        Returns an index over the repodata of the specified repos for finding outdated rpms.
+        The index is built once and shared by every caller asking for the same set of repos and arch.
+        """
+        key = (tuple(sorted(set(repo_names))), arch)
+        index = self._repo_indexes.get(key)
+        if index:
+            return index
+        repodatas: List[Repodata] = await asyncio.gather(*(self[repo_name].get_repodata_threadsafe(arch) for repo_name in key[0]))
+        with self._repo_index_lock:
+            index = self._repo_indexes.get(key)
+            if not index:
+                index = self._repo_indexes[key] = RepoIndex(repodatas)
+        return index
+
     def values(self):
         return self._repos.values()
 
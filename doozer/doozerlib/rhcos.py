@@ -1,16 +1,16 @@
 
 import asyncio
 import json
-from typing import Dict, List, Optional, Tuple
-from urllib import request
-from urllib.error import URLError
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
+import aiohttp
 import koji
-from tenacity import retry, stop_after_attempt, wait_fixed
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_fixed
 
-from doozerlib import brew, exectools, logutil
+from doozerlib import brew, exectools, logutil, telemetry
 from doozerlib.model import ListModel, Model
-from doozerlib.repodata import OutdatedRPMFinder, Repodata
+from doozerlib.registry import RegistryClient, RegistryError
 from doozerlib.runtime import Runtime
 from doozerlib.util import brew_suffix_for_arch, isolate_el_version_in_release
 
@@ -98,9 +98,99 @@ class RHCOSNotFound(Exception):
     pass
 
 
+def _is_retryable_http_error(e: BaseException) -> bool:
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status >= 500
+    return isinstance(e, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+
+class RHCOSReleaseBrowser:
+    """
+    An asynchronous client of the RHCOS release browser.
+
+    Requests share a pooled HTTP session and the documents read are cached for the runtime by
+    (release url, build id, arch, document type). For example, the meta.json of each arch read while
+    checking that a multi-arch build is complete is not read again to inspect the build of that arch.
+
+    async with RHCOSReleaseBrowser(runtime) as release_browser:
+        meta = await release_browser.get_build_meta(release_url, build_id, 'x86_64')
+
+    An instance must only be used from a single event loop.
+    """
+
+    def __init__(self, runtime, connection_limit: int = 16, timeout: float = 60):
+        """
+        :param runtime: The Runtime whose cache of RHCOS metadata is used
+        :param connection_limit: Maximum number of concurrent connections
+        :param timeout: Seconds after which a request times out
+        """
+        self.runtime = runtime
+        self.connection_limit = connection_limit
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._in_flight: Dict[Tuple, asyncio.Task] = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.connection_limit),
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def get_builds(self, release_url: str) -> Dict:
+        """
+        :param release_url: Base url of a release stream (see RHCOSBuildFinder.rhcos_release_url)
+        :return: The builds.json of the release stream
+        """
+        return await self._get_document((release_url, None, None, 'builds'), f'{release_url}/builds.json')
+
+    async def get_build_meta(self, release_url: str, build_id: str, arch: str, meta_type: str = 'meta') -> Dict:
+        """
+        :param release_url: Base url of a release stream (see RHCOSBuildFinder.rhcos_release_url)
+        :param build_id: e.g. 410.81.20200520.0
+        :param arch: e.g. x86_64
+        :param meta_type: "meta" or "commitmeta"
+        :return: The {meta_type}.json of the build for the arch
+        """
+        return await self._get_document((release_url, build_id, arch, meta_type),
+                                        f'{release_url}/{build_id}/{arch}/{meta_type}.json')
+
+    async def _get_document(self, key: Tuple, url: str) -> Dict:
+        cache = self.runtime.rhcos_metadata_cache
+        if key in cache:
+            return cache[key]
+        task = self._in_flight.get(key)
+        if task is None:
+            # concurrent requests for the same document share a single fetch
+            task = self._in_flight[key] = asyncio.ensure_future(self._fetch_json(url))
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        document = await asyncio.shield(task)
+        cache[key] = document
+        return document
+
+    @retry(reraise=True, stop=stop_after_attempt(10), wait=wait_fixed(3), retry=retry_if_exception(_is_retryable_http_error))
+    async def _fetch_json(self, url: str) -> Dict:
+        with telemetry.span('http', 'GET rhcos ' + url.rsplit('/', 1)[-1], url=url) as fields:
+            async with self._get_session().get(url) as resp:
+                fields['status'] = resp.status
+                resp.raise_for_status()
+                return await resp.json(content_type=None)
+
+
 class RHCOSBuildFinder:
 
-    def __init__(self, runtime, version: str, brew_arch: str = "x86_64", private: bool = False, custom: bool = False):
+    def __init__(self, runtime, version: str, brew_arch: str = "x86_64", private: bool = False, custom: bool = False,
+                 release_browser: Optional[RHCOSReleaseBrowser] = None):
         """
         @param runtime  The Runtime object passed in from the CLI
         @param version  The 4.y ocp version as a string (e.g. "4.6")
@@ -109,12 +199,15 @@ class RHCOSBuildFinder:
         @param custom If the caller knows this build is custom, the library will only search in the -custom buckets. When the RHCOS pipeline runs a custom build, artifacts
             should be stored in a different area; e.g. https://releases-rhcos-art.apps.ocp-virt.prod.psi.redhat.com/storage/releases/rhcos-4.8-custom/48.84.....-0/x86_64/commitmeta.json
             This is done by ART's RHCOS pipeline code when a custom build is indicated: https://gitlab.cee.redhat.com/openshift-art/rhcos-upshift/-/blob/fdad7917ebdd9c8b47d952010e56e511394ed348/Jenkinsfile#L30
+        @param release_browser  Client shared by the async methods of this finder (and others) in the current event loop.
+            If not specified, each query uses its own client. Must not be specified if the synchronous methods are used.
         """
         self.runtime = runtime
         self.version = version
         self.brew_arch = brew_arch
         self.private = private
         self.custom = custom
+        self.release_browser = release_browser
         self._primary_container = None
 
     def get_primary_container_conf(self):
@@ -151,44 +244,56 @@ class RHCOSBuildFinder:
 
         return f"{RHCOS_BASE_URL}/rhcos-{self.version}{bucket_suffix}"
 
-    @retry(reraise=True, stop=stop_after_attempt(10), wait=wait_fixed(3))
+    @asynccontextmanager
+    async def _release_browser(self) -> AsyncIterator[RHCOSReleaseBrowser]:
+        if self.release_browser:
+            yield self.release_browser
+        else:
+            async with RHCOSReleaseBrowser(self.runtime) as release_browser:
+                yield release_browser
+
     def latest_rhcos_build_id(self) -> Optional[str]:
         """
         :return: Returns the build id for the latest RHCOS build for the specific CPU arch. Return None if not found.
         """
-        # this is hard to test with retries, so wrap testable method
-        return self._latest_rhcos_build_id()
+        return exectools.run_coroutine(self.find_latest_rhcos_build_id())
 
-    def _latest_rhcos_build_id(self) -> Optional[str]:
-        # returns the build id string or None (raises RHCOSNotFound for failure to retrieve)
+    async def find_latest_rhcos_build_id(self) -> Optional[str]:
+        """
+        Async version of latest_rhcos_build_id.
+        :raises RHCOSNotFound: If the builds of the release stream cannot be retrieved.
+        """
         # (may want to return "schema-version" also if this ever gets more complex)
-        url = f"{self.rhcos_release_url()}/builds.json"
-        try:
-            with request.urlopen(url) as req:
-                data = json.loads(req.read().decode())
-        except URLError as ex:
-            raise RHCOSNotFound(f"Loading RHCOS build at {url} failed: {ex}")
-
-        if not data["builds"]:
-            return None
-
-        multi_url = self.runtime.group_config.urls.rhcos_release_base["multi"]
-        arches_building = []
-        if multi_url:
-            arches_building = self.runtime.group_config.arches
-        for b in data["builds"]:
-            # Make sure all rhcos arch builds are complete
-            if multi_url and not self.is_multi_build_complete(b, arches_building):
-                continue
-            return b["id"]
-
-    def is_multi_build_complete(self, build_dict, arches_building):
+        url = self.rhcos_release_url()
+        async with self._release_browser() as release_browser:
+            try:
+                data = await release_browser.get_builds(url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                raise RHCOSNotFound(f"Loading RHCOS build at {url}/builds.json failed: {ex}")
+
+            if not data["builds"]:
+                return None
+
+            multi_url = self.runtime.group_config.urls.rhcos_release_base["multi"]
+            arches_building = []
+            if multi_url:
+                arches_building = self.runtime.group_config.arches
+            for b in data["builds"]:
+                # Make sure all rhcos arch builds are complete
+                if multi_url and not await self.is_multi_build_complete(b, arches_building):
+                    continue
+                return b["id"]
+
+    async def is_multi_build_complete(self, build_dict, arches_building) -> bool:
         if len(build_dict["arches"]) != len(arches_building):
             missing_arches = set(arches_building) - set(build_dict["arches"])
             logger.info(f"Skipping {build_dict['id']} - missing these arch builds - {missing_arches}")
             return False
-        for arch in arches_building:
-            if not self.meta_has_required_attributes(self.rhcos_build_meta(build_dict["id"], arch=arch)):
+        # The metadata of all arches is read concurrently. It is cached, so it will not be read again
+        # when the build of each arch is inspected.
+        metas = await asyncio.gather(*(self.get_build_meta(build_dict["id"], arch=arch) for arch in arches_building))
+        for arch, meta in zip(arches_building, metas):
+            if not self.meta_has_required_attributes(meta):
                 logger.warning(f"Skipping {build_dict['id']} - {arch} meta.json isn't complete - forget to run "
                                "rhcos release job?")
                 return False
@@ -201,7 +306,6 @@ class RHCOSBuildFinder:
                 return False
         return True
 
-    @retry(reraise=True, stop=stop_after_attempt(10), wait=wait_fixed(3))
     def rhcos_build_meta(self, build_id: str, arch: str = None, meta_type: str = "meta") -> Dict:
         """
         Queries the RHCOS release browser to return metadata about the specified RHCOS build.
@@ -222,75 +326,139 @@ class RHCOSBuildFinder:
              ...
          }
         """
-        # this is hard to test with retries, so wrap testable method
-        return self._rhcos_build_meta(build_id, arch, meta_type)
+        return exectools.run_coroutine(self.get_build_meta(build_id, arch, meta_type))
 
-    def _rhcos_build_meta(self, build_id: str, arch: str = None, meta_type: str = "meta") -> Dict:
+    async def get_build_meta(self, build_id: str, arch: str = None, meta_type: str = "meta") -> Dict:
         """
-        See public API rhcos_build_meta for details.
+        Async version of rhcos_build_meta.
         """
-        if not arch:
-            arch = self.brew_arch
-        url = f"{self.rhcos_release_url()}/{build_id}/{arch}/{meta_type}.json"
-        with request.urlopen(url) as req:
-            return json.loads(req.read().decode())
+        async with self._release_browser() as release_browser:
+            return await release_browser.get_build_meta(self.rhcos_release_url(), build_id, arch or self.brew_arch, meta_type)
 
     def latest_container(self, container_conf: dict = None) -> Tuple[Optional[str], Optional[str]]:
         """
         :param container_conf: a payload tag conf Model from group.yml (with build_metadata_key)
         :return: Returns (rhcos build id, image pullspec) or (None, None) if not found.
         """
-        build_id = self.latest_rhcos_build_id()
+        return exectools.run_coroutine(self.find_latest_container(container_conf))
+
+    async def find_latest_container(self, container_conf: dict = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Async version of latest_container.
+        """
+        build_id = await self.find_latest_rhcos_build_id()
         if build_id is None:
             return None, None
         return build_id, get_container_pullspec(
-            self.rhcos_build_meta(build_id),
+            await self.get_build_meta(build_id),
             container_conf or self.get_primary_container_conf()
         )
 
 
+def _stream_version_for_build_id(build_id: str) -> str:
+    # The first digits of the RHCOS build are the major.minor of the rhcos stream name.
+    # Which, near branch cut, might not match the actual release stream.
+    # Sadly we don't have any other labels or anything to look at to determine the stream.
+    version = build_id.split('.')[0]
+    return version[0] + '.' + version[1:]  # e.g. 43.82.202102081639.0 -> "4.3"
+
+
+async def _get_image_build_id(registry: RegistryClient, pullspec: str) -> Optional[str]:
+    """
+    :return: The RHCOS build id an RHCOS container image was built from (its version label)
+    """
+    try:
+        image_config = await registry.get_image_config(pullspec)
+    except RegistryError as e:
+        # e.g. credentials for the registry are only available to oc
+        logger.warning(f'Unable to read the config of {pullspec} from its registry ({e}); trying oc image info')
+        try:
+            image_info_str, _ = await exectools.cmd_assert_async(['oc', 'image', 'info', '-o', 'json', pullspec], retries=3)
+        except ChildProcessError as e:
+            raise Exception(f'Error fetching RHCOS build info from {pullspec}: {e}')
+        image_config = json.loads(image_info_str)['config']
+    return Model(image_config).config.Labels.version or None
+
+
 class RHCOSBuildInspector:
 
-    def __init__(self, runtime: Runtime, pullspec_for_tag: Dict[str, str], brew_arch: str, build_id: Optional[str] = None):
+    def __init__(self, runtime: Runtime, pullspec_for_tag: Dict[str, str], brew_arch: str, build_id: Optional[str] = None,
+                 build_meta: Optional[Dict] = None, os_commitmeta: Optional[Dict] = None):
+        """
+        :param runtime: The Runtime object passed in from the CLI
+        :param pullspec_for_tag: Map of payload tag name => RHCOS container image pullspec
+        :param brew_arch: e.g. "x86_64"
+        :param build_id: The RHCOS build id, if known
+        :param build_meta: meta.json of the build, if already retrieved
+        :param os_commitmeta: commitmeta.json of the build, if already retrieved
+        Unless the metadata of the build is passed in, it is retrieved while constructing the inspector.
+        Use create() to construct inspectors concurrently.
+        """
         self.runtime = runtime
         self.brew_arch = brew_arch
         self.pullspec_for_tag = pullspec_for_tag
+        if build_meta is None or os_commitmeta is None:
+            build_id, build_meta, os_commitmeta = exectools.run_coroutine(
+                self._fetch_build_metadata(runtime, pullspec_for_tag, brew_arch, build_id))
         self.build_id = build_id
-
-        # Remember the pullspec(s) provided in case it does not match what is in the releases.yaml.
-        # Because of an incident where we needed to repush RHCOS and get a new SHA for 4.10 GA,
-        # trust the exact pullspec in releases.yml instead of what we find in the RHCOS release
-        # browser.
-        for tag, pullspec in pullspec_for_tag.items():
+        self.stream_version = _stream_version_for_build_id(build_id)
+        self._build_meta = build_meta
+        self._os_commitmeta = os_commitmeta
+
+    @classmethod
+    async def create(cls, runtime: Runtime, pullspec_for_tag: Dict[str, str], brew_arch: str, build_id: Optional[str] = None,
+                     release_browser: Optional[RHCOSReleaseBrowser] = None,
+                     registry: Optional[RegistryClient] = None) -> 'RHCOSBuildInspector':
+        """
+        Constructs an inspector, retrieving the metadata of the build asynchronously.
+        :param release_browser: Client to use for the RHCOS release browser. Share it among concurrent calls.
+        :param registry: Client to use to read the labels of the images. Share it among concurrent calls.
+        Other parameters are those of the constructor.
+        """
+        build_id, build_meta, os_commitmeta = await cls._fetch_build_metadata(
+            runtime, pullspec_for_tag, brew_arch, build_id, release_browser, registry)
+        return cls(runtime, pullspec_for_tag, brew_arch, build_id, build_meta=build_meta, os_commitmeta=os_commitmeta)
+
+    @staticmethod
+    async def _fetch_build_metadata(runtime: Runtime, pullspec_for_tag: Dict[str, str], brew_arch: str, build_id: Optional[str],
+                                    release_browser: Optional[RHCOSReleaseBrowser] = None,
+                                    registry: Optional[RegistryClient] = None) -> Tuple[str, Dict, Dict]:
+        """
+        :return: (build_id, meta.json, commitmeta.json) of the build
+        """
+        async with AsyncExitStack() as stack:
+            if release_browser is None:
+                release_browser = await stack.enter_async_context(RHCOSReleaseBrowser(runtime))
+
+            # Remember the pullspec(s) provided in case it does not match what is in the releases.yaml.
+            # Because of an incident where we needed to repush RHCOS and get a new SHA for 4.10 GA,
+            # trust the exact pullspec in releases.yml instead of what we find in the RHCOS release
+            # browser.
+            if pullspec_for_tag:
+                if registry is None:
+                    registry = await stack.enter_async_context(RegistryClient())
+                tags = list(pullspec_for_tag)
+                image_build_ids = await asyncio.gather(*(_get_image_build_id(registry, pullspec_for_tag[tag]) for tag in tags))
+                for tag, image_build_id in zip(tags, image_build_ids):
+                    pullspec = pullspec_for_tag[tag]
+                    if not image_build_id:
+                        raise Exception(f'Unable to determine RHCOS build_id from tag {tag} pullspec {pullspec}.')
+                    if build_id and build_id != image_build_id:
+                        raise Exception(f'Found divergent RHCOS build_id for {pullspec_for_tag}. {image_build_id} versus'
+                                        f' {build_id}')
+                    build_id = image_build_id
+
+            stream_version = _stream_version_for_build_id(build_id)
             try:
-                image_info_str, _ = exectools.cmd_assert(f'oc image info -o json {pullspec}', retries=3)
-            except ChildProcessError as e:
-                raise Exception(f'Error fetching RHCOS build {build_id}: {e}')
-
-            image_info = Model(json.loads(image_info_str))
-            image_build_id = image_info.config.config.Labels.version
-            if not image_build_id:
-                raise Exception(f'Unable to determine RHCOS build_id from tag {tag} pullspec {pullspec}. Retrieved image info: {image_info_str}')
-            if self.build_id and self.build_id != image_build_id:
-                raise Exception(f'Found divergent RHCOS build_id for {pullspec_for_tag}. {image_build_id} versus'
-                                f' {self.build_id}')
-            self.build_id = image_build_id
-
-        # The first digits of the RHCOS build are the major.minor of the rhcos stream name.
-        # Which, near branch cut, might not match the actual release stream.
-        # Sadly we don't have any other labels or anything to look at to determine the stream.
-        version = self.build_id.split('.')[0]
-        self.stream_version = version[0] + '.' + version[1:]  # e.g. 43.82.202102081639.0 -> "4.3"
-
-        try:
-            finder = RHCOSBuildFinder(runtime, self.stream_version, self.brew_arch)
-            self._build_meta = finder.rhcos_build_meta(self.build_id, meta_type='meta')
-            self._os_commitmeta = finder.rhcos_build_meta(self.build_id, meta_type='commitmeta')
-        except Exception:
-            # Fall back to trying to find a custom build
-            finder = RHCOSBuildFinder(runtime, self.stream_version, self.brew_arch, custom=True)
-            self._build_meta = finder.rhcos_build_meta(self.build_id, meta_type='meta')
-            self._os_commitmeta = finder.rhcos_build_meta(self.build_id, meta_type='commitmeta')
+                finder = RHCOSBuildFinder(runtime, stream_version, brew_arch, release_browser=release_browser)
+                build_meta, os_commitmeta = await asyncio.gather(finder.get_build_meta(build_id, meta_type='meta'),
+                                                                 finder.get_build_meta(build_id, meta_type='commitmeta'))
+            except Exception:
+                # Fall back to trying to find a custom build
+                finder = RHCOSBuildFinder(runtime, stream_version, brew_arch, custom=True, release_browser=release_browser)
+                build_meta, os_commitmeta = await asyncio.gather(finder.get_build_meta(build_id, meta_type='meta'),
+                                                                 finder.get_build_meta(build_id, meta_type='commitmeta'))
+        return build_id, build_meta, os_commitmeta
 
     def __repr__(self):
         return f'RHCOSBuild:{self.brew_arch}:{self.build_id}'
@@ -478,7 +646,7 @@ class RHCOSBuildInspector:
         group_repos = self.runtime.repos
         arch = self.brew_arch
         logger.info("Fetching repodatas for enabled repos %s", ", ".join(f"{repo_name}-{arch}" for repo_name in enabled_repos))
-        repodatas: List[Repodata] = await asyncio.gather(*[group_repos[repo_name].get_repodata_threadsafe(arch) for repo_name in enabled_repos])
+        repo_index = await group_repos.get_repo_index(enabled_repos, arch)
 
         # Get all installed rpms
         rpms_to_check = [
@@ -493,5 +661,5 @@ class RHCOSBuildInspector:
         ]
 
         logger.info("Determining outdated rpms...")
-        results = OutdatedRPMFinder().find_non_latest_rpms(rpms_to_check, repodatas, logger=logger)
+        results = repo_index.find_non_latest_rpms(rpms_to_check, logger=logger)
         return results
@@ -1,8 +1,10 @@
 from future import standard_library
 
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
+import asyncio
 import os
 import tempfile
 import shutil
@@ -17,21 +19,22 @@ import signal
 import io
 import pathlib
 from typing import Optional, List, Dict, Tuple, Union
-import time
 import re
 
 from jira import JIRA
+from requests.adapters import HTTPAdapter
 
 from doozerlib import gitdata
 from . import logutil
 from . import assertion
 from . import exectools
+from . import telemetry
 from . import dblib
 from .pushd import Dir
 
 from .image import ImageMetadata
 from .rpmcfg import RPMMetadata
-from .metadata import Metadata, RebuildHint
+from .metadata import LatestBuildSearch, Metadata, RebuildHint
 from doozerlib import state
 from .model import Model, Missing
 from multiprocessing import Lock, RLock, Semaphore
@@ -42,6 +45,7 @@ from doozerlib import util
 from doozerlib import brew
 from doozerlib.assembly import assembly_group_config, assembly_basis_event, assembly_type, AssemblyTypes, assembly_streams_config
 from doozerlib.build_status_detector import BuildStatusDetector
+from doozerlib.remote_refs import RemoteRefResolver
 
 standard_library.install_aliases()
 # Values corresponds to schema for group.yml: freeze_automation. When
@@ -106,8 +110,15 @@ class Runtime(object):
         self.rhpkg_config = None
         self._koji_client_session = None
         self.db = None
-        self.session_pool = {}
-        self.session_pool_available = {}
+        self.koji_session_pool_size = None  # Click option. Overrides group config / default size of the koji session pool.
+        self._koji_session_pool: Optional[brew.KojiSessionPool] = None
+        # Async koji clients shared by coroutines of each event loop: loop => [client, number of users]
+        self._async_koji_clients: Dict[asyncio.AbstractEventLoop, List] = {}
+        self.remote_refs = RemoteRefResolver()  # memoizes the branches and tags of upstream repositories
+        self._latest_builds: Dict[Tuple, Optional[Dict]] = {}  # LatestBuildSearch.key => latest build
+        self._latest_builds_lock = Lock()
+        # Documents read from the RHCOS release browser: (release url, build id, arch, document type) => document
+        self.rhcos_metadata_cache: Dict[Tuple, Dict] = {}
         self.brew_event = None
         self.assembly_basis_event = None
         self.assembly_type = None
@@ -116,6 +127,10 @@ class Runtime(object):
         self._build_status_detector = None
         self.disable_gssapi = False
         self._build_data_product_cache: Model = None
+        self.koji_cache_dir = None  # If set, KojiWrapper results are cached on disk in this directory
+        self.koji_cache_ttl = None
+        self.concurrency_limit: List[str] = []  # Click option. RESOURCE=LIMIT overrides of concurrency_limits in group.yml
+        self._resource_limiter_stats_registered = False  # whether resource usage is logged at exit
 
         self.stream: List[str] = []  # Click option. A list of image stream overrides from the command line.
         self.stream_overrides: Dict[str, str] = {}  # Dict of stream name -> pullspec from command line.
@@ -149,6 +164,7 @@ class Runtime(object):
         self.record_log_path = None
 
         self.debug_log_path = None
+        self.trace_path = None
 
         self.brew_logs_dir = None
 
@@ -208,6 +224,30 @@ class Runtime(object):
         else:
             self.rhpkg_config = ''
 
+    def configure_resource_limits(self):
+        """
+        Sets the limits of shared resources (see exectools.get_resource_limiter) from defaults,
+        concurrency_limits in group.yml and --concurrency-limit (in increasing order of precedence).
+        Resource usage is logged when doozer exits.
+        """
+        limits = dict(constants.DEFAULT_RESOURCE_LIMITS)
+        if self.group_config and self.group_config.concurrency_limits:
+            limits.update(self.group_config.concurrency_limits.primitive())
+        for entry in self.concurrency_limit or []:
+            resource, _, limit = entry.partition('=')
+            if not resource or not limit.isdigit():
+                raise ValueError(f'Invalid --concurrency-limit {entry}; expected RESOURCE=LIMIT (0 for no limit)')
+            limits[resource] = int(limit)
+        exectools.configure_resource_limits(limits)
+        if not self._resource_limiter_stats_registered:
+            atexit.register(self._log_resource_limiter_stats)
+            self._resource_limiter_stats_registered = True
+
+    def _log_resource_limiter_stats(self):
+        for name, stats in sorted(exectools.get_resource_limiter_stats().items()):
+            if stats.acquisitions:
+                self.logger.info(f'Resource {name}: {stats}')
+
     def get_named_semaphore(self, lock_name, is_dir=False, count=1):
         """
         Returns a semaphore (which can be used as a context manager). The first time a lock_name
@@ -331,13 +371,14 @@ class Runtime(object):
         self.flags_dir = os.path.join(self.working_dir, "flags")
         self.state_file = os.path.join(self.working_dir, 'state.yaml')
         self.debug_log_path = os.path.join(self.working_dir, "debug.log")
+        self.trace_path = os.path.join(self.working_dir, "trace.jsonl")
 
         if self.upcycle:
             # A working directory may be upcycle'd numerous times.
             # Don't let anything grow unbounded.
             shutil.rmtree(self.brew_logs_dir, ignore_errors=True)
             shutil.rmtree(self.flags_dir, ignore_errors=True)
-            for path in (self.record_log_path, self.state_file, self.debug_log_path):
+            for path in (self.record_log_path, self.state_file, self.debug_log_path, self.trace_path):
                 if os.path.exists(path):
                     os.unlink(path)
 
@@ -354,6 +395,8 @@ class Runtime(object):
             self.load_disabled = disabled
 
         self.initialize_logging()
+        # Structured record of subprocess and koji api calls; see doozer analyze:trace
+        telemetry.enable_trace(self.trace_path)
 
         self.init_state()
 
@@ -408,12 +451,20 @@ class Runtime(object):
         if self.cache_dir:
             self.cache_dir = os.path.abspath(self.cache_dir)
 
+        if self.koji_cache_dir:
+            self.koji_cache_dir = os.path.abspath(self.koji_cache_dir)
+            self.logger.info(f'Persisting Koji API results in {self.koji_cache_dir}')
+            ttl = self.koji_cache_ttl if self.koji_cache_ttl is not None else constants.KOJI_CACHE_VOLATILE_TTL
+            brew.KojiWrapper.enable_persistent_cache(self.koji_cache_dir, volatile_ttl=ttl)
+
         # get_releases_config also inits self.releases_config
         self.assembly_type = assembly_type(self.get_releases_config(), self.assembly)
 
         self.group_dir = self.gitdata.data_dir
         self.group_config = self.get_group_config()
 
+        self.configure_resource_limits()
+
         self.hotfix = False  # True indicates builds should be tagged with associated hotfix tag for the artifacts branch
 
         if self.group_config.assemblies.enabled or self.enable_assemblies:
@@ -507,7 +558,8 @@ class Runtime(object):
                 # We should only really be building the latest release with unsigned RPMs, so default to True
                 self.gpgcheck = True
 
-            self.repos = Repos(self.group_config.repos, self.arches, self.gpgcheck)
+            repodata_cache_dir = os.path.join(self.cache_dir, self.user or "default", 'repodata') if self.cache_dir else None
+            self.repos = Repos(self.group_config.repos, self.arches, self.gpgcheck, repodata_cache_dir=repodata_cache_dir)
             self.freeze_automation = self.group_config.freeze_automation or FREEZE_AUTOMATION_NO
 
             if validate_content_sets:
@@ -605,11 +657,7 @@ class Runtime(object):
                 raise DoozerFatalError('The following images or rpms were either missing or filtered out: {}'.format(', '.join(missed_include)))
 
             if mode in ['images', 'both']:
-                for i in image_data.values():
-                    if i.key not in self.image_map:
-                        metadata = ImageMetadata(self, i, self.upstream_commitish_overrides.get(i.key), clone_source=clone_source, prevent_cloning=prevent_cloning)
-                        self.image_map[metadata.distgit_key] = metadata
-                        self.component_map[metadata.get_component_name()] = metadata
+                self._load_image_metas(list(image_data.values()), clone_source=clone_source, prevent_cloning=prevent_cloning)
                 if not self.image_map:
                     self.logger.warning("No image metadata directories found for given options within: {}".format(self.group_dir))
 
@@ -625,11 +673,10 @@ class Runtime(object):
                 self.generate_image_tree()
 
             if mode in ['rpms', 'both']:
-                for r in rpm_data.values():
-                    if clone_source is None:
-                        # Historically, clone_source defaulted to True for rpms.
-                        clone_source = True
-                    metadata = RPMMetadata(self, r, self.upstream_commitish_overrides.get(r.key), clone_source=clone_source, prevent_cloning=prevent_cloning)
+                if clone_source is None and rpm_data:
+                    # Historically, clone_source defaulted to True for rpms.
+                    clone_source = True
+                for metadata in self._construct_metas(RPMMetadata, list(rpm_data.values()), clone_source=clone_source, prevent_cloning=prevent_cloning):
                     self.rpm_map[metadata.distgit_key] = metadata
                     self.component_map[metadata.get_component_name()] = metadata
                 if not self.rpm_map:
@@ -649,6 +696,37 @@ class Runtime(object):
 
         self.initialized = True
 
+    def _load_image_metas(self, data_objs: List[gitdata.DataObj], **kwargs):
+        """
+        Adds the metadata of images to image_map, in the order of data_objs.
+        Images declaring dependents resolve (and add) those images while being constructed; they, and images
+        which are dependents, are constructed in order. All other images are constructed concurrently up front.
+        """
+        pending = [i for i in data_objs if i.key not in self.image_map]
+        dependents = {d for i in pending for d in i.data.get('dependents') or []}
+        independent = [i for i in pending if not i.data.get('dependents') and i.key not in dependents]
+        constructed = dict(zip([i.key for i in independent], self._construct_metas(ImageMetadata, independent, **kwargs)))
+        for i in pending:
+            if i.key in self.image_map:
+                continue  # added as the dependent of an image
+            metadata = constructed.get(i.key) or ImageMetadata(self, i, self.upstream_commitish_overrides.get(i.key), **kwargs)
+            self.image_map[metadata.distgit_key] = metadata
+            self.component_map[metadata.get_component_name()] = metadata
+
+    def _construct_metas(self, meta_class, data_objs: List[gitdata.DataObj], **kwargs) -> List[Metadata]:
+        """
+        Constructs the metadata of many components concurrently. Construction can wait on koji (e.g. to pin the
+        upstream commit of an assembly with a basis event) or on cloning sources.
+        :return: The metadata, in the order of data_objs
+        """
+        def construct(data_obj: gitdata.DataObj) -> Metadata:
+            return meta_class(self, data_obj, self.upstream_commitish_overrides.get(data_obj.key), **kwargs)
+
+        if len(data_objs) < 2:
+            return [construct(data_obj) for data_obj in data_objs]
+        with ThreadPoolExecutor(max_workers=constants.METADATA_LOAD_THREADS, thread_name_prefix='load-metadata') as executor:
+            return list(executor.map(construct, data_objs))
+
     def initialize_logging(self):
 
         if self.initialized:
@@ -713,13 +791,46 @@ class Runtime(object):
         client = JIRA(server, token_auth=token_auth)
         return client
 
-    def build_retrying_koji_client(self):
+    def build_retrying_koji_client(self, http_adapter: Optional[HTTPAdapter] = None):
         """
+        :param http_adapter: If specified, the client sends its requests through this (possibly shared) adapter.
         :return: Returns a new koji client instance that will automatically retry
         methods when it receives common exceptions (e.g. Connection Reset)
         Honors doozer --brew-event.
         """
-        return brew.KojiWrapper([self.group_config.urls.brewhub], brew_event=self.brew_event)
+        return brew.KojiWrapper([self.group_config.urls.brewhub], brew_event=self.brew_event, http_adapter=http_adapter)
+
+    def build_async_koji_client(self) -> brew.AsyncKojiWrapper:
+        """
+        :return: Returns a new asyncio koji client for anonymous queries. Honors doozer --brew-event.
+                 Close it (or use it as an async context manager) when done.
+        """
+        return brew.AsyncKojiWrapper(self.group_config.urls.brewhub, brew_event=self.brew_event)
+
+    @asynccontextmanager
+    async def async_koji_client_session(self):
+        """
+        Async context manager which offers an asyncio koji client shared by all coroutines of the running
+        event loop which are within this context at the same time. Identical concurrent queries made by
+        those coroutines are coalesced. The client is closed when the last of them exits.
+        Honors doozer --brew-event.
+        """
+        loop = asyncio.get_running_loop()
+        with self.mutex:
+            entry = self._async_koji_clients.get(loop)
+            if entry is None:
+                entry = self._async_koji_clients[loop] = [self.build_async_koji_client(), 0]
+            entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            with self.mutex:
+                entry[1] -= 1
+                last_user = entry[1] == 0
+                if last_user:
+                    del self._async_koji_clients[loop]
+            if last_user:
+                await entry[0].close()
 
     @contextmanager
     def shared_koji_client_session(self):
@@ -748,47 +859,130 @@ class Runtime(object):
                 self._build_status_detector = BuildStatusDetector(self, self.logger)
             yield self._build_status_detector
 
+    def get_koji_session_pool(self) -> brew.KojiSessionPool:
+        """
+        :return: The bounded pool backing pooled_koji_client_session. Its size comes from --koji-session-pool-size,
+                 koji_session_pool_size in group.yml, or a default (in that order of precedence).
+        """
+        with self.mutex:
+            if self._koji_session_pool is None:
+                size = self.koji_session_pool_size
+                if not size and self.group_config:
+                    size = self.group_config.koji_session_pool_size
+                size = int(size or constants.KOJI_SESSION_POOL_SIZE)
+                # All pooled sessions share one adapter so that keep-alive connections to the hub are reused.
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+                self._koji_session_pool = brew.KojiSessionPool(lambda: self.build_retrying_koji_client(http_adapter=adapter), size)
+            return self._koji_session_pool
+
     @contextmanager
     def pooled_koji_client_session(self, caching: bool = False):
         """
         Context manager which offers a koji client session from a limited pool. You hold a lock on this
         session until you return. It is not recommended to call other methods that acquire their
         own pooled sessions, because that may lead to deadlock if the pool is exhausted.
+        If the pool is exhausted, callers wait (in FIFO order) for a session to be released.
         Honors doozer --brew-event.
         :param caching: Set to True in order for your instance to place calls/results into
                         the global KojiWrapper cache. This is equivalent to passing
                         KojiWrapperOpts(caching=True) in each call within the session context.
         """
-        session = None
-        session_id = None
-        while True:
-            with self.mutex:
-                if len(self.session_pool_available) == 0:
-                    if len(self.session_pool) < 30:
-                        # pool has not grown to max size;
-                        new_session = self.build_retrying_koji_client()
-                        session_id = len(self.session_pool)
-                        self.session_pool[session_id] = new_session
-                        session = new_session  # This is what we wil hand to the caller
-                        break
-                    else:
-                        # Caller is just going to have to wait and try again
-                        pass
-                else:
-                    session_id, session = self.session_pool_available.popitem()
-                    break
-
-            time.sleep(5)
+        with self.get_koji_session_pool().session() as session:
+            try:
+                session.force_instance_caching = caching
+                yield session
+            finally:
+                session.force_instance_caching = False
 
-        # Arriving here, we have a session to use.
-        try:
-            session.force_instance_caching = caching
-            yield session
-        finally:
-            session.force_instance_caching = False
-            # Put it back into the pool
-            with self.mutex:
-                self.session_pool_available[session_id] = session
+    def get_cached_latest_build(self, search_key: Tuple) -> Tuple[bool, Optional[Dict]]:
+        """
+        :param search_key: LatestBuildSearch.key
+        :return: (found, build). build is None if the search was performed but found no build.
+        """
+        with self._latest_builds_lock:
+            if search_key in self._latest_builds:
+                return True, self._latest_builds[search_key]
+        return False, None
+
+    def cache_latest_build(self, search_key: Tuple, build: Optional[Dict]):
+        with self._latest_builds_lock:
+            self._latest_builds[search_key] = build
+
+    def resolve_latest_builds(self, metas: Optional[List[Metadata]] = None, assembly: Optional[str] = None, extra_pattern: str = '*',
+                              build_state: brew.BuildStates = brew.BuildStates.COMPLETE, el_target: Optional[Union[str, int]] = None,
+                              complete_before_event: Optional[int] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Finds the latest builds of many components at once. Instead of the sequential koji queries of
+        Metadata.get_latest_build for each component, each step of the search is performed for all components
+        in a single koji multicall. Results are cached so that subsequent get_latest_build calls with the same
+        parameters do not query koji. See get_latest_build for a description of the parameters.
+        :param metas: The metas to search for. Defaults to all image and rpm metas.
+        :return: A dict mapping distgit_key => latest build (or None if there is no such build)
+        """
+        if metas is None:
+            metas = self.image_metas() + self.rpm_metas()
+        if assembly is None:
+            assembly = self.assembly
+
+        searches: Dict[Metadata, LatestBuildSearch] = {}
+        for meta in metas:
+            if meta.config['is']:
+                continue  # Pinned builds are looked up directly by nvr
+            search = meta.latest_build_search(assembly=assembly, extra_pattern=extra_pattern, build_state=build_state,
+                                              el_target=el_target, complete_before_event=complete_before_event)
+            if not self.get_cached_latest_build(search.key)[0]:
+                searches[meta] = search
+
+        if searches:
+            with self.pooled_koji_client_session(caching=True) as koji_api:
+                with koji_api.multicall(strict=True) as m:
+                    package_tasks = {meta: m.getPackage(meta.get_component_name()) for meta in searches}
+                # Components without a brew package are left to get_latest_build, which reports them.
+                pending = {meta: package_tasks[meta].result['id'] for meta in searches if package_tasks[meta].result}
+
+                list_builds_kwargs = next(iter(searches.values())).list_builds_kwargs(koji_api)
+                found: Dict[Metadata, Dict] = {}
+                attempt = 0
+                while pending:
+                    # Each round searches for the next preferred release suffix of components not found so far
+                    round_suffixes = {meta: searches[meta].release_suffixes[attempt] for meta in pending if attempt < len(searches[meta].release_suffixes)}
+                    if not round_suffixes:
+                        break
+                    with koji_api.multicall(strict=True) as m:
+                        list_tasks = {meta: m.listBuilds(packageID=pending[meta], **searches[meta].list_builds_query(release_suffix), **list_builds_kwargs)
+                                      for meta, release_suffix in round_suffixes.items()}
+                    for meta, task in list_tasks.items():
+                        builds = searches[meta].refine(task.result, round_suffixes[meta])
+                        if builds:
+                            found[meta] = builds[0]
+                            del pending[meta]
+                    attempt += 1
+
+                for meta in pending:
+                    self.cache_latest_build(searches[meta].key, None)
+
+                if build_state == brew.BuildStates.COMPLETE and found:
+                    with koji_api.multicall(strict=True) as m:
+                        tag_tasks = {meta: m.listTags(build=build['nvr']) for meta, build in found.items()}
+                    for meta, task in tag_tasks.items():
+                        tags = {tag['name'] for tag in task.result}
+                        if not tags:
+                            # A complete build may not have been tagged yet; get_latest_build waits for it.
+                            del found[meta]
+                            continue
+                        meta._check_latest_build_tags(found[meta], tags)
+
+                for meta, build in found.items():
+                    # Different brew apis return different keys here; normalize to make the rest of doozer not need to change.
+                    build['id'] = build['build_id']
+                    self.cache_latest_build(searches[meta].key, build)
+
+        # Anything not resolved above (e.g. pinned by 'is') is found individually.
+        latest_builds = {}
+        for meta in metas:
+            latest_builds[meta.distgit_key] = meta.get_latest_build(default=None, assembly=assembly, extra_pattern=extra_pattern, build_state=build_state,
+                                                                    el_target=el_target, complete_before_event=complete_before_event)
+        return latest_builds
 
     @staticmethod
     def timestamp():
@@ -1219,7 +1413,8 @@ class Runtime(object):
         cmd.extend(['git', 'clone', remote_url])
         cmd.extend(gitargs)
         cmd.append(target_dir)
-        exectools.cmd_assert(cmd, retries=3, on_retry=["rm", "-rf", target_dir], set_env=set_env)
+        with exectools.get_resource_limiter(constants.RESOURCE_GIT_CLONE):
+            exectools.cmd_assert(cmd, retries=3, on_retry=["rm", "-rf", target_dir], set_env=set_env)
 
     def is_branch_commit_hash(self, branch):
         """
@@ -1405,16 +1600,16 @@ class Runtime(object):
         self.logger.info('Checking if target branch {} exists in {}'.format(branch, git_url))
 
         try:
-            out, _ = exectools.cmd_assert('git ls-remote --heads {} {}'.format(git_url, branch), retries=3)
+            # The refs of each repository are listed only once per runtime
+            result = self.remote_refs.resolve(git_url, branch, heads_only=True)
         except Exception as err:
-            # We don't expect and exception if the branch does not exist; just an empty string
+            # We don't expect and exception if the branch does not exist; just None
             self.logger.error('Error attempting to find target branch {} hash: {}'.format(branch, err))
             return None
-        result = out.strip()  # any result means the branch is found; e.g. "7e66b10fbcd6bb4988275ffad0a69f563695901f	refs/heads/some_branch")
         if not result and self.is_branch_commit_hash(branch):
             return branch  # It is valid hex; just return it
 
-        return result.split()[0] if result else None
+        return result
 
     def resolve_source_head(self, meta):
         """
@@ -1561,12 +1756,25 @@ class Runtime(object):
         :return: Returns a list of tuples. Each tuple contains an rpm or image metadata
         and a change tuple (changed: bool, message: str).
         """
+        metas = self.image_metas() + self.rpm_metas()
+        self.prefetch_remote_refs(metas)
         return exectools.parallel_exec(
             lambda meta, _: (meta, meta.needs_rebuild()),
-            self.image_metas() + self.rpm_metas(),
+            metas,
             n_threads=20,
         ).get()
 
+    def prefetch_remote_refs(self, metas: List[Metadata]):
+        """
+        Lists the refs of the upstream repositories of the specified metas, once per repository.
+        """
+        git_urls = set()
+        for meta in metas:
+            source_details = meta.get_remote_source_details()
+            if source_details:
+                git_urls.add(source_details.url)
+        self.remote_refs.prefetch(git_urls)
+
     def resolve_metadata(self):
         """
         The group control data can be on a local filesystem, in a git
@@ -1584,8 +1792,10 @@ class Runtime(object):
                  "* Environment variable DOOZER_DATA_PATH\n"
                  ).format(self.cfg_obj.full_path))
 
+        parse_cache_dir = os.path.join(os.path.abspath(self.cache_dir), self.user or "default", 'build-data') if self.cache_dir else None
         self.gitdata = gitdata.GitData(data_path=self.data_path, clone_dir=self.working_dir,
-                                       commitish=self.group_commitish, reclone=self.upcycle, logger=self.logger)
+                                       commitish=self.group_commitish, reclone=self.upcycle, logger=self.logger,
+                                       parse_cache_dir=parse_cache_dir)
         self.data_dir = self.gitdata.data_dir
 
     def get_rpm_config(self) -> dict:
@@ -0,0 +1,214 @@
+"""
+A structured trace of the external work performed during a run.
+
+Each subprocess executed through exectools and each koji api call made through KojiWrapper is
+recorded as a span (one JSON object per line) in a trace file. Unlike debug.log, the trace can
+be analyzed without parsing log messages. export_chrome_trace converts a trace file into the
+Chrome trace event format, so that a whole run can be viewed as a timeline of concurrent work
+and idle gaps (chrome://tracing or https://ui.perfetto.dev).
+
+Span fields:
+- cat: kind of work (e.g. 'subprocess', 'koji')
+- name: what was done (e.g. 'git clone', 'getBuild')
+- start, end: wall clock times (seconds since the epoch)
+- pid, thread, thread_name, task: the process, thread and asyncio task which did the work
+- any category specific fields (e.g. cwd, rc, stdout_bytes)
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Fields present in every span. Everything else is reported as args of the span.
+SPAN_FIELDS = ('cat', 'name', 'start', 'end', 'pid', 'thread', 'thread_name', 'task')
+
+_trace_lock = threading.Lock()
+_trace_file = None
+
+_SUBCOMMAND_PATTERN = re.compile(r'^[a-z][a-z0-9_-]*$')
+# Global options (of git, oc, rhpkg, ...) whose value is passed as a separate argument before the subcommand
+_OPTIONS_WITH_VALUE = {'-C', '-c', '--git-dir', '--work-tree', '-n', '--namespace', '--kubeconfig', '--context',
+                       '--config', '--path', '--user'}
+
+
+def enable_trace(path: str):
+    """
+    Starts appending spans to the specified trace file.
+    """
+    global _trace_file
+    with _trace_lock:
+        if _trace_file is not None:
+            _trace_file.close()
+        # line buffered so that the trace is complete even if the process is killed
+        _trace_file = open(path, 'a', encoding='utf-8', buffering=1)
+
+
+def disable_trace():
+    global _trace_file
+    with _trace_lock:
+        if _trace_file is not None:
+            _trace_file.close()
+        _trace_file = None
+
+
+def _current_task_name() -> Optional[str]:
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:  # no running event loop
+        return None
+    return task.get_name() if task else None
+
+
+def record_span(category: str, name: str, start: float, end: float, **fields):
+    """
+    Appends a span to the trace file, if tracing is enabled.
+    :param category: The kind of work (e.g. 'subprocess')
+    :param name: What was done
+    :param start: time.time() at which the work started
+    :param end: time.time() at which the work ended
+    :param fields: Additional information about the work. Values must be json serializable.
+    """
+    if _trace_file is None:
+        return
+    current_thread = threading.current_thread()
+    span = {
+        'cat': category,
+        'name': name,
+        'start': start,
+        'end': end,
+        'pid': os.getpid(),
+        'thread': current_thread.ident,
+        'thread_name': current_thread.name,
+        'task': _current_task_name(),
+    }
+    span.update(fields)
+    line = json.dumps(span, default=str)
+    with _trace_lock:
+        if _trace_file is not None:
+            _trace_file.write(line + '\n')
+
+
+@contextmanager
+def span(category: str, name: str, **fields) -> Iterator[Dict]:
+    """
+    Records the work done within the context as a span. The yielded dict can be updated
+    with fields which are only known once the work is done (e.g. an exit code).
+    If the context raises, the exception class is recorded in the 'error' field.
+
+    with telemetry.span('subprocess', 'git clone', cwd=cwd) as fields:
+        ...
+        fields['rc'] = rc
+    """
+    if _trace_file is None:
+        yield fields
+        return
+    start = time.time()
+    try:
+        yield fields
+    except BaseException as e:
+        fields['error'] = type(e).__name__
+        raise
+    finally:
+        record_span(category, name, start, time.time(), **fields)
+
+
+def command_class(cmd_list: List[str]) -> str:
+    """
+    Classifies a command line by its program and subcommand so that similar commands can be
+    aggregated. e.g. ['git', '-C', 'path', 'clone', ...] => 'git clone'
+    """
+    if not cmd_list:
+        return ''
+    program = os.path.basename(str(cmd_list[0]))
+    args = iter(cmd_list[1:])
+    for arg in args:
+        if str(arg) in _OPTIONS_WITH_VALUE:
+            next(args, None)  # e.g. the path of -C path
+        elif _SUBCOMMAND_PATTERN.match(str(arg)):
+            return f'{program} {arg}'
+    return program
+
+
+def load_trace(path: str) -> List[Dict]:
+    """
+    Reads the spans of a trace file. Incomplete lines (e.g. from a killed process) are ignored.
+    """
+    spans = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return spans
+
+
+def to_chrome_trace(spans: List[Dict]) -> Dict:
+    """
+    Converts spans into the Chrome trace event format. Spans are laid out in a lane per
+    asyncio task or, outside of asyncio, per thread, so that the spans within a lane never overlap.
+    """
+    if not spans:
+        return {'traceEvents': [], 'displayTimeUnit': 'ms'}
+    origin = min(s['start'] for s in spans)
+    lanes: Dict[Tuple, int] = {}
+    events = []
+    for s in sorted(spans, key=lambda s: s['start']):
+        pid = s.get('pid', 0)
+        task = s.get('task')
+        lane_key = (pid, s.get('thread'), task)
+        tid = lanes.get(lane_key)
+        if tid is None:
+            tid = lanes[lane_key] = len(lanes) + 1
+            lane_name = s.get('thread_name') or str(s.get('thread'))
+            if task:
+                lane_name = f'{lane_name}/{task}'
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': lane_name}})
+        events.append({
+            'name': s['name'],
+            'cat': s['cat'],
+            'ph': 'X',
+            'ts': (s['start'] - origin) * 1_000_000,
+            'dur': max(s['end'] - s['start'], 0) * 1_000_000,
+            'pid': pid,
+            'tid': tid,
+            'args': {k: v for k, v in s.items() if k not in SPAN_FIELDS},
+        })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def export_chrome_trace(trace_path: str, output_path: str) -> int:
+    """
+    Converts a trace file into a Chrome trace event file.
+    :return: The number of spans exported
+    """
+    spans = load_trace(trace_path)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(to_chrome_trace(spans), f)
+    return len(spans)
+
+
+def summarize_trace(spans: List[Dict]) -> List[Tuple[str, str, int, float, float]]:
+    """
+    Aggregates spans by category and name.
+    :return: A list of (category, name, count, total seconds, max seconds), most time consuming first.
+    """
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    for s in spans:
+        duration = max(s['end'] - s['start'], 0)
+        entry = totals[(s['cat'], s['name'])]
+        entry[0] += 1
+        entry[1] += duration
+        entry[2] = max(entry[2], duration)
+    summary = [(cat, name, count, total, longest) for (cat, name), (count, total, longest) in totals.items()]
+    summary.sort(key=lambda e: e[3], reverse=True)
+    return summary
@@ -602,6 +602,31 @@ spec:
         gpcli.create_multi_release_manifest_list.assert_awaited_once_with(
             {"arch": "quay.io/org/repo:spam-arch"}, 'isname', 'quay.io/org/repo:spam')
 
+    @patch("aiofiles.open")
+    @patch("doozerlib.exectools.cmd_assert_async")
+    async def test_mirror_missing_images(self, exec_mock, open_mock):
+        gpcli = rgp_cli.GenPayloadCli(output_dir="/tmp", apply=True)
+        buffer = io.StringIO()
+        open_mock.return_value.__aenter__.return_value.write = AsyncMock(side_effect=lambda s: buffer.write(s))
+        exec_mock.return_value = None  # do not actually run the command
+        mirrored = set()
+        exec_mock.side_effect = lambda cmd, **_: mirrored.update(line.split("=")[1] for line in buffer.getvalue().splitlines())
+        registry = Mock(manifest_exists=AsyncMock(side_effect=lambda dest: dest == "spam_pullspec" or dest in mirrored))
+
+        await gpcli.mirror_missing_images("s390x", {"spam_pullspec": "spam_src", "eggs_pullspec": "eggs_src"}, registry)
+
+        # only the image missing from the destination is mirrored
+        exec_mock.assert_awaited_once_with("oc image mirror --keep-manifest-list --filename=/tmp/src_dest.s390x.0", retries=3)
+        self.assertEqual(buffer.getvalue(), "eggs_src=eggs_pullspec\n")
+        # the mirrored image is probed again until it is readable
+        self.assertEqual([c.args[0] for c in registry.manifest_exists.await_args_list].count("eggs_pullspec"), 2)
+
+    async def test_wait_for_mirrored_images_timeout(self):
+        gpcli = rgp_cli.GenPayloadCli(output_dir="/tmp", apply=True)
+        registry = Mock(manifest_exists=AsyncMock(return_value=False))
+        with patch("doozerlib.constants.PAYLOAD_MIRROR_READY_TIMEOUT", 0), self.assertRaises(DoozerFatalError):
+            await gpcli.wait_for_mirrored_images("s390x", ["eggs_pullspec"], registry, 0)
+
     @patch("doozerlib.cli.release_gen_payload.find_manifest_list_sha")
     @patch("doozerlib.cli.release_gen_payload.GenPayloadCli.mirror_payload_content")
     @patch("doozerlib.exectools.cmd_assert_async")
@@ -12,6 +12,7 @@ class TestRPMsBuildCli(IsolatedAsyncioTestCase):
 
     def _make_runtime(self, assembly=None):
         runtime = MagicMock()
+        runtime.get_cached_latest_build.return_value = (False, None)
         runtime.group_config.public_upstreams = [{"private": "https://github.com/openshift-priv", "public": "https://github.com/openshift"}]
         runtime.brew_logs_dir = "/path/to/brew-logs"
         runtime.assembly = assembly
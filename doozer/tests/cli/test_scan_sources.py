@@ -1,9 +1,11 @@
-from unittest import TestCase
-from unittest.mock import MagicMock, patch
+import asyncio
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import yaml
 
 from doozerlib.cli import scan_sources
+from doozerlib.metadata import RebuildHint, RebuildHintCode
 from doozerlib.model import Model
 from doozerlib import rhcos
 
@@ -42,3 +44,72 @@ class TestScanSourcesCli(TestCase):
 
         mock_get_build.side_effect = rhcos.RHCOSNotFound("test")
         self.assertIsNone(scan_sources._latest_rhcos_build_id(MagicMock(), "4.9", "aarch64", False))
+
+
+class TestConfigScanSources(IsolatedAsyncioTestCase):
+
+    @staticmethod
+    def _image_meta(dgk, descendants=(), builder_members=()):
+        meta = MagicMock(distgit_key=dgk, qualified_key=f'containers/{dgk}')
+        meta.get_descendants.return_value = list(descendants)
+        meta.config = Model({'from': {'builder': [{'member': m} for m in builder_members]}})
+        return meta
+
+    def test_add_image_meta_change_propagates(self):
+        child = self._image_meta('child')
+        parent = self._image_meta('parent', descendants=[child])
+        builder_user = self._image_meta('builder-user', builder_members=['child'])
+        unrelated = self._image_meta('unrelated')
+        scanner = scan_sources.ConfigScanSources(MagicMock(), None, False)
+        for meta in [child, parent, builder_user, unrelated]:
+            for builder in meta.config['from'].builder:
+                scanner.builder_dependents[builder.member].append(meta)
+
+        scanner.add_image_meta_change(parent, RebuildHint(RebuildHintCode.NEW_UPSTREAM_COMMIT, 'upstream'))
+        self.assertEqual(scanner.changing_image_metas, {parent, child, builder_user})
+        self.assertEqual(scanner.assessment_reason['containers/parent+True'], 'upstream')
+        self.assertEqual(scanner.assessment_reason['containers/child+True'], 'Ancestor parent is changing')
+        self.assertEqual(scanner.assessment_reason['containers/builder-user+True'], 'Builder group member has changed: child')
+
+    async def test_scan_image_skips_content_check_when_changing(self):
+        runtime = MagicMock()
+        image_meta = self._image_meta('image')
+        image_meta.needs_rebuild.return_value = RebuildHint(RebuildHintCode.NEW_UPSTREAM_COMMIT, 'upstream')
+        image_meta.does_image_need_change = AsyncMock()
+        scanner = scan_sources.ConfigScanSources(runtime, None, False)
+
+        await scanner.scan_image(image_meta)
+        self.assertIn(image_meta, scanner.changing_image_metas)
+        image_meta.get_latest_build.assert_not_called()
+        image_meta.does_image_need_change.assert_not_called()
+        self.assertEqual(scanner._phase_timings['upstream'][0], 1)
+
+    @staticmethod
+    def _runtime():
+        runtime = MagicMock(brew_event=None)
+        runtime.rpm_metas.return_value = []
+        runtime.image_metas.return_value = []
+        return runtime
+
+    @patch("click.echo")
+    @patch("doozerlib.brew.KojiWrapper.get_cache_stats", return_value={})
+    async def test_run(self, _, mock_echo):
+        runtime = self._runtime()
+        scanner = scan_sources.ConfigScanSources(runtime, None, True)
+
+        await scanner.run()
+        runtime.resolve_latest_builds.assert_called_once_with([])
+        runtime.prefetch_remote_refs.assert_called_once_with([])
+        self.assertEqual(yaml.safe_load(mock_echo.call_args[0][0]), {'rpms': [], 'images': []})
+        self.assertIsNone(scanner._executor)
+
+    @patch("doozerlib.exectools.TrackingThreadPoolExecutor.cancel_pending")
+    async def test_run_failure(self, mock_cancel_pending):
+        runtime = self._runtime()
+        runtime.resolve_latest_builds.side_effect = IOError("koji is down")
+        scanner = scan_sources.ConfigScanSources(runtime, None, False)
+
+        with self.assertRaisesRegex(IOError, "koji is down"):
+            await scanner.run()
+        mock_cancel_pending.assert_called_once_with()
+        self.assertIsNone(scanner._executor)
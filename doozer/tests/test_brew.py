@@ -1,11 +1,39 @@
+import asyncio
+import tempfile
+import threading
+import time
 import unittest
 from unittest import mock
 
+import aiohttp
 import koji
+from koji.xmlrpcplus import Fault, dumps
+from requests.adapters import HTTPAdapter
 
 from doozerlib import brew
 
 
+class _FakeTaskInfoMultiCall:
+    """ A koji multicall answering getTaskInfo with the next state of each task in states """
+
+    def __init__(self, states, polls=None):
+        self.states = states
+        self.polls = polls if polls is not None else []
+
+    def __enter__(self):
+        self.polls.append([])
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def getTaskInfo(self, task_id, request):
+        self.polls[-1].append(task_id)
+        task_states = self.states[task_id]
+        state = task_states.pop(0) if len(task_states) > 1 else task_states[0]
+        return mock.Mock(result={"id": task_id, "state": koji.TASK_STATES[state]})
+
+
 class TestBrew(unittest.TestCase):
     def test_get_build_objects(self):
         build_infos = {
@@ -79,51 +107,360 @@ class TestBrew(unittest.TestCase):
         actual = brew.list_archives_by_builds(build_ids, "image", fake_session)
         self.assertListEqual(actual, expected)
 
-    @mock.patch("koji_cli.lib.TaskWatcher")
-    @mock.patch("koji.ClientSession")
-    @mock.patch("time.time", return_value=10000)
-    def test_watch_tasks(self, mock_time, MockSession, MockWatcher):
-        brew_session = mock.MagicMock()
+    def test_watch_tasks(self):
+        states = {}
+        session = mock.MagicMock()
+        session.multicall.side_effect = lambda strict: _FakeTaskInfoMultiCall(states)
+        session.getTaskResult.side_effect = koji.GenericError("some reason")
+        session.cancelTask.return_value = True
         log_func = mock.MagicMock()
         tasks = [1, 2, 3]
-        terminate_event = mock.MagicMock()
+        terminate_event = threading.Event()
+
+        def watcher():
+            return brew.KojiTaskWatcher(lambda: session, min_poll_interval=0.01, max_poll_interval=0.01)
 
         # all tasks are finished successfully
-        MockWatcher.return_value.is_done.return_value = True
-        MockWatcher.return_value.is_success.return_value = True
-        MockWatcher.return_value.info = {"state": koji.TASK_STATES['CLOSED']}
-        errors = brew.watch_tasks(brew_session, log_func, tasks, terminate_event)
-        self.assertFalse(any(errors.values()))
+        states.update({task: ["OPEN", "CLOSED"] for task in tasks})
+        with mock.patch("doozerlib.brew.get_task_watcher", return_value=watcher()):
+            errors = brew.watch_tasks(session, log_func, tasks, terminate_event)
+        self.assertEqual(errors, {1: None, 2: None, 3: None})
 
         # all tasks fails with "some reason"
-        MockWatcher.return_value.is_success.return_value = False
-        MockWatcher.return_value.get_failure.return_value = "some reason"
-        MockWatcher.return_value.info = {"state": koji.TASK_STATES['FAILED']}
-        errors = brew.watch_tasks(brew_session, log_func, tasks, terminate_event)
-        self.assertTrue(all(map(lambda failure: failure == "some reason", errors.values())))
+        states.update({task: ["FAILED"] for task in tasks})
+        with mock.patch("doozerlib.brew.get_task_watcher", return_value=watcher()):
+            errors = brew.watch_tasks(session, log_func, tasks, terminate_event)
+        self.assertTrue(all(map(lambda failure: failure == "GenericError: some reason", errors.values())))
 
         # interrupted
-        MockWatcher.return_value.is_done.return_value = False
-        MockWatcher.return_value.info = {"state": koji.TASK_STATES['OPEN']}
-        terminate_event.wait.return_value = True
-        brew_session.cancelTask.return_value = True
-        errors = brew.watch_tasks(brew_session, log_func, tasks, terminate_event)
+        states.update({task: ["OPEN"] for task in tasks})
+        terminate_event.set()
+        with mock.patch("doozerlib.brew.get_task_watcher", return_value=watcher()):
+            errors = brew.watch_tasks(session, log_func, tasks, terminate_event)
         self.assertTrue(all(map(lambda failure: failure == "Interrupted", errors.values())))
-        brew_session.cancelTask.assert_has_calls([mock.call(task, recurse=True) for task in tasks], any_order=True)
+        session.cancelTask.assert_has_calls([mock.call(task, recurse=True) for task in tasks], any_order=True)
 
         # timed out
-        terminate_event.wait.return_value = False
-        counter = 0
-
-        def fake_time_func():
-            nonlocal counter
-            counter += 1
-            if counter > 1:
-                return 10000 + 5 * 60 * 60  # 5 hours
-            return 10000
-        mock_time.side_effect = fake_time_func
-        brew_session.cancelTask.return_value = True
-        brew_session.cancelTask.reset_mock()
-        errors = brew.watch_tasks(brew_session, log_func, tasks, terminate_event)
+        terminate_event.clear()
+        session.cancelTask.reset_mock()
+        with mock.patch("doozerlib.brew.get_task_watcher", return_value=watcher()):
+            errors = brew.watch_tasks(session, log_func, tasks, terminate_event, timeout=0.05)
         self.assertTrue(all(map(lambda failure: failure == "Timeout watching task", errors.values())))
-        brew_session.cancelTask.assert_has_calls([mock.call(task, recurse=True) for task in tasks], any_order=True)
+        session.cancelTask.assert_has_calls([mock.call(task, recurse=True) for task in tasks], any_order=True)
+
+    def test_watch_task(self):
+        states = {1: ["OPEN", "CLOSED"]}
+        session = mock.MagicMock()
+        session.multicall.side_effect = lambda strict: _FakeTaskInfoMultiCall(states)
+        session.cancelTask.return_value = True
+        terminate_event = threading.Event()
+
+        def watcher():
+            return brew.KojiTaskWatcher(lambda: session, min_poll_interval=0.01, max_poll_interval=0.01)
+
+        with mock.patch("doozerlib.brew.get_task_watcher", return_value=watcher()):
+            self.assertIsNone(brew.watch_task(session, mock.MagicMock(), 1, terminate_event))
+
+        # timed out
+        states[1] = ["OPEN"]
+        with mock.patch("doozerlib.brew.get_task_watcher", return_value=watcher()), \
+                mock.patch("doozerlib.constants.BREW_BUILD_TIMEOUT", 0.05):
+            self.assertEqual(brew.watch_task(session, mock.MagicMock(), 1, terminate_event), "Timeout building image")
+        session.cancelTask.assert_called_once_with(1, recurse=True)
+
+    def test_task_watcher_poll_interval(self):
+        watcher = brew.KojiTaskWatcher(mock.MagicMock(), min_poll_interval=10, max_poll_interval=180)
+        self.assertEqual(watcher.poll_interval(0), 10)
+        self.assertEqual(watcher.poll_interval(600), 60)
+        self.assertEqual(watcher.poll_interval(6 * 60 * 60), 180)
+
+    def test_get_task_watcher(self):
+        session = mock.MagicMock(baseurl="https://koji.example.com/kojihub", opts={})
+        other = mock.MagicMock(baseurl="https://koji.example.com/kojihub", opts={})
+        self.assertIs(brew.get_task_watcher(session), brew.get_task_watcher(other))
+
+    @mock.patch("koji.ClientSession._callMethod")
+    def test_koji_wrapper_persistent_cache(self, super_call_method):
+        super_call_method.return_value = {"id": 1, "nvr": "a-1-1", "state": 1}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            brew.KojiWrapper.clear_global_cache()
+            brew.KojiWrapper.enable_persistent_cache(tmpdir)
+            try:
+                k = brew.KojiWrapper(["https://brewhub.example.com/brewhub"])
+                call_meta = k.getBuild(1, brew.KojiWrapperOpts(caching=True, return_metadata=True))
+                self.assertFalse(call_meta.cache_hit)
+
+                # Simulate a new process by dropping the in-memory cache
+                brew.KojiWrapper.clear_global_cache()
+                call_meta = k.getBuild(1, brew.KojiWrapperOpts(caching=True, return_metadata=True))
+                self.assertTrue(call_meta.cache_hit)
+                self.assertEqual(call_meta.result["nvr"], "a-1-1")
+                super_call_method.assert_called_once()
+
+                stats = brew.KojiWrapper.get_cache_stats()
+                self.assertGreaterEqual(stats.persistent_hits, 1)
+                self.assertGreater(stats.bytes_written, 0)
+            finally:
+                brew.KojiWrapper.disable_persistent_cache()
+                brew.KojiWrapper.clear_global_cache()
+
+    @mock.patch("koji.ClientSession._callMethod")
+    def test_koji_wrapper_single_flight(self, super_call_method):
+        calls_started = threading.Event()
+        release_call = threading.Event()
+
+        def fake_call_method(name, args, kwargs=None, retry=True):
+            calls_started.set()
+            release_call.wait(5)
+            return {"id": args[0], "state": 1}
+        super_call_method.side_effect = fake_call_method
+        brew.KojiWrapper.clear_global_cache()
+        deduplicated_before = brew.KojiWrapper.get_cache_stats().deduplicated
+        k = brew.KojiWrapper(["https://brewhub.example.com/brewhub"])
+        results = []
+
+        def get_build():
+            results.append(k.getBuild(1, brew.KojiWrapperOpts(caching=True)))
+        threads = [threading.Thread(target=get_build) for _ in range(3)]
+        try:
+            for t in threads:
+                t.start()
+            calls_started.wait(5)
+            time.sleep(0.1)  # let the other threads find the call in flight
+            release_call.set()
+            for t in threads:
+                t.join(5)
+        finally:
+            brew.KojiWrapper.clear_global_cache()
+        self.assertEqual(results, [{"id": 1, "state": 1}] * 3)
+        super_call_method.assert_called_once()
+        self.assertEqual(brew.KojiWrapper.get_cache_stats().deduplicated - deduplicated_before, 2)
+
+    @mock.patch("koji.ClientSession._callMethod")
+    def test_koji_wrapper_multicall_cache(self, super_call_method):
+        def fake_call_method(name, args, kwargs=None, retry=True):
+            self.assertEqual(name, "multiCall")
+            return [{"faultCode": 1000, "faultString": "No such build"} if c["params"][0] == 99 else [{"id": c["params"][0]}]
+                    for c in args[0]]
+        super_call_method.side_effect = fake_call_method
+        brew.KojiWrapper.clear_global_cache()
+        k = brew.KojiWrapper(["https://brewhub.example.com/brewhub"])
+        try:
+            with k.multicall(strict=True) as m:
+                m.getBuild(1, brew.KojiWrapperOpts(caching=True))
+                m.getBuild(2)
+
+            with k.multicall(strict=False) as m:
+                tasks = [m.getBuild(build_id, brew.KojiWrapperOpts(caching=True, return_metadata=True)) for build_id in (2, 99, 3, 2)]
+            # Only the calls missing from the cache are sent to the hub
+            self.assertEqual([c["params"][0] for c in super_call_method.call_args[0][1][0]], [99, 3])
+            self.assertEqual([(tasks[i].result.result, tasks[i].result.cache_hit) for i in (0, 2, 3)],
+                             [({"id": 2}, True), ({"id": 3}, False), ({"id": 2}, True)])
+            with self.assertRaises(koji.GenericError):
+                tasks[1].result
+
+            # Faults are not cached and still raise with strict=True
+            with self.assertRaises(koji.GenericError):
+                with k.multicall(strict=True) as m:
+                    m.getBuild(3, brew.KojiWrapperOpts(caching=True))
+                    m.getBuild(99)
+            self.assertEqual([c["params"][0] for c in super_call_method.call_args[0][1][0]], [99])
+
+            # Ordinary calls share the cached entries
+            self.assertEqual(k.getBuild(1, brew.KojiWrapperOpts(caching=True)), {"id": 1})
+            self.assertEqual(super_call_method.call_count, 3)
+        finally:
+            brew.KojiWrapper.clear_global_cache()
+
+    def test_koji_task_watcher(self):
+        states = {1: ["OPEN", "CLOSED"], 2: ["FAILED"], 3: ["OPEN"]}
+        polls = []
+
+        session = mock.MagicMock()
+        session.multicall.side_effect = lambda strict: _FakeTaskInfoMultiCall(states, polls)
+        session.getTaskResult.side_effect = koji.GenericError("build failed")
+        session.cancelTask.return_value = True
+        watcher = brew.KojiTaskWatcher(lambda: session, min_poll_interval=0.01, max_poll_interval=0.01)
+        futures = [watcher.watch(task_id) for task_id in [1, 2, 3]]
+        self.assertIs(watcher.watch(1), futures[0])
+        self.assertIsNone(futures[0].result(5))
+        self.assertEqual(futures[1].result(5), "GenericError: build failed")
+        self.assertFalse(futures[2].done())
+        # all tasks are polled with a single multicall
+        self.assertEqual(polls[0], [1, 2, 3])
+        self.assertEqual(brew.get_watch_task_info_copy()[2]["state"], koji.TASK_STATES["FAILED"])
+
+        watcher.stop()
+        self.assertEqual(futures[2].result(5), "Interrupted")
+        session.cancelTask.assert_called_once_with(3, recurse=True)
+        with self.assertRaises(ValueError):
+            watcher.watch(4)
+
+    def test_koji_session_pool(self):
+        created = []
+
+        def factory():
+            session = mock.MagicMock(name=f"session-{len(created)}")
+            created.append(session)
+            return session
+
+        pool = brew.KojiSessionPool(factory, max_size=2)
+        cm1, cm2 = pool.session(), pool.session()
+        s1, s2 = cm1.__enter__(), cm2.__enter__()
+        self.assertIsNot(s1, s2)
+        self.assertEqual(pool.stats().in_use, 2)
+
+        # The pool is exhausted; waiters are woken in FIFO order as sessions are released.
+        order = []
+
+        def waiter(name):
+            with pool.session() as s:
+                order.append((name, s))
+
+        def wait_for(condition):
+            while not condition():
+                time.sleep(0.01)
+
+        t1 = threading.Thread(target=waiter, args=("first",))
+        t1.start()
+        wait_for(lambda: len(pool._waiters) == 1)
+        t2 = threading.Thread(target=waiter, args=("second",))
+        t2.start()
+        wait_for(lambda: len(pool._waiters) == 2)
+
+        cm2.__exit__(None, None, None)
+        wait_for(lambda: order)
+        cm1.__exit__(None, None, None)
+        t1.join()
+        t2.join()
+
+        self.assertEqual(order[0], ("first", s2))
+        self.assertEqual(order[1][0], "second")
+        self.assertIn(order[1][1], (s1, s2))
+        self.assertEqual(len(created), 2, "pool must not grow beyond max_size")
+        stats = pool.stats()
+        self.assertEqual(stats.size, 2)
+        self.assertEqual(stats.in_use, 0)
+        self.assertEqual(stats.peak_in_use, 2)
+        self.assertEqual(stats.checkouts, 4)
+        self.assertEqual(stats.waits, 2)
+
+    def test_new_session_keeps_shared_adapter_open(self):
+        adapter = HTTPAdapter()
+        k1 = brew.KojiWrapper(["https://brewhub.example.com/brewhub"], http_adapter=adapter)
+        k2 = brew.KojiWrapper(["https://brewhub.example.com/brewhub"], http_adapter=adapter)
+        old_rsession = k1.rsession
+        with mock.patch.object(adapter, "close") as close:
+            k1.new_session()  # as koji does on login and after a retried transport error
+        close.assert_not_called()
+        self.assertIsNot(k1.rsession, old_rsession)
+        self.assertIs(k1.rsession.get_adapter("https://brewhub.example.com/brewhub"), adapter)
+        self.assertIs(k2.rsession.get_adapter("https://brewhub.example.com/brewhub"), adapter)
+
+        # A session with adapters of its own still closes them
+        k3 = brew.KojiWrapper(["https://brewhub.example.com/brewhub"])
+        with mock.patch.object(k3.rsession, "close") as close:
+            k3.new_session()
+        close.assert_called_once_with()
+
+    def test_koji_session_pool_factory_failure(self):
+        pool = brew.KojiSessionPool(mock.MagicMock(side_effect=IOError("hub down")), max_size=1)
+        with self.assertRaises(IOError):
+            with pool.session():
+                pass
+        # The reserved slot is released, so a later checkout can try again
+        self.assertEqual(pool.stats().size, 0)
+        self.assertEqual(pool.stats().in_use, 0)
+
+
+class TestAsyncKojiWrapper(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        brew.KojiWrapper.clear_global_cache()
+
+    @staticmethod
+    def _response(body: str):
+        resp = mock.MagicMock()
+        resp.__aenter__.return_value.raise_for_status = mock.Mock()
+
+        async def _iter_chunked(size):
+            yield body.encode()
+        resp.__aenter__.return_value.content.iter_chunked = _iter_chunked
+        return resp
+
+    @mock.patch("aiohttp.ClientSession")
+    async def test_call(self, ClientSession: mock.Mock):
+        session = ClientSession.return_value
+        session.close = mock.AsyncMock()
+        session.post.side_effect = [
+            self._response(dumps(({"id": 1, "nvr": "foo-1.0-1"},), methodresponse=True)),
+            self._response(dumps(Fault(1000, "No such build"), methodresponse=True)),
+        ]
+        async with brew.AsyncKojiWrapper("https://hub.example.com/kojihub") as koji_api:
+            self.assertEqual(await koji_api.getBuild("foo-1.0-1", strict=True), {"id": 1, "nvr": "foo-1.0-1"})
+            with self.assertRaises(koji.GenericError):
+                await koji_api.getBuild("bar-1.0-1", strict=True)
+        session.close.assert_awaited_once()
+        url = session.post.call_args_list[0][0][0]
+        request = session.post.call_args_list[0][1]["data"].decode()
+        self.assertEqual(url, "https://hub.example.com/kojihub")
+        self.assertIn("<methodName>getBuild</methodName>", request)
+        self.assertIn("__starstar", request)
+
+    @mock.patch("doozerlib.brew.AsyncKojiWrapper._send")
+    async def test_coalescing_and_brew_event(self, _send: mock.AsyncMock):
+        requests_sent = []
+
+        async def fake_send(name, args, kwargs):
+            requests_sent.append((name, args, kwargs))
+            await asyncio.sleep(0.01)
+            if name == "getEvent":
+                return {"id": args[0], "ts": 1234.5}
+            return f"{name}-result"
+        _send.side_effect = fake_send
+
+        koji_api = brew.AsyncKojiWrapper("https://hub.example.com/kojihub", brew_event=42)
+        results = await asyncio.gather(*(koji_api.listBuilds(packageID=1) for _ in range(5)), koji_api.listTagged("tag"))
+        self.assertEqual(results, ["listBuilds-result"] * 5 + ["listTagged-result"])
+        self.assertEqual(koji_api.coalesced_calls, 4 + 5)  # the brew event is also looked up only once
+        self.assertEqual(requests_sent, [
+            ("getEvent", (42,), {}),
+            ("listBuilds", (), {"packageID": 1, "completeBefore": 1234.5}),
+            ("listTagged", ("tag",), {"event": 42}),
+        ])
+
+        # calls which are not queries are never coalesced
+        await asyncio.gather(koji_api.call("tagBuild", "tag", 1, brew.KojiWrapperOpts(brew_event_aware=True)),
+                             koji_api.call("tagBuild", "tag", 1, brew.KojiWrapperOpts(brew_event_aware=True)))
+        self.assertEqual(len(requests_sent), 5)
+
+    @mock.patch("doozerlib.brew.AsyncKojiWrapper._send")
+    async def test_shared_cache(self, _send: mock.AsyncMock):
+        async def fake_send(name, args, kwargs):
+            return f"{name}-{args[0]}"
+        _send.side_effect = fake_send
+
+        # cached by another (e.g. synchronous) wrapper
+        brew.KojiWrapper._cache_result(brew.KojiWrapper.get_caching_key("getBuild", (1,), {}), "getBuild-cached",
+                                       method_name="getBuild", args=(1,), kwargs={})
+        koji_api = brew.AsyncKojiWrapper("https://hub.example.com/kojihub")
+        self.assertEqual(await koji_api.getBuild(1, brew.KojiWrapperOpts(caching=True)), "getBuild-cached")
+        self.assertEqual(await koji_api.getBuild(2, brew.KojiWrapperOpts(caching=True)), "getBuild-2")
+        _send.assert_awaited_once()
+        self.assertEqual(brew.KojiWrapper._get_cache_result(brew.KojiWrapper.get_caching_key("getBuild", (2,), {}), None), "getBuild-2")
+
+    @mock.patch("asyncio.sleep")
+    @mock.patch("aiohttp.ClientSession")
+    async def test_send_retries_server_errors(self, ClientSession: mock.Mock, _):
+        session = ClientSession.return_value
+        session.close = mock.AsyncMock()
+        session.post.side_effect = [
+            aiohttp.ClientResponseError(mock.Mock(), (), status=503),
+            self._response(dumps(({"id": 1},), methodresponse=True)),
+            aiohttp.ClientResponseError(mock.Mock(), (), status=404),
+        ]
+        async with brew.AsyncKojiWrapper("https://hub.example.com/kojihub") as koji_api:
+            self.assertEqual(await koji_api.getBuild(1), {"id": 1})
+            # client errors are not retried
+            with self.assertRaises(aiohttp.ClientResponseError):
+                await koji_api.getBuild(2)
+        self.assertEqual(session.post.call_count, 3)
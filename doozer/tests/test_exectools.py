@@ -5,7 +5,10 @@ Test functions related to controlled command execution
 
 
 import asyncio
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
 from unittest import IsolatedAsyncioTestCase, mock
 
@@ -190,6 +193,34 @@ class TestGather(IsolatedAsyncioTestCase):
 
         self.assertEqual(len(lines), 6)
 
+    def test_gather_realtime(self):
+        with mock.patch("doozerlib.exectools.green_print") as green_print, \
+                mock.patch("doozerlib.exectools.yellow_print") as yellow_print:
+            rc, stdout, stderr = exectools.cmd_gather(
+                ["sh", "-c", "echo out1; echo err1 >&2; printf out2"], realtime=True)
+        self.assertEqual(0, rc)
+        self.assertEqual("out1\nout2", stdout)
+        self.assertEqual("err1\n", stderr)
+        self.assertEqual([mock.call(b"out1"), mock.call(b"out2")], green_print.call_args_list)
+        yellow_print.assert_called_once_with(b"err1")
+
+    def test_gather_realtime_max_output_bytes(self):
+        with mock.patch("doozerlib.exectools.green_print") as green_print:
+            rc, stdout, _ = exectools.cmd_gather(
+                ["sh", "-c", "for i in $(seq 1 20000); do echo line$i; done"], realtime=True, max_output_bytes=1000)
+        self.assertEqual(0, rc)
+        self.assertEqual(20000, green_print.call_count)  # everything is still printed
+        self.assertLess(len(stdout), 1000 + 65536)
+        self.assertTrue(stdout.endswith("line19999\nline20000\n"))
+        self.assertTrue(stdout.startswith("line"))
+
+    def test_gather_realtime_timeout(self):
+        with mock.patch("doozerlib.exectools.green_print"):
+            start = time.monotonic()
+            rc, _, _ = exectools.cmd_gather(["sleep", "30"], realtime=True, timeout=0.5)
+        self.assertNotEqual(0, rc)
+        self.assertLess(time.monotonic() - start, 10)
+
     async def test_cmd_gather_async(self):
         cmd = ["uname", "-a"]
         fake_cwd = "/foo/bar"
@@ -241,6 +272,120 @@ class TestGather(IsolatedAsyncioTestCase):
         results = results.get()
         self.assertEqual(results, items)
 
+    def test_run_coroutine(self):
+        async def coro(value):
+            await asyncio.sleep(0)
+            return value
+
+        async def fail():
+            raise ValueError()
+
+        self.assertEqual(exectools.run_coroutine(coro(1)), 1)
+        with self.assertRaises(ValueError):
+            exectools.run_coroutine(fail())
+
+        async def nested():
+            # synchronous code called from a coroutine
+            return exectools.run_coroutine(coro(2))
+        self.assertEqual(asyncio.run(nested()), 2)
+
+    async def test_to_executor(self):
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="test-executor") as executor:
+            thread_name = await exectools.to_executor(executor, lambda: threading.current_thread().name)
+        self.assertTrue(thread_name.startswith("test-executor"))
+
+    def test_tracking_executor_cancel_pending(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        executor = exectools.TrackingThreadPoolExecutor(max_workers=1)
+        running = executor.submit(block)
+        started.wait(5)
+        queued = [executor.submit(lambda: None) for _ in range(3)]
+        self.assertEqual(executor.cancel_pending(), 3)
+        release.set()
+        executor.shutdown(wait=True)
+        self.assertTrue(all(f.cancelled() for f in queued))
+        self.assertFalse(running.cancelled())
+        self.assertFalse(executor._pending)
+
+
+class TestResourceLimiter(IsolatedAsyncioTestCase):
+    async def test_shared_between_threads_and_coroutines(self):
+        limiter = exectools.ResourceLimiter("test", limit=2)
+        in_use = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def use():
+            nonlocal in_use, peak
+            with lock:
+                in_use += 1
+                peak = max(peak, in_use)
+            time.sleep(0.02)
+            with lock:
+                in_use -= 1
+
+        def use_sync():
+            with limiter:
+                use()
+
+        async def use_async():
+            async with limiter:
+                await exectools.to_thread(use)
+
+        await asyncio.gather(*([exectools.to_thread(use_sync) for _ in range(4)] + [use_async() for _ in range(4)]))
+        self.assertEqual(2, peak)
+        stats = limiter.stats()
+        self.assertEqual(8, stats.acquisitions)
+        self.assertEqual(2, stats.peak_in_use)
+        self.assertGreater(stats.waits, 0)
+        self.assertGreater(stats.peak_queue_depth, 0)
+
+    async def test_cancelled_waiter(self):
+        limiter = exectools.ResourceLimiter("test", limit=1)
+        limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+        # the cancelled waiter neither holds nor blocks the resource
+        await asyncio.wait_for(limiter.acquire_async(), 1)
+        limiter.release()
+
+    async def test_set_limit(self):
+        limiter = exectools.ResourceLimiter("test", limit=1)
+        limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        limiter.set_limit(0)  # no limit
+        await asyncio.wait_for(waiter, 1)
+        self.assertIsNone(limiter.limit)
+
+    async def test_registry(self):
+        with mock.patch.dict(exectools._resource_limiters, clear=True), \
+                mock.patch.dict(exectools._resource_limits, clear=True):
+            exectools.configure_resource_limits({"foo": 3})
+            self.assertEqual(3, exectools.get_resource_limiter("foo", 5).limit)
+            self.assertEqual(5, exectools.get_resource_limiter("bar", 5).limit)
+            self.assertIs(exectools.get_resource_limiter("bar"), exectools.get_resource_limiter("bar"))
+            exectools.configure_resource_limits({"bar": 7})
+            self.assertEqual(7, exectools.get_resource_limiter("bar").limit)
+
+            @exectools.limit_concurrency(resource="foo")
+            async def f():
+                return 1
+
+            self.assertEqual(1, await f())
+            self.assertEqual(1, exectools.get_resource_limiter_stats()["foo"].acquisitions)
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import yaml
+
+from doozerlib import gitdata
+
+
+class TestGitData(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.tmp_dir, "data")
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+        os.makedirs(os.path.join(self.data_dir, "images"))
+        with open(os.path.join(self.data_dir, "images", "foo.yml"), "w") as f:
+            f.write("name: openshift/foo\nversion: '{MAJOR}.{MINOR}'\n")
+        with open(os.path.join(self.data_dir, "images", "bar.yml"), "w") as f:
+            f.write("name: openshift/bar\nmode: disabled\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _gitdata(self):
+        data = gitdata.GitData(logger=mock.MagicMock(), parse_cache_dir=self.cache_dir)
+        data.data_dir = self.data_dir
+        return data
+
+    def test_load_data_parses_once(self):
+        data = self._gitdata()
+        with mock.patch("yaml.load", wraps=yaml.load) as yaml_load:
+            all_images = data.load_data(path="images")
+            images = data.load_data(path="images", replace_vars={"MAJOR": 4, "MINOR": 15})
+            # bar has no variables to replace, so its content was already parsed
+            self.assertEqual(yaml_load.call_count, 3)
+        self.assertEqual(all_images["foo"].data["version"], "{MAJOR}.{MINOR}")
+        self.assertEqual(images["foo"].data["version"], "4.15")
+        self.assertEqual(images["bar"].data, all_images["bar"].data)
+        # each load gets its own copy of the data
+        images["bar"].data["mode"] = "enabled"
+        self.assertEqual(data.load_data(path="images", key="bar").data["mode"], "disabled")
+
+    def test_parse_cache_dir(self):
+        self._gitdata().load_data(path="images")
+        with mock.patch("yaml.load") as yaml_load:
+            images = self._gitdata().load_data(path="images")
+            yaml_load.assert_not_called()
+        self.assertEqual(images["foo"].data["name"], "openshift/foo")
+
+    def test_parse_cache_dir_json_only(self):
+        data = self._gitdata()
+        self.assertEqual(data.parse("name: foo\n"), {"name": "foo"})
+        self.assertEqual(data.parse("released: 2024-01-01\n")["released"].year, 2024)
+        self.assertEqual(data.parse("8: rhel\n"), {8: "rhel"})
+        # entries are JSON; data which JSON cannot represent faithfully is not persisted
+        entries = [os.path.join(root, f) for root, _, files in os.walk(self.cache_dir) for f in files]
+        self.assertEqual(len(entries), 1)
+        with open(entries[0]) as f:
+            self.assertEqual(json.load(f), {"name": "foo"})
+        with mock.patch("yaml.load", wraps=yaml.load) as yaml_load:
+            self.assertEqual(self._gitdata().parse("8: rhel\n"), {8: "rhel"})
+            self.assertEqual(self._gitdata().parse("name: foo\n"), {"name": "foo"})
+            self.assertEqual(yaml_load.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -166,12 +166,12 @@ class TestImageMetadata(unittest.TestCase):
 
 class TestArchiveImageInspector(IsolatedAsyncioTestCase):
     @mock.patch("doozerlib.repos.Repo.get_repodata_threadsafe")
-    @mock.patch("doozerlib.image.ArchiveImageInspector.get_installed_rpm_dicts")
+    @mock.patch("doozerlib.image.ArchiveImageInspector.get_installed_rpm_dicts_async")
     @mock.patch("doozerlib.image.ArchiveImageInspector.image_arch")
     @mock.patch("doozerlib.image.ArchiveImageInspector.get_image_meta")
     @mock.patch("doozerlib.image.ArchiveImageInspector.get_brew_build_id")
     async def test_find_non_latest_rpms(self, get_brew_build_id: mock.Mock, get_image_meta: mock.Mock,
-                                        image_arch: mock.Mock, get_installed_rpm_dicts: mock.Mock,
+                                        image_arch: mock.Mock, get_installed_rpm_dicts_async: mock.AsyncMock,
                                         get_repodata_threadsafe: mock.AsyncMock):
         runtime = mock.MagicMock(repos=Repos({
             "rhel-8-baseos-rpms": {"conf": {"baseurl": {"x86_64": "fake_url"}}, "content_set": {"default": "fake"}},
@@ -193,13 +193,53 @@ class TestArchiveImageInspector(IsolatedAsyncioTestCase):
                 Rpm.from_dict({'name': 'bar', 'version': '1.1.0', 'release': '1.el9', 'epoch': '0', 'arch': 'x86_64', 'nvr': 'bar-1.1.0-1.el9'}),
             ]
         )
-        get_installed_rpm_dicts.return_value = [
+        get_installed_rpm_dicts_async.return_value = [
             {'name': 'foo', 'version': '1.0.0', 'release': '1.el9', 'epoch': '0', 'arch': 'x86_64', 'nvr': 'foo-1.0.0-1.el9'},
             {'name': 'bar', 'version': '1.0.0', 'release': '1.el9', 'epoch': '0', 'arch': 'x86_64', 'nvr': 'bar-1.0.0-1.el9'},
         ]
         inspector = image.ArchiveImageInspector(runtime, archive, brew_build_inspector)
         actual = await inspector.find_non_latest_rpms()
         get_image_meta.assert_called_once_with()
-        get_installed_rpm_dicts.assert_called_once_with()
+        get_installed_rpm_dicts_async.assert_awaited_once_with()
         get_repodata_threadsafe.assert_awaited()
         self.assertEqual(actual, [('bar-0:1.0.0-1.el9.x86_64', 'bar-0:1.1.0-1.el9.x86_64', 'rhel-8-appstream-rpms')])
+
+
+class TestBrewBuildImageInspector(unittest.TestCase):
+    def test_get_many_and_prefetch(self):
+        koji_api = mock.MagicMock()
+        runtime = mock.MagicMock()
+        runtime.pooled_koji_client_session.return_value.__enter__.return_value = koji_api
+        m = koji_api.multicall.return_value.__enter__.return_value
+
+        def build(nvr, build_id):
+            return {"id": build_id, "nvr": nvr, "extra": {"image": {"index": {"pull": [f"registry/{nvr}"]}}}}
+        m.getBuild.side_effect = lambda b, *_: mock.Mock(result=build(b, hash(b) % 1000))
+        inspectors = image.BrewBuildImageInspector.get_many(runtime, ["a-1-1", "b-1-1"])
+        self.assertEqual([i.get_nvr() for i in inspectors], ["a-1-1", "b-1-1"])
+        self.assertEqual(koji_api.multicall.call_count, 1)
+
+        m.listArchives.side_effect = lambda build_id: mock.Mock(result=[
+            {"id": build_id * 10, "build_id": build_id, "btype": "image", "extra": {"image": {"arch": "x86_64"}}},
+            {"id": build_id * 10 + 1, "build_id": build_id, "btype": "remote-sources"},
+        ])
+        m.listRPMs.side_effect = lambda _, imageID: mock.Mock(result=[{"nvr": f"pkg-{imageID}", "build_id": 7}, {"nvr": "common", "build_id": 8}])
+        m.getBuild.side_effect = lambda build_id, *_: mock.Mock(result={"id": build_id, "package_name": f"package{build_id}"})
+        koji_api.multicall.reset_mock()
+        image.BrewBuildImageInspector.prefetch(runtime, inspectors)
+        self.assertEqual(koji_api.multicall.call_count, 3)
+        self.assertEqual(m.listRPMs.call_count, 2)  # only image archives
+        self.assertEqual(m.getBuild.call_count, 2)  # each distinct package build once
+
+        # nothing is queried lazily afterwards
+        koji_api.reset_mock()
+        self.assertEqual(set(inspectors[0].get_all_installed_package_build_dicts()), {"package7", "package8"})
+        self.assertEqual(len(inspectors[1].get_all_installed_rpm_dicts()), 2)
+        koji_api.listArchives.assert_not_called()
+        koji_api.listRPMs.assert_not_called()
+        koji_api.getBuild.assert_not_called()
+
+        # prefetching again does not query koji
+        koji_api.multicall.reset_mock()
+        image.BrewBuildImageInspector.prefetch(runtime, inspectors)
+        koji_api.multicall.assert_not_called()
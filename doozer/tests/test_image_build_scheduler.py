@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from doozerlib import exectools
+from doozerlib.image_build_scheduler import ImageBuildScheduler
+
+
+class TestImageBuildScheduler(TestCase):
+
+    def _dgr(self, key, dependencies):
+        dgr = MagicMock()
+        dgr.metadata.distgit_key = key
+        dgr.get_build_dependencies.return_value = dependencies
+        return dgr
+
+    def test_run(self):
+        dgrs = [
+            self._dgr("base", []),
+            self._dgr("builder", []),
+            self._dgr("child", ["base", "builder"]),
+            self._dgr("grandchild", ["child", "not-included"]),
+            self._dgr("broken", []),
+            self._dgr("broken-child", ["broken"]),
+        ]
+        runtime = MagicMock()
+        runtime.resolve_image.side_effect = lambda name, required: None if name == "not-included" else MagicMock(distgit_key=name)
+
+        lock = threading.Lock()
+        finished = {}
+        running = []
+        max_running = []
+
+        def build(dgr):
+            key = dgr.metadata.distgit_key
+            with lock:
+                # every dependency must have finished building first
+                for dependency in dgr.get_build_dependencies():
+                    if dependency != "not-included":
+                        self.assertIn(dependency, finished)
+                running.append(key)
+                max_running.append(len(running))
+            # like build_container, fail if a dependency failed
+            success = key != "broken" and all(finished.get(dependency, True) for dependency in dgr.get_build_dependencies())
+            with lock:
+                running.remove(key)
+                finished[key] = success
+            return key, success
+
+        scheduler = ImageBuildScheduler(runtime, build, max_concurrent_builds=2)
+        results = asyncio.run(scheduler.run(dgrs))
+
+        self.assertEqual(results, [
+            ("base", True), ("builder", True), ("child", True), ("grandchild", True), ("broken", False), ("broken-child", False),
+        ])
+        self.assertLessEqual(max(max_running), 2)
+
+    def test_run_with_error(self):
+        dgrs = [self._dgr("base", []), self._dgr("child", ["base"])]
+        runtime = MagicMock()
+        runtime.resolve_image.side_effect = lambda name, required: MagicMock(distgit_key=name)
+
+        def build(dgr):
+            if dgr.metadata.distgit_key == "base":
+                raise ValueError("boom")
+            return dgr.metadata.distgit_key, True
+
+        results = asyncio.run(ImageBuildScheduler(runtime, build).run(dgrs))
+        self.assertEqual(results, [("base", False), ("child", True)])
+
+    def test_run_cancelled(self):
+        dgrs = [self._dgr("base", []), self._dgr("child", ["base"])]
+        runtime = MagicMock()
+        runtime.resolve_image.side_effect = lambda name, required: MagicMock(distgit_key=name)
+        started = threading.Event()
+        terminate_event = threading.Event()
+
+        def build(dgr):
+            started.set()
+            # like build_container, stop when asked to
+            terminate_event.wait(10)
+            return dgr.metadata.distgit_key, False
+
+        on_cancel = MagicMock(side_effect=terminate_event.set)
+        scheduler = ImageBuildScheduler(runtime, build, on_cancel=on_cancel)
+
+        async def cancel_run():
+            task = asyncio.create_task(scheduler.run(dgrs))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 10)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        with patch.object(exectools.TrackingThreadPoolExecutor, "cancel_pending", autospec=True) as cancel_pending:
+            asyncio.run(cancel_run())
+        cancel_pending.assert_called_once()
+        on_cancel.assert_called_once_with()
+        self.assertTrue(terminate_event.is_set())
@@ -0,0 +1,88 @@
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from doozerlib import koji_cache
+from doozerlib.koji_cache import KojiCachePolicy, KojiCacheStore
+
+
+class TestKojiCachePolicy(unittest.TestCase):
+    def test_classify_call(self):
+        self.assertEqual(koji_cache.classify_call('getBuild', (1,), {}, {'id': 1, 'state': 1}), KojiCachePolicy.IMMUTABLE)
+        self.assertEqual(koji_cache.classify_call('getBuild', (1,), {}, {'id': 1, 'state': 0}), KojiCachePolicy.VOLATILE)
+        self.assertEqual(koji_cache.classify_call('getBuild', (1,), {}, None), KojiCachePolicy.VOLATILE)
+        self.assertEqual(koji_cache.classify_call('listRPMs', (), {'imageID': 1}, [{'id': 2}]), KojiCachePolicy.IMMUTABLE)
+        self.assertEqual(koji_cache.classify_call('listArchives', (), {'buildID': 1}, []), KojiCachePolicy.VOLATILE)
+        self.assertEqual(koji_cache.classify_call('listTagged', ('tag',), {'event': 123}, []), KojiCachePolicy.EVENT_BOUNDED)
+        self.assertEqual(koji_cache.classify_call('listTagged', ('tag',), {}, []), KojiCachePolicy.VOLATILE)
+        self.assertEqual(koji_cache.classify_call('queryHistory', (), {'beforeEvent': 124}, {}), KojiCachePolicy.EVENT_BOUNDED)
+        self.assertEqual(koji_cache.classify_call('listBuilds', (), {'completeBefore': 1000.0}, []), KojiCachePolicy.EVENT_BOUNDED)
+        self.assertEqual(koji_cache.classify_call('listBuilds', (), {'completeBefore': None}, []), KojiCachePolicy.VOLATILE)
+        self.assertEqual(koji_cache.classify_call('listBuilds', (), {'createdBefore': 1000.0}, []), KojiCachePolicy.VOLATILE)
+        self.assertEqual(koji_cache.classify_call('listTags', (), {'build': 'a-1-1'}, [{'name': 'x'}]), KojiCachePolicy.VOLATILE)
+
+    def test_split_multicall_params(self):
+        self.assertEqual(koji_cache.split_multicall_params((1, {'__starstar': True, 'strict': True})), ((1,), {'strict': True}))
+        self.assertEqual(koji_cache.split_multicall_params((1, {'strict': True})), ((1, {'strict': True}), {}))
+        self.assertEqual(koji_cache.split_multicall_params(()), ((), {}))
+
+
+class TestKojiCacheStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = KojiCacheStore(self.tmpdir.name, volatile_ttl=60)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def _key(name, args, kwargs=None):
+        return json.dumps({'method_name': name, 'args': args, 'kwargs': kwargs}, sort_keys=True)
+
+    def test_roundtrip_across_instances(self):
+        key = self._key('getBuild', [1])
+        build = {'id': 1, 'nvr': 'a-1-1', 'state': 1}
+        self.assertEqual(self.store.put(key, 'getBuild', (1,), None, build), KojiCachePolicy.IMMUTABLE)
+        self.assertGreater(self.store.bytes_written, 0)
+
+        # A fresh store over the same directory sees the entry
+        other = KojiCacheStore(self.tmpdir.name)
+        try:
+            self.assertEqual(other.get(key), (True, build))
+            self.assertGreater(other.bytes_read, 0)
+            self.assertEqual(other.get(self._key('getBuild', [2])), (False, None))
+        finally:
+            other.close()
+
+    @mock.patch("doozerlib.koji_cache.time.time")
+    def test_volatile_expiry(self, mock_time):
+        mock_time.return_value = 1000.0
+        immutable_key = self._key('getBuild', [1])
+        volatile_key = self._key('listTags', [], {'build': 1})
+        self.store.put(immutable_key, 'getBuild', (1,), None, {'id': 1, 'state': 1})
+        self.assertEqual(self.store.put(volatile_key, 'listTags', (), {'build': 1}, [{'name': 'x'}]), KojiCachePolicy.VOLATILE)
+        self.assertTrue(self.store.get(volatile_key)[0])
+
+        mock_time.return_value = 1061.0
+        self.assertFalse(self.store.get(volatile_key)[0])
+        self.assertTrue(self.store.get(immutable_key)[0])
+
+    def test_uncacheable(self):
+        calls = [{'methodName': 'getBuild', 'params': (1,)}]
+        key = self._key('multiCall', [calls])
+        self.assertEqual(self.store.put(key, 'multiCall', (calls,), None, [[{'id': 1, 'state': 1}]]), KojiCachePolicy.UNCACHEABLE)
+        self.assertFalse(self.store.get(key)[0])
+
+        no_ttl = KojiCacheStore(self.tmpdir.name, volatile_ttl=0)
+        try:
+            key = self._key('listTags', [], {'build': 1})
+            self.assertEqual(no_ttl.put(key, 'listTags', (), {'build': 1}, []), KojiCachePolicy.UNCACHEABLE)
+            self.assertFalse(no_ttl.get(key)[0])
+        finally:
+            no_ttl.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
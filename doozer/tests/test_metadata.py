@@ -15,6 +15,7 @@ class TestMetadata(TestCase):
     def setUp(self) -> None:
         data_obj = MagicMock(key="foo", filename="foo.yml", data={"name": "foo"})
         runtime = MagicMock()
+        runtime.get_cached_latest_build.return_value = (False, None)
         runtime.group_config.urls.cgit = "http://distgit.example.com/cgit"
         runtime.group_config.scan_freshness.threshold_hours = 6
         runtime.logger = Mock()
@@ -46,6 +47,7 @@ class TestMetadata(TestCase):
     def test_cgit_url(self):
         data_obj = MagicMock(key="foo", filename="foo.yml", data={"name": "foo"})
         runtime = MagicMock()
+        runtime.get_cached_latest_build.return_value = (False, None)
         runtime.group_config.urls.cgit = "http://distgit.example.com/cgit"
         meta = Metadata("image", runtime, data_obj)
         url = meta.cgit_file_url("some_path/some_file.txt", "abcdefg", "some-branch")
@@ -211,6 +213,21 @@ class TestMetadata(TestCase):
         ]
         self.assertEqual(meta.get_latest_build(default=None, extra_pattern='*.g1234567.*'), builds[1])
 
+    def test_get_latest_build_cached(self):
+        build = {"id": 1, "build_id": 1, "nvr": "foo-container-v4.7.0-1.p0.assembly.hotfix_a", "extra": {"foo": "bar"}}
+        self.runtime.get_cached_latest_build.return_value = (True, build)
+        found = self.meta.get_latest_build()
+        self.assertEqual(found, build)
+        # callers may modify the result without corrupting the cache
+        self.assertIsNot(found, build)
+        self.assertIsNot(found["extra"], build["extra"])
+        self.runtime.pooled_koji_client_session.assert_not_called()
+
+        # a search which found no build is cached too
+        self.runtime.get_cached_latest_build.return_value = (True, None)
+        self.assertEqual(self.meta.get_latest_build(default="none"), "none")
+        self.runtime.pooled_koji_client_session.assert_not_called()
+
     def test_get_latest_build_multi_target(self):
         meta = self.meta
         koji_mock = self.koji_mock
@@ -388,8 +405,7 @@ class TestMetadata(TestCase):
         ]
         self.assertEqual(meta.needs_rebuild().code, RebuildHintCode.DELAYING_NEXT_ATTEMPT)
 
-    @patch("doozerlib.metadata.exectools.cmd_assert", return_value=("296ac244f3e7fd2d937316639892f90f158718b0", ""))  # emulate response to ls-remote of openshift/release
-    def test_needs_rebuild_with_upstream(self, mock_cmd_assert):
+    def test_needs_rebuild_with_upstream(self):
         runtime = self.runtime
         meta = self.meta
         koji_mock = self.koji_mock
@@ -402,6 +418,7 @@ class TestMetadata(TestCase):
         runtime.downstream_commitish_overrides = {}
         koji_mock.listBuilds.side_effect = list_builds
         ls_remote_commit = '296ac244f3e7fd2d937316639892f90f158718b0'
+        runtime.detect_remote_source_branch.return_value = ('release-4.7', ls_remote_commit)  # emulate resolving openshift/release
 
         meta.config.content = Model(dict_to_model={
             'source': {
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import ANY, MagicMock, patch
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
 
 from doozerlib import constants
 from doozerlib.distgit import ImageDistGitRepo
@@ -26,6 +26,7 @@ class TestOSBS2Builder(unittest.IsolatedAsyncioTestCase):
 
     def test_construct_build_source_url(self):
         runtime = MagicMock()
+        runtime.get_cached_latest_build.return_value = (False, None)
         osbs2 = OSBS2Builder(runtime)
         meta = self._make_image_meta(runtime)
         dg = ImageDistGitRepo(meta, autoclone=False)
@@ -40,6 +41,7 @@ class TestOSBS2Builder(unittest.IsolatedAsyncioTestCase):
 
     async def test_start_build(self):
         runtime = MagicMock()
+        runtime.get_cached_latest_build.return_value = (False, None)
         osbs2 = OSBS2Builder(runtime)
         meta = self._make_image_meta(runtime)
         dg = ImageDistGitRepo(meta, autoclone=False)
@@ -71,13 +73,14 @@ class TestOSBS2Builder(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(task_url, f"{constants.BREWWEB_URL}/taskinfo?taskID=12345")
 
     @patch("doozerlib.exectools.cmd_gather", return_value=(0, "", ""))
-    @patch("doozerlib.brew.watch_task", return_value=None)
+    @patch("doozerlib.brew.watch_task_async", return_value=None)
     @patch("doozerlib.osbs2_builder.OSBS2Builder._start_build", return_value=(12345, f"{constants.BREWWEB_URL}/taskinfo?taskID=12345"))
-    async def test_build(self, _start_build: MagicMock, watch_task: MagicMock, cmd_gather: MagicMock):
+    async def test_build(self, _start_build: MagicMock, watch_task_async: AsyncMock, cmd_gather: MagicMock):
         koji_api = MagicMock(logged_in=False)
         koji_api.getTaskResult = MagicMock(return_value={"koji_builds": [42]})
         koji_api.getBuild = MagicMock(return_value={"id": 42, "nvr": "foo-v4.12.0-12345.p0.assembly.test"})
         runtime = MagicMock()
+        runtime.get_cached_latest_build.return_value = (False, None)
         runtime.build_retrying_koji_client = MagicMock(return_value=koji_api)
         osbs2 = OSBS2Builder(runtime)
         meta = self._make_image_meta(runtime)
@@ -101,7 +104,7 @@ class TestOSBS2Builder(unittest.IsolatedAsyncioTestCase):
         koji_api.tagBuild.assert_called_once_with('rhaos-4.12-rhel-8-hotfix', "foo-v4.12.0-12345.p0.assembly.test")
         runtime.build_retrying_koji_client.assert_called_once_with()
         _start_build.assert_called_once_with(dg, 'rhaos-4.12-rhel-8-containers-candidate', {'signing_intent': 'release', 'repo_type': 'signed', 'repo_list': []}, koji_api)
-        watch_task.assert_called_once_with(koji_api, ANY, 12345, ANY)
+        watch_task_async.assert_awaited_once_with(koji_api, ANY, 12345)
         cmd_gather.assert_called_once_with(['brew', 'download-logs', '--recurse', '-d', ANY, 12345])
 
 
@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from doozerlib import registry
+
+
+class _FakeResponse:
+    def __init__(self, status, headers=None, body=None):
+        self.status = status
+        self.headers = headers or {}
+        self.body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        pass
+
+    async def json(self, content_type=None):
+        return self.body
+
+    async def read(self):
+        return json.dumps(self.body).encode()
+
+
+class TestRegistry(unittest.IsolatedAsyncioTestCase):
+    def test_parse_pullspec(self):
+        self.assertEqual(registry.parse_pullspec("quay.io/org/repo:sha256-abc"), ("quay.io", "org/repo", "sha256-abc"))
+        self.assertEqual(registry.parse_pullspec("quay.io/org/repo@sha256:abc"), ("quay.io", "org/repo", "sha256:abc"))
+        self.assertEqual(registry.parse_pullspec("localhost:5000/repo"), ("localhost:5000", "repo", "latest"))
+        with self.assertRaises(ValueError):
+            registry.parse_pullspec("repo:tag")
+
+    def test_load_registry_auths(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            auth_file = os.path.join(tmpdir, "config.json")
+            with open(auth_file, "w") as f:
+                json.dump({"auths": {"https://quay.io": {"auth": "a"}, "quay.io/org": {"auth": "b"}, "other.io": {}}}, f)
+            client = registry.RegistryClient(auth_file=auth_file)
+        self.assertEqual(client.auths, {"quay.io": "a", "quay.io/org": "b"})
+        self.assertEqual(client._get_basic_auth("quay.io", "org/repo"), "b")
+        self.assertEqual(client._get_basic_auth("quay.io", "organization/repo"), "a")
+        self.assertIsNone(client._get_basic_auth("registry.example.com", "org/repo"))
+
+    async def test_manifest_exists(self):
+        client = registry.RegistryClient(auth_file="/nonexistent")
+        session = mock.Mock()
+        challenge = 'Bearer realm="https://quay.io/v2/auth",service="quay.io",scope="repository:org/repo:pull"'
+        session.request.side_effect = [
+            _FakeResponse(401, {"WWW-Authenticate": challenge}),
+            _FakeResponse(200),
+            _FakeResponse(404),
+        ]
+        session.get.return_value = _FakeResponse(200, body={"token": "t0ken"})
+        with mock.patch.object(client, "_get_session", return_value=session):
+            self.assertTrue(await client.manifest_exists("quay.io/org/repo:a"))
+            self.assertFalse(await client.manifest_exists("quay.io/org/repo:b"))
+        # the token is requested once and reused
+        session.get.assert_called_once_with("https://quay.io/v2/auth", params={"scope": "repository:org/repo:pull", "service": "quay.io"}, headers={})
+        self.assertEqual(session.request.call_args.kwargs["headers"]["Authorization"], "Bearer t0ken")
+        self.assertEqual(session.request.call_args.args, ("HEAD", "https://quay.io/v2/org/repo/manifests/b"))
+
+    async def test_manifest_exists_error(self):
+        client = registry.RegistryClient(auth_file="/nonexistent")
+        session = mock.Mock()
+        session.request.return_value = _FakeResponse(500)
+        with mock.patch.object(client, "_get_session", return_value=session), self.assertRaises(registry.RegistryError):
+            await client.manifest_exists("quay.io/org/repo:a")
+
+    async def test_get_image_config(self):
+        client = registry.RegistryClient(auth_file="/nonexistent")
+        session = mock.Mock()
+        session.request.side_effect = [
+            _FakeResponse(200, body={"schemaVersion": 2, "config": {"digest": "sha256:c0nfig"}}),
+            _FakeResponse(200, body={"config": {"Labels": {"version": "1.0"}}}),
+            _FakeResponse(200, body={"schemaVersion": 2, "manifests": []}),
+        ]
+        with mock.patch.object(client, "_get_session", return_value=session):
+            config = await client.get_image_config("quay.io/org/repo@sha256:abc")
+            self.assertEqual(config["config"]["Labels"]["version"], "1.0")
+            self.assertEqual(session.request.call_args.args, ("GET", "https://quay.io/v2/org/repo/blobs/sha256:c0nfig"))
+            with self.assertRaises(registry.RegistryError):  # manifest list
+                await client.get_image_config("quay.io/org/repo:latest")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from doozerlib.remote_refs import RemoteRefResolver
+
+LS_REMOTE_OUTPUT = """296ac244f3e7fd2d937316639892f90f158718b0\trefs/heads/release-4.8
+7e66b10fbcd6bb4988275ffad0a69f563695901f\trefs/heads/main
+1111111111111111111111111111111111111111\trefs/tags/release-4.8
+2222222222222222222222222222222222222222\trefs/tags/v1.0
+3333333333333333333333333333333333333333\trefs/tags/v1.0^{}
+"""
+
+
+class TestRemoteRefResolver(TestCase):
+
+    def test_parse_ls_remote(self):
+        refs = RemoteRefResolver.parse_ls_remote(LS_REMOTE_OUTPUT + "\n")
+        self.assertEqual(len(refs), 5)
+        self.assertEqual(refs["refs/heads/main"], "7e66b10fbcd6bb4988275ffad0a69f563695901f")
+
+    @patch("doozerlib.remote_refs.exectools.cmd_assert", return_value=(LS_REMOTE_OUTPUT, ""))
+    def test_resolve(self, cmd_assert):
+        resolver = RemoteRefResolver()
+        self.assertEqual(resolver.resolve("https://example.com/repo.git", "release-4.8"), "296ac244f3e7fd2d937316639892f90f158718b0")
+        self.assertEqual(resolver.resolve("https://example.com/repo.git", "refs/tags/release-4.8"), "1111111111111111111111111111111111111111")
+        self.assertEqual(resolver.resolve("https://example.com/repo.git", "v1.0"), "2222222222222222222222222222222222222222")
+        self.assertIsNone(resolver.resolve("https://example.com/repo.git", "v1.0", heads_only=True))
+        self.assertIsNone(resolver.resolve("https://example.com/repo.git", "ain"))
+        cmd_assert.assert_called_once_with(["git", "ls-remote", "--heads", "--tags", "https://example.com/repo.git"], retries=5, pollrate=5)
+
+    @patch("doozerlib.remote_refs.exectools.cmd_assert")
+    def test_prefetch(self, cmd_assert):
+        def ls_remote(cmd, **kwargs):
+            if cmd[-1] == "https://example.com/bad.git":
+                raise ChildProcessError("boom")
+            return LS_REMOTE_OUTPUT, ""
+        cmd_assert.side_effect = ls_remote
+
+        resolver = RemoteRefResolver(max_concurrency=2)
+        resolver.prefetch(["https://example.com/a.git", "https://example.com/b.git", "https://example.com/a.git", "https://example.com/bad.git"])
+        self.assertEqual(cmd_assert.call_count, 3)
+
+        # Successful listings are memoized; failed ones are attempted again
+        self.assertEqual(resolver.resolve("https://example.com/b.git", "main"), "7e66b10fbcd6bb4988275ffad0a69f563695901f")
+        with self.assertRaises(ChildProcessError):
+            resolver.get_refs("https://example.com/bad.git")
+        self.assertEqual(cmd_assert.call_count, 4)
@@ -4,7 +4,8 @@ Test the Repo class
 """
 import unittest
 from unittest.mock import ANY, Mock, patch
-from doozerlib.repos import Repo
+from doozerlib.repodata import Repodata, Rpm
+from doozerlib.repos import Repo, Repos
 
 EXPECTED_BASIC_REPO = """[rhaos-4.4-rhel-8-build]
 baseurl = http://download-node-02.eng.bos.redhat.com/brewroot/repos/rhaos-4.4-rhel-8-build/latest/x86_64/
@@ -182,3 +183,14 @@ class TestRepo(unittest.IsolatedAsyncioTestCase):
 
         # Implicitly assert that this does _not_ raise an exception
         Repo('no-config-set-arches', self.no_config_set_arches_repo, self.arches)
+
+    @patch("doozerlib.repos.Repo.get_repodata_threadsafe")
+    async def test_get_repo_index(self, get_repodata_threadsafe: Mock):
+        get_repodata_threadsafe.return_value = Repodata(name="test-x86_64", primary_rpms=[Rpm.from_nevra("foo-0:2.0.0-1.el8.x86_64")])
+        repos = Repos({"a": self.repo_config, "b": self.repo_config}, self.arches)
+        index = await repos.get_repo_index(["a", "b"], "x86_64")
+        self.assertIs(await repos.get_repo_index(["b", "a", "b"], "x86_64"), index)
+        self.assertEqual(get_repodata_threadsafe.await_count, 2)
+        self.assertIsNot(await repos.get_repo_index(["a"], "x86_64"), index)
+        self.assertEqual(index.find_non_latest_rpms([Rpm.from_nevra("foo-0:1.0.0-1.el8.x86_64").to_dict()]),
+                         [("foo-0:1.0.0-1.el8.x86_64", "foo-0:2.0.0-1.el8.x86_64", "test-x86_64")])
@@ -1,9 +1,13 @@
+import gzip
+import os
+import tempfile
 from io import StringIO
+from pathlib import Path
 from typing import Optional
 from unittest import TestCase, IsolatedAsyncioTestCase
 from unittest.mock import ANY, AsyncMock, MagicMock, Mock, patch
 
-from doozerlib.repodata import OutdatedRPMFinder, Repodata, RepodataLoader, Rpm, RpmModule
+from doozerlib.repodata import OutdatedRPMFinder, Repodata, RepodataLoader, RepoIndex, Rpm, RpmModule
 import xml.etree.ElementTree as ET
 from ruamel.yaml import YAML
 
@@ -138,15 +142,10 @@ data:
 
 
 class TestRepodataLoader(IsolatedAsyncioTestCase):
-    @patch("doozerlib.repodata.RepodataLoader._fetch_remote_gzip", autospec=True)
-    @patch("aiohttp.ClientSession", autospec=True)
-    async def test_load(self, ClientSession: Mock, _fetch_remote_gzip: AsyncMock):
-        repo_name = "test-x86_64"
-        repo_url = "https://example.com/repos/test/x86_64/os"
-        loader = RepodataLoader()
-        session = ClientSession.return_value.__aenter__.return_value = Mock(name="session")
-        resp = session.get.return_value = AsyncMock(name="get")
-        resp.__aenter__.return_value.text.return_value = """<?xml version="1.0" encoding="UTF-8"?>
+    REPO_URL = "https://example.com/repos/test/x86_64/os"
+    PRIMARY_URL = "https://example.com/repos/test/x86_64/os/repodata/06ed3172b751202671416050ea432945e54a36ee1ab8ef2cc71307234343f1ef-primary.xml.gz"
+    MODULES_URL = "https://example.com/repos/test/x86_64/os/repodata/454ea63462df316e80d93b60ce07e4f523bc06dd1989e878cf2df6ee2a762a34-modules.yaml.gz"
+    REPOMD_XML = """<?xml version="1.0" encoding="UTF-8"?>
 <repomd xmlns="http://linux.duke.edu/metadata/repo" xmlns:rpm="http://linux.duke.edu/metadata/rpm">
   <revision>1689150070</revision>
   <data type="primary">
@@ -167,10 +166,8 @@ class TestRepodataLoader(IsolatedAsyncioTestCase):
   </data>
 </repomd>
 """
-
-        def _fake_fetch_remote_gzip(_, url: Optional[str]):
-            primary_xml = """<?xml version="1.0" encoding="UTF-8"?>
-<metadata packages="2" xmlns="http://linux.duke.edu/metadata/common" xmlns:rpm="http://linux.duke.edu/metadata/rpm">
+    PRIMARY_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<metadata packages="3" xmlns="http://linux.duke.edu/metadata/common" xmlns:rpm="http://linux.duke.edu/metadata/rpm">
     <package type="rpm">
         <name>foo</name>
         <arch>x86_64</arch>
@@ -181,9 +178,14 @@ class TestRepodataLoader(IsolatedAsyncioTestCase):
         <arch>x86_64</arch>
         <version epoch="1" rel="1.el9" ver="2.2.3" />
     </package>
+    <package type="srpm">
+        <name>baz</name>
+        <arch>src</arch>
+        <version epoch="0" rel="1.el9" ver="1.0.0" />
+    </package>
 </metadata>
 """
-            modules_yaml = """
+    MODULES_YAML = """
 ---
 document: modulemd
 version: 2
@@ -193,6 +195,9 @@ data:
     version: 1
     context: deadbeef
     arch: x86_64
+    artifacts:
+        rpms:
+        - foo-1:1.2.3-1.el9.x86_64
 ---
 document: modulemd
 version: 2
@@ -203,24 +208,76 @@ data:
     context: beefdead
     arch: x86_64
 """
-            if not url:
-                return b''
-            if url.endswith("primary.xml.gz"):
-                return primary_xml.encode()
-            if url.endswith("modules.yaml.gz"):
-                return modules_yaml.encode()
-            raise ValueError("url")
-        _fetch_remote_gzip.side_effect = _fake_fetch_remote_gzip
-        repodata = await loader.load(repo_name, repo_url)
-        _fetch_remote_gzip.assert_any_await(ANY, "https://example.com/repos/test/x86_64/os/repodata/06ed3172b751202671416050ea432945e54a36ee1ab8ef2cc71307234343f1ef-primary.xml.gz")
-        _fetch_remote_gzip.assert_any_await(ANY, "https://example.com/repos/test/x86_64/os/repodata/454ea63462df316e80d93b60ce07e4f523bc06dd1989e878cf2df6ee2a762a34-modules.yaml.gz")
-        self.assertEqual(repodata.name, repo_name)
+
+    def _mock_session(self, ClientSession: Mock):
+        session = ClientSession.return_value.__aenter__.return_value = Mock(name="session")
+
+        def _get(url: str):
+            resp = AsyncMock(name=f"get {url}")
+            resp.__aenter__.return_value.raise_for_status = Mock()
+            if url.endswith("repomd.xml"):
+                resp.__aenter__.return_value.text.return_value = self.REPOMD_XML
+            elif url == self.PRIMARY_URL:
+                compressed = gzip.compress(self.PRIMARY_XML.encode())
+
+                async def _iter_chunked(size: int):
+                    for i in range(0, len(compressed), 16):  # exercise the incremental parser
+                        yield compressed[i:i + 16]
+                resp.__aenter__.return_value.content.iter_chunked = _iter_chunked
+            else:
+                raise ValueError(url)
+            return resp
+        session.get.side_effect = _get
+        return session
+
+    @staticmethod
+    def _fake_fetch_remote_gzip(_, url: Optional[str]):
+        if not url:
+            return b''
+        if url == TestRepodataLoader.MODULES_URL:
+            return TestRepodataLoader.MODULES_YAML.encode()
+        raise ValueError(url)
+
+    def _assert_repodata(self, repodata: Repodata):
+        self.assertEqual(repodata.name, "test-x86_64")
         self.assertEqual(
             [rpm.nevra for rpm in repodata.primary_rpms],
             ["foo-1:1.2.3-1.el9.x86_64", "bar-1:2.2.3-1.el9.x86_64"])
         self.assertEqual(
             [m.nsvca for m in repodata.modules],
             ['aaa:rhel8:1:deadbeef:x86_64', 'bbb:rhel9:2:beefdead:x86_64'])
+        self.assertEqual(repodata.modules[0].rpms, {"foo-1:1.2.3-1.el9.x86_64"})
+
+    @patch("doozerlib.repodata.RepodataLoader._fetch_remote_gzip", autospec=True)
+    @patch("aiohttp.ClientSession", autospec=True)
+    async def test_load(self, ClientSession: Mock, _fetch_remote_gzip: AsyncMock):
+        loader = RepodataLoader()
+        session = self._mock_session(ClientSession)
+        _fetch_remote_gzip.side_effect = self._fake_fetch_remote_gzip
+        repodata = await loader.load("test-x86_64", self.REPO_URL)
+        session.get.assert_any_call(self.PRIMARY_URL)
+        _fetch_remote_gzip.assert_awaited_once_with(ANY, self.MODULES_URL)
+        self._assert_repodata(repodata)
+
+    @patch("doozerlib.repodata.RepodataLoader._fetch_remote_gzip", autospec=True)
+    @patch("aiohttp.ClientSession", autospec=True)
+    async def test_load_with_cache(self, ClientSession: Mock, _fetch_remote_gzip: AsyncMock):
+        session = self._mock_session(ClientSession)
+        _fetch_remote_gzip.side_effect = self._fake_fetch_remote_gzip
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # an entry for a previous version of the repository should be pruned
+            stale = Path(cache_dir, "test-x86_64.0000.none.json.gz")
+            stale.write_bytes(b"")
+
+            self._assert_repodata(await RepodataLoader(cache_dir=cache_dir).load("test-x86_64", self.REPO_URL))
+            self.assertEqual(session.get.call_count, 2)
+            self.assertFalse(stale.exists())
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            # repomd.xml is unchanged; only it is fetched again
+            self._assert_repodata(await RepodataLoader(cache_dir=cache_dir).load("test-x86_64", self.REPO_URL))
+            self.assertEqual(session.get.call_count, 3)
+            _fetch_remote_gzip.assert_awaited_once()
 
 
 class TestOutdatedRPMFinder(IsolatedAsyncioTestCase):
@@ -385,3 +442,47 @@ class TestOutdatedRPMFinder(IsolatedAsyncioTestCase):
             ('f-0:1.0.0-el8.x86_64', 'f-0:999.0.0-el8.x86_64', 'bravo-x86_64'),
         ]
         self.assertEqual(actual, expected)
+
+
+class TestRepoIndex(TestCase):
+    def test_find_non_latest_rpms_of_many_images(self):
+        index = RepoIndex([
+            Repodata(
+                name="alfa-x86_64",
+                primary_rpms=[
+                    Rpm.from_nevra("a-0:2.0.0-el8.x86_64"),
+                    Rpm.from_nevra("e-0:999.0.0-el8.x86_64"),
+                ],
+            ),
+            Repodata(
+                name="charlie-x86_64",
+                primary_rpms=[
+                    Rpm.from_nevra("e-0:1.0.0-el8.x86_64"),
+                    Rpm.from_nevra("e-0:1.1.0-el8.x86_64"),
+                ],
+                modules=[
+                    RpmModule(name="e", stream="1", version=1000, context="whatever", arch="x86_64", rpms={"e-0:1.0.0-el8.x86_64"}),
+                    RpmModule(name="e", stream="1", version=1001, context="whatever", arch="x86_64", rpms={"e-0:1.1.0-el8.x86_64"}),
+                ],
+            ),
+        ])
+        # the index is shared by the images built from the same repos
+        actual = {image: index.find_non_latest_rpms([Rpm.from_nevra(nevra).to_dict() for nevra in nevras], logger=MagicMock()) for image, nevras in {
+            "modular": ["a-0:1.0.0-el8.x86_64", "e-0:1.0.0-el8.x86_64"],
+            "modular-again": ["e-0:1.0.0-el8.x86_64"],
+            "non-modular": ["a-0:2.0.0-el8.x86_64", "e-0:5.0.0-el8.x86_64"],
+        }.items()}
+        self.assertEqual(actual, {
+            "modular": [
+                ("a-0:1.0.0-el8.x86_64", "a-0:2.0.0-el8.x86_64", "alfa-x86_64"),
+                ("e-0:1.0.0-el8.x86_64", "e-0:1.1.0-el8.x86_64", "charlie-x86_64"),
+            ],
+            "modular-again": [
+                ("e-0:1.0.0-el8.x86_64", "e-0:1.1.0-el8.x86_64", "charlie-x86_64"),
+            ],
+            "non-modular": [
+                ("e-0:5.0.0-el8.x86_64", "e-0:999.0.0-el8.x86_64", "alfa-x86_64"),
+            ],
+        })
+        # candidates of the same enabled module streams are only computed once
+        self.assertEqual(len(index._candidate_modular_rpms), 1)
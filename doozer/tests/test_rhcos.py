@@ -1,11 +1,12 @@
+import asyncio
 import json
 import logging
 import os
 import unittest
 from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock, Mock, patch
-from urllib.error import URLError
 
+import aiohttp
 import yaml
 
 from doozerlib import rhcos
@@ -20,15 +21,17 @@ class MockRuntime(object):
         self.logger = logger
         self.group_config = Model({})
         self.pooled_koji_client_session = MagicMock()
+        self.rhcos_metadata_cache = {}
 
 
-def _urlopen_json_cm(mock_urlopen, content, rc=200):
-    # serializes content as json and has the urlopen context manager return it
-    cm = MagicMock()
-    cm.getcode.return_value = rc
-    cm.read.return_value = bytes(json.dumps(content), 'utf-8')
-    cm.__enter__.return_value = cm
-    mock_urlopen.return_value = cm
+def _build_meta_side_effect(meta, commitmeta):
+    # returns the meta or commitmeta document requested from RHCOSBuildFinder.get_build_meta
+    return lambda build_id, arch=None, meta_type="meta": commitmeta if meta_type == "commitmeta" else meta
+
+
+def _image_config(version):
+    # the config of an RHCOS container image as returned by RegistryClient.get_image_config
+    return {"config": {"Labels": {"version": version}}}
 
 
 class TestRhcos(unittest.IsolatedAsyncioTestCase):
@@ -61,30 +64,32 @@ class TestRhcos(unittest.IsolatedAsyncioTestCase):
         self.assertIn("4.x-aarch64", rhcos.RHCOSBuildFinder(self.runtime, "4.9", "aarch64").rhcos_release_url())
         self.assertIn("4.9-s390x", rhcos.RHCOSBuildFinder(self.runtime, "4.9", "s390x").rhcos_release_url())
 
-    @patch('urllib.request.urlopen')
-    def test_build_id(self, mock_urlopen):
+    @patch('doozerlib.rhcos.RHCOSReleaseBrowser.get_builds')
+    def test_build_id(self, get_builds):
         builds = [{'id': 'id-1'}, {'id': 'id-2'}]
-        _urlopen_json_cm(mock_urlopen, dict(builds=builds))
-        self.assertEqual('id-1', rhcos.RHCOSBuildFinder(self.runtime, "4.4")._latest_rhcos_build_id())
-        self.assertIn('/rhcos-4.4/', mock_urlopen.call_args_list[0][0][0])
-
-    @patch('urllib.request.urlopen')
-    def test_build_id_no_builds(self, mock_urlopen):
-        _urlopen_json_cm(mock_urlopen, dict(builds=[]))
-        self.assertIsNone(rhcos.RHCOSBuildFinder(self.runtime, "4.2", "ppc64le")._latest_rhcos_build_id())
-        self.assertIn('/rhcos-4.2-ppc64le/', mock_urlopen.call_args_list[0][0][0])
-
-    @patch('urllib.request.urlopen')
-    def test_build_id_multi(self, mock_urlopen):
+        get_builds.return_value = dict(builds=builds)
+        self.assertEqual('id-1', rhcos.RHCOSBuildFinder(self.runtime, "4.4").latest_rhcos_build_id())
+        self.assertTrue(get_builds.call_args[0][0].endswith('/rhcos-4.4'))
+
+    @patch('doozerlib.rhcos.RHCOSReleaseBrowser.get_builds')
+    def test_build_id_no_builds(self, get_builds):
+        get_builds.return_value = dict(builds=[])
+        self.assertIsNone(rhcos.RHCOSBuildFinder(self.runtime, "4.2", "ppc64le").latest_rhcos_build_id())
+        self.assertTrue(get_builds.call_args[0][0].endswith('/rhcos-4.2-ppc64le'))
+
+    @patch('doozerlib.rhcos.RHCOSReleaseBrowser.get_builds')
+    @patch('doozerlib.rhcos.RHCOSBuildFinder.get_build_meta')
+    def test_build_id_multi(self, get_build_meta, get_builds):
+        get_build_meta.return_value = {}
         builds = [{'id': 'id-1', 'arches': ['arch1', 'arch2']}, {'id': 'id-2', 'arches': ['arch1', 'arch2', 'arch3']}]
-        _urlopen_json_cm(mock_urlopen, dict(builds=builds))
+        get_builds.return_value = dict(builds=builds)
         self.runtime.group_config.urls = Model(dict(rhcos_release_base=dict(multi='some_url')))
         self.runtime.group_config.arches = ['arch1', 'arch2', 'arch3']
-        self.assertEqual('id-2', rhcos.RHCOSBuildFinder(self.runtime, "4.4")._latest_rhcos_build_id())
+        self.assertEqual('id-2', rhcos.RHCOSBuildFinder(self.runtime, "4.4").latest_rhcos_build_id())
 
-    @patch('urllib.request.urlopen')
-    @patch('doozerlib.rhcos.RHCOSBuildFinder.rhcos_build_meta')
-    def test_build_id_build_release_job_completes(self, rhcos_build_meta, mock_urlopen):  # XXX: Change name
+    @patch('doozerlib.rhcos.RHCOSReleaseBrowser.get_builds')
+    @patch('doozerlib.rhcos.RHCOSBuildFinder.get_build_meta')
+    def test_build_id_build_release_job_completes(self, get_build_meta, get_builds):  # XXX: Change name
         # If not all required attributes exist, which can happen if the rhcos release job did not successfully complete, take the previous
         self.runtime.group_config.rhcos = Model(dict(payload_tags=[dict(name="spam", build_metadata_key="spam"),
                                                                    dict(name="eggs", primary=True, build_metadata_key="eggs")]))
@@ -101,21 +106,36 @@ class TestRhcos(unittest.IsolatedAsyncioTestCase):
             if build_id == 'id-2':
                 return {'spam': 'sha:345', 'eggs': 'sha:789'}
 
-        rhcos_build_meta.side_effect = mock_rhcos_build_meta
+        get_build_meta.side_effect = mock_rhcos_build_meta
         builds = [{'id': 'id-1', 'arches': ['arch1', 'arch2']}, {'id': 'id-2', 'arches': ['arch1', 'arch2']}]
-        _urlopen_json_cm(mock_urlopen, dict(builds=builds))
+        get_builds.return_value = dict(builds=builds)
         self.runtime.group_config.urls = Model(dict(rhcos_release_base=dict(multi='some_url')))
         self.runtime.group_config.arches = ['arch1', 'arch2']
-        self.assertEqual('id-2', rhcos.RHCOSBuildFinder(self.runtime, "4.14")._latest_rhcos_build_id())
+        self.assertEqual('id-2', rhcos.RHCOSBuildFinder(self.runtime, "4.14").latest_rhcos_build_id())
 
-    @patch('urllib.request.urlopen')
-    def test_build_find_failure(self, mock_urlopen):
-        mock_urlopen.side_effect = URLError("test")
+    @patch('doozerlib.rhcos.RHCOSReleaseBrowser.get_builds')
+    def test_build_find_failure(self, get_builds):
+        get_builds.side_effect = aiohttp.ClientConnectionError("test")
         with self.assertRaises(rhcos.RHCOSNotFound):
-            rhcos.RHCOSBuildFinder(self.runtime, "4.9")._latest_rhcos_build_id()
-
-    @patch('doozerlib.rhcos.RHCOSBuildFinder.latest_rhcos_build_id')
-    @patch('doozerlib.rhcos.RHCOSBuildFinder.rhcos_build_meta')
+            rhcos.RHCOSBuildFinder(self.runtime, "4.9").latest_rhcos_build_id()
+
+    async def test_release_browser_cache(self):
+        release_browser = rhcos.RHCOSReleaseBrowser(self.runtime)
+        with patch.object(release_browser, "_fetch_json", AsyncMock(return_value={"buildid": "id-1"})) as fetch_json:
+            metas = await asyncio.gather(*(release_browser.get_build_meta("https://example.com/rhcos-4.14", "id-1", "x86_64")
+                                           for _ in range(3)))
+            self.assertEqual(metas, [{"buildid": "id-1"}] * 3)
+            fetch_json.assert_awaited_once_with("https://example.com/rhcos-4.14/id-1/x86_64/meta.json")
+
+        # the document is cached for the runtime, so other clients do not read it again
+        release_browser = rhcos.RHCOSReleaseBrowser(self.runtime)
+        with patch.object(release_browser, "_fetch_json", AsyncMock()) as fetch_json:
+            await release_browser.get_build_meta("https://example.com/rhcos-4.14", "id-1", "x86_64")
+            await release_browser.get_build_meta("https://example.com/rhcos-4.14", "id-1", "s390x", meta_type="commitmeta")
+            fetch_json.assert_awaited_once_with("https://example.com/rhcos-4.14/id-1/s390x/commitmeta.json")
+
+    @patch('doozerlib.rhcos.RHCOSBuildFinder.find_latest_rhcos_build_id')
+    @patch('doozerlib.rhcos.RHCOSBuildFinder.get_build_meta')
     def test_latest_container(self, meta_mock, id_mock):
         # "normal" lookup
         id_mock.return_value = "dummy"
@@ -137,9 +157,9 @@ class TestRhcos(unittest.IsolatedAsyncioTestCase):
         self.runtime.group_config.rhcos = Model(dict(payload_tags=[alt_container]))
         self.assertEqual(("dummy", "test@sha256:abcd1234alt"), rhcos.RHCOSBuildFinder(self.runtime, "4.4").latest_container())
 
-    @patch('doozerlib.exectools.cmd_assert')
-    @patch('doozerlib.rhcos.RHCOSBuildFinder.rhcos_build_meta')
-    def test_rhcos_build_inspector(self, rhcos_build_meta_mock, cmd_assert_mock):
+    @patch('doozerlib.registry.RegistryClient.get_image_config')
+    @patch('doozerlib.rhcos.RHCOSBuildFinder.get_build_meta')
+    def test_rhcos_build_inspector(self, rhcos_build_meta_mock, get_image_config_mock):
         """
         Tests the RHCOS build inspector abstraction to ensure it correctly parses and utilizes
         pre-canned data.
@@ -151,8 +171,8 @@ class TestRhcos(unittest.IsolatedAsyncioTestCase):
         rpm_defs = yaml.safe_load(self.respath.joinpath('rhcos1', '47.83.202107261211-0.rpm_defs.yaml').read_text())
         pkg_build_dicts = yaml.safe_load(self.respath.joinpath('rhcos1', '47.83.202107261211-0.pkg_builds.yaml').read_text())
 
-        rhcos_build_meta_mock.side_effect = [rhcos_meta, rhcos_commitmeta]
-        cmd_assert_mock.return_value = ('{"config": {"config": {"Labels": {"version": "47.83.202107261211-0"}}}}', None)
+        rhcos_build_meta_mock.side_effect = _build_meta_side_effect(rhcos_meta, rhcos_commitmeta)
+        get_image_config_mock.return_value = _image_config("47.83.202107261211-0")
         test_digest = 'sha256:spamneggs'
         test_pullspec = f'somereg/somerepo@{test_digest}'
         pullspecs = {'machine-os-content': test_pullspec}
@@ -179,19 +199,19 @@ class TestRhcos(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(rhcos_build.get_package_build_objects()['dbus']['nvr'], 'dbus-1.12.8-12.el8_3')
         self.assertEqual(rhcos_build.get_container_digest(), test_digest)
 
-    @patch('doozerlib.exectools.cmd_assert')
-    @patch('doozerlib.rhcos.RHCOSBuildFinder.rhcos_build_meta')
-    def test_rhcos_build_inspector_extension(self, rhcos_build_meta_mock, cmd_assert_mock):
+    @patch('doozerlib.registry.RegistryClient.get_image_config')
+    @patch('doozerlib.rhcos.RHCOSBuildFinder.get_build_meta')
+    def test_rhcos_build_inspector_extension(self, rhcos_build_meta_mock, get_image_config_mock):
         """
         Tests the RHCOS build inspector to ensure it additionally includes RPMs from extensions.
         """
         # Data source: https://releases-rhcos-art.apps.ocp-virt.prod.psi.redhat.com/storage/prod/streams/4.13/builds/413.86.202212021619-0/x86_64/commitmeta.json
         rhcos_meta = json.loads(self.respath.joinpath('rhcos2', '4.13-meta.json').read_text())
         rhcos_commitmeta = json.loads(self.respath.joinpath('rhcos2', '4.13-commitmeta.json').read_text())
-        rhcos_build_meta_mock.side_effect = [rhcos_meta, rhcos_commitmeta]
+        rhcos_build_meta_mock.side_effect = _build_meta_side_effect(rhcos_meta, rhcos_commitmeta)
 
         pullspecs = {'machine-os-content': 'somereg/somerepo@sha256:spamneggs'}
-        cmd_assert_mock.return_value = ('{"config": {"config": {"Labels": {"version": "412.86.bogus"}}}}', None)
+        get_image_config_mock.return_value = _image_config("412.86.bogus")
 
         rhcos_build = rhcos.RHCOSBuildInspector(self.runtime, pullspecs, 'x86_64')
 
@@ -200,14 +220,40 @@ class TestRhcos(unittest.IsolatedAsyncioTestCase):
         self.assertIn("qemu-img-6.2.0-11.module+el8.6.0+16538+01ea313d.6",
                       rhcos_build.get_rpm_nvrs())  # epoch stripped
 
-    @patch('doozerlib.exectools.cmd_assert')
-    @patch('doozerlib.rhcos.RHCOSBuildFinder.rhcos_build_meta')
-    def test_inspector_get_container_pullspec(self, rhcos_build_meta_mock, cmd_assert_mock):
+    @patch('doozerlib.exectools.cmd_assert_async')
+    @patch('doozerlib.registry.RegistryClient.get_image_config')
+    @patch('doozerlib.rhcos.RHCOSBuildFinder.get_build_meta')
+    async def test_inspector_create(self, rhcos_build_meta_mock, get_image_config_mock, cmd_assert_async_mock):
+        rhcos_meta = {"buildid": "412.86.bogus"}
+        rhcos_build_meta_mock.side_effect = _build_meta_side_effect(rhcos_meta, {})
+
+        def get_image_config(pullspec):
+            if pullspec != "spam@eggs":
+                raise rhcos.RegistryError("no credentials")  # the config of this image can only be read with oc
+            return _image_config("412.86.bogus")
+        get_image_config_mock.side_effect = get_image_config
+        cmd_assert_async_mock.return_value = ('{"config": {"config": {"Labels": {"version": "412.86.bogus"}}}}', None)
+        pullspecs = {'machine-os-content': 'spam@eggs', 'rhel-coreos': 'spam@ham'}
+
+        rhcos_build = await rhcos.RHCOSBuildInspector.create(self.runtime, pullspecs, 's390x')
+        self.assertEqual(rhcos_build.build_id, "412.86.bogus")
+        self.assertEqual(rhcos_build.stream_version, "4.12")
+        self.assertEqual(rhcos_build.get_build_metadata(), rhcos_meta)
+        cmd_assert_async_mock.assert_awaited_once_with(['oc', 'image', 'info', '-o', 'json', 'spam@ham'], retries=3)
+
+        # divergent build ids
+        cmd_assert_async_mock.return_value = ('{"config": {"config": {"Labels": {"version": "412.86.other"}}}}', None)
+        with self.assertRaises(Exception):
+            await rhcos.RHCOSBuildInspector.create(self.runtime, pullspecs, 's390x')
+
+    @patch('doozerlib.registry.RegistryClient.get_image_config')
+    @patch('doozerlib.rhcos.RHCOSBuildFinder.get_build_meta')
+    def test_inspector_get_container_pullspec(self, rhcos_build_meta_mock, get_image_config_mock):
         # mock out the things RHCOSBuildInspector calls in __init__
         rhcos_meta = {"buildid": "412.86.bogus"}
         rhcos_commitmeta = {}
-        rhcos_build_meta_mock.side_effect = [rhcos_meta, rhcos_commitmeta]
-        cmd_assert_mock.return_value = ('{"config": {"config": {"Labels": {"version": "412.86.bogus"}}}}', None)
+        rhcos_build_meta_mock.side_effect = _build_meta_side_effect(rhcos_meta, rhcos_commitmeta)
+        get_image_config_mock.return_value = _image_config("412.86.bogus")
         pullspecs = {'machine-os-content': 'spam@eggs'}
         rhcos_build = rhcos.RHCOSBuildInspector(self.runtime, pullspecs, 's390x')
 
@@ -216,14 +262,14 @@ class TestRhcos(unittest.IsolatedAsyncioTestCase):
         with self.assertRaises(rhcos.RhcosMissingContainerException):
             rhcos_build.get_container_pullspec(Model(container_conf))
 
-    @patch('doozerlib.exectools.cmd_assert')
-    @patch('doozerlib.rhcos.RHCOSBuildFinder.rhcos_build_meta')
-    async def test_find_non_latest_rpms_with_missing_enabled_repos(self, rhcos_build_meta_mock, cmd_assert_mock):
+    @patch('doozerlib.registry.RegistryClient.get_image_config')
+    @patch('doozerlib.rhcos.RHCOSBuildFinder.get_build_meta')
+    async def test_find_non_latest_rpms_with_missing_enabled_repos(self, rhcos_build_meta_mock, get_image_config_mock):
         # mock out the things RHCOSBuildInspector calls in __init__
         rhcos_meta = {"buildid": "412.86.bogus"}
         rhcos_commitmeta = {}
-        rhcos_build_meta_mock.side_effect = [rhcos_meta, rhcos_commitmeta]
-        cmd_assert_mock.return_value = ('{"config": {"config": {"Labels": {"version": "412.86.bogus"}}}}', None)
+        rhcos_build_meta_mock.side_effect = _build_meta_side_effect(rhcos_meta, rhcos_commitmeta)
+        get_image_config_mock.return_value = _image_config("412.86.bogus")
         pullspecs = {'machine-os-content': 'spam@eggs'}
         self.runtime.group_config.rhcos = Model({})
         rhcos_build = rhcos.RHCOSBuildInspector(self.runtime, pullspecs, 's390x')
@@ -232,15 +278,15 @@ class TestRhcos(unittest.IsolatedAsyncioTestCase):
 
     @patch('doozerlib.rhcos.RHCOSBuildInspector.get_os_metadata_rpm_list')
     @patch("doozerlib.repos.Repo.get_repodata_threadsafe")
-    @patch('doozerlib.exectools.cmd_assert')
-    @patch('doozerlib.rhcos.RHCOSBuildFinder.rhcos_build_meta')
-    async def test_find_non_latest_rpms(self, rhcos_build_meta_mock: Mock, cmd_assert_mock: Mock,
+    @patch('doozerlib.registry.RegistryClient.get_image_config')
+    @patch('doozerlib.rhcos.RHCOSBuildFinder.get_build_meta')
+    async def test_find_non_latest_rpms(self, rhcos_build_meta_mock: Mock, get_image_config_mock: Mock,
                                         get_repodata_threadsafe: AsyncMock, get_os_metadata_rpm_list: Mock):
         # mock out the things RHCOSBuildInspector calls in __init__
         rhcos_meta = {"buildid": "412.86.bogus"}
         rhcos_commitmeta = {}
-        rhcos_build_meta_mock.side_effect = [rhcos_meta, rhcos_commitmeta]
-        cmd_assert_mock.return_value = ('{"config": {"config": {"Labels": {"version": "412.86.bogus"}}}}', None)
+        rhcos_build_meta_mock.side_effect = _build_meta_side_effect(rhcos_meta, rhcos_commitmeta)
+        get_image_config_mock.return_value = _image_config("412.86.bogus")
         pullspecs = {'machine-os-content': 'spam@eggs'}
         self.runtime.group_config.rhcos = Model({
             "enabled_repos": ["rhel-8-baseos-rpms", "rhel-8-appstream-rpms"]
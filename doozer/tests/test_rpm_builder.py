@@ -16,6 +16,7 @@ class TestRPMBuilder(IsolatedAsyncioTestCase):
 
     def _make_runtime(self, assembly=None):
         runtime = mock.MagicMock()
+        runtime.get_cached_latest_build.return_value = (False, None)
         runtime.group_config.public_upstreams = [{"private": "https://github.com/openshift-priv", "public": "https://github.com/openshift"}]
         runtime.brew_logs_dir = "/path/to/brew-logs"
         runtime.assembly = assembly
@@ -299,8 +300,8 @@ Task info: https://brewweb.example.com/brew/taskinfo?taskID=123456
         self.assertEqual(actual, expected)
         mocked_cmd_assert_async.assert_called_once_with(["rhpkg", "build", "--nowait", "--target", "my-target2", "--skip-tag"], cwd=dg.dg_path)
 
-    @mock.patch("doozerlib.rpm_builder.brew.watch_tasks")
-    async def test_watch_tasks_async(self, mocked_watch_tasks: mock.Mock):
+    @mock.patch("doozerlib.rpm_builder.brew.watch_tasks_async")
+    async def test_watch_tasks_async(self, mocked_watch_tasks: mock.AsyncMock):
         task_ids = [10001, 10002]
         mocked_watch_tasks.return_value = {task: None for task in task_ids}
 
@@ -308,4 +309,4 @@ Task info: https://brewweb.example.com/brew/taskinfo?taskID=123456
         actual = await builder._watch_tasks_async(task_ids, mock.Mock())
 
         self.assertEqual(actual, {task: None for task in task_ids})
-        mocked_watch_tasks.assert_called_once_with(mock.ANY, mock.ANY, task_ids, mock.ANY)
+        mocked_watch_tasks.assert_awaited_once_with(mock.ANY, mock.ANY, task_ids)
@@ -29,6 +29,7 @@ targets:
     @mock.patch("doozerlib.rpmcfg.Dir")
     def test_assert_golang_versions(self, MockDir, MockEntityLoggingAdapter):
         runtime = mock.MagicMock(brew_logs_dir="/path/to/brew/logs")
+        runtime.get_cached_latest_build.return_value = (False, None)
         koji_session = runtime.build_retrying_koji_client.return_value
         data_obj = mock.MagicMock(
             key="foo",
@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 import unittest
+from unittest.mock import MagicMock, patch
 from flexmock import flexmock
 from doozerlib import runtime, exectools, logutil, model
+from doozerlib.brew import BuildStates
+from doozerlib.metadata import LatestBuildSearch
 
 
 def stub_runtime():
@@ -19,14 +22,18 @@ def stub_runtime():
 class RuntimeTestCase(unittest.TestCase):
     def test_get_remote_branch_ref(self):
         rt = stub_runtime()
-        flexmock(exectools).should_receive("cmd_assert").once().and_return("spam", "")
+        flexmock(exectools).should_receive("cmd_assert").once().and_return("spam\trefs/heads/branch\neggs\trefs/tags/v1.0", "")
         res = rt._get_remote_branch_ref("giturl", "branch")
         self.assertEqual(res, "spam")
+        # Refs of a repository are only listed once
+        self.assertIsNone(rt._get_remote_branch_ref("giturl", "v1.0"))
 
+        rt = stub_runtime()
         flexmock(exectools).should_receive("cmd_assert").once().and_return("", "")
         self.assertIsNone(rt._get_remote_branch_ref("giturl", "branch"))
 
-        flexmock(exectools).should_receive("cmd_assert").once().and_raise(Exception("whatever"))
+        rt = stub_runtime()
+        flexmock(exectools).should_receive("cmd_assert").once().and_raise(ChildProcessError("whatever"))
         self.assertIsNone(rt._get_remote_branch_ref("giturl", "branch"))
 
     def test_detect_remote_source_branch(self):
@@ -67,6 +74,83 @@ class RuntimeTestCase(unittest.TestCase):
         with self.assertRaises(runtime.DoozerFatalError):
             rt.detect_remote_source_branch(source_details)
 
+    def test_resolve_latest_builds(self):
+        rt = stub_runtime()
+        rt.assembly = 'stream'
+
+        def make_meta(name, pinned=False):
+            meta = MagicMock(distgit_key=name, config=model.Model({'is': {'nvr': f'{name}-1-1'}} if pinned else {}))
+            meta.get_component_name.return_value = f'{name}-container'
+            meta.latest_build_search.return_value = LatestBuildSearch(
+                key=(name,), pattern_prefix=f'{name}-container-v4.14.', extra_pattern='*', rpm_suffix='', el_ver=None,
+                build_state=BuildStates.COMPLETE, release_suffixes=['.assembly.stream', ''], complete_before_event=None)
+            meta.get_latest_build.side_effect = lambda **_: rt.get_cached_latest_build((name,))[1]
+            return meta
+
+        builds = {
+            'a-container-v4.14.*.assembly.stream*': [{'nvr': 'a-container-v4.14.0-1.assembly.stream', 'release': '1.assembly.stream', 'build_id': 1}],
+            'b-container-v4.14.**': [{'nvr': 'b-container-v4.14.0-2', 'release': '2', 'build_id': 2}],
+        }
+        m = MagicMock()
+        m.getPackage.side_effect = lambda name: MagicMock(result=None if name == 'c-container' else {'id': name})
+        m.listBuilds.side_effect = lambda packageID, pattern, **_: MagicMock(result=builds.get(pattern, []))
+        m.listTags.side_effect = lambda build: MagicMock(result=[{'name': 'rhaos-4.14-rhel-9-candidate'}])
+        koji_api = MagicMock()
+        koji_api.multicall.return_value.__enter__.return_value = m
+        rt.pooled_koji_client_session = MagicMock()
+        rt.pooled_koji_client_session.return_value.__enter__.return_value = koji_api
+
+        metas = [make_meta('a'), make_meta('b'), make_meta('c'), make_meta('d', pinned=True)]
+        latest = rt.resolve_latest_builds(metas)
+        self.assertEqual(latest['a']['id'], 1)
+        self.assertEqual(latest['b']['id'], 2)
+        self.assertIsNone(latest['c'])
+        self.assertIsNone(latest['d'])
+        # getPackage, two rounds of listBuilds, listTags
+        self.assertEqual(koji_api.multicall.call_count, 4)
+        self.assertEqual(m.listBuilds.call_count, 3)
+        metas[3].latest_build_search.assert_not_called()
+
+        # Everything resolved is cached
+        self.assertEqual(rt.resolve_latest_builds(metas[:2])['b']['id'], 2)
+        self.assertEqual(koji_api.multicall.call_count, 4)
+
+    def test_construct_metas(self):
+        rt = stub_runtime()
+        rt.upstream_commitish_overrides = {'b': 'c0mmit'}
+        data_objs = [MagicMock(key=key) for key in 'abcdefgh']
+        meta_class = MagicMock(side_effect=lambda runtime, data_obj, commitish, **kwargs: (data_obj.key, commitish, kwargs))
+        metas = rt._construct_metas(meta_class, data_objs, clone_source=False)
+        self.assertEqual([m[0] for m in metas], list('abcdefgh'))  # in the order of the data
+        self.assertEqual(metas[1], ('b', 'c0mmit', {'clone_source': False}))
+        self.assertEqual(metas[0][1], None)
+
+    def test_load_image_metas(self):
+        rt = stub_runtime()
+        data_objs = [MagicMock(key=key, data={}) for key in 'abcde']
+        data_objs[1].data = {'dependents': ['d']}  # b adds d to image_map while it is constructed
+
+        def image_metadata(runtime, data_obj, commitish, **kwargs):
+            meta = MagicMock(distgit_key=data_obj.key)
+            for dependent in data_obj.data.get('dependents', []):
+                runtime.image_map[dependent] = MagicMock(distgit_key=dependent)
+            return meta
+
+        with patch("doozerlib.runtime.ImageMetadata", side_effect=image_metadata) as ImageMetadata:
+            rt._load_image_metas(data_objs, clone_source=False)
+        self.assertEqual(list(rt.image_map), ['a', 'd', 'b', 'c', 'e'])  # in the order of the data
+        self.assertEqual(ImageMetadata.call_count, 4)
+
+    def test_configure_resource_limits(self):
+        rt = stub_runtime()
+        rt.concurrency_limit = ['scan-sources::koji=5']
+        with patch("atexit.register") as register, \
+                patch("doozerlib.exectools.configure_resource_limits") as configure:
+            rt.configure_resource_limits()
+            rt.configure_resource_limits()
+        self.assertEqual(configure.call_args.args[0]['scan-sources::koji'], 5)
+        register.assert_called_once_with(rt._log_resource_limiter_stats)
+
 
 if __name__ == "__main__":
     unittest.main()
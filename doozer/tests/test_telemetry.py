@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from doozerlib import exectools, telemetry
+
+
+class TestTelemetry(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.trace_path = os.path.join(self.tmp_dir, 'trace.jsonl')
+        telemetry.enable_trace(self.trace_path)
+
+    def tearDown(self):
+        telemetry.disable_trace()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_command_class(self):
+        self.assertEqual('git clone', telemetry.command_class(['git', '-C', '/tmp/x', 'clone', 'https://example.com/repo']))
+        self.assertEqual('git clone', telemetry.command_class(['git', '-C', 'path', 'clone', 'https://example.com/repo']))
+        self.assertEqual('oc get', telemetry.command_class(['oc', '-n', 'ocp', '--kubeconfig', 'kc', 'get', 'is']))
+        self.assertEqual('oc image', telemetry.command_class(['/usr/bin/oc', 'image', 'mirror', 'a', 'b']))
+        self.assertEqual('true', telemetry.command_class(['true']))
+        self.assertEqual('', telemetry.command_class([]))
+
+    def test_span(self):
+        with telemetry.span('test', 'ok', a=1) as fields:
+            fields['b'] = 2
+        with self.assertRaises(ValueError):
+            with telemetry.span('test', 'failed'):
+                raise ValueError()
+        spans = telemetry.load_trace(self.trace_path)
+        self.assertEqual(['ok', 'failed'], [s['name'] for s in spans])
+        self.assertEqual((1, 2), (spans[0]['a'], spans[0]['b']))
+        self.assertNotIn('error', spans[0])
+        self.assertEqual('ValueError', spans[1]['error'])
+        self.assertLessEqual(spans[0]['start'], spans[0]['end'])
+
+    def test_disabled(self):
+        telemetry.disable_trace()
+        with telemetry.span('test', 'ignored'):
+            pass
+        telemetry.record_span('test', 'ignored', 0, 1)
+        self.assertEqual([], telemetry.load_trace(self.trace_path))
+
+    def test_cmd_gather(self):
+        rc, out, _ = exectools.cmd_gather(['echo', 'hello'])
+        self.assertEqual(0, rc)
+        rc, out, _ = asyncio.run(exectools.cmd_gather_async(['echo', 'hello']))
+        self.assertEqual(0, rc)
+        spans = telemetry.load_trace(self.trace_path)
+        self.assertEqual(2, len(spans))
+        for s in spans:
+            self.assertEqual(('subprocess', 'echo hello', 0, 6), (s['cat'], s['name'], s['rc'], s['stdout_bytes']))
+        self.assertIsNone(spans[0]['task'])
+        self.assertIsNotNone(spans[1]['task'])
+
+    def test_to_chrome_trace(self):
+        telemetry.record_span('subprocess', 'git clone', 100.0, 102.5, rc=0)
+        telemetry.record_span('koji', 'getBuild', 101.0, 101.5)
+
+        async def call():
+            telemetry.record_span('koji', 'listTags', 101.0, 101.25)
+        asyncio.run(call())
+
+        output_path = os.path.join(self.tmp_dir, 'trace.json')
+        self.assertEqual(3, telemetry.export_chrome_trace(self.trace_path, output_path))
+        with open(output_path) as f:
+            events = json.load(f)['traceEvents']
+        spans = {e['name']: e for e in events if e['ph'] == 'X'}
+        self.assertEqual((0, 2_500_000), (spans['git clone']['ts'], spans['git clone']['dur']))
+        self.assertEqual({'rc': 0}, spans['git clone']['args'])
+        self.assertEqual(spans['git clone']['tid'], spans['getBuild']['tid'])
+        self.assertNotEqual(spans['git clone']['tid'], spans['listTags']['tid'])  # asyncio tasks get their own lane
+        self.assertEqual(2, len([e for e in events if e['ph'] == 'M']))
+
+    def test_summarize_trace(self):
+        spans = [
+            {'cat': 'koji', 'name': 'getBuild', 'start': 0, 'end': 1},
+            {'cat': 'koji', 'name': 'getBuild', 'start': 0, 'end': 2},
+            {'cat': 'subprocess', 'name': 'git clone', 'start': 0, 'end': 10},
+        ]
+        self.assertEqual([('subprocess', 'git clone', 1, 10, 10), ('koji', 'getBuild', 2, 3, 2)], telemetry.summarize_trace(spans))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -48,13 +48,15 @@ class TestKojiWrapper(DoozerRunnerTestCase):
             return call_1_meta, call_2_meta
 
         c1_meta, c2_meta = run_multicall()
-        self.assertFalse(c1_meta.cache_hit)  # Though getLastEvent was cached above a single call, it has to be cached uniquely as a multiCall
-        self.assertFalse(c2_meta.cache_hit)  # cache_hit should be identical for every call
+        self.assertTrue(c1_meta.cache_hit)  # Each call in a multicall is cached individually, so getLastEvent cached above is a hit
+        self.assertEqual(c1_meta.result, last_event)
+        self.assertFalse(c2_meta.cache_hit)  # getTag has not been called before
         self.assertEqual(c2_meta.result['id'], 70115)  # The numeric id for the tag should not change
 
         # Now try it again and we should hit the cache
         _c1_meta, _c2_meta = run_multicall()
         self.assertTrue(_c1_meta.cache_hit)
+        self.assertTrue(_c2_meta.cache_hit)
         self.assertEqual(_c1_meta.result, c1_meta.result)
         self.assertEqual(_c2_meta.result, c2_meta.result)
         self.assertEqual(_c2_meta.result['id'], 70115)  # The numeric id for the tag should not change
@@ -19,7 +19,7 @@ import requests
 from requests_gssapi import HTTPSPNEGOAuth
 
 # ours
-from elliottlib import constants, exceptions, logutil
+from elliottlib import constants, exceptions, logutil, telemetry
 from elliottlib.util import total_size
 
 logger = logutil.getLogger(__name__)
@@ -148,6 +148,33 @@ def get_builds_tags(build_nvrs, session=None):
     return [task.result for task in tasks]
 
 
+# Brew package name -> package ID (None if the package doesn't exist); package IDs never change
+_package_id_cache: Dict[str, Optional[int]] = {}
+_package_id_cache_lock = threading.Lock()
+
+
+def get_package_ids(package_names: Iterable[str], session: koji.ClientSession) -> Dict[str, Optional[int]]:
+    """ Get IDs of multiple Brew packages with a single multicall.
+    Results are cached for the lifetime of the process.
+
+    :param package_names: package names; duplicates are only queried once
+    :param session: instance of :class:`koji.ClientSession`
+    :return: a dict; keys are package names, values are package IDs or None if the package doesn't exist
+    """
+    package_names = set(package_names)
+    with _package_id_cache_lock:
+        cache_miss = sorted(package_names - _package_id_cache.keys())
+    if cache_miss:
+        logger.debug(f"Fetching package IDs for {cache_miss} from Koji/Brew...")
+        with session.multicall(strict=True) as m:
+            tasks = [m.getPackageID(name) for name in cache_miss]
+        with _package_id_cache_lock:
+            for name, task in zip(cache_miss, tasks):
+                _package_id_cache[name] = task.result
+    with _package_id_cache_lock:
+        return {name: _package_id_cache[name] for name in package_names}
+
+
 def get_brew_build(nvr, product_version='', session=None):
     """5.2.2.1. GET /api/v1/build/{id_or_nvr}
 
@@ -766,7 +793,12 @@ class KojiWrapper(koji.ClientSession):
                             logger.info(f'CACHE HIT: koji-api-call-{my_id}: {name} returned={result}')
                         return package_result(result, True)
 
-                result = super()._callMethod(name, args, kwargs=kwargs, retry=retry)
+                trace_fields = {}
+                if name == 'multiCall':
+                    methods = [call_dict['methodName'] for call_dict in args[0]]
+                    trace_fields = {'calls': len(methods), 'methods': sorted(set(methods))}
+                with telemetry.span('koji', name, id=my_id, **trace_fields):
+                    result = super()._callMethod(name, args, kwargs=kwargs, retry=retry)
 
                 if use_caching:
                     self._cache_result(caching_key, result)
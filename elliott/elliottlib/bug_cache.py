@@ -0,0 +1,303 @@
+"""
+A persistent, on-disk cache of bug tracker state for find-bugs:sweep.
+
+A sweep searches for all bugs of a release in the desired statuses, evaluates the status history of each
+candidate against the sweep cutoff and asks Errata whether each of them is already attached to an advisory.
+Most of those bugs do not change between the sweeps of a release day. BugSweepCache keeps bug fields,
+status history and advisory attachment in a sqlite database and only refreshes what changed:
+- Search results are stored per query. After a full search, only bugs updated since the last sync are
+  searched for; previous results which have been updated and no longer match are dropped.
+- Status history is refetched only for bugs which changed since it was fetched. Cutoff evaluation is local.
+- Advisory attachment is trusted until the bug changes, or until a TTL passes. The TTL of a bug found attached is
+  longer than that of an unattached one; it may still have been dropped from its advisory without changing.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from elliottlib import constants, logutil
+from elliottlib.bzutil import Bug, BugStatusChange, BugTracker
+from elliottlib.util import chunk
+
+logger = logutil.getLogger(__name__)
+
+
+class BugCacheStore:
+    """
+    A sqlite backed store for bug tracker state. Instances are safe to share between threads.
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS bugs (
+            tracker TEXT NOT NULL,
+            bug_id TEXT NOT NULL,
+            updated REAL NOT NULL,
+            data TEXT NOT NULL,
+            history TEXT,
+            history_updated REAL,
+            attached INTEGER,
+            attached_updated REAL,
+            attached_checked REAL,
+            PRIMARY KEY (tracker, bug_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS query_members (
+            tracker TEXT NOT NULL,
+            query_key TEXT NOT NULL,
+            bug_id TEXT NOT NULL,
+            PRIMARY KEY (tracker, query_key, bug_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS query_syncs (
+            tracker TEXT NOT NULL,
+            query_key TEXT NOT NULL,
+            last_sync REAL NOT NULL,
+            PRIMARY KEY (tracker, query_key)
+        )
+        """,
+    ]
+
+    def __init__(self, path: str):
+        """
+        :param path: A directory in which the cache database will be stored (created if it does not exist).
+        """
+        os.makedirs(path, exist_ok=True)
+        self.db_path = os.path.join(path, 'bug-cache.sqlite')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=60)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            # WAL allows concurrent elliott processes to read while another writes.
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+
+    def get(self, tracker: str, bug_ids: Iterable[str]) -> Dict[str, sqlite3.Row]:
+        """
+        :return: The cached rows of the given bugs, keyed by bug id. Bugs which are not cached are left out.
+        """
+        rows = {}
+        with self._lock:
+            for chunk_of_ids in chunk(list(bug_ids), 500):
+                placeholders = ','.join('?' * len(chunk_of_ids))
+                for row in self._conn.execute(f'SELECT * FROM bugs WHERE tracker = ? AND bug_id IN ({placeholders})',
+                                              [tracker, *chunk_of_ids]):
+                    rows[row['bug_id']] = row
+        return rows
+
+    def put_bugs(self, tracker: str, entries: Iterable[tuple]):
+        """
+        :param entries: (bug_id, updated, data) tuples
+        """
+        with self._lock:
+            self._conn.executemany(
+                'INSERT INTO bugs (tracker, bug_id, updated, data) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (tracker, bug_id) DO UPDATE SET updated = excluded.updated, data = excluded.data',
+                [(tracker, *entry) for entry in entries])
+
+    def put_histories(self, tracker: str, entries: Iterable[tuple]):
+        """
+        :param entries: (bug_id, updated, history) tuples; updated is the last change time of the bug the history belongs to
+        """
+        with self._lock:
+            self._conn.executemany('UPDATE bugs SET history = ?, history_updated = ? WHERE tracker = ? AND bug_id = ?',
+                                   [(history, updated, tracker, bug_id) for bug_id, updated, history in entries])
+
+    def put_attachments(self, tracker: str, entries: Iterable[tuple]):
+        """
+        :param entries: (bug_id, updated, attached) tuples; updated is the last change time of the bug when it was checked
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE bugs SET attached = ?, attached_updated = ?, attached_checked = ? WHERE tracker = ? AND bug_id = ?',
+                [(int(attached), updated, now, tracker, bug_id) for bug_id, updated, attached in entries])
+
+    def get_members(self, tracker: str, query_key: str) -> List[str]:
+        with self._lock:
+            return [row['bug_id'] for row in self._conn.execute(
+                'SELECT bug_id FROM query_members WHERE tracker = ? AND query_key = ?', (tracker, query_key))]
+
+    def update_members(self, tracker: str, query_key: str, added: Iterable[str], removed: Iterable[str] = (),
+                       replace: bool = False):
+        """
+        Updates the result of a query.
+        :param added: ids of bugs which match the query
+        :param removed: ids of bugs which no longer match the query
+        :param replace: If True, added replaces all existing members
+        """
+        with self._lock:
+            if replace:
+                self._conn.execute('DELETE FROM query_members WHERE tracker = ? AND query_key = ?', (tracker, query_key))
+            self._conn.executemany('DELETE FROM query_members WHERE tracker = ? AND query_key = ? AND bug_id = ?',
+                                   [(tracker, query_key, bug_id) for bug_id in removed])
+            self._conn.executemany('INSERT OR IGNORE INTO query_members (tracker, query_key, bug_id) VALUES (?, ?, ?)',
+                                   [(tracker, query_key, bug_id) for bug_id in added])
+
+    def get_last_sync(self, tracker: str, query_key: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute('SELECT last_sync FROM query_syncs WHERE tracker = ? AND query_key = ?',
+                                     (tracker, query_key)).fetchone()
+        return row['last_sync'] if row else None
+
+    def set_last_sync(self, tracker: str, query_key: str, last_sync: float):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO query_syncs (tracker, query_key, last_sync) VALUES (?, ?, ?)',
+                               (tracker, query_key, last_sync))
+
+    def clear(self):
+        with self._lock:
+            for table in ['bugs', 'query_members', 'query_syncs']:
+                self._conn.execute(f'DELETE FROM {table}')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BugSweepCache:
+    """
+    Performs the bug tracker queries of find-bugs:sweep against a BugCacheStore, only querying the bug tracker
+    for what changed since the previous sweep.
+    """
+
+    def __init__(self, store: BugCacheStore, bug_tracker: BugTracker,
+                 max_sync_age: float = constants.BUG_CACHE_MAX_SYNC_AGE,
+                 unattached_ttl: float = constants.BUG_CACHE_UNATTACHED_TTL,
+                 attached_ttl: float = constants.BUG_CACHE_ATTACHED_TTL):
+        """
+        :param store: The store in which bug tracker state is persisted
+        :param bug_tracker: The bug tracker to query
+        :param max_sync_age: Number of seconds after which a query is run in full rather than incrementally
+        :param unattached_ttl: Number of seconds for which a bug found unattached to any advisory is not rechecked
+        :param attached_ttl: Number of seconds for which a bug found attached to an advisory is not rechecked
+        """
+        self.store = store
+        self.bug_tracker = bug_tracker
+        self.max_sync_age = max_sync_age
+        self.unattached_ttl = unattached_ttl
+        self.attached_ttl = attached_ttl
+        self.tracker = f"{bug_tracker.type}:{bug_tracker.config.get('server', '')}"
+
+    def _query_key(self, find_bugs_obj) -> str:
+        # the bug tracker config determines target releases and component filters of the query
+        key = json.dumps({
+            'status': sorted(find_bugs_obj.status),
+            'cve_only': find_bugs_obj.cve_only,
+            'config': self.bug_tracker.config,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _put_bugs(self, bugs: Iterable[Bug]):
+        self.store.put_bugs(self.tracker, [
+            (str(bug.id), bug.last_change_time_parsed().timestamp(), json.dumps(self.bug_tracker.serialize_bug(bug)))
+            for bug in bugs
+        ])
+
+    def search(self, find_bugs_obj, verbose: bool = False) -> List[Bug]:
+        """
+        Equivalent of find_bugs_obj.search(bug_tracker) which only searches for bugs updated since the last sync.
+        :param find_bugs_obj: A FindBugsMode
+        """
+        query_key = self._query_key(find_bugs_obj)
+        sync_start = time.time()
+        last_sync = self.store.get_last_sync(self.tracker, query_key)
+
+        if last_sync is None or sync_start - last_sync > self.max_sync_age:
+            bugs = find_bugs_obj.search(bug_tracker_obj=self.bug_tracker, verbose=verbose)
+            self._put_bugs(bugs)
+            self.store.update_members(self.tracker, query_key, [str(bug.id) for bug in bugs], replace=True)
+            self.store.set_last_sync(self.tracker, query_key, sync_start)
+            return bugs
+
+        updated_since = last_sync - constants.BUG_CACHE_SYNC_OVERLAP
+        updated_bugs = find_bugs_obj.search(bug_tracker_obj=self.bug_tracker, verbose=verbose,
+                                            updated_since=updated_since)
+        updated_bug_ids = {str(bug.id) for bug in updated_bugs}
+        # previous results which have been updated, but are no longer found by the query
+        members = self.store.get_members(self.tracker, query_key)
+        other_members = self.bug_tracker.id_convert([bug_id for bug_id in members if bug_id not in updated_bug_ids])
+        unmatched_bugs = self.bug_tracker.get_bugs_updated_since(other_members, updated_since, verbose=verbose) \
+            if other_members else []
+        self._put_bugs(updated_bugs)
+        self.store.update_members(self.tracker, query_key, updated_bug_ids, removed=[str(bug.id) for bug in unmatched_bugs])
+        self.store.set_last_sync(self.tracker, query_key, sync_start)
+        logger.info(f"{len(updated_bugs)} {self.bug_tracker.type} bugs found and {len(unmatched_bugs)} dropped since the "
+                    f"last sync at {datetime.utcfromtimestamp(last_sync)}")
+
+        rows = self.store.get(self.tracker, self.store.get_members(self.tracker, query_key))
+        return [self.bug_tracker.deserialize_bug(json.loads(row['data'])) for row in rows.values()]
+
+    def filter_bugs_by_cutoff_event(self, bugs: Iterable[Bug], desired_statuses: Iterable[str],
+                                    sweep_cutoff_timestamp: float, verbose: bool = False) -> List[Bug]:
+        """
+        Equivalent of bug_tracker.filter_bugs_by_cutoff_event which evaluates cached status history locally.
+        """
+        bugs = list(bugs)
+        rows = self.store.get(self.tracker, [str(bug.id) for bug in bugs])
+        status_changes = {}
+        outdated_bugs = []
+        for bug in bugs:
+            row = rows.get(str(bug.id))
+            if row and row['history'] is not None and row['history_updated'] >= bug.last_change_time_parsed().timestamp():
+                status_changes[bug.id] = [BugStatusChange(*change) for change in json.loads(row['history'])]
+            else:
+                outdated_bugs.append(bug)
+
+        logger.info(f"Fetching status history of {len(outdated_bugs)} of {len(bugs)} bugs")
+        for chunk_of_bugs in chunk(outdated_bugs, constants.BUG_LOOKUP_CHUNK_SIZE):
+            fetched = self.bug_tracker.get_status_changes(chunk_of_bugs)
+            self.store.put_histories(self.tracker, [
+                (str(bug.id), bug.last_change_time_parsed().timestamp(), json.dumps(fetched[bug.id]))
+                for bug in chunk_of_bugs if bug.id in fetched
+            ])
+            status_changes.update(fetched)
+
+        qualified_bugs = self.bug_tracker.filter_bugs_by_status_changes(
+            [bug for bug in bugs if bug.id in status_changes], status_changes, desired_statuses, sweep_cutoff_timestamp)
+        # bugs whose history could not be fetched completely are left to the bug tracker
+        unknown_bugs = [bug for bug in bugs if bug.id not in status_changes]
+        for chunk_of_bugs in chunk(unknown_bugs, constants.BUG_LOOKUP_CHUNK_SIZE):
+            qualified_bugs.extend(self.bug_tracker.filter_bugs_by_cutoff_event(
+                chunk_of_bugs, desired_statuses, sweep_cutoff_timestamp, verbose=verbose))
+        return qualified_bugs
+
+    async def filter_attached_bugs(self, bugs: Iterable[Bug]) -> List[Bug]:
+        """
+        Equivalent of bug_tracker.filter_attached_bugs which only asks Errata about bugs that changed since they
+        were last checked.
+        """
+        bugs = list(bugs)
+        rows = self.store.get(self.tracker, [str(bug.id) for bug in bugs])
+        now = time.time()
+        attached_bugs = []
+        unknown_bugs = []
+        for bug in bugs:
+            row = rows.get(str(bug.id))
+            if row and row['attached'] is not None and row['attached_updated'] >= bug.last_change_time_parsed().timestamp() \
+                    and now - row['attached_checked'] < (self.attached_ttl if row['attached'] else self.unattached_ttl):
+                if row['attached']:
+                    attached_bugs.append(bug)
+            else:
+                unknown_bugs.append(bug)
+
+        if unknown_bugs:
+            logger.info(f"Checking advisory attachment of {len(unknown_bugs)} of {len(bugs)} bugs")
+            newly_attached_bugs = await self.bug_tracker.filter_attached_bugs(unknown_bugs)
+            newly_attached_bug_ids = {bug.id for bug in newly_attached_bugs}
+            self.store.put_attachments(self.tracker, [
+                (str(bug.id), bug.last_change_time_parsed().timestamp(), bug.id in newly_attached_bug_ids)
+                for bug in unknown_bugs
+            ])
+            attached_bugs.extend(newly_attached_bugs)
+        return attached_bugs
@@ -1,15 +1,15 @@
 from elliottlib.imagecfg import ImageMetadata
 import logging
 from logging import Logger
-from typing import Dict, Iterable, List, Optional, Union
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 from koji import ClientSession
 
-from elliottlib.assembly import assembly_metadata_config, assembly_rhcos_config
-from elliottlib.brew import get_build_objects
+from elliottlib.assembly import assembly_basis_event, assembly_metadata_config, assembly_rhcos_config
+from elliottlib.brew import BuildStates, get_build_objects
 from elliottlib.model import Model
 from elliottlib.rpmcfg import RPMMetadata
-from elliottlib.util import find_latest_builds, parse_nvr, strip_epoch, to_nvre
+from elliottlib.util import find_latest_builds, isolate_el_version_in_brew_tag, parse_nvr, strip_epoch, to_nvre
 
 
 class BuildFinder:
@@ -19,6 +19,7 @@ class BuildFinder:
         self._koji_api = koji_api
         self._logger = logger or logging.getLogger(__name__)
         self._build_cache: Dict[str, Optional[Dict]] = {}  # Cache build_id/nvre -> build_dict to prevent unnecessary queries.
+        self._package_id_cache: Dict[str, Optional[int]] = {}  # Cache package name -> package ID
 
     def _get_builds(self, ids_or_nvrs: Iterable[Union[int, str]]) -> List[Dict]:
         """ Get build dicts from Brew. This method uses an internal cache to avoid unnecessary queries.
@@ -36,6 +37,19 @@ class BuildFinder:
                     self._build_cache[id_or_nvre] = None  # None indicates the build ID or NVRE doesn't exist
         return [self._build_cache[id] for id in ids_or_nvrs]
 
+    def _get_package_ids(self, package_names: Iterable[str]) -> Dict[str, Optional[int]]:
+        """ Get Brew package IDs with a single multicall. This method uses an internal cache to avoid unnecessary queries.
+        :param package_names: package names
+        :return: a dict; keys are package names, values are package IDs or None if the package doesn't exist
+        """
+        cache_miss = sorted(set(package_names) - self._package_id_cache.keys())
+        if cache_miss:
+            with self._koji_api.multicall(strict=True) as m:
+                tasks = [m.getPackage(name) for name in cache_miss]
+            for name, task in zip(cache_miss, tasks):
+                self._package_id_cache[name] = task.result["id"] if task.result else None
+        return {name: self._package_id_cache[name] for name in package_names}
+
     def _cache_build(self, build: Dict):
         """ Save build dict to cache """
         self._build_cache[build["build_id"]] = build
@@ -67,6 +81,100 @@ class BuildFinder:
             self._cache_build(build)
         return component_builds
 
+    def from_rpm_members(self, rpm_metas: Iterable[RPMMetadata], el_tags: Iterable[str], assembly: Optional[str], releases_config: Model) -> List[Dict]:
+        """ Returns the latest build of every member rpm for every el target tag. This is what
+        RPMMetadata.get_latest_build(default=None, el_target=tag) returns for each (rpm, tag) pair,
+        but all pairs are resolved together with a few multicalls instead of several calls per pair.
+        :param rpm_metas: rpm metadatas
+        :param el_tags: Brew tags to determine the RHEL versions to look for (e.g. rhaos-4.14-rhel-9-candidate)
+        :param assembly: Assembly name to query. If None or empty, true latest builds are returned.
+        :param releases_config: a Model for releases.yaml
+        :return: a list of Brew build dicts; Builds whose tags were checked have them saved in their "_tags" field.
+        """
+        rpm_metas = list(rpm_metas)
+        if assembly and assembly_basis_event(releases_config, assembly=assembly):
+            # If an assembly has a basis event, its latest rpms can only be sourced from
+            # "is:" or the stream assembly.
+            assembly = 'stream'
+        if not assembly:
+            pattern_suffixes = ['']
+        else:
+            pattern_suffixes = [f'.assembly.{assembly}']
+            if assembly != 'stream':
+                pattern_suffixes.append('.assembly.stream')
+            pattern_suffixes.append('')  # Fall back to true latest
+
+        package_ids = self._get_package_ids({meta.get_component_name() for meta in rpm_metas})
+        missing_packages = sorted(name for name, package_id in package_ids.items() if package_id is None)
+        if missing_packages:
+            raise IOError(f'No brew package is defined for {missing_packages}')
+
+        pinned_nvrs: List[str] = []
+        pending: List[Tuple[RPMMetadata, str]] = []  # (rpm_meta, pattern) pairs still looking for a build
+        for el_tag in el_tags:
+            el_ver = isolate_el_version_in_brew_tag(el_tag)
+            if not el_ver:
+                raise IOError(f'Unable to determine rhel version from specified el_target: {el_tag}')
+            for meta in rpm_metas:
+                if meta.config['is']:
+                    is_nvr = meta.config['is'][f'el{el_ver}']
+                    if is_nvr:
+                        pinned_nvrs.append(str(is_nvr))
+                    continue
+                pattern = f'{meta.get_component_name()}-{meta.branch_major_minor()}.*{{suffix}}*.el{el_ver}'
+                pending.append((meta, pattern))
+
+        found: List[Dict] = []
+        if pinned_nvrs:
+            pinned_builds = self._get_builds(pinned_nvrs)
+            missing_nvrs = [nvr for nvr, build in zip(pinned_nvrs, pinned_builds) if not build]
+            if missing_nvrs:
+                raise IOError(f"The following NVRs pinned by 'is' don't exist: {missing_nvrs}")
+            found.extend(pinned_builds)
+
+        latest: List[Tuple[RPMMetadata, Dict]] = []
+        for pattern_suffix in pattern_suffixes:
+            if not pending:
+                break
+            self._logger.info("Finding latest builds of %s rpm/el pairs with release suffix '%s'...", len(pending), pattern_suffix)
+            with self._koji_api.multicall(strict=True) as m:
+                tasks = [m.listBuilds(packageID=package_ids[meta.get_component_name()],
+                                      state=BuildStates.COMPLETE.value,
+                                      pattern=pattern.format(suffix=pattern_suffix),
+                                      queryOpts={'limit': 1, 'order': '-creation_event_id'}) for meta, pattern in pending]
+            still_pending = []
+            for (meta, pattern), task in zip(pending, tasks):
+                # Ensure the suffix ends the string OR at least terminated by a '.' .
+                # This latter check ensures that 'assembly.how' doesn't not match a build from "assembly.howdy'.
+                refined = [b for b in task.result if b['nvr'].endswith(pattern_suffix) or f'{pattern_suffix}.' in b['nvr']]
+                if not refined:
+                    still_pending.append((meta, pattern))
+                elif assembly and not pattern_suffix and '.assembly.' in refined[0]['release']:
+                    # True latest belongs to another assembly. In this case, there are no builds for this assembly.
+                    continue
+                else:
+                    latest.append((meta, refined[0]))
+            pending = still_pending
+
+        if latest:
+            # Save tag names to build dicts so that they don't need to be queried again
+            with self._koji_api.multicall(strict=True) as m:
+                tasks = [m.listTags(build=build['nvr']) for _, build in latest]
+            for (meta, build), task in zip(latest, tasks):
+                tags = {tag['name'] for tag in task.result}
+                if tags:
+                    build['_tags'] = tags
+                # RPMS have multiple targets, so our meta.branch() isn't perfect.
+                # We should permit rhel-8/rhel-7/etc.
+                tag_prefix = meta.branch().rsplit('-', 1)[0] + '-'  # String off the rhel version.
+                if not any(name.startswith(tag_prefix) for name in tags):
+                    self._logger.warning(f'Expected to find at least one tag starting with {meta.branch()} on latest build {build["nvr"]} but found [{tags}]; tagging failed after build or something has changed tags in an unexpected way')
+                found.append(build)
+        for build in found:
+            # Different brew apis return different keys here; normalize
+            build['id'] = build['build_id']
+        return found
+
     def from_pinned_by_is(self, el_version: int, assembly: str, releases_config: Model, rpm_map: Dict[str, RPMMetadata]) -> Dict[str, Dict]:
         """ Returns RPM builds pinned by "is" in assembly config
         :param el_version: RHEL version
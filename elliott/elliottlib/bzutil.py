@@ -5,8 +5,10 @@ with BugTrackers
 import asyncio
 import itertools
 import re
+import threading
 import urllib.parse
 import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
 import bugzilla
 import click
 import os
@@ -14,7 +16,7 @@ import requests
 from requests_gssapi import HTTPSPNEGOAuth
 from datetime import datetime, timezone
 from time import sleep
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
 from jira import JIRA, Issue
 from errata_tool import Erratum
 from errata_tool.jira_issue import JiraIssue as ErrataJira
@@ -22,7 +24,7 @@ from errata_tool.bug import Bug as ErrataBug
 from bugzilla.bug import Bug
 from koji import ClientSession
 
-from elliottlib import constants, exceptions, exectools, logutil, errata, util
+from elliottlib import brew, constants, exceptions, exectools, logutil, errata, util
 from elliottlib.cli import cli_opts
 from elliottlib.errata_async import AsyncErrataAPI
 from elliottlib.metadata import Metadata
@@ -58,6 +60,9 @@ class Bug:
     def creation_time_parsed(self):
         raise NotImplementedError
 
+    def last_change_time_parsed(self):
+        raise NotImplementedError
+
     @property
     def corresponding_flaw_bug_ids(self):
         raise NotImplementedError
@@ -205,6 +210,9 @@ class BugzillaBug(Bug):
     def creation_time_parsed(self):
         return datetime.strptime(str(self.bug.creation_time), '%Y%m%dT%H:%M:%S').replace(tzinfo=timezone.utc)
 
+    def last_change_time_parsed(self):
+        return datetime.strptime(str(self.bug.last_change_time), '%Y%m%dT%H:%M:%S').replace(tzinfo=timezone.utc)
+
 
 class JIRABug(Bug):
     def __init__(self, bug_obj: Issue):
@@ -386,6 +394,9 @@ class JIRABug(Bug):
     def creation_time_parsed(self):
         return datetime.strptime(str(self.bug.fields.created), '%Y-%m-%dT%H:%M:%S.%f%z')
 
+    def last_change_time_parsed(self):
+        return datetime.strptime(str(self.bug.fields.updated), '%Y-%m-%dT%H:%M:%S.%f%z')
+
     def is_ocp_bug(self):
         return self.bug.fields.project.key == "OCPBUGS" and not self.is_placeholder_bug()
 
@@ -414,6 +425,34 @@ class JIRABug(Bug):
         return pattern.match(str(bug_id))
 
 
+class BugStatusChange(NamedTuple):
+    timestamp: float  # when this change is made?
+    old: str  # old status
+    new: str  # new status
+
+    @classmethod
+    def from_bugzilla_history(cls, history):
+        """ Converts from bug history dict returned from Bugzilla to BugStatusChange object.
+        The history dict returned from Bugzilla includes bug changes on all fields, but we are only interested in the "status" field change.
+        :return: BugStatusChange object, or None if the history doesn't include a "status" field change.
+        """
+        status_change = next(filter(lambda change: change["field_name"] == "status", history["changes"]), None)
+        if not status_change:
+            return None
+        return cls(to_timestamp(history["when"]), status_change["removed"], status_change["added"])
+
+    @classmethod
+    def from_jira_history(cls, history):
+        """ Converts from an issue changelog history returned from JIRA to BugStatusChange object.
+        :return: BugStatusChange object, or None if the history doesn't include a "status" field change.
+        """
+        status_change = next(filter(lambda item: item.field == "status", history.items), None)
+        if not status_change:
+            return None
+        timestamp = datetime.strptime(history.created, '%Y-%m-%dT%H:%M:%S.%f%z').timestamp()
+        return cls(timestamp, status_change.fromString, status_change.toString)
+
+
 class BugTracker:
     def __init__(self, config: dict, tracker_type: str):
         self.config = config
@@ -441,6 +480,28 @@ class BugTracker:
     def get_bugs(self, bugids: List, permissive=False, **kwargs):
         raise NotImplementedError
 
+    def get_bugs_updated_since(self, bugids: List, updated_since: float, verbose=False) -> List:
+        """ Returns those of the given bugs which have been updated since the given unix timestamp """
+        raise NotImplementedError
+
+    def serialize_bug(self, bug: Bug) -> Dict:
+        """ Returns the raw data of a bug as a json serializable dict which can be restored with deserialize_bug """
+        raise NotImplementedError
+
+    def deserialize_bug(self, data: Dict) -> Bug:
+        raise NotImplementedError
+
+    def get_status_changes(self, bugs: Iterable[Bug]) -> Dict[str, List[BugStatusChange]]:
+        """ Queries the status changes of the given bugs, keyed by bug id and in chronological order """
+        raise NotImplementedError
+
+    def filter_bugs_by_status_changes(self, bugs: Iterable[Bug], status_changes: Dict[str, List[BugStatusChange]],
+                                      desired_statuses: Iterable[str], sweep_cutoff_timestamp: float) -> List:
+        """ Performs the evaluation of filter_bugs_by_cutoff_event against status changes which have already been
+        fetched with get_status_changes.
+        """
+        raise NotImplementedError
+
     def get_bugs_map(self, bugids: List, permissive: bool = False, **kwargs) -> Dict:
         id_bug_map = {}
         if not bugids:
@@ -516,10 +577,17 @@ class BugTracker:
         bug id as value, flaw_id_bugs is a dict with flaw bug id as key and flaw bug object as value
         """
         bug_tracker = flaw_bug_tracker
-        flaw_bugs = bug_tracker.get_flaw_bugs(
-            list(set(sum([t.corresponding_flaw_bug_ids for t in tracker_bugs], []))),
-            verbose=verbose
-        )
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # fetch flaw bugs while whiteboard components are validated
+            flaw_bugs_future = executor.submit(
+                bug_tracker.get_flaw_bugs,
+                list(set(sum([t.corresponding_flaw_bug_ids for t in tracker_bugs], []))),
+                verbose=verbose
+            )
+            # are the components valid package names in brew?
+            components = {t.whiteboard_component for t in tracker_bugs if t.whiteboard_component}
+            package_ids = brew.get_package_ids(components, brew_api)
+            flaw_bugs = flaw_bugs_future.result()
         flaw_tracker_map = {bug.id: {'bug': bug, 'trackers': []}
                             for bug in flaw_bugs}
 
@@ -533,8 +601,7 @@ class BugTracker:
                 trackers_with_invalid_components.add(t.id)
                 continue
 
-            # is this component a valid package name in brew?
-            if not brew_api.getPackageID(component):
+            if not package_ids[component]:
                 logger.info(f'package `{component}` not found in brew')
                 trackers_with_invalid_components.add(t.id)
                 continue
@@ -586,6 +653,17 @@ class JIRABugTracker(BugTracker):
     FIELD_BLOCKED_REASON = 'customfield_12316544'  # "Blocked Reason"
     FIELD_SEVERITY = 'customfield_12316142'  # "Severity"
 
+    # The fields read by JIRABug; fetching only these keeps responses small
+    BUG_FIELDS = ['summary', 'status', 'components', 'labels', 'issuelinks', 'versions', 'resolution', 'security',
+                  'project', 'created', 'updated', FIELD_BLOCKED_BY_BZ, FIELD_TARGET_VERSION, FIELD_RELEASE_BLOCKER,
+                  FIELD_BLOCKED_REASON, FIELD_SEVERITY]
+    JIRA_BUG_FETCH_CONCURRENCY = 8
+
+    # Bugs fetched by get_bugs, shared among all instances.
+    # Issue key -> (updated, fetched fields or None for all fields, JIRABug)
+    _bug_cache: Dict[str, Tuple[str, Optional[FrozenSet[str]], JIRABug]] = {}
+    _bug_cache_lock = threading.Lock()
+
     @staticmethod
     def get_config(runtime) -> Dict:
         major, minor = runtime.get_major_minor()
@@ -624,7 +702,11 @@ class JIRABugTracker(BugTracker):
     def get_bug(self, bugid: str, **kwargs) -> JIRABug:
         return JIRABug(self._client.issue(bugid, **kwargs))
 
-    def get_bugs(self, bugids: List[str], permissive=False, verbose=False, **kwargs) -> List[JIRABug]:
+    def get_bugs(self, bugids: List[str], permissive=False, verbose=False, fields: Optional[List[str]] = None,
+                 **kwargs) -> List[JIRABug]:
+        """
+        :param fields: Only fetch these fields of the bugs, e.g. BUG_FIELDS. None to fetch all fields.
+        """
         invalid_bugs = [b for b in bugids if not self.looks_like_a_jira_project_bug(b)]
         if invalid_bugs:
             logger.warn(f"Cannot fetch bugs from a different project (current project: {self._project}):"
@@ -635,12 +717,10 @@ class JIRABugTracker(BugTracker):
 
         # Split the request in chunks, in order not to fall into
         # jira.exceptions.JIRAError for request header size too large
-        bugs = []
-        for chunk_of_bugs in chunk(list(bugids), self.JIRA_BUG_BATCH_SIZE):
-            query = self._query(bugids=chunk_of_bugs, with_target_release=False)
-            if verbose:
-                logger.info(query)
-            bugs.extend(self._search(query))
+        chunks = list(chunk(list(bugids), self.JIRA_BUG_BATCH_SIZE))
+        with ThreadPoolExecutor(max_workers=min(self.JIRA_BUG_FETCH_CONCURRENCY, len(chunks))) as executor:
+            results = list(executor.map(lambda c: self._get_bugs_chunk(c, fields, verbose), chunks))
+        bugs = [bug for result in results for bug in result]
 
         if len(bugs) < len(bugids):
             bugids_not_found = set(bugids) - {b.id for b in bugs}
@@ -651,6 +731,48 @@ class JIRABugTracker(BugTracker):
                 logger.warn(msg)
         return bugs
 
+    def _get_bugs_chunk(self, bugids: List[str], fields: Optional[List[str]], verbose=False) -> List[JIRABug]:
+        """ Fetches bugs which are not in the bug cache or have been updated since they were cached """
+        if fields is not None:
+            fields = sorted(set(fields) | {'updated'})  # needed to tell whether a cached bug is current
+        fields_key = frozenset(fields) if fields is not None else None
+
+        with self._bug_cache_lock:
+            # a bug fetched with all fields (None) can serve any request
+            cached = {key: entry for key, entry in ((key, self._bug_cache.get(key)) for key in bugids)
+                      if entry and (entry[1] is None or (fields_key is not None and fields_key <= entry[1]))}
+        bugs = {}
+        if cached:
+            query = self._query(bugids=list(cached), with_target_release=False)
+            updated = {issue.key: issue.fields.updated
+                       for issue in self._client.search_issues(query, maxResults=0, fields='updated')}
+            bugs = {key: bug for key, (bug_updated, _, bug) in cached.items() if updated.get(key) == bug_updated}
+
+        missing = [key for key in bugids if key not in bugs]
+        if missing:
+            query = self._query(bugids=missing, with_target_release=False)
+            fetched = self._search(query, verbose=verbose, fields=fields)
+            with self._bug_cache_lock:
+                for bug in fetched:
+                    bug_updated = getattr(bug.bug.fields, 'updated', None)
+                    if bug_updated:
+                        self._bug_cache[bug.id] = (bug_updated, fields_key, bug)
+            bugs.update((bug.id, bug) for bug in fetched)
+        return [bugs[key] for key in bugids if key in bugs]
+
+    def get_bugs_updated_since(self, bugids: List[str], updated_since: float, verbose=False) -> List[JIRABug]:
+        bugs = []
+        for chunk_of_bugs in chunk(list(bugids), self.JIRA_BUG_BATCH_SIZE):
+            query = self._query(bugids=chunk_of_bugs, with_target_release=False, updated_since=updated_since)
+            bugs.extend(self._search(query, verbose=verbose))
+        return bugs
+
+    def serialize_bug(self, bug: JIRABug) -> Dict:
+        return bug.bug.raw
+
+    def deserialize_bug(self, data: Dict) -> JIRABug:
+        return JIRABug(Issue(self._client._options, self._client._session, raw=data))
+
     def get_bug_remote_links(self, bug: JIRABug):
         remote_links = self._client.remote_links(bug)
         link_dict = {}
@@ -697,7 +819,8 @@ class JIRABugTracker(BugTracker):
                exclude_labels: Optional[List] = None,
                with_target_release: bool = True,
                search_filter: str = None,
-               custom_query: str = None) -> str:
+               custom_query: str = None,
+               updated_since: Optional[float] = None) -> str:
 
         if target_release and with_target_release:
             raise ValueError("cannot use target_release and with_target_release together")
@@ -725,14 +848,19 @@ class JIRABugTracker(BugTracker):
             # https://docs.adaptavist.com/sr4js/6.55.1/features/jql-functions/included-jql-functions/calculations
             val = ','.join(f'componentMatch("{c}*")' for c in exclude_components)
             query += f" and component not in ({val})"
+        if updated_since:
+            dt = datetime.utcfromtimestamp(updated_since).strftime("%Y/%m/%d %H:%M")
+            query += f' and updated >= "{dt}"'
         if custom_query:
             query += custom_query
         return query
 
-    def _search(self, query, verbose=False) -> List[JIRABug]:
+    def _search(self, query, verbose=False, fields: Optional[List[str]] = None) -> List[JIRABug]:
         if verbose:
             logger.info(query)
-        results = self._client.search_issues(query, maxResults=0)
+        # maxResults=0 pages through all results
+        kwargs = {'fields': fields} if fields is not None else {}
+        results = self._client.search_issues(query, maxResults=0, **kwargs)
         return [JIRABug(j) for j in results]
 
     def blocker_search(self, status, search_filter='default', verbose=False, **kwargs):
@@ -744,18 +872,20 @@ class JIRABugTracker(BugTracker):
         )
         return self._search(query, verbose=verbose, **kwargs)
 
-    def search(self, status, search_filter='default', verbose=False):
+    def search(self, status, search_filter='default', verbose=False, updated_since: Optional[float] = None):
         query = self._query(
             status=status,
-            search_filter=search_filter
+            search_filter=search_filter,
+            updated_since=updated_since,
         )
         return self._search(query, verbose=verbose)
 
-    def cve_tracker_search(self, status, search_filter='default', verbose=False):
+    def cve_tracker_search(self, status, search_filter='default', verbose=False, updated_since: Optional[float] = None):
         query = self._query(
             status=status,
             search_filter=search_filter,
             include_labels=["SecurityTracking"],
+            updated_since=updated_since,
         )
         return self._search(query, verbose=verbose)
 
@@ -781,6 +911,40 @@ class JIRABugTracker(BugTracker):
                 f'before("{dt}")'
         return self._search(query, verbose=verbose)
 
+    def get_status_changes(self, bugs: Iterable[JIRABug]) -> Dict[str, List[BugStatusChange]]:
+        """ Queries the status changes of the given bugs from their changelogs.
+        A search only returns a limited number of changelog entries per issue;
+        bugs whose changelog is incomplete are left out of the result.
+        """
+        status_changes = {}
+        for chunk_of_bugs in chunk([b.id for b in bugs], self.JIRA_BUG_BATCH_SIZE):
+            query = f"issue in ({','.join(chunk_of_bugs)})"
+            for issue in self._client.search_issues(query, maxResults=0, fields='status', expand='changelog'):
+                changelog = issue.changelog
+                if changelog.total > len(changelog.histories):
+                    logger.debug(f"Changelog of {issue.key} is incomplete ({len(changelog.histories)} of {changelog.total})")
+                    continue
+                changes = filter(None, map(BugStatusChange.from_jira_history, changelog.histories))
+                status_changes[issue.key] = sorted(changes, key=lambda change: change.timestamp)
+        return status_changes
+
+    def filter_bugs_by_status_changes(self, bugs: Iterable[JIRABug], status_changes: Dict[str, List[BugStatusChange]],
+                                      desired_statuses: Iterable[str], sweep_cutoff_timestamp: float) -> List:
+        """ Equivalent of the `status was in (desired_statuses) before(cutoff)` query of filter_bugs_by_cutoff_event:
+        finds those bugs which have been in one of the desired statuses at some point before the given timestamp.
+        """
+        desired_statuses = {s.upper() for s in desired_statuses}
+        qualified_bugs = []
+        for bug in bugs:
+            if bug.creation_time_parsed().timestamp() > sweep_cutoff_timestamp:
+                continue
+            changes = status_changes[bug.id]
+            initial_status = changes[0].old if changes else bug.status
+            statuses = [initial_status] + [c.new for c in changes if c.timestamp < sweep_cutoff_timestamp]
+            if any(s.upper() in desired_statuses for s in statuses):
+                qualified_bugs.append(bug)
+        return qualified_bugs
+
     async def filter_attached_bugs(self, bugs: Iterable):
         bugs = list(bugs)
         api = AsyncErrataAPI()
@@ -798,10 +962,12 @@ class JIRABugTracker(BugTracker):
         return cli_opts.id_convert_str(id_string)
 
     def get_tracker_bugs(self, bug_ids: List, strict: bool = False, verbose: bool = False):
-        return [b for b in self.get_bugs(bug_ids, permissive=not strict, verbose=verbose) if b.is_tracker_bug()]
+        return [b for b in self.get_bugs(bug_ids, permissive=not strict, verbose=verbose, fields=self.BUG_FIELDS)
+                if b.is_tracker_bug()]
 
     def get_flaw_bugs(self, bug_ids: List, strict: bool = True, verbose: bool = False):
-        return [b for b in self.get_bugs(bug_ids, permissive=not strict, verbose=verbose) if b.is_flaw_bug()]
+        return [b for b in self.get_bugs(bug_ids, permissive=not strict, verbose=verbose, fields=self.BUG_FIELDS)
+                if b.is_flaw_bug()]
 
 
 class BugzillaBugTracker(BugTracker):
@@ -848,6 +1014,24 @@ class BugzillaBugTracker(BugTracker):
                 print(msg)
         return bugs
 
+    def get_bugs_updated_since(self, bugids: List[int], updated_since: float, verbose=False) -> List[BugzillaBug]:
+        bugs = []
+        for chunk_of_bugs in chunk(list(bugids), constants.BUG_LOOKUP_CHUNK_SIZE):
+            query = _construct_query_url({'server': self._server}, [], updated_since=updated_since)
+            query.addFilter('bug_id', 'anyexact', ','.join(str(b) for b in chunk_of_bugs))
+            bugs.extend(self._search(query, verbose))
+        return bugs
+
+    def serialize_bug(self, bug: BugzillaBug) -> Dict:
+        # xmlrpc DateTime values are not json serializable
+        return {k: {'__datetime__': v.value} if isinstance(v, xmlrpc.client.DateTime) else v
+                for k, v in bug.bug.get_raw_data().items()}
+
+    def deserialize_bug(self, data: Dict) -> BugzillaBug:
+        data = {k: xmlrpc.client.DateTime(v['__datetime__']) if isinstance(v, dict) and '__datetime__' in v else v
+                for k, v in data.items()}
+        return BugzillaBug(bugzilla.bug.Bug(self._client, dict=data))
+
     def client(self):
         return self._client
 
@@ -855,12 +1039,12 @@ class BugzillaBugTracker(BugTracker):
         query = _construct_query_url(self.config, status, search_filter, flag='blocker+')
         return self._search(query, verbose)
 
-    def search(self, status, search_filter='default', verbose=False):
-        query = _construct_query_url(self.config, status, search_filter)
+    def search(self, status, search_filter='default', verbose=False, updated_since: Optional[float] = None):
+        query = _construct_query_url(self.config, status, search_filter, updated_since=updated_since)
         return self._search(query, verbose)
 
-    def cve_tracker_search(self, status, search_filter='default', verbose=False):
-        query = _construct_query_url(self.config, status, search_filter)
+    def cve_tracker_search(self, status, search_filter='default', verbose=False, updated_since: Optional[float] = None):
+        query = _construct_query_url(self.config, status, search_filter, updated_since=updated_since)
         query.addKeyword('SecurityTracking')
         return self._search(query, verbose)
 
@@ -939,6 +1123,23 @@ class BugzillaBugTracker(BugTracker):
         :param sweep_cutoff_timestamp: a unix timestamp
         :return: a list of found bugs
         """
+        # Filters out bugs that are created after the sweep cutoff timestamp; there is no need to query their history
+        before_cutoff_bugs = [bug for bug in bugs if to_timestamp(bug.creation_time) <= sweep_cutoff_timestamp]
+        status_changes = self.get_status_changes(before_cutoff_bugs)
+        return self.filter_bugs_by_status_changes(bugs, status_changes, desired_statuses, sweep_cutoff_timestamp)
+
+    def get_status_changes(self, bugs: Iterable[BugzillaBug]) -> Dict[int, List[BugStatusChange]]:
+        bugs = list(bugs)
+        if not bugs:
+            return {}
+        bugs_history = self._client.bugs_history_raw([bug.id for bug in bugs])
+        # We are only interested in "status" field changes
+        return {bug_history["id"]: list(filter(None, map(BugStatusChange.from_bugzilla_history, bug_history["history"])))
+                for bug_history in bugs_history["bugs"]}
+
+    def filter_bugs_by_status_changes(self, bugs: Iterable[BugzillaBug], status_changes: Dict[int, List[BugStatusChange]],
+                                      desired_statuses: Iterable[str], sweep_cutoff_timestamp: float) -> List:
+        bugs = list(bugs)
         qualified_bugs = []
         desired_statuses = set(desired_statuses)
 
@@ -948,36 +1149,10 @@ class BugzillaBugTracker(BugTracker):
             logger.info(
                 f"{len(bugs) - len(before_cutoff_bugs)} of {len(bugs)} bugs are ignored because they were created after the sweep cutoff timestamp {sweep_cutoff_timestamp} ({datetime.utcfromtimestamp(sweep_cutoff_timestamp)})")
 
-        # Queries bug history
-        bugs_history = self._client.bugs_history_raw([bug.id for bug in before_cutoff_bugs])
-
-        class BugStatusChange:
-            def __init__(self, timestamp: int, old: str, new: str) -> None:
-                self.timestamp = timestamp  # when this change is made?
-                self.old = old  # old status
-                self.new = new  # new status
-
-            @classmethod
-            def from_history_ent(cls, history):
-                """ Converts from bug history dict returned from Bugzilla to BugStatusChange object.
-                The history dict returned from Bugzilla includes bug changes on all fields, but we are only interested in the "status" field change.
-                :return: BugStatusChange object, or None if the history doesn't include a "status" field change.
-                """
-                status_change = next(filter(lambda change: change["field_name"] == "status", history["changes"]), None)
-                if not status_change:
-                    return None
-                return cls(to_timestamp(history["when"]), status_change["removed"], status_change["added"])
-
-        for bug, bug_history in zip(before_cutoff_bugs, bugs_history["bugs"]):
-            assert bug.id == bug_history[
-                "id"]  # `bugs_history["bugs"]` returned from Bugzilla API should have the same order as `before_cutoff_bugs`, but be safe
-
-            # We are only interested in "status" field changes
-            status_changes = filter(None, map(BugStatusChange.from_history_ent, bug_history["history"]))
-
+        for bug in before_cutoff_bugs:
             # status changes after the cutoff event
             after_cutoff_status_changes = list(
-                itertools.dropwhile(lambda change: change.timestamp <= sweep_cutoff_timestamp, status_changes))
+                itertools.dropwhile(lambda change: change.timestamp <= sweep_cutoff_timestamp, status_changes[bug.id]))
 
             # determines the status of the bug at the moment of the sweep cutoff event
             if not after_cutoff_status_changes:
@@ -1071,9 +1246,9 @@ def is_viable_bug(bug_obj):
     return bug_obj.status in ["MODIFIED", "ON_QA", "VERIFIED"]
 
 
-def _construct_query_url(config, status, search_filter='default', flag=None):
+def _construct_query_url(config, status, search_filter='default', flag=None, updated_since: Optional[float] = None):
     query_url = SearchURL(config)
-    query_url.fields = ['id', 'status', 'summary', 'creation_time', 'cf_pm_score', 'component',
+    query_url.fields = ['id', 'status', 'summary', 'creation_time', 'last_change_time', 'cf_pm_score', 'component',
                         # the api expects "sub_components" for the field "sub_component"
                         # https://github.com/python-bugzilla/python-bugzilla/blob/main/bugzilla/base.py#L321
                         'sub_components',
@@ -1101,6 +1276,10 @@ def _construct_query_url(config, status, search_filter='default', flag=None):
     if flag:
         query_url.addFlagFilter(flag, "substring")
 
+    if updated_since:
+        query_url.addFilter('delta_ts', 'greaterthaneq',
+                            datetime.utcfromtimestamp(updated_since).strftime('%Y-%m-%d %H:%M:%S'))
+
     return query_url
 
 
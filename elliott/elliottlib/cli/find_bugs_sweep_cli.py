@@ -3,9 +3,10 @@ import click
 import sys
 import traceback
 from datetime import datetime
-from typing import List, Dict, Set
+from typing import List, Dict, Optional, Set
 
 from elliottlib.assembly import assembly_issues_config
+from elliottlib.bug_cache import BugCacheStore, BugSweepCache
 from elliottlib.bzutil import BugTracker, Bug, JIRABug
 from elliottlib import (Runtime, bzutil, constants, errata, logutil)
 from elliottlib.cli import common
@@ -30,11 +31,13 @@ class FindBugsMode:
     def exclude_status(self, status: List):
         self.status -= set(status)
 
-    def search(self, bug_tracker_obj: BugTracker, verbose: bool = False):
+    def search(self, bug_tracker_obj: BugTracker, verbose: bool = False, updated_since: Optional[float] = None):
         func = bug_tracker_obj.cve_tracker_search if self.cve_only else bug_tracker_obj.search
+        kwargs = {'updated_since': updated_since} if updated_since else {}
         return func(
             self.status,
-            verbose=verbose
+            verbose=verbose,
+            **kwargs
         )
 
 
@@ -78,6 +81,9 @@ class FindBugsSweep(FindBugsMode):
 @click.option("--cve-only",
               is_flag=True,
               help="Only find CVE trackers")
+@click.option("--bug-cache-dir", metavar="DIR", envvar="ELLIOTT_BUG_CACHE_DIR", default=None,
+              help="Keep bug tracker state in this directory so that repeated sweeps only query bugs which changed "
+                   "since the previous sweep. Also: ELLIOTT_BUG_CACHE_DIR")
 @click.option("--noop", "--dry-run",
               is_flag=True,
               default=False,
@@ -85,7 +91,7 @@ class FindBugsSweep(FindBugsMode):
 @click.pass_obj
 @click_coroutine
 async def find_bugs_sweep_cli(runtime: Runtime, advisory_id, default_advisory_type, include_status, exclude_status,
-                              report, output, into_default_advisories, brew_event, cve_only, noop):
+                              report, output, into_default_advisories, brew_event, cve_only, bug_cache_dir, noop):
     """Find OCP bugs and (optional) add them to ADVISORY.
 
  The --group automatically determines the correct target-releases to search
@@ -125,16 +131,23 @@ advisory with the --add option.
     find_bugs_obj.include_status(include_status)
     find_bugs_obj.exclude_status(exclude_status)
 
+    bug_cache_store = BugCacheStore(bug_cache_dir) if bug_cache_dir else None
+
     bugs: type_bug_list = []
     errors = []
-    for b in [runtime.get_bug_tracker('jira'), runtime.get_bug_tracker('bugzilla')]:
-        try:
-            bugs.extend(await find_and_attach_bugs(runtime, advisory_id, default_advisory_type, major_version, find_bugs_obj,
-                        output, brew_event, noop, count_advisory_attach_flags, b))
-        except Exception as e:
-            errors.append(e)
-            logger.error(traceback.format_exc())
-            logger.error(f'exception with {b.type} bug tracker: {e}')
+    try:
+        for b in [runtime.get_bug_tracker('jira'), runtime.get_bug_tracker('bugzilla')]:
+            try:
+                bug_cache = BugSweepCache(bug_cache_store, b) if bug_cache_store else None
+                bugs.extend(await find_and_attach_bugs(runtime, advisory_id, default_advisory_type, major_version, find_bugs_obj,
+                            output, brew_event, noop, count_advisory_attach_flags, b, bug_cache=bug_cache))
+            except Exception as e:
+                errors.append(e)
+                logger.error(traceback.format_exc())
+                logger.error(f'exception with {b.type} bug tracker: {e}')
+    finally:
+        if bug_cache_store:
+            bug_cache_store.close()
 
     if errors:
         raise ElliottFatalError(f"Error finding or attaching bugs: {errors}. See logs for more information.")
@@ -153,8 +166,14 @@ advisory with the --add option.
     sys.exit(0)
 
 
-async def get_bugs_sweep(runtime: Runtime, find_bugs_obj, brew_event, bug_tracker):
-    bugs = find_bugs_obj.search(bug_tracker_obj=bug_tracker, verbose=runtime.debug)
+async def get_bugs_sweep(runtime: Runtime, find_bugs_obj, brew_event, bug_tracker,
+                         bug_cache: Optional[BugSweepCache] = None):
+    # The bug cache answers the same queries as the bug tracker, only querying what changed since the last sweep
+    cached_tracker = bug_cache or bug_tracker
+    if bug_cache:
+        bugs = bug_cache.search(find_bugs_obj, verbose=runtime.debug)
+    else:
+        bugs = find_bugs_obj.search(bug_tracker_obj=bug_tracker, verbose=runtime.debug)
 
     sweep_cutoff_timestamp = await get_sweep_cutoff_timestamp(runtime, cli_brew_event=brew_event)
     if sweep_cutoff_timestamp:
@@ -163,15 +182,15 @@ async def get_bugs_sweep(runtime: Runtime, find_bugs_obj, brew_event, bug_tracke
                     f"cutoff time {utc_ts}...")
         qualified_bugs = []
         for chunk_of_bugs in chunk(bugs, constants.BUG_LOOKUP_CHUNK_SIZE):
-            b = bug_tracker.filter_bugs_by_cutoff_event(chunk_of_bugs, find_bugs_obj.status,
-                                                        sweep_cutoff_timestamp, verbose=runtime.debug)
+            b = cached_tracker.filter_bugs_by_cutoff_event(chunk_of_bugs, find_bugs_obj.status,
+                                                           sweep_cutoff_timestamp, verbose=runtime.debug)
             qualified_bugs.extend(b)
         logger.info(f"{len(qualified_bugs)} of {len(bugs)} bugs are qualified for the cutoff time {utc_ts}...")
         bugs = qualified_bugs
 
     # filter bugs that have been swept into other advisories
     logger.info("Filtering bugs that haven't been attached to any advisories...")
-    attached_bugs = await bug_tracker.filter_attached_bugs(bugs)
+    attached_bugs = await cached_tracker.filter_attached_bugs(bugs)
     if attached_bugs:
         attached_bug_ids = {b.id for b in attached_bugs}
         logger.warning("The following bugs have been attached to advisories: %s", attached_bug_ids)
@@ -195,13 +214,14 @@ async def get_bugs_sweep(runtime: Runtime, find_bugs_obj, brew_event, bug_tracke
 
 
 async def find_and_attach_bugs(runtime: Runtime, advisory_id, default_advisory_type, major_version,
-                               find_bugs_obj, output, brew_event, noop, count_advisory_attach_flags, bug_tracker):
+                               find_bugs_obj, output, brew_event, noop, count_advisory_attach_flags, bug_tracker,
+                               bug_cache: Optional[BugSweepCache] = None):
     if output == 'text':
         statuses = sorted(find_bugs_obj.status)
         tr = bug_tracker.target_release()
         green_prefix(f"Searching {bug_tracker.type} for bugs with status {statuses} and target releases: {tr}\n")
 
-    bugs = await get_bugs_sweep(runtime, find_bugs_obj, brew_event, bug_tracker)
+    bugs = await get_bugs_sweep(runtime, find_bugs_obj, brew_event, bug_tracker, bug_cache=bug_cache)
 
     advisory_ids = runtime.get_default_advisories()
     bugs_by_type = categorize_bugs_by_type(bugs, advisory_ids,
@@ -1,12 +1,10 @@
 import asyncio
-import functools
 import json
 import re
-from typing import Dict, List, Set, Union
+from typing import Dict, List, Optional, Set, Union
 
 import click
 import koji
-import requests
 from errata_tool import ErrataException
 
 import elliottlib
@@ -14,6 +12,7 @@ from elliottlib import Runtime, brew, constants, errata, logutil
 from elliottlib import exectools
 from elliottlib.assembly import assembly_metadata_config, assembly_rhcos_config
 from elliottlib.build_finder import BuildFinder
+from elliottlib.errata_async import AsyncErrataAPI, AsyncErrataBuildResolver
 from elliottlib.cli.common import (cli, find_default_advisory,
                                    use_default_advisory_option, click_coroutine)
 from elliottlib.exceptions import ElliottFatalError
@@ -21,7 +20,7 @@ from elliottlib.imagecfg import ImageMetadata
 from elliottlib.util import (ensure_erratatool_auth, exit_unauthenticated,
                              get_release_version, green_prefix, green_print,
                              isolate_el_version_in_brew_tag,
-                             parallel_results_with_progress, pbar_header, progress_func,
+                             pbar_header, progress_func,
                              red_print, yellow_print)
 
 LOGGER = logutil.getLogger(__name__)
@@ -180,12 +179,18 @@ PRESENT advisory. Here are some examples:
         # e.g. :
         # ('atomic-openshift-descheduler-container', 'v4.3.23', '202005250821', 'RHEL-7-OSE-4.3').
         # Build(atomic-openshift-descheduler-container-v4.3.23-202005250821).
-        unshipped_builds = parallel_results_with_progress(
-            unshipped_nvrps,
-            lambda nvrp: elliottlib.errata.get_brew_build('{}-{}-{}'.format(nvrp[0], nvrp[1], nvrp[2]), nvrp[3], session=requests.Session())
-        )
-        previous = len(unshipped_builds)
-        unshipped_builds = _filter_out_inviable_builds(kind, unshipped_builds, elliottlib.errata)
+        errata_api = AsyncErrataAPI()
+        try:
+            resolver = AsyncErrataBuildResolver(errata_api)
+            click.secho('[', nl=False)
+            unshipped_builds = await asyncio.gather(*[
+                _with_progress(resolver.get_brew_build(f"{nvrp[0]}-{nvrp[1]}-{nvrp[2]}", nvrp[3])) for nvrp in unshipped_nvrps
+            ])
+            click.echo(']')
+            previous = len(unshipped_builds)
+            unshipped_builds = await _filter_out_inviable_builds(kind, unshipped_builds, resolver)
+        finally:
+            await errata_api.close()
         if len(unshipped_builds) != previous:
             click.echo(f'Filtered out {previous - len(unshipped_builds)} inviable build(s)')
 
@@ -282,18 +287,25 @@ def _fetch_builds_from_diff(from_payload, to_payload, tag_pv_map):
     return _fetch_nvrps_by_nvr_or_id(nvrs, tag_pv_map)
 
 
-def _find_shipped_builds(build_ids: List[Union[str, int]], brew_session: koji.ClientSession) -> Set[Union[str, int]]:
+def _find_shipped_builds(build_ids: List[Union[str, int]], brew_session: koji.ClientSession,
+                         known_tags: Optional[Dict[Union[str, int], Set[str]]] = None) -> Set[Union[str, int]]:
     """ Finds shipped builds
     :param builds: list of Brew build IDs or NVRs
     :param brew_session: Brew session
+    :param known_tags: Tag names of builds which have already been queried; keys are Brew build IDs or NVRs
     :return: a set of shipped Brew build IDs or NVRs
     """
     shipped_ids = set()
-    tag_lists = brew.get_builds_tags(build_ids, brew_session)
+    tag_names = dict(known_tags or {})
+    unknown_ids = [build_id for build_id in build_ids if build_id not in tag_names]
+    if unknown_ids:
+        tag_lists = brew.get_builds_tags(unknown_ids, brew_session)
+        for build_id, tags in zip(unknown_ids, tag_lists):
+            tag_names[build_id] = {tag["name"] for tag in tags}
     released_tag_pattern = re.compile(r"^RH[BSE]A-.+-released$")  # https://issues.redhat.com/browse/ART-3277
-    for build_id, tags in zip(build_ids, tag_lists):
+    for build_id in build_ids:
         # a shipped build with OCP Errata should have a Brew tag ending with `-released`, like `RHBA-2020:2713-released`
-        shipped = any(map(lambda tag: released_tag_pattern.match(tag["name"]), tags))
+        shipped = any(map(released_tag_pattern.match, tag_names[build_id]))
         if shipped:
             shipped_ids.add(build_id)
     return shipped_ids
@@ -321,7 +333,8 @@ async def _fetch_builds_by_kind_image(runtime: Runtime, tag_pv_map: Dict[str, st
         click.echo("Do not filter out shipped builds, all builds will be attached")
     else:
         click.echo("Filtering out shipped builds...")
-        shipped = _find_shipped_builds([b["id"] for b in brew_latest_builds], brew_session)
+        shipped = _find_shipped_builds([b["id"] for b in brew_latest_builds], brew_session,
+                                       known_tags={b["id"]: b["_tags"] for b in brew_latest_builds if "_tags" in b})
     unshipped = [b for b in brew_latest_builds if b["id"] not in shipped]
     click.echo(f'Found {len(shipped)+len(unshipped)} builds, of which {len(unshipped)} are new.')
     nvrps = _gen_nvrp_tuples(unshipped, tag_pv_map)
@@ -372,14 +385,13 @@ async def _fetch_builds_by_kind_rpm(runtime: Runtime, tag_pv_map: Dict[str, str]
     click.echo('Hold on a moment, fetching Brew builds')
     builds: List[Dict] = []
 
+    builder = BuildFinder(brew_session, logger=LOGGER)
     if member_only:  # Sweep only member rpms
-        for tag in tag_pv_map:
-            tasks = [exectools.to_thread(progress_func, functools.partial(rpm.get_latest_build, default=None, el_target=tag)) for rpm in runtime.rpm_metas()]
-            builds_for_tag = await asyncio.gather(*tasks)
-            builds.extend(filter(lambda b: b is not None, builds_for_tag))
+        # Latest builds of all member rpms for all tags are resolved together with a few multicalls
+        builds = await exectools.to_thread(builder.from_rpm_members, runtime.rpm_metas(), tag_pv_map.keys(),
+                                           runtime.assembly, runtime.get_releases_config())
 
     else:  # Sweep all tagged rpms
-        builder = BuildFinder(brew_session, logger=LOGGER)
         for tag in tag_pv_map:
             # keys are rpm component names, values are nvres
             component_builds: Dict[str, Dict] = builder.from_tag("rpm", tag, inherit=False, assembly=assembly, event=runtime.brew_event)
@@ -423,7 +435,8 @@ async def _fetch_builds_by_kind_rpm(runtime: Runtime, tag_pv_map: Dict[str, str]
         click.echo("Do not filter out shipped builds, all builds will be attached")
     else:
         click.echo("Filtering out shipped builds...")
-        shipped = _find_shipped_builds([b["id"] for b in qualified_builds], brew_session)
+        shipped = _find_shipped_builds([b["id"] for b in qualified_builds], brew_session,
+                                       known_tags={b["id"]: b["_tags"] for b in qualified_builds if "_tags" in b})
     unshipped = [b for b in qualified_builds if b["id"] not in shipped]
     click.echo(f'Found {len(shipped)+len(unshipped)} builds, of which {len(unshipped)} are new.')
     nvrps = _gen_nvrp_tuples(unshipped, tag_pv_map)
@@ -431,27 +444,19 @@ async def _fetch_builds_by_kind_rpm(runtime: Runtime, tag_pv_map: Dict[str, str]
     return nvrps
 
 
-def _filter_out_inviable_builds(kind, results, errata):
+async def _with_progress(coro, char='*'):
+    result = await coro
+    click.secho(char, fg='green', nl=False)
+    return result
+
+
+async def _filter_out_inviable_builds(kind, results, resolver: AsyncErrataBuildResolver):
+    # check if build is attached to any existing advisory for this version
+    advisory_ids = sorted({e['id'] for b in results for e in b.all_errata})
+    release_versions = dict(zip(advisory_ids, await asyncio.gather(*[resolver.get_release_version(eid) for eid in advisory_ids])))
     unshipped_builds = []
-    errata_version_cache = {}  # avoid reloading the same errata for multiple builds
     for b in results:
-        # check if build is attached to any existing advisory for this version
-        in_same_version = False
-        for eid in [e['id'] for e in b.all_errata]:
-            if eid not in errata_version_cache:
-                metadata_comments_json = errata.get_metadata_comments_json(eid)
-                if not metadata_comments_json:
-                    # Does not contain ART metadata; consider it unversioned
-                    red_print("Errata {} Does not contain ART metadata\n".format(eid))
-                    errata_version_cache[eid] = ''
-                    continue
-                # it's possible for an advisory to have multiple metadata comments,
-                # though not very useful (there's a command for adding them,
-                # but not much point in doing it). just looking at the first one is fine.
-                errata_version_cache[eid] = metadata_comments_json[0]['release']
-            if errata_version_cache[eid] == get_release_version(b.product_version):
-                in_same_version = True
-                break
-        if not in_same_version:
+        release_version = get_release_version(b.product_version)
+        if not any(release_versions[e['id']] == release_version for e in b.all_errata):
             unshipped_builds.append(b)
     return unshipped_builds
@@ -27,6 +27,12 @@ GOLANG_BUILDER_CVE_COMPONENT = 'openshift-golang-builder-container'
 BUG_LOOKUP_CHUNK_SIZE = 100
 BUG_ATTACH_CHUNK_SIZE = 100
 
+# find-bugs:sweep bug cache (see elliottlib.bug_cache)
+BUG_CACHE_SYNC_OVERLAP = 5 * 60  # seconds; tolerates clock skew and the minute granularity of JQL date queries
+BUG_CACHE_MAX_SYNC_AGE = 24 * 60 * 60  # seconds after which a full search replaces the incremental one
+BUG_CACHE_UNATTACHED_TTL = 15 * 60  # seconds for which a bug found unattached to any advisory is not rechecked
+BUG_CACHE_ATTACHED_TTL = 4 * 60 * 60  # seconds for which a bug found attached to an advisory is not rechecked
+
 # When severity isn't set on all tracking and flaw bugs, default to "Low"
 # https://jira.coreos.com/browse/ART-1192
 SECURITY_IMPACT = ["Low", "Low", "Moderate", "Important", "Critical"]
@@ -1,5 +1,6 @@
 import asyncio
 import base64
+import json
 from typing import Dict, Iterable, List, Set, Union
 from urllib.parse import quote, urlparse
 from aiohttp import ClientResponseError, ClientTimeout
@@ -9,7 +10,7 @@ import gssapi
 from elliottlib.exectools import limit_concurrency
 
 from elliottlib.rpm_utils import parse_nvr
-from elliottlib import constants, util, logutil
+from elliottlib import brew, constants, exceptions, util, logutil
 
 _LOGGER = logutil.getLogger(__name__)
 
@@ -20,7 +21,9 @@ class AsyncErrataAPI:
         self._timeout = ClientTimeout(total=60 * 15)  # 900 seconds (15 min)
         self._errata_gssapi_name = gssapi.Name(f"HTTP@{urlparse(self._errata_url).hostname}", gssapi.NameType.hostbased_service)
         self._gssapi_flags = [gssapi.RequirementFlag.out_of_sequence_detection]
-        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=32, force_close=True), timeout=self._timeout)
+        self._gssapi_creds = None  # acquired on first use and reused for every request
+        # Keep connections alive so that concurrent lookups share a pool of TLS connections
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=32), timeout=self._timeout)
         self._headers = {
             "Content-Type": "application/json",
             "Accept": "application/json",
@@ -30,7 +33,10 @@ class AsyncErrataAPI:
         await self._session.close()
 
     def _generate_auth_header(self):
-        client_ctx = gssapi.SecurityContext(name=self._errata_gssapi_name, usage='initiate', flags=self._gssapi_flags)
+        if self._gssapi_creds is None:
+            self._gssapi_creds = gssapi.Credentials(usage='initiate')
+        client_ctx = gssapi.SecurityContext(name=self._errata_gssapi_name, usage='initiate', flags=self._gssapi_flags,
+                                            creds=self._gssapi_creds)
         out_token = client_ctx.step(b"")
         return f'Negotiate {base64.b64encode(out_token).decode()}'
 
@@ -61,6 +67,40 @@ class AsyncErrataAPI:
             nvr for pv in pv_builds.values() for pvb in pv["builds"] for nvr in pvb
         }
 
+    async def get_brew_build(self, nvr: str) -> Dict:
+        path = f"/api/v1/build/{quote(nvr)}"
+        return await self._make_request(aiohttp.hdrs.METH_GET, path)
+
+    async def get_comments(self, advisory_id: int):
+        path = "/api/v1/comments"
+        # This is a paginated API, we need to increment page[number] until an empty array is returned.
+        params = {"filter[errata_id]": str(int(advisory_id)), "filter[type]": "Comment", "page[number]": 1}
+        while True:
+            result = await self._make_request(aiohttp.hdrs.METH_GET, path, params=params)
+            data: List[Dict] = result.get('data', [])
+            if not data:
+                break
+            for item in data:
+                yield item
+            params["page[number]"] += 1
+
+    async def get_metadata_comments_json(self, advisory_id: int) -> List[Dict]:
+        """ Fetch just the comments that look like our metadata JSON comments from the advisory.
+        :return: a list of metadata dicts, oldest first
+        """
+        metadata_json_list = []
+        comments = [c async for c in self.get_comments(advisory_id)]
+        # they come out in (mostly) reverse order, start at the beginning
+        for c in reversed(comments):
+            try:
+                metadata = json.loads(c['attributes']['text'])
+            except Exception:
+                pass
+            else:
+                if 'release' in metadata and 'kind' in metadata and 'impetus' in metadata:
+                    metadata_json_list.append(metadata)
+        return metadata_json_list
+
     async def get_cves(self, advisory: Union[int, str]) -> List[str]:
         # Errata API "/cve/show/{advisory}.json" doesn't return the correct CVEs for some RHSAs.
         # Not sure if it's an Errata bug. Use a different approach instead.
@@ -112,6 +152,65 @@ class AsyncErrataAPI:
         return await self._make_request(aiohttp.hdrs.METH_GET, path)
 
 
+class AsyncErrataBuildResolver:
+    """ Resolves Brew builds and advisory releases with a shared AsyncErrataAPI.
+    Each NVR and each advisory is looked up at most once per resolver, no matter how many
+    builds refer to it, and concurrent lookups share the pooled connections of the API.
+    """
+
+    def __init__(self, api: AsyncErrataAPI, concurrency: int = 32):
+        """
+        :param api: Errata API
+        :param concurrency: Maximum number of concurrent Errata Tool requests
+        """
+        self._api = api
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._build_bodies: Dict[str, asyncio.Future] = {}
+        self._release_versions: Dict[int, asyncio.Future] = {}
+
+    def _memoize(self, cache: Dict, key, coro_func):
+        future = cache.get(key)
+        if future is None:
+            future = cache[key] = asyncio.ensure_future(coro_func())
+        return future
+
+    async def _fetch_build_body(self, nvr: str) -> Dict:
+        async with self._semaphore:
+            try:
+                return await self._api.get_brew_build(nvr)
+            except ClientResponseError as e:
+                raise exceptions.BrewBuildException(f"{nvr}: {e.message}")
+
+    async def _fetch_release_version(self, advisory_id: int) -> str:
+        async with self._semaphore:
+            metadata_comments_json = await self._api.get_metadata_comments_json(advisory_id)
+        if not metadata_comments_json:
+            # Does not contain ART metadata; consider it unversioned
+            util.red_print("Errata {} Does not contain ART metadata\n".format(advisory_id))
+            return ''
+        # it's possible for an advisory to have multiple metadata comments,
+        # though not very useful (there's a command for adding them,
+        # but not much point in doing it). just looking at the first one is fine.
+        return metadata_comments_json[0]['release']
+
+    async def get_brew_build(self, nvr: str, product_version: str = '') -> brew.Build:
+        """ Get Brew build details from Errata Tool.
+        :param nvr: A name-version-release string of a brew rpm/image build
+        :param product_version: The product version tag as given to ET when attaching a build
+        :return: An initialized Build object with the build details
+        :raises exceptions.BrewBuildException: When build not found
+        """
+        body = await self._memoize(self._build_bodies, nvr, lambda: self._fetch_build_body(nvr))
+        return brew.Build(nvr=nvr, body=body, product_version=product_version)
+
+    async def get_release_version(self, advisory_id: int) -> str:
+        """ Get the OCP release (e.g. "4.12") an advisory is for, according to its ART metadata comment.
+        :param advisory_id: advisory id
+        :return: the release, or an empty string if the advisory has no ART metadata
+        """
+        return await self._memoize(self._release_versions, advisory_id, lambda: self._fetch_release_version(advisory_id))
+
+
 class AsyncErrataUtils:
     @classmethod
     async def get_advisory_cve_exclusions(cls, api: AsyncErrataAPI, advisory_id: int):
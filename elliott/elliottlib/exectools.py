@@ -13,7 +13,7 @@ import subprocess
 import time
 import urllib
 
-from elliottlib import assertion, logutil, pushd
+from elliottlib import assertion, logutil, pushd, telemetry
 
 SUCCESS = 0
 
@@ -105,11 +105,13 @@ def cmd_gather(cmd, text_mode=True):
     cmd_info = '[cwd={}]: {}'.format(cwd, json.dumps(cmd_list))
 
     logger.debug("Executing:cmd_gather {}".format(cmd_info))
-    proc = subprocess.Popen(
-        cmd_list, cwd=cwd,
-        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    out, err = proc.communicate()
-    rc = proc.returncode
+    with telemetry.span('subprocess', telemetry.command_class(cmd_list), cmd=cmd_list, cwd=cwd) as trace_fields:
+        proc = subprocess.Popen(
+            cmd_list, cwd=cwd,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        rc = proc.returncode
+        trace_fields.update(rc=rc, stdout_bytes=len(out), stderr_bytes=len(err))
     if text_mode:
         out_str = out.decode(encoding="utf-8")
         err_str = err.decode(encoding="utf-8")
@@ -134,13 +136,15 @@ async def cmd_gather_async(cmd, text_mode=True):
     cmd_info = '[cwd={}]: {}'.format(cwd, json.dumps(cmd_list))
 
     logger.debug("Executing:cmd_gather {}".format(cmd_info))
-    proc = await asyncio.create_subprocess_exec(
-        *cmd, cwd=cwd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE)
-
-    out, err = await proc.communicate()
-    rc = proc.returncode
+    with telemetry.span('subprocess', telemetry.command_class(cmd_list), cmd=cmd_list, cwd=cwd) as trace_fields:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE)
+
+        out, err = await proc.communicate()
+        rc = proc.returncode
+        trace_fields.update(rc=rc, stdout_bytes=len(out), stderr_bytes=len(err))
 
     if text_mode:
         out_str = out.decode(encoding="utf-8")
@@ -12,7 +12,7 @@ from typing import Dict, Optional, Tuple
 import click
 import yaml
 
-from elliottlib import brew, constants, gitdata, logutil, util
+from elliottlib import brew, constants, gitdata, logutil, telemetry, util
 from elliottlib.assembly import AssemblyTypes, assembly_basis_event, assembly_group_config, assembly_type
 from elliottlib.exceptions import ElliottFatalError
 from elliottlib.imagecfg import ImageMetadata
@@ -278,6 +278,9 @@ class Runtime(object):
         debug_log_handler.setLevel(logging.DEBUG)
         self.logger.addHandler(debug_log_handler)
 
+        # Structured record of subprocess and koji api calls; see doozer analyze:trace
+        telemetry.enable_trace(os.path.join(self.working_dir, "trace.jsonl"))
+
     def image_metas(self):
         return list(self.image_map.values())
 
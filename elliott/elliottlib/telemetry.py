@@ -0,0 +1,119 @@
+"""
+A structured trace of the external work performed during a run.
+
+Each subprocess executed through exectools and each koji api call made through KojiWrapper is
+recorded as a span (one JSON object per line) in a trace file. The format is the same as that
+of doozer's trace, so `doozer analyze:trace <working_dir>/trace.jsonl` can summarize an elliott
+run and convert it into a Chrome trace event timeline.
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+_trace_lock = threading.Lock()
+_trace_file = None
+
+_SUBCOMMAND_PATTERN = re.compile(r'^[a-z][a-z0-9_-]*$')
+# Global options (of git, oc, rhpkg, ...) whose value is passed as a separate argument before the subcommand
+_OPTIONS_WITH_VALUE = {'-C', '-c', '--git-dir', '--work-tree', '-n', '--namespace', '--kubeconfig', '--context',
+                       '--config', '--path', '--user'}
+
+
+def enable_trace(path: str):
+    """
+    Starts appending spans to the specified trace file.
+    """
+    global _trace_file
+    with _trace_lock:
+        if _trace_file is not None:
+            _trace_file.close()
+        # line buffered so that the trace is complete even if the process is killed
+        _trace_file = open(path, 'a', encoding='utf-8', buffering=1)
+
+
+def disable_trace():
+    global _trace_file
+    with _trace_lock:
+        if _trace_file is not None:
+            _trace_file.close()
+        _trace_file = None
+
+
+def _current_task_name() -> Optional[str]:
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:  # no running event loop
+        return None
+    return task.get_name() if task else None
+
+
+def record_span(category: str, name: str, start: float, end: float, **fields):
+    """
+    Appends a span to the trace file, if tracing is enabled.
+    :param category: The kind of work (e.g. 'subprocess')
+    :param name: What was done
+    :param start: time.time() at which the work started
+    :param end: time.time() at which the work ended
+    :param fields: Additional information about the work. Values must be json serializable.
+    """
+    if _trace_file is None:
+        return
+    current_thread = threading.current_thread()
+    span = {
+        'cat': category,
+        'name': name,
+        'start': start,
+        'end': end,
+        'pid': os.getpid(),
+        'thread': current_thread.ident,
+        'thread_name': current_thread.name,
+        'task': _current_task_name(),
+    }
+    span.update(fields)
+    line = json.dumps(span, default=str)
+    with _trace_lock:
+        if _trace_file is not None:
+            _trace_file.write(line + '\n')
+
+
+@contextmanager
+def span(category: str, name: str, **fields) -> Iterator[Dict]:
+    """
+    Records the work done within the context as a span. The yielded dict can be updated
+    with fields which are only known once the work is done (e.g. an exit code).
+    If the context raises, the exception class is recorded in the 'error' field.
+    """
+    if _trace_file is None:
+        yield fields
+        return
+    start = time.time()
+    try:
+        yield fields
+    except BaseException as e:
+        fields['error'] = type(e).__name__
+        raise
+    finally:
+        record_span(category, name, start, time.time(), **fields)
+
+
+def command_class(cmd_list: List[str]) -> str:
+    """
+    Classifies a command line by its program and subcommand so that similar commands can be
+    aggregated. e.g. ['git', '-C', 'path', 'clone', ...] => 'git clone'
+    """
+    if not cmd_list:
+        return ''
+    program = os.path.basename(str(cmd_list[0]))
+    args = iter(cmd_list[1:])
+    for arg in args:
+        if str(arg) in _OPTIONS_WITH_VALUE:
+            next(args, None)  # e.g. the path of -C path
+        elif _SUBCOMMAND_PATTERN.match(str(arg)):
+            return f'{program} {arg}'
+    return program
@@ -274,6 +274,25 @@ class TestBrew(unittest.TestCase):
         actual = brew.get_latest_builds(tag_component_tuples, fake_session)
         self.assertListEqual(actual, expected)
 
+    def test_get_package_ids(self):
+        package_ids = {"foo": 1, "bar": 2, "baz": None}
+
+        def fake_get_package_id(name):
+            return mock.MagicMock(result=package_ids[name])
+
+        fake_session = mock.MagicMock()
+        fake_context_manager = fake_session.multicall.return_value.__enter__.return_value
+        fake_context_manager.getPackageID.side_effect = fake_get_package_id
+        with mock.patch.dict(brew._package_id_cache, clear=True):
+            actual = brew.get_package_ids(["foo", "bar", "foo", "baz"], fake_session)
+            self.assertEqual(package_ids, actual)
+            self.assertEqual(3, fake_context_manager.getPackageID.call_count)
+
+            # cached names, including missing packages, are not queried again
+            actual = brew.get_package_ids(["foo", "baz"], fake_session)
+            self.assertEqual({"foo": 1, "baz": None}, actual)
+            self.assertEqual(1, fake_session.multicall.call_count)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,139 @@
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+from elliottlib.bug_cache import BugCacheStore, BugSweepCache
+from elliottlib.bzutil import BugStatusChange
+
+
+class FakeBug:
+    def __init__(self, id, status, updated):
+        self.id = id
+        self.status = status
+        self.updated = updated
+
+    def last_change_time_parsed(self):
+        return datetime.fromtimestamp(self.updated, tz=timezone.utc)
+
+
+class TestBugSweepCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.store = BugCacheStore(self.cache_dir)
+        self.bug_tracker = MagicMock(type='jira', config={'server': 'jira.example.com'})
+        self.bug_tracker.serialize_bug.side_effect = lambda b: {'id': b.id, 'status': b.status, 'updated': b.updated}
+        self.bug_tracker.deserialize_bug.side_effect = lambda d: FakeBug(d['id'], d['status'], d['updated'])
+        self.bug_tracker.id_convert.side_effect = list
+        self.find_bugs_obj = MagicMock(status={'MODIFIED', 'ON_QA'}, cve_only=False)
+        self.cache = BugSweepCache(self.store, self.bug_tracker)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.cache_dir)
+
+    def test_search(self):
+        # first sweep queries everything
+        self.find_bugs_obj.search.return_value = [FakeBug('OCPBUGS-1', 'ON_QA', 100), FakeBug('OCPBUGS-2', 'MODIFIED', 100)]
+        bugs = self.cache.search(self.find_bugs_obj)
+        self.assertEqual(['OCPBUGS-1', 'OCPBUGS-2'], [b.id for b in bugs])
+        self.find_bugs_obj.search.assert_called_once_with(bug_tracker_obj=self.bug_tracker, verbose=False)
+
+        # next sweep only queries the delta: OCPBUGS-3 was added, OCPBUGS-2 no longer matches
+        self.find_bugs_obj.search.reset_mock()
+        self.find_bugs_obj.search.return_value = [FakeBug('OCPBUGS-3', 'ON_QA', 200)]
+        self.bug_tracker.get_bugs_updated_since.return_value = [FakeBug('OCPBUGS-2', 'ASSIGNED', 200)]
+        bugs = self.cache.search(self.find_bugs_obj)
+        self.assertEqual({'OCPBUGS-1', 'OCPBUGS-3'}, {b.id for b in bugs})
+        updated_since = self.find_bugs_obj.search.call_args.kwargs['updated_since']
+        self.assertLess(updated_since, time.time())
+        self.bug_tracker.get_bugs_updated_since.assert_called_once()
+        self.assertEqual({'OCPBUGS-1', 'OCPBUGS-2'}, set(self.bug_tracker.get_bugs_updated_since.call_args.args[0]))
+
+        # a different query is not answered from the cache
+        self.find_bugs_obj.search.reset_mock()
+        self.find_bugs_obj.status = {'VERIFIED'}
+        self.find_bugs_obj.search.return_value = []
+        self.assertEqual([], self.cache.search(self.find_bugs_obj))
+        self.find_bugs_obj.search.assert_called_once_with(bug_tracker_obj=self.bug_tracker, verbose=False)
+
+    def test_filter_bugs_by_cutoff_event(self):
+        bugs = [FakeBug('OCPBUGS-1', 'ON_QA', 100), FakeBug('OCPBUGS-2', 'ON_QA', 100)]
+        self.find_bugs_obj.search.return_value = bugs
+        self.cache.search(self.find_bugs_obj)
+        self.bug_tracker.get_status_changes.return_value = {
+            'OCPBUGS-1': [BugStatusChange(50, 'POST', 'ON_QA')],
+            'OCPBUGS-2': [BugStatusChange(90, 'POST', 'ON_QA')],
+        }
+        self.bug_tracker.filter_bugs_by_status_changes.side_effect = \
+            lambda bugs, changes, statuses, ts: [b for b in bugs if changes[b.id][-1].timestamp <= ts]
+
+        actual = self.cache.filter_bugs_by_cutoff_event(bugs, {'ON_QA'}, 60)
+        self.assertEqual(['OCPBUGS-1'], [b.id for b in actual])
+        self.bug_tracker.get_status_changes.assert_called_once()
+
+        # unchanged bugs are evaluated against the cached history; changed bugs are refetched
+        self.bug_tracker.get_status_changes.reset_mock()
+        self.bug_tracker.get_status_changes.return_value = {'OCPBUGS-2': [BugStatusChange(55, 'POST', 'ON_QA')]}
+        bugs = [FakeBug('OCPBUGS-1', 'ON_QA', 100), FakeBug('OCPBUGS-2', 'ON_QA', 150)]
+        actual = self.cache.filter_bugs_by_cutoff_event(bugs, {'ON_QA'}, 60)
+        self.assertEqual(['OCPBUGS-1', 'OCPBUGS-2'], [b.id for b in actual])
+        self.assertEqual(['OCPBUGS-2'], [b.id for b in self.bug_tracker.get_status_changes.call_args.args[0]])
+        self.bug_tracker.filter_bugs_by_cutoff_event.assert_not_called()
+
+    def test_filter_bugs_by_cutoff_event_incomplete_history(self):
+        bugs = [FakeBug('OCPBUGS-1', 'ON_QA', 100)]
+        self.find_bugs_obj.search.return_value = bugs
+        self.cache.search(self.find_bugs_obj)
+        self.bug_tracker.get_status_changes.return_value = {}
+        self.bug_tracker.filter_bugs_by_status_changes.return_value = []
+        self.bug_tracker.filter_bugs_by_cutoff_event.return_value = bugs
+        actual = self.cache.filter_bugs_by_cutoff_event(bugs, {'ON_QA'}, 60)
+        self.assertEqual(bugs, actual)
+        self.bug_tracker.filter_bugs_by_cutoff_event.assert_called_once_with(bugs, {'ON_QA'}, 60, verbose=False)
+
+    async def test_filter_attached_bugs(self):
+        bugs = [FakeBug('OCPBUGS-1', 'ON_QA', 100), FakeBug('OCPBUGS-2', 'ON_QA', 100)]
+        self.find_bugs_obj.search.return_value = bugs
+        self.cache.search(self.find_bugs_obj)
+        self.bug_tracker.filter_attached_bugs = AsyncMock(return_value=[bugs[0]])
+        actual = await self.cache.filter_attached_bugs(bugs)
+        self.assertEqual(['OCPBUGS-1'], [b.id for b in actual])
+
+        # attachment of unchanged bugs is not rechecked within the TTL
+        self.bug_tracker.filter_attached_bugs.reset_mock()
+        actual = await self.cache.filter_attached_bugs(bugs)
+        self.assertEqual(['OCPBUGS-1'], [b.id for b in actual])
+        self.bug_tracker.filter_attached_bugs.assert_not_awaited()
+
+        # a changed bug is rechecked
+        self.bug_tracker.filter_attached_bugs.return_value = []
+        bugs = [FakeBug('OCPBUGS-1', 'ON_QA', 200), FakeBug('OCPBUGS-2', 'ON_QA', 100)]
+        actual = await self.cache.filter_attached_bugs(bugs)
+        self.assertEqual([], actual)
+        self.bug_tracker.filter_attached_bugs.assert_awaited_once()
+        self.assertEqual(['OCPBUGS-1'], [b.id for b in self.bug_tracker.filter_attached_bugs.call_args.args[0]])
+
+        # an unattached bug is rechecked once the TTL has passed
+        self.cache.unattached_ttl = 0
+        self.bug_tracker.filter_attached_bugs.reset_mock()
+        await self.cache.filter_attached_bugs(bugs)
+        self.assertEqual({'OCPBUGS-1', 'OCPBUGS-2'}, {b.id for b in self.bug_tracker.filter_attached_bugs.call_args.args[0]})
+
+        # so is an attached bug, after its own TTL
+        self.bug_tracker.filter_attached_bugs.side_effect = lambda bugs: [bug for bug in bugs if bug.id == 'OCPBUGS-2']
+        await self.cache.filter_attached_bugs(bugs)
+        self.bug_tracker.filter_attached_bugs.reset_mock()
+        actual = await self.cache.filter_attached_bugs(bugs)
+        self.assertEqual(['OCPBUGS-2'], [b.id for b in actual])
+        self.assertEqual(['OCPBUGS-1'], [b.id for b in self.bug_tracker.filter_attached_bugs.call_args.args[0]])
+        self.cache.attached_ttl = 0
+        self.bug_tracker.filter_attached_bugs.reset_mock()
+        await self.cache.filter_attached_bugs(bugs)
+        self.assertEqual({'OCPBUGS-1', 'OCPBUGS-2'}, {b.id for b in self.bug_tracker.filter_attached_bugs.call_args.args[0]})
+
+
+if __name__ == '__main__':
+    unittest.main()
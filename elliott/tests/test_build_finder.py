@@ -55,6 +55,47 @@ class TestPlashetBuilder(unittest.TestCase):
         expected = {2, 4}
         self.assertEqual({b["id"] for b in actual.values()}, expected)
 
+    @patch("elliottlib.build_finder.assembly_basis_event", return_value=None)
+    def test_from_rpm_members(self, _):
+        builds = {  # (package ID, pattern) => builds
+            (1, "foo-4.14.*.assembly.art1*.el8"): [],
+            (1, "foo-4.14.*.assembly.stream*.el8"): [{"build_id": 11, "nvr": "foo-4.14.0-1.assembly.stream.el8", "release": "1.assembly.stream.el8"}],
+            (1, "foo-4.14.*.assembly.art1*.el9"): [{"build_id": 12, "nvr": "foo-4.14.0-1.assembly.art1.el9", "release": "1.assembly.art1.el9"}],
+            (2, "bar-4.14.*.assembly.art1*.el8"): [],
+            (2, "bar-4.14.*.assembly.stream*.el8"): [],
+            (2, "bar-4.14.*.*.el8"): [{"build_id": 21, "nvr": "bar-4.14.0-1.assembly.art2.el8", "release": "1.assembly.art2.el8"}],
+        }
+        calls = []
+        koji_api = MagicMock()
+        multicall = koji_api.multicall.return_value.__enter__.return_value
+        multicall.getPackage.side_effect = lambda name: MagicMock(result={"id": {"foo": 1, "bar": 2, "pinned": 3}[name]})
+
+        def list_builds(packageID, state, pattern, queryOpts):
+            calls.append(pattern)
+            return MagicMock(result=builds.get((packageID, pattern), []))
+        multicall.listBuilds.side_effect = list_builds
+        multicall.listTags.side_effect = lambda build: MagicMock(result=[{"name": "rhaos-4.14-rhel-8-candidate"}])
+
+        def rpm_meta(name, is_config=None):
+            meta = MagicMock()
+            meta.get_component_name.return_value = name
+            meta.branch_major_minor.return_value = "4.14"
+            meta.branch.return_value = "rhaos-4.14-rhel-8"
+            meta.config = Model({"is": is_config} if is_config else {})
+            return meta
+
+        finder = BuildFinder(koji_api)
+        finder._get_builds = MagicMock(return_value=[{"build_id": 31, "nvr": "pinned-1.0-1.el8"}])
+        actual = finder.from_rpm_members([rpm_meta("foo"), rpm_meta("bar"), rpm_meta("pinned", {"el8": "pinned-1.0-1.el8"})],
+                                         ["rhaos-4.14-rhel-8-candidate", "rhaos-4.14-rhel-9-candidate"], "art1", Model())
+
+        self.assertEqual(sorted(b["id"] for b in actual), [11, 12, 31])
+        self.assertEqual(koji_api.multicall.call_count, 5)  # getPackage, 3 x listBuilds, listTags
+        self.assertEqual(multicall.getPackage.call_count, 3)
+        self.assertEqual(len(calls), 4 + 3 + 2)
+        self.assertEqual(next(b for b in actual if b["id"] == 11)["_tags"], {"rhaos-4.14-rhel-8-candidate"})
+        finder._get_builds.assert_called_once_with(["pinned-1.0-1.el8"])
+
     def test_from_group_deps(self):
         finder = BuildFinder(MagicMock())
         group_config = Model({
@@ -47,7 +47,10 @@ class TestBugTracker(unittest.TestCase):
             }
         )
         brew_api = flexmock()
-        brew_api.should_receive("getPackageID").and_return(True)
+        flexmock(bzutil.brew).should_receive("get_package_ids")\
+            .with_args({'component:foo', 'component:bar', 'component:foobar'}, brew_api)\
+            .and_return({'component:foo': 1, 'component:bar': 2, 'component:foobar': 3})\
+            .once()
         actual = BugTracker.get_corresponding_flaw_bugs(tracker_bugs, BugzillaBugTracker({}), brew_api, strict=False)
         self.assertEqual(expected, actual)
 
@@ -68,7 +71,8 @@ class TestBugTracker(unittest.TestCase):
         flexmock(BugzillaBugTracker).should_receive("get_flaw_bugs").and_return(valid_flaw_bugs)
 
         brew_api = flexmock()
-        brew_api.should_receive("getPackageID").and_return(True)
+        flexmock(bzutil.brew).should_receive("get_package_ids")\
+            .and_return({'component:foo': 1, 'component:bar': 2, 'component:foobar': 3})
         self.assertRaises(
             exceptions.ElliottFatalError,
             BugTracker.get_corresponding_flaw_bugs, tracker_bugs, BugzillaBugTracker({}), brew_api, strict=True)
@@ -85,6 +89,35 @@ class TestJIRABugTracker(unittest.TestCase):
         expected = {'foo': 1, 'bar': 2}
         self.assertEqual(actual, expected)
 
+    def test_filter_bugs_by_status_changes(self):
+        with mock.patch("elliottlib.bzutil.JIRABugTracker.login"):
+            bug_tracker = JIRABugTracker({})
+        sweep_cutoff_timestamp = datetime(2021, 6, 30, 12, 30, 00, 0, tzinfo=timezone.utc).timestamp()
+
+        def bug(key, status, created="2021-06-01T00:00:00.000+0000"):
+            return JIRABug(flexmock(key=key, fields=flexmock(status=flexmock(name=status), created=created)))
+
+        def change(when, old, new):
+            return bzutil.BugStatusChange(datetime.strptime(when, "%Y%m%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp(), old, new)
+
+        bugs = [
+            bug("OCPBUGS-1", "ON_QA"),  # no status change; current status applies
+            bug("OCPBUGS-2", "ON_QA", created="2021-07-01T00:00:00.000+0000"),  # created after cutoff
+            bug("OCPBUGS-3", "ON_QA"),  # moved to ON_QA after cutoff
+            bug("OCPBUGS-4", "ASSIGNED"),  # was Verified before cutoff
+            bug("OCPBUGS-5", "ON_QA"),  # initially New
+        ]
+        status_changes = {
+            "OCPBUGS-1": [],
+            "OCPBUGS-2": [],
+            "OCPBUGS-3": [change("20210630T12:31:00", "POST", "ON_QA")],
+            "OCPBUGS-4": [change("20210601T00:00:00", "New", "Verified"), change("20210630T00:00:00", "Verified", "ASSIGNED")],
+            "OCPBUGS-5": [change("20210629T00:00:00", "New", "ON_QA")],
+        }
+        actual = bug_tracker.filter_bugs_by_status_changes(bugs, status_changes, ["MODIFIED", "ON_QA", "VERIFIED"],
+                                                           sweep_cutoff_timestamp)
+        self.assertListEqual(["OCPBUGS-1", "OCPBUGS-4", "OCPBUGS-5"], [b.id for b in actual])
+
 
 class TestBugzillaBugTracker(unittest.TestCase):
     def test_get_config(self):
@@ -1,4 +1,6 @@
+import re
 import unittest
+from unittest import mock
 from elliottlib.bzutil import JIRABugTracker
 from flexmock import flexmock
 
@@ -47,6 +49,39 @@ class TestJIRABugTracker(unittest.TestCase):
         jira._client = client
         jira.add_comment(bug.id, 'comment', private=True)
 
+    def test_get_bugs(self):
+        flexmock(JIRABugTracker).should_receive("login").and_return(None)
+        jira = JIRABugTracker({'project': 'OCPBUGS'})
+        jira._client = mock.MagicMock()
+        updated = {f"OCPBUGS-{i}": "2023-01-01T00:00:00.000+0000" for i in range(120)}
+
+        def search_issues(query, maxResults, fields=None):
+            keys = re.search(r"issue in \((.*)\)", query)[1].split(",")
+            return [flexmock(key=key, fields=flexmock(updated=updated[key])) for key in keys]
+        jira._client.search_issues.side_effect = search_issues
+        bug_ids = list(updated.keys())
+
+        with mock.patch.dict(JIRABugTracker._bug_cache, clear=True):
+            bugs = jira.get_bugs(bug_ids, fields=['labels'])
+            self.assertEqual(bug_ids, [b.id for b in bugs])
+            self.assertEqual(3, jira._client.search_issues.call_count)  # chunks of 50
+            self.assertEqual(['labels', 'updated'], jira._client.search_issues.call_args.kwargs['fields'])
+
+            # unchanged bugs are served from the cache once their update time is confirmed
+            jira._client.search_issues.reset_mock()
+            updated["OCPBUGS-0"] = "2023-01-02T00:00:00.000+0000"
+            bugs = jira.get_bugs(bug_ids, fields=['labels'])
+            self.assertEqual(bug_ids, [b.id for b in bugs])
+            fetched = [c for c in jira._client.search_issues.call_args_list if c.kwargs['fields'] != 'updated']
+            self.assertEqual(1, len(fetched))
+            self.assertIn("issue in (OCPBUGS-0)", fetched[0].args[0])
+
+            # bugs cached with fewer fields than requested are fetched again
+            jira._client.search_issues.reset_mock()
+            jira.get_bugs(bug_ids[:10])
+            self.assertEqual(1, jira._client.search_issues.call_count)
+            self.assertNotIn('fields', jira._client.search_issues.call_args.kwargs)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,9 @@
+import asyncio
 import base64
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import ANY, AsyncMock, Mock, patch
 from elliottlib.rpm_utils import parse_nvr
-from elliottlib.errata_async import AsyncErrataAPI, AsyncErrataUtils
+from elliottlib.errata_async import AsyncErrataAPI, AsyncErrataBuildResolver, AsyncErrataUtils
 from elliottlib import constants
 
 
@@ -130,6 +131,49 @@ class TestAsyncErrataAPI(IsolatedAsyncioTestCase):
         _make_request.assert_awaited_with(ANY, 'GET', '/api/v1/cve_package_exclusion', params={'filter[errata_id]': '1', 'page[number]': 3, 'page[size]': 1000})
         self.assertEqual(actual, [{'id': 1}, {'id': 2}, {'id': 3}, {'id': 4}, {'id': 5}])
 
+    @patch("aiohttp.ClientSession", autospec=True)
+    @patch("elliottlib.errata_async.AsyncErrataAPI._make_request", autospec=True)
+    async def test_get_metadata_comments_json(self, _make_request: Mock, ClientSession: Mock):
+        api = AsyncErrataAPI("https://errata.example.com")
+        _make_request.side_effect = lambda _0, _1, _2, params: {
+            1: {"data": [
+                {"attributes": {"text": "not json"}},
+                {"attributes": {"text": '{"release": "4.13", "kind": "rpm", "impetus": "standard"}'}},
+            ]},
+            2: {"data": [{"attributes": {"text": '{"release": "4.12", "kind": "rpm", "impetus": "standard"}'}}]},
+            3: {"data": []},
+        }[params['page[number]']]
+
+        actual = await api.get_metadata_comments_json(1)
+        _make_request.assert_awaited_with(ANY, 'GET', '/api/v1/comments', params={'filter[errata_id]': '1', 'filter[type]': 'Comment', 'page[number]': 3})
+        self.assertEqual([m["release"] for m in actual], ["4.12", "4.13"])
+
+
+class TestAsyncErrataBuildResolver(IsolatedAsyncioTestCase):
+    async def test_get_brew_build(self):
+        api = Mock()
+        api.get_brew_build = AsyncMock(return_value={"all_errata": [{"id": 1}], "files": [{"type": "tar"}]})
+        resolver = AsyncErrataBuildResolver(api)
+        builds = await asyncio.gather(
+            resolver.get_brew_build("a-1.0.0-1", "OSE-4.12-RHEL-8"),
+            resolver.get_brew_build("a-1.0.0-1", "OSE-4.12-RHEL-9"),
+        )
+        api.get_brew_build.assert_awaited_once_with("a-1.0.0-1")
+        self.assertEqual([b.product_version for b in builds], ["OSE-4.12-RHEL-8", "OSE-4.12-RHEL-9"])
+        self.assertEqual(builds[0].kind, "image")
+        self.assertEqual(builds[0].all_errata, [{"id": 1}])
+
+    async def test_get_release_version(self):
+        api = Mock()
+        api.get_metadata_comments_json = AsyncMock(side_effect=lambda advisory_id: {
+            1: [{"release": "4.12", "kind": "rpm", "impetus": "standard"}],
+            2: [],
+        }[advisory_id])
+        resolver = AsyncErrataBuildResolver(api)
+        actual = await asyncio.gather(*[resolver.get_release_version(advisory_id) for advisory_id in [1, 2, 1]])
+        self.assertEqual(actual, ["4.12", "", "4.12"])
+        self.assertEqual(api.get_metadata_comments_json.await_count, 2)
+
 
 class TestAsyncErrataUtils(IsolatedAsyncioTestCase):
     @patch("elliottlib.errata_async.AsyncErrataAPI", autospec=True)
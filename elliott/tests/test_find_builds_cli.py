@@ -1,9 +1,8 @@
+import asyncio
 import unittest
 from elliottlib.cli.find_builds_cli import _filter_out_inviable_builds, _find_shipped_builds
 from elliottlib.brew import Build
-import elliottlib
 from flexmock import flexmock
-import json
 from unittest import mock
 
 
@@ -14,41 +13,34 @@ class TestFindBuildsCli(unittest.TestCase):
 
     def test_attached_errata_failed(self):
         """
-        Test the internal wrapper function _attached_to_open_erratum_with_correct_product_version
+        Test the internal wrapper function _filter_out_inviable_builds
         attached_to_open_erratum = True, product_version is also the same:
-            _attached_to_open_erratum_with_correct_product_version() should return []
+            _filter_out_inviable_builds() should return []
         """
-        metadata_json_list = []
-        metadata = json.loads('''{"release": "4.1", "kind": "rpm", "impetus": "cve"}''')
-        metadata_json_list.append(metadata)
-
-        fake_errata = flexmock(model=elliottlib.errata, get_metadata_comments_json=lambda: 1234)
-        fake_errata.should_receive("get_metadata_comments_json").and_return(metadata_json_list)
+        resolver = mock.MagicMock()
+        resolver.get_release_version = mock.AsyncMock(return_value="4.1")
 
         builds = flexmock(Build(nvr="test-1.1.1", product_version="RHEL-7-OSE-4.1"))
         builds.should_receive("all_errata").and_return([{"id": 12345}])
 
         # expect return empty list []
-        self.assertEqual([], _filter_out_inviable_builds("image", [builds], fake_errata))
+        self.assertEqual([], asyncio.run(_filter_out_inviable_builds("image", [builds], resolver)))
+        resolver.get_release_version.assert_awaited_once_with(12345)
 
     def test_attached_errata_succeed(self):
         """
-        Test the internal wrapper function _attached_to_open_erratum_with_correct_product_version
+        Test the internal wrapper function _filter_out_inviable_builds
         attached_to_open_erratum = True but product_version is not same:
-            _attached_to_open_erratum_with_correct_product_version() should return [Build("test-1.1.1")]
+            _filter_out_inviable_builds() should return [Build("test-1.1.1")]
         """
-        metadata_json_list = []
-        metadata = json.loads('''{"release": "4.1", "kind": "rpm", "impetus": "cve"}''')
-        metadata_json_list.append(metadata)
-
-        fake_errata = flexmock(model=elliottlib.errata, get_metadata_comments_json=lambda: 1234)
-        fake_errata.should_receive("get_metadata_comments_json").and_return(metadata_json_list)
+        resolver = mock.MagicMock()
+        resolver.get_release_version = mock.AsyncMock(return_value="4.1")
 
         builds = flexmock(Build(nvr="test-1.1.1", product_version="RHEL-7-OSE-4.5"))
         builds.should_receive("all_errata").and_return([{"id": 12345}])
 
         # expect return list with one build
-        self.assertEqual([Build("test-1.1.1")], _filter_out_inviable_builds("image", [builds], fake_errata))
+        self.assertEqual([Build("test-1.1.1")], asyncio.run(_filter_out_inviable_builds("image", [builds], resolver)))
 
     @mock.patch("elliottlib.brew.get_builds_tags")
     def test_find_shipped_builds(self, get_builds_tags: mock.MagicMock):
@@ -66,6 +58,14 @@ class TestFindBuildsCli(unittest.TestCase):
         self.assertEqual(expected, actual)
         get_builds_tags.assert_called_once_with(build_ids, mock.ANY)
 
+    @mock.patch("elliottlib.brew.get_builds_tags")
+    def test_find_shipped_builds_with_known_tags(self, get_builds_tags: mock.MagicMock):
+        get_builds_tags.return_value = [[{"name": "RHBA-2077:1001-released"}]]
+        known_tags = {11: {"foo-candidate"}, 12: {"bar-candidate", "RHSA-2077:1002-released"}}
+        actual = _find_shipped_builds([11, 12, 13], mock.MagicMock(), known_tags=known_tags)
+        self.assertEqual({12, 13}, actual)
+        get_builds_tags.assert_called_once_with([13], mock.ANY)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from elliottlib import exectools, telemetry
+
+
+class TestTelemetry(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.trace_path = os.path.join(self.tmp_dir, 'trace.jsonl')
+        telemetry.enable_trace(self.trace_path)
+
+    def tearDown(self):
+        telemetry.disable_trace()
+        shutil.rmtree(self.tmp_dir)
+
+    def _load_trace(self):
+        with open(self.trace_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def test_command_class(self):
+        self.assertEqual('git clone', telemetry.command_class(['git', '-C', 'path', 'clone', 'https://example.com/repo']))
+        self.assertEqual('oc get', telemetry.command_class(['oc', '-n', 'ocp', '--kubeconfig', 'kc', 'get', 'is']))
+        self.assertEqual('oc image', telemetry.command_class(['/usr/bin/oc', 'image', 'mirror', 'a', 'b']))
+        self.assertEqual('true', telemetry.command_class(['true']))
+        self.assertEqual('', telemetry.command_class([]))
+
+    def test_span(self):
+        with telemetry.span('test', 'ok', a=1) as fields:
+            fields['b'] = 2
+        with self.assertRaises(ValueError):
+            with telemetry.span('test', 'failed'):
+                raise ValueError()
+        spans = self._load_trace()
+        self.assertEqual(['ok', 'failed'], [s['name'] for s in spans])
+        self.assertEqual((1, 2), (spans[0]['a'], spans[0]['b']))
+        self.assertNotIn('error', spans[0])
+        self.assertEqual('ValueError', spans[1]['error'])
+        self.assertLessEqual(spans[0]['start'], spans[0]['end'])
+
+    def test_disabled(self):
+        telemetry.disable_trace()
+        with telemetry.span('test', 'ignored'):
+            pass
+        telemetry.record_span('test', 'ignored', 0, 1)
+        self.assertEqual([], self._load_trace())
+
+    def test_cmd_gather(self):
+        rc, _, _ = exectools.cmd_gather(['echo', 'hello'])
+        self.assertEqual(0, rc)
+        rc, _, _ = asyncio.run(exectools.cmd_gather_async(['echo', 'hello']))
+        self.assertEqual(0, rc)
+        spans = self._load_trace()
+        self.assertEqual(2, len(spans))
+        for s in spans:
+            self.assertEqual(('subprocess', 'echo hello', 0), (s['cat'], s['name'], s['rc']))
+        self.assertIsNone(spans[0]['task'])
+        self.assertIsNotNone(spans[1]['task'])
+
+
+if __name__ == '__main__':
+    unittest.main()